@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSVの読み込み（エンジン切り替え）
+サービス実態・勤怠履歴・アップロードCSVを、同じ形の表にして返す。
+- 'pandas'  : pandas の C エンジン（dtype=str 指定で型推定をしない）
+- 'pyarrow' : pyarrow.csv（マルチスレッド。pyarrow が入っていれば使える）
+- 'polars'  : polars（入っていれば使える。cp932 は読み込み前に UTF-8 に変換する）
+どのエンジンでも、列はファイルの見出しどおり・値はファイルに書かれた文字列のまま（先頭の0や '1.0' を保つ）、
+空欄だけを欠損（NaN）にし（'NA'・'None'・'null'・'#N/A' などは文字列のまま）、dtype は object にそろえる。columns を渡すとその列だけ読む（ファイルにない列は無視）。
+
+既定のエンジンは環境変数 CSV_INGEST_ENGINE（なければ 'pandas'）。
+どれが速いかは `python csv_ingest.py input` のベンチマークで確かめられる。
+"""
+
+import argparse
+import codecs
+import csv
+import importlib.util
+import io
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from src import ENCODING
+
+ENGINES = ('pandas', 'pyarrow', 'polars')
+DEFAULT_ENGINE = os.environ.get('CSV_INGEST_ENGINE', 'pandas')
+# エンジンごとに必要なモジュール
+_ENGINE_MODULES = {'pandas': 'pandas', 'pyarrow': 'pyarrow.csv', 'polars': 'polars'}
+
+Source = Union[str, os.PathLike, bytes, io.IOBase]
+
+
+def engine_available(engine: str) -> bool:
+    module = _ENGINE_MODULES.get(engine)
+    if module is None:
+        return False
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def available_engines() -> List[str]:
+    """インストールされているエンジン（ENGINES の順）"""
+    return [engine for engine in ENGINES if engine_available(engine)]
+
+
+def _is_utf8(encoding: str) -> bool:
+    return encoding.replace('-', '').replace('_', '').lower() in ('utf8', 'utf8sig')
+
+
+def _read_bytes(source: Source) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        return Path(source).read_bytes()
+    data = source.read()
+    return data.encode('utf-8') if isinstance(data, str) else data
+
+
+def read_header(data: bytes, encoding: str = ENCODING) -> List[str]:
+    """先頭行の列名"""
+    text = io.TextIOWrapper(io.BytesIO(data), encoding=encoding, newline='')
+    return next(csv.reader(text), [])
+
+
+def _projection(header: Sequence[str], columns: Optional[Iterable[str]]) -> List[str]:
+    """読む列（ファイルの列順、columns にあってファイルにない列は除く）"""
+    if columns is None:
+        return list(header)
+    wanted = set(columns)
+    return [c for c in header if c in wanted]
+
+
+# 欠損として読む値（空欄だけ。各エンジンの既定の欠損表記 'NA'・'null' などは使わない）
+NULL_VALUES = ['']
+
+
+def _read_pandas(data: bytes, header: List[str], encoding: str) -> pd.DataFrame:
+    return pd.read_csv(io.BytesIO(data), encoding=encoding, engine='c', dtype=str, usecols=header,
+                       keep_default_na=False, na_values=NULL_VALUES)
+
+
+def _read_pyarrow(data: bytes, header: List[str], encoding: str) -> pd.DataFrame:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    table = pacsv.read_csv(
+        io.BytesIO(data),
+        read_options=pacsv.ReadOptions(encoding=encoding),
+        convert_options=pacsv.ConvertOptions(column_types={c: pa.string() for c in header},
+                                             include_columns=header, null_values=NULL_VALUES,
+                                             strings_can_be_null=True),
+    )
+    return table.to_pandas()
+
+
+def _read_polars(data: bytes, header: List[str], encoding: str) -> pd.DataFrame:
+    import polars as pl
+
+    if not _is_utf8(encoding):
+        data = data.decode(encoding).encode('utf-8')
+    # infer_schema_length=0：すべての列を文字列として読む
+    frame = pl.read_csv(io.BytesIO(data), columns=header, infer_schema_length=0, null_values=NULL_VALUES)
+    return pd.DataFrame(frame.to_dict(as_series=False), columns=header)
+
+
+_READERS: Dict[str, Callable[[bytes, List[str], str], pd.DataFrame]] = {
+    'pandas': _read_pandas,
+    'pyarrow': _read_pyarrow,
+    'polars': _read_polars,
+}
+
+
+def normalize_records(frame: pd.DataFrame, header: Sequence[str]) -> pd.DataFrame:
+    """エンジンによらない形に：列は header の順、dtype は object、欠損は NaN"""
+    frame = frame.reindex(columns=list(header)).astype(object)
+    return frame.where(frame.notna(), np.nan)
+
+
+def read_records(source: Source, columns: Optional[Iterable[str]] = None, engine: Optional[str] = None,
+                 encoding: str = ENCODING) -> pd.DataFrame:
+    """
+    CSVを読み込む（source はパス・bytes・バイナリのファイルオブジェクト）
+    engine を省略すると DEFAULT_ENGINE。入っていないエンジンを指定すると ImportError
+    """
+    engine = engine or DEFAULT_ENGINE
+    if engine not in _READERS:
+        raise ValueError(f"未対応の読み込みエンジンです: {engine}（{', '.join(ENGINES)}）")
+    if not engine_available(engine):
+        raise ImportError(f"読み込みエンジン {engine} を使うには {_ENGINE_MODULES[engine].split('.')[0]} をインストールしてください")
+    data = _read_bytes(source)
+    if _is_utf8(encoding) and data.startswith(codecs.BOM_UTF8):
+        # BOM は見出しに残さない（エンジンごとの扱いの違いをなくす）
+        data = data[len(codecs.BOM_UTF8):]
+    header = _projection(read_header(data, encoding), columns)
+    if not header:
+        return pd.DataFrame()
+    return normalize_records(_READERS[engine](data, header, encoding), header)
+
+
+def benchmark_engines(paths: Iterable[Union[str, os.PathLike]], columns: Optional[Iterable[str]] = None,
+                      engines: Optional[Iterable[str]] = None, repeat: int = 3,
+                      encoding: str = ENCODING) -> Dict[str, float]:
+    """
+    エンジンごとに paths を全部読む時間（秒、repeat 回の最小値）
+    ファイルはあらかじめメモリに読んでおき、ディスクの速さではなく解析の速さを比べる
+    """
+    blobs = [Path(p).read_bytes() for p in paths]
+    columns = list(columns) if columns is not None else None
+    results: Dict[str, float] = {}
+    for engine in (engines or available_engines()):
+        best = float('inf')
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            for data in blobs:
+                read_records(data, columns=columns, engine=engine, encoding=encoding)
+            best = min(best, time.perf_counter() - start)
+        results[engine] = best
+    return results
+
+
+def fastest_engine(paths: Iterable[Union[str, os.PathLike]], **kwargs) -> str:
+    """benchmark_engines で最も速かったエンジン"""
+    results = benchmark_engines(paths, **kwargs)
+    return min(results, key=results.get)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="CSV読み込みエンジンのベンチマーク")
+    ap.add_argument("input", help="入力CSVのあるフォルダ、またはCSVファイル")
+    ap.add_argument("--columns", "-c", default=None, help="読む列（カンマ区切り、省略時は全列）")
+    ap.add_argument("--repeat", type=int, default=3, help="各エンジンの計測回数（最小値を採用）")
+    ap.add_argument("--encoding", default=ENCODING, help="文字コード")
+    args = ap.parse_args()
+
+    target = Path(args.input)
+    # フォルダなら入力CSV（出力の result_*.csv は除く）
+    paths = sorted(p for p in target.glob("*.csv") if not p.name.startswith(("result_", "_result_"))) \
+        if target.is_dir() else [target]
+    if not paths:
+        raise SystemExit(f"CSVが見つかりません: {target}")
+    columns = [c.strip() for c in args.columns.split(",") if c.strip()] if args.columns else None
+
+    missing = [engine for engine in ENGINES if not engine_available(engine)]
+    if missing:
+        print(f"未インストールのため対象外: {', '.join(missing)}")
+    results = benchmark_engines(paths, columns=columns, repeat=args.repeat, encoding=args.encoding)
+    for engine, seconds in sorted(results.items(), key=lambda item: item[1]):
+        print(f"{engine:8s} {seconds * 1000:8.1f} ms（{len(paths)}ファイル）")
+    best = min(results, key=results.get)
+    print(f"最速: {best}（CSV_INGEST_ENGINE={best} で既定にできます）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+サービス実態から勤怠を算出する
+全施設のサービス区間を従業員ごとに1本の表（分単位の整数）にまとめ、
+- 2時間ルール（前のサービスの終了から2時間未満で始まるサービスは同じ勤務）で結合した区間を出勤〜退勤とし、
+- 勤務の長さに応じた休憩（required_break_minutes）を、勤務中のサービスのない時間に長い順に割り当てる。
+勤務は開始した日の勤務として扱い、日をまたぐ時刻は 24:00 を超える表記（例: 26:30）のまま残す。
+結果は勤怠履歴CSVと同じ列（名前・*従業員ID・*年月日・出勤n/退勤n・休憩n/復帰n）の表で返し、
+そのまま build_jinjer_frame に渡せる。
+"""
+
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from csv_ingest import read_records
+from employee_roster import EmployeeRoster
+from interval_engine import merge_close_intervals, valid_interval_mask
+from pattern_evaluator import required_break_minutes
+from src import ENCODING, build_service_records
+
+DAY_MINUTES = 24 * 60
+# 2時間ルール（optimal_attendance_export.MERGE_GAP_MINUTES と同じ）
+MERGE_GAP_MINUTES = 120
+# これより短いサービスの空きは休憩に使わない
+MIN_BREAK_PIECE_MINUTES = 15
+# 出力する出勤n/退勤n・休憩n/復帰n の数（勤怠履歴CSV・jinjer形式CSVの列数）
+MAX_SLOTS = 10
+
+
+def load_service_dfs(input_dir, encoding: str = ENCODING) -> Dict[str, pd.DataFrame]:
+    """フォルダ内のサービス実態CSV（result_*・勤怠履歴を除く）を build_service_records で読み込む"""
+    service_dfs = {}
+    for p in sorted(Path(input_dir).glob("*.csv")):
+        if p.name.startswith(("result_", "_result_")) or "勤怠" in p.name:
+            continue
+        service_dfs[p.stem] = build_service_records(p, read_records(p, encoding=encoding), p.stem)
+    return service_dfs
+
+
+def _minutes(values: pd.Series) -> np.ndarray:
+    return pd.to_datetime(values).to_numpy(dtype="datetime64[m]").astype(np.int64)
+
+
+def combined_service_minutes(service_dfs: Mapping[str, pd.DataFrame]) -> pd.DataFrame:
+    """全施設のサービスを (従業員, 開始分, 終了分) の1つの表に（分は 1970-01-01 0:00 から、区間の壊れた行は除く）"""
+    parts = []
+    for df in service_dfs.values():
+        if df.empty:
+            continue
+        part = df[valid_interval_mask(df["_開始DT"], df["_終了DT"])]
+        parts.append(pd.DataFrame({
+            "従業員": part["_担当所員_norm"].astype(object).fillna("").to_numpy(dtype=object),
+            "開始": _minutes(part["_開始DT"]),
+            "終了": _minutes(part["_終了DT"]),
+        }))
+    if not parts:
+        return pd.DataFrame({"従業員": pd.Series(dtype=object), "開始": pd.Series(dtype=np.int64),
+                             "終了": pd.Series(dtype=np.int64)})
+    combined = pd.concat(parts, ignore_index=True)
+    return combined[combined["従業員"] != ""].reset_index(drop=True)
+
+
+def derive_attendance_intervals(service_dfs: Mapping[str, pd.DataFrame], merge_gap: int = MERGE_GAP_MINUTES,
+                                min_break_piece: int = MIN_BREAK_PIECE_MINUTES
+                                ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (勤務, 休憩) の縦長の表を返す。時刻は勤務を開始した日の 0:00 からの分（24時間超あり）
+    勤務: 従業員・日付・出勤・退勤・休憩（必要な分）・休憩不足（サービスの空きが足りず割り当てられなかった分）
+    休憩: 従業員・日付・休憩・復帰
+    休憩は勤務（2時間ルールで結合した区間）ごとに required_break_minutes の長さを、サービスのない時間のうち
+    min_break_piece 分以上のものへ長い順に（同じ長さなら早い順に）割り当てる
+    """
+    services = combined_service_minutes(service_dfs)
+    codes, staff_names = pd.factorize(services["従業員"])
+    starts = services["開始"].to_numpy(dtype=np.int64)
+    ends = services["終了"].to_numpy(dtype=np.int64)
+    block_staff, block_starts, block_ends = merge_close_intervals(codes, starts, ends, merge_gap)
+    n_blocks = len(block_staff)
+    spans = block_ends - block_starts
+    required = required_break_minutes(spans)
+
+    # 勤務の中のサービスのない時間：(従業員, 開始) 順にたどり、ここまでの終了の最大値より後に始まる部分
+    breaks = pd.DataFrame({"勤務": np.empty(0, dtype=np.int64), "休憩": np.empty(0, dtype=np.int64),
+                           "復帰": np.empty(0, dtype=np.int64)})
+    if len(codes):
+        order = np.lexsort((starts, codes))
+        c, s, e = codes[order].astype(np.int64), starts[order], ends[order]
+        origin = int(min(s.min(), e.min()))
+        width = int(max(s.max(), e.max())) - origin + 1
+        running_end = np.maximum.accumulate(c * width + (e - origin)) - c * width + origin
+        same_staff = np.concatenate([[False], c[1:] == c[:-1]])
+        gap_starts = np.concatenate([[0], running_end[:-1]])
+        gap_len = np.where(same_staff, s - gap_starts, 0)
+        is_gap = (gap_len >= min_break_piece) & (gap_len < merge_gap)
+        # 空きの属する勤務：勤務は (従業員, 開始) 順に並んでいるので合成キーで二分探索する
+        block_key = block_staff * width + (block_starts - origin)
+        gap_block = np.searchsorted(block_key, c[is_gap] * width + (s[is_gap] - origin), side="right") - 1
+        gaps = pd.DataFrame({"勤務": gap_block, "開始": gap_starts[is_gap], "長さ": gap_len[is_gap]})
+        gaps = gaps[required[gaps["勤務"].to_numpy()] > 0]
+        # 勤務ごとに長い順に必要な分だけ使う
+        gaps = gaps.sort_values(["勤務", "長さ", "開始"], ascending=[True, False, True], kind="stable")
+        used_before = gaps.groupby("勤務")["長さ"].cumsum().to_numpy() - gaps["長さ"].to_numpy()
+        take = np.minimum(gaps["長さ"].to_numpy(), required[gaps["勤務"].to_numpy()] - used_before)
+        keep = take > 0
+        breaks = pd.DataFrame({"勤務": gaps["勤務"].to_numpy()[keep], "休憩": gaps["開始"].to_numpy()[keep],
+                               "復帰": gaps["開始"].to_numpy()[keep] + take[keep]})
+    assigned = np.bincount(breaks["勤務"].to_numpy(), weights=breaks["復帰"] - breaks["休憩"],
+                           minlength=n_blocks).astype(np.int64)
+
+    days = block_starts // DAY_MINUTES
+    base = days * DAY_MINUTES
+    work = pd.DataFrame({
+        "従業員": np.asarray(staff_names, dtype=object)[block_staff] if n_blocks else np.empty(0, dtype=object),
+        "日付": pd.to_datetime(days, unit="D"),
+        "出勤": block_starts - base,
+        "退勤": block_ends - base,
+        "休憩": assigned,
+        "休憩不足": required - assigned,
+    })
+    break_blocks = breaks["勤務"].to_numpy()
+    break_table = pd.DataFrame({
+        "従業員": work["従業員"].to_numpy()[break_blocks],
+        "日付": work["日付"].to_numpy()[break_blocks],
+        "休憩": breaks["休憩"].to_numpy() - base[break_blocks],
+        "復帰": breaks["復帰"].to_numpy() - base[break_blocks],
+    }).sort_values(["従業員", "日付", "休憩"], kind="stable", ignore_index=True)
+    return work, break_table
+
+
+def _format_minutes(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    return (pd.Series(values // 60).astype(str) + ":" + pd.Series(values % 60).astype(str).str.zfill(2)).to_numpy()
+
+
+def _spread(table: pd.DataFrame, keys: pd.MultiIndex, columns: Tuple[str, str],
+            labels: Tuple[str, str]) -> Dict[str, np.ndarray]:
+    """縦長の (従業員, 日付, 開始, 終了) を行 keys の 開始n/終了n 列に広げる（MAX_SLOTS まで）"""
+    out = {f"{label}{k}": np.full(len(keys), None, dtype=object) for k in range(1, MAX_SLOTS + 1) for label in labels}
+    if table.empty:
+        return out
+    row = keys.get_indexer(pd.MultiIndex.from_arrays([table["従業員"], table["日付"]]))
+    first = np.concatenate([[True], row[1:] != row[:-1]])
+    position = np.arange(len(row))
+    slot = position - np.maximum.accumulate(np.where(first, position, 0)) + 1
+    start_text = _format_minutes(table[columns[0]].to_numpy())
+    end_text = _format_minutes(table[columns[1]].to_numpy())
+    for k in range(1, MAX_SLOTS + 1):
+        in_slot = slot == k
+        out[f"{labels[0]}{k}"][row[in_slot]] = start_text[in_slot]
+        out[f"{labels[1]}{k}"][row[in_slot]] = end_text[in_slot]
+    return out
+
+
+def derive_attendance_frame(service_dfs: Mapping[str, pd.DataFrame], roster: Optional[EmployeeRoster] = None,
+                            merge_gap: int = MERGE_GAP_MINUTES) -> pd.DataFrame:
+    """
+    サービス実態から算出した勤怠を、勤怠履歴CSVと同じ列の表（従業員 × 勤務のある日、1行）で返す
+    名前・*従業員ID は roster（勤怠履歴の名簿）があれば表示名・IDに置き換える
+    """
+    work, break_table = derive_attendance_intervals(service_dfs, merge_gap=merge_gap)
+    work = work.sort_values(["従業員", "日付", "出勤"], kind="stable", ignore_index=True)
+    keys = pd.MultiIndex.from_frame(work[["従業員", "日付"]].drop_duplicates())
+
+    names = keys.get_level_values(0).to_numpy(dtype=object)
+    if roster is not None:
+        display = {name: roster.display_name(name) for name in pd.unique(names)}
+        emp_ids = {name: roster.lookup(display[name]) or "" for name in display}
+        display_names = np.array([display[n] for n in names], dtype=object)
+        ids = np.array([emp_ids[n] for n in names], dtype=object)
+    else:
+        display_names, ids = names, np.full(len(names), "", dtype=object)
+
+    frame = pd.DataFrame({
+        "名前": display_names,
+        "*従業員ID": ids,
+        "*年月日": keys.get_level_values(1).strftime("%Y-%m-%d"),
+    })
+    for column, values in _spread(work, keys, ("出勤", "退勤"), ("出勤", "退勤")).items():
+        frame[column] = values
+    for column, values in _spread(break_table, keys, ("休憩", "復帰"), ("休憩", "復帰")).items():
+        frame[column] = values
+    shortage = work.groupby(["従業員", "日付"], sort=False)["休憩不足"].sum()
+    frame["休憩不足(分)"] = shortage.reindex(keys).to_numpy(dtype=np.int64)
+    return frame
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+汎用重複チェック用の重複インデックス
+アップロードされたDataFrameの各列を一度だけハッシュ化し、
+行の重複（選択列の組み合わせ）・列ごとの重複数・品質指標をそこから導出する。
+- 行ハッシュは列ハッシュの合成で作るので、列の選択を変えてもデータは再ハッシュしない
+- ハッシュが一致した候補は元の値で照合し、衝突があれば厳密なグループ化で求め直す
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+_HASH_SEED = np.uint64(0x345678)
+_HASH_MULT = np.uint64(1000003)
+
+
+def _combine_hashes(hashes: Sequence[np.ndarray]) -> np.ndarray:
+    """列ハッシュを順序付きで合成して行ハッシュにする"""
+    combined = np.full(len(hashes[0]), _HASH_SEED, dtype=np.uint64)
+    mult = _HASH_MULT
+    n = len(hashes)
+    for i, h in enumerate(hashes):
+        combined = (combined ^ h) * mult
+        mult = mult + np.uint64(82520 + 2 * (n - i))
+    return combined + np.uint64(97531)
+
+
+def _first_positions(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """キー配列の (コード, コードごとの初出位置, コードごとの件数)"""
+    codes, uniques = pd.factorize(keys)
+    # factorize のコードは初出順に振られるので、累積最大値が更新される位置が初出位置
+    if len(codes):
+        running_max = np.maximum.accumulate(codes)
+        first = np.flatnonzero(np.r_[True, codes[1:] > running_max[:-1]])
+    else:
+        first = np.empty(0, dtype=np.intp)
+    counts = np.bincount(codes, minlength=len(uniques))
+    return codes, first, counts
+
+
+def _values_equal(values: np.ndarray, left: np.ndarray, right: np.ndarray) -> bool:
+    """values[left] と values[right] がすべて等しいか（欠損同士は等しいとみなす）"""
+    a = values[left]
+    b = values[right]
+    with np.errstate(invalid="ignore"):
+        equal = np.asarray(a == b, dtype=bool)
+    if not equal.all():
+        equal |= np.asarray(pd.isna(a) & pd.isna(b), dtype=bool)
+    return bool(equal.all())
+
+
+class RowDuplicates:
+    """
+    選択列に対する行の重複情報
+    - duplicated: 2件目以降の重複行（df.duplicated(keep='first') 相当）
+    - in_group: 重複グループに属する全行（df.duplicated(keep=False) 相当）
+    - group_ids: 重複グループ番号（グループに属さない行は -1）
+    """
+
+    def __init__(self, codes: np.ndarray, first: np.ndarray, counts: np.ndarray):
+        n = len(codes)
+        self.duplicated = first[codes] != np.arange(n, dtype=np.intp)
+        self.in_group = counts[codes] > 1
+        # グループ番号は初出順に 0, 1, 2, ...
+        group_of_code = np.full(len(counts), -1, dtype=np.int64)
+        grouped = np.flatnonzero(counts > 1)
+        grouped = grouped[np.argsort(first[grouped], kind="stable")]
+        group_of_code[grouped] = np.arange(len(grouped))
+        self.group_ids = group_of_code[codes]
+
+    @property
+    def duplicate_count(self) -> int:
+        return int(self.duplicated.sum())
+
+    @property
+    def group_count(self) -> int:
+        return int(self.group_ids.max()) + 1 if len(self.group_ids) else 0
+
+    def group_positions(self) -> np.ndarray:
+        """重複グループに属する行の位置（グループ番号順・グループ内は元の順）"""
+        positions = np.flatnonzero(self.in_group)
+        order = np.argsort(self.group_ids[positions], kind="stable")
+        return positions[order]
+
+
+class DuplicateIndex:
+    """
+    アップロード1件分の重複インデックス
+    列ハッシュ・列ごとの重複数・選択列ごとの行重複はそれぞれ初回参照時に1回だけ計算する。
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._column_hashes: Dict[str, np.ndarray] = {}
+        self._column_duplicates: Dict[str, int] = {}
+        self._rows: Dict[Tuple[str, ...], RowDuplicates] = {}
+        self._null_counts: Optional[pd.Series] = None
+        self._complete_rows: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    # ---- 列ハッシュ ----
+    def column_hash(self, col: str) -> np.ndarray:
+        h = self._column_hashes.get(col)
+        if h is None:
+            h = pd.util.hash_pandas_object(self.df[col], index=False).to_numpy()
+            self._column_hashes[col] = h
+        return h
+
+    def column_duplicate_count(self, col: str) -> int:
+        """df[col].duplicated().sum() 相当"""
+        count = self._column_duplicates.get(col)
+        if count is None:
+            codes, first, _ = _first_positions(self.column_hash(col))
+            dup = np.flatnonzero(first[codes] != np.arange(len(codes), dtype=np.intp))
+            values = self.df[col].to_numpy()
+            if _values_equal(values, dup, first[codes[dup]]):
+                count = len(dup)
+            else:
+                count = int(self.df[col].duplicated().sum())
+            self._column_duplicates[col] = count
+        return count
+
+    def column_duplicate_counts(self) -> Dict[str, int]:
+        return {col: self.column_duplicate_count(col) for col in self.df.columns}
+
+    # ---- 行の重複 ----
+    def rows(self, subset: Optional[Sequence[str]] = None) -> RowDuplicates:
+        """選択列（省略時は全列）での行の重複情報"""
+        key = tuple(subset) if subset else tuple(self.df.columns)
+        result = self._rows.get(key)
+        if result is None:
+            result = self._build_rows(list(key))
+            self._rows[key] = result
+        return result
+
+    def _build_rows(self, subset: List[str]) -> RowDuplicates:
+        n = len(self.df)
+        if n == 0 or not subset:
+            empty = np.empty(0, dtype=np.intp)
+            return RowDuplicates(empty, empty, empty) if n == 0 else RowDuplicates(
+                np.zeros(n, dtype=np.intp), np.zeros(1, dtype=np.intp), np.array([n]))
+        keys = _combine_hashes([self.column_hash(c) for c in subset])
+        codes, first, counts = _first_positions(keys)
+
+        # ハッシュが一致した行が本当に同じ値か照合する
+        later = np.flatnonzero(first[codes] != np.arange(n, dtype=np.intp))
+        firsts = first[codes[later]]
+        if all(_values_equal(self.df[c].to_numpy(), later, firsts) for c in subset):
+            return RowDuplicates(codes, first, counts)
+
+        # 衝突があった場合は厳密なグループ化で求め直す
+        exact = self.df.groupby(subset, sort=False, dropna=False).ngroup().to_numpy()
+        return RowDuplicates(*_first_positions(exact))
+
+    def duplicate_rows(self, subset: Optional[Sequence[str]] = None,
+                       group_col: str = "重複グループ") -> pd.DataFrame:
+        """重複グループに属する行（グループ番号の列付き、グループ順）"""
+        rows = self.rows(subset)
+        positions = rows.group_positions()
+        out = self.df.iloc[positions].copy()
+        out.insert(0, group_col, rows.group_ids[positions] + 1)
+        return out
+
+    # ---- 品質指標 ----
+    @property
+    def null_counts(self) -> pd.Series:
+        if self._null_counts is None:
+            self._null_counts = self.df.isnull().sum()
+        return self._null_counts
+
+    def quality_metrics(self) -> Dict[str, int]:
+        """総行数・重複行数・欠損値数・完全行数"""
+        null_total = int(self.null_counts.sum())
+        if self._complete_rows is None:
+            self._complete_rows = len(self.df) if null_total == 0 else int(self.df.notna().all(axis=1).sum())
+        return {
+            "総行数": len(self.df),
+            "重複行数": self.rows().duplicate_count,
+            "欠損値数": null_total,
+            "完全行数": self._complete_rows,
+        }
+
+    def quality_score(self) -> float:
+        """(総行数 - 重複行数 - 欠損値数) / 総行数 * 100"""
+        metrics = self.quality_metrics()
+        if metrics["総行数"] == 0:
+            return 0.0
+        return (metrics["総行数"] - metrics["重複行数"] - metrics["欠損値数"]) / metrics["総行数"] * 100
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+従業員名簿（名前 → *従業員ID・表示名の一覧）
+勤怠履歴CSVを1回だけ読み、名前の正規化は重複を除いた名前に対してまとめて行う。
+ファイルのパス・更新時刻・サイズをキーにプロセス全体で保持し、ファイルが変わったときだけ読み直す。
+jinjer形式CSVの出力画面と generate_jinjer_csv が同じ名簿を使う。
+"""
+
+import os
+import threading
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import pandas as pd
+
+from csv_ingest import read_records
+from src import ENCODING, normalize_name
+
+DEFAULT_ATTENDANCE_PATH = 'input/勤怠履歴.csv'
+
+# 勤怠CSVから名簿を作れない場合の固定ID
+FALLBACK_EMPLOYEE_IDS = {
+    '利光 梨絵': 'EMP001',
+    '大宮 浩子': 'EMP002',
+    '早崎 友音': 'EMP003',
+    '早崎 琴絵': 'EMP004',
+    '萩原 真理子': 'EMP005'
+}
+
+
+def _text(values: pd.Series) -> pd.Series:
+    """文字列に（欠損・'nan' は空文字）"""
+    text = values.astype(str).str.strip()
+    return text.mask(values.isna() | (text == 'nan'), '')
+
+
+def normalize_names(names: Iterable[str]) -> List[str]:
+    """名前をまとめて正規化する（同じ名前は1回だけ normalize_name を通す）"""
+    names = list(names)
+    table = {name: normalize_name(name) for name in dict.fromkeys(names)}
+    return [table[name] for name in names]
+
+
+class EmployeeRoster:
+    """
+    勤怠データから作る従業員名簿（読み取り専用）
+    ids は前後の空白を除いた名前と正規化した名前の両方をキーに持ち、同じ名前が複数行あれば後の行を優先する
+    """
+
+    def __init__(self, display_names: Iterable[str], ids: Mapping[str, str],
+                 attendance: Optional[pd.DataFrame] = None, signature: Optional[Tuple] = None):
+        self.display_names: Tuple[str, ...] = tuple(display_names)
+        self.ids: Mapping[str, str] = MappingProxyType(dict(ids))
+        self.attendance = attendance
+        self.signature = signature
+        self._display_set = frozenset(self.display_names)
+        self._display_by_normalized: Dict[str, str] = {}
+        for name, normalized in zip(self.display_names, normalize_names(self.display_names)):
+            self._display_by_normalized.setdefault(normalized, name)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, signature: Optional[Tuple] = None) -> "EmployeeRoster":
+        """勤怠データ（名前・*従業員ID 列）から作る"""
+        names = _text(df['名前']) if '名前' in df.columns else pd.Series('', index=df.index, dtype=object)
+        display_names = [name for name in pd.unique(names.to_numpy()) if name]
+
+        ids: Dict[str, str] = {}
+        if '*従業員ID' in df.columns:
+            emp_ids = _text(df['*従業員ID'])
+            pairs = pd.DataFrame({'name': names, 'id': emp_ids})
+            pairs = pairs[(pairs['name'] != '') & (pairs['id'] != '')].drop_duplicates('name', keep='last')
+            for name, normalized, emp_id in zip(pairs['name'], normalize_names(pairs['name']), pairs['id']):
+                if normalized:
+                    ids[normalized] = emp_id
+                    # 正規化前の名前でも引けるようにする
+                    ids[name] = emp_id
+        return cls(display_names, ids, attendance=df, signature=signature)
+
+    @classmethod
+    def from_csv(cls, path: str, encoding: str = ENCODING) -> "EmployeeRoster":
+        return cls.from_frame(read_records(path, encoding=encoding), signature=file_signature(path))
+
+    def __len__(self) -> int:
+        return len(self.display_names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._display_set
+
+    def lookup(self, name: str) -> Optional[str]:
+        """従業員ID（名前そのもの、次に正規化した名前で探す。見つからなければ None）"""
+        emp_id = self.ids.get(name)
+        if emp_id is None:
+            emp_id = self.ids.get(normalize_name(name))
+        return emp_id
+
+    def display_name(self, name: str) -> str:
+        """勤怠データ上の表示名（正規化した名前が一致するもの。なければ name のまま）"""
+        if name in self._display_set:
+            return name
+        return self._display_by_normalized.get(normalize_name(name), name)
+
+    def employee_id(self, name: str) -> str:
+        """従業員ID（見つからなければフォールバックのIDを生成）"""
+        if not self.ids:
+            return FALLBACK_EMPLOYEE_IDS.get(name, f'EMP{hash(name) % 1000:03d}')
+        emp_id = self.lookup(name)
+        if emp_id is not None:
+            return emp_id
+        print(f"警告: 従業員 '{name}' (正規化後: '{normalize_name(name)}') が勤怠CSVに見つかりません")
+        print(f"利用可能な従業員名: {list(self.display_names[:10])}...")
+        return f'EMP{hash(name) % 1000:03d}'
+
+    def employee_ids(self, names: Iterable[str]) -> List[str]:
+        return [self.employee_id(name) for name in names]
+
+
+def file_signature(path: str) -> Tuple[str, int, int]:
+    """(絶対パス, 更新時刻ns, サイズ)"""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime_ns, st.st_size
+
+
+_roster_cache: Dict[str, EmployeeRoster] = {}
+_roster_lock = threading.Lock()
+
+
+def load_employee_roster(path: str = DEFAULT_ATTENDANCE_PATH, encoding: str = ENCODING) -> EmployeeRoster:
+    """
+    名簿をキャッシュから取得する（ファイルの更新時刻・サイズが変わっていれば読み直す）
+    ファイルを読めない場合は空の名簿を返す
+    """
+    try:
+        signature = file_signature(path)
+    except OSError as e:
+        print(f"勤怠CSVの読み込みエラー: {e}")
+        return EmployeeRoster((), {})
+    with _roster_lock:
+        roster = _roster_cache.get(signature[0])
+        if roster is not None and roster.signature == signature:
+            return roster
+        try:
+            roster = EmployeeRoster.from_frame(read_records(path, encoding=encoding), signature=signature)
+        except Exception as e:
+            print(f"勤怠CSVの読み込みエラー: {e}")
+            return EmployeeRoster((), {})
+        _roster_cache[signature[0]] = roster
+        return roster
+
+
+def clear_roster_cache() -> None:
+    with _roster_lock:
+        _roster_cache.clear()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+結果グリッドエンジン
+result_*.csv を一度だけ読み込んで型付きの列指向DataFrameにし、
+エラー・カテゴリ・担当所員・利用者名・日付の索引を事前計算する。
+フィルタは索引の参照とマスク演算だけで行い、表示はページ単位で切り出す。
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import ENCODING, ERR_COL, CAT_COL, FLAG, SERVICE_DATE_COL
+
+# グリッド列 → result_*.csv の列
+GRID_COLUMN_MAP: Dict[str, str] = {
+    'A': ERR_COL,            # エラー状態
+    'B': CAT_COL,            # カテゴリ
+    'C': '担当所員',
+    'D': '日付',
+    'E': '開始時間',
+    'F': '終了時間',
+    'G': '利用者名',
+    'H': '重複時間（分）',
+    'I': '超過時間（分）',
+    'J': '重複相手施設',
+    'K': '重複相手担当者',
+    'L': '重複タイプ',
+    'M': 'カバー状況',
+    'N': '勤務区間数',
+    'O': '詳細ID',
+}
+
+# 表示用ラベル
+GRID_LABELS: Dict[str, str] = {
+    'A': 'エラー', 'B': 'カテゴリ', 'C': '担当所員', 'D': '日付',
+    'E': '開始時間', 'F': '終了時間', 'G': '利用者名', 'AB': 'サービス',
+    'H': '重複時間(分)', 'I': '超過時間(分)', 'J': '重複相手施設', 'K': '重複相手担当者',
+    'L': '重複タイプ', 'M': 'カバー状況', 'N': '勤務区間数', 'O': '詳細ID',
+}
+
+GRID_COLUMNS = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'AB',
+                'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'ファイル', '行番号', '西暦日付']
+
+CATEGORICAL_COLUMNS = ['A', 'B', 'C', 'G', 'J', 'K', 'L', 'M', 'ファイル']
+INT_COLUMNS = ['H', 'I', 'N']
+STRING_COLUMNS = ['D', 'E', 'F', 'AB', 'O']
+
+# 索引を張る列（日付は別途ソート索引）
+INDEXED_COLUMNS = ['A', 'B', 'C', 'G']
+
+CATEGORY_SEP = "，"
+CATEGORY_TOKENS = ["施設間重複", "事業所内重複", "勤怠履歴超過"]
+
+DEFAULT_PAGE_SIZE = 100
+
+_SOURCE_COLUMNS = set(GRID_COLUMN_MAP.values()) | {'サービス内容', '実施時間', SERVICE_DATE_COL}
+
+
+def read_result_csv(path: str, usecols: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """result_*.csv を読み込む（cp932 で読めなければ UTF-8 BOM付き）"""
+    wanted = set(usecols) if usecols is not None else None
+    kwargs = {"dtype": str, "keep_default_na": False}
+    if wanted is not None:
+        kwargs["usecols"] = lambda c: c in wanted
+    try:
+        return pd.read_csv(path, encoding=ENCODING, **kwargs)
+    except UnicodeDecodeError:
+        return pd.read_csv(path, encoding="utf-8-sig", **kwargs)
+
+
+def _empty_grid_frame() -> pd.DataFrame:
+    frame = pd.DataFrame({col: pd.Series(dtype=str) for col in GRID_COLUMNS})
+    for col in CATEGORICAL_COLUMNS:
+        frame[col] = frame[col].astype("category")
+    for col in INT_COLUMNS + ['行番号']:
+        frame[col] = frame[col].astype("int32")
+    frame['西暦日付'] = pd.to_datetime(frame['西暦日付'])
+    return frame
+
+
+def load_grid_frame(result_paths: Sequence[str]) -> pd.DataFrame:
+    """
+    result_*.csv 群を1つの型付きグリッドDataFrameにまとめる。
+    文字列の繰り返し列はカテゴリ型、分・件数列は int32、日付は datetime64 にする。
+    """
+    if not result_paths:
+        return _empty_grid_frame()
+
+    parts: List[pd.DataFrame] = []
+    for p in result_paths:
+        raw = read_result_csv(p, usecols=_SOURCE_COLUMNS)
+        part = pd.DataFrame(index=raw.index)
+        for grid_col, src_col in GRID_COLUMN_MAP.items():
+            part[grid_col] = raw[src_col] if src_col in raw.columns else ""
+        content = raw['サービス内容'] if 'サービス内容' in raw.columns else ""
+        minutes = raw['実施時間'] if '実施時間' in raw.columns else ""
+        part['AB'] = content + " - " + minutes
+        part['ファイル'] = os.path.basename(p)
+        part['行番号'] = np.arange(1, len(raw) + 1, dtype=np.int32)
+        part['西暦日付'] = raw[SERVICE_DATE_COL] if SERVICE_DATE_COL in raw.columns else part['D']
+        parts.append(part)
+
+    frame = pd.concat(parts, ignore_index=True)
+    for col in INT_COLUMNS:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce").fillna(0).astype("int32")
+    for col in CATEGORICAL_COLUMNS:
+        frame[col] = frame[col].astype("category")
+    frame['西暦日付'] = pd.to_datetime(frame['西暦日付'], errors="coerce", format="mixed")
+    return frame[GRID_COLUMNS]
+
+
+def _positions_by_code(codes: np.ndarray, n_categories: int) -> List[np.ndarray]:
+    """カテゴリコードごとの行位置（昇順）のリスト"""
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes[codes >= 0], minlength=n_categories)
+    # コード -1（欠損）は先頭に並ぶので読み飛ばす
+    offset = int((codes < 0).sum())
+    bounds = np.concatenate([[0], np.cumsum(counts)]) + offset
+    return [order[bounds[i]:bounds[i + 1]] for i in range(n_categories)]
+
+
+class GridEngine:
+    """
+    型付きグリッドと事前計算済み索引
+    - 索引: 列の値 → 行位置配列（昇順）
+    - カテゴリ列（B）は「，」区切りのトークン単位でも索引化
+    - 日付はソート済み配列を二分探索して範囲抽出
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self._n = len(frame)
+        self._indexes: Dict[str, Dict[str, np.ndarray]] = {}
+        for col in INDEXED_COLUMNS:
+            cats = frame[col].cat.categories
+            positions = _positions_by_code(frame[col].cat.codes.to_numpy(), len(cats))
+            self._indexes[col] = {str(c): pos for c, pos in zip(cats, positions)}
+
+        tokens: Dict[str, List[np.ndarray]] = {}
+        for value, pos in self._indexes['B'].items():
+            for token in value.split(CATEGORY_SEP):
+                token = token.strip()
+                if token:
+                    tokens.setdefault(token, []).append(pos)
+        self._category_tokens: Dict[str, np.ndarray] = {
+            t: np.sort(np.concatenate(p)) for t, p in tokens.items()
+        }
+
+        dates = frame['西暦日付'].to_numpy(dtype="datetime64[D]")
+        self._date_order = np.argsort(dates, kind="stable")  # NaT は末尾
+        self._sorted_dates = dates[self._date_order]
+        self._summary: Optional[pd.DataFrame] = None
+        self._staff_summary: Optional[pd.DataFrame] = None
+
+    @classmethod
+    def from_paths(cls, result_paths: Sequence[str]) -> "GridEngine":
+        return cls(load_grid_frame(result_paths))
+
+    def __len__(self) -> int:
+        return self._n
+
+    # ---- 索引参照 ----
+    def options(self, col: str) -> List[str]:
+        """フィルタ候補（空文字を除く値の昇順）"""
+        if col == 'B':
+            return sorted(self._category_tokens)
+        return sorted(v for v in self._indexes[col] if v != "")
+
+    def date_bounds(self) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        valid = self._sorted_dates[~np.isnat(self._sorted_dates)]
+        if len(valid) == 0:
+            return None, None
+        return pd.Timestamp(valid[0]), pd.Timestamp(valid[-1])
+
+    def _mark(self, mask: np.ndarray, positions: Iterable[np.ndarray]) -> np.ndarray:
+        hit = np.zeros(self._n, dtype=bool)
+        for pos in positions:
+            hit[pos] = True
+        return mask & hit
+
+    def select(self, errors_only: bool = False, categories: Optional[Sequence[str]] = None,
+               staff: Optional[Sequence[str]] = None, users: Optional[Sequence[str]] = None,
+               date_range: Optional[Tuple] = None) -> np.ndarray:
+        """
+        条件に一致する行位置（昇順）を返す。
+        各条件は OR（同一列内）/ AND（列間）で結合する。
+        """
+        mask = np.ones(self._n, dtype=bool)
+        filtered = False
+        empty = np.empty(0, dtype=np.intp)
+        if errors_only:
+            mask = self._mark(mask, [self._indexes['A'].get(FLAG, empty)])
+            filtered = True
+        if categories:
+            mask = self._mark(mask, [self._category_tokens.get(c, empty) for c in categories])
+            filtered = True
+        if staff:
+            mask = self._mark(mask, [self._indexes['C'].get(s, empty) for s in staff])
+            filtered = True
+        if users:
+            mask = self._mark(mask, [self._indexes['G'].get(u, empty) for u in users])
+            filtered = True
+        if date_range:
+            start, end = (np.datetime64(pd.Timestamp(d).date(), "D") for d in date_range)
+            lo = np.searchsorted(self._sorted_dates, start, side="left")
+            hi = np.searchsorted(self._sorted_dates, end, side="right")
+            mask = self._mark(mask, [self._date_order[lo:hi]])
+            filtered = True
+        if not filtered:
+            return np.arange(self._n)
+        return np.flatnonzero(mask)
+
+    # ---- ページング ----
+    @staticmethod
+    def page_count(n_rows: int, page_size: int = DEFAULT_PAGE_SIZE) -> int:
+        return max(1, -(-n_rows // page_size))
+
+    def page(self, positions: np.ndarray, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE,
+             columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """positions のうち page（1始まり）に当たる行だけを切り出す"""
+        page = min(max(1, page), self.page_count(len(positions), page_size))
+        start = (page - 1) * page_size
+        frame = self.frame if columns is None else self.frame[list(columns)]
+        return frame.iloc[positions[start:start + page_size]]
+
+    # ---- 集計（結果セットごとに1回） ----
+    def summary(self) -> pd.DataFrame:
+        """ファイル別の件数サマリー"""
+        if self._summary is None:
+            frame = self.frame
+            is_error = (frame['A'] == FLAG).to_numpy()
+            stats = (
+                pd.DataFrame({'ファイル': frame['ファイル'], '_err': is_error})
+                .groupby('ファイル', observed=True, sort=True)['_err']
+                .agg(総件数='size', エラー件数='sum')
+            )
+            file_codes = frame['ファイル'].cat.codes.to_numpy()
+            n_files = len(frame['ファイル'].cat.categories)
+            for token in CATEGORY_TOKENS:
+                pos = self._category_tokens.get(token, np.empty(0, dtype=np.intp))
+                counts = np.bincount(file_codes[pos], minlength=n_files)
+                stats[f"{token}件数"] = pd.Series(
+                    counts, index=frame['ファイル'].cat.categories
+                ).reindex(stats.index).to_numpy()
+            stats['エラー率(%)'] = (stats['エラー件数'] / stats['総件数'] * 100).round(1)
+            self._summary = stats.reset_index()
+        return self._summary
+
+    def staff_summary(self) -> pd.DataFrame:
+        """担当所員別の件数・時間サマリー"""
+        if self._staff_summary is None:
+            frame = self.frame
+            stats = (
+                frame.assign(_err=(frame['A'] == FLAG).to_numpy())
+                .groupby('C', observed=True, sort=True)
+                .agg(総件数=('A', 'size'), エラー件数=('_err', 'sum'),
+                     重複時間合計=('H', 'sum'), 超過時間合計=('I', 'sum'))
+            )
+            self._staff_summary = stats.sort_values('エラー件数', ascending=False).reset_index()
+        return self._staff_summary
+
+
+class DetailStore:
+    """
+    行詳細の取得元
+    グリッドは表示列だけを持つので、詳細パネルを開いたときに (ファイル, 行番号) または
+    詳細ID で1行だけを取り出す。全列の読み込みはファイルごとに初回参照時の1回のみ。
+    """
+
+    def __init__(self, result_paths: Sequence[str]):
+        self._paths = {os.path.basename(p): p for p in result_paths}
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._id_index: Optional[Dict[str, Tuple[str, int]]] = None
+
+    def _frame(self, file_name: str) -> pd.DataFrame:
+        frame = self._frames.get(file_name)
+        if frame is None:
+            frame = read_result_csv(self._paths[file_name])
+            self._frames[file_name] = frame
+        return frame
+
+    def get(self, file_name: str, row_number: int) -> Optional[pd.Series]:
+        """行番号（1始まり）で元の結果行を返す"""
+        if file_name not in self._paths:
+            return None
+        frame = self._frame(file_name)
+        if not 1 <= row_number <= len(frame):
+            return None
+        return frame.iloc[row_number - 1]
+
+    def get_by_id(self, detail_id: str) -> Optional[pd.Series]:
+        """詳細IDで元の結果行を返す"""
+        if self._id_index is None:
+            index: Dict[str, Tuple[str, int]] = {}
+            for name, path in self._paths.items():
+                ids = read_result_csv(path, usecols=[GRID_COLUMN_MAP['O']])
+                if GRID_COLUMN_MAP['O'] not in ids.columns:
+                    continue
+                for row_number, value in enumerate(ids[GRID_COLUMN_MAP['O']], start=1):
+                    if value:
+                        index.setdefault(value, (name, row_number))
+            self._id_index = index
+        location = self._id_index.get(detail_id)
+        return self.get(*location) if location else None
+
+
+def prepare_grid_data(result_paths: Sequence[str]) -> pd.DataFrame:
+    """A-G, AB, H-O の列を持つグリッドDataFrameを返す"""
+    return GridEngine.from_paths(result_paths).frame
+
+
+def collect_summary(result_paths: Sequence[str]) -> pd.DataFrame:
+    """ファイル別サマリー（ファイル, 総件数, エラー件数, カテゴリ別件数, エラー率）"""
+    return GridEngine.from_paths(result_paths).summary()
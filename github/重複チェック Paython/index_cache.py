@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+勤怠インデックスの共有キャッシュ
+勤怠履歴CSVのハッシュをキーに build_work_intervals の結果（att_map, name_index）を
+プロセス全体で1つだけ保持する。複数セッションが同じ月のファイルを開いても
+構築は1回・メモリ上のコピーも1つで済む。
+- 値は読み取り専用（MappingProxyType + tuple）で共有
+- 推定バイト数で上限を管理し、超えたら最も古く使われたものから破棄（LRU）
+"""
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+from src import Interval
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 16
+
+
+def file_digest(source: Union[bytes, str], chunk_size: int = 1 << 20) -> str:
+    """ファイル内容（bytes またはパス）の blake2b ハッシュ"""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        h.update(source)
+    else:
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def estimate_index_bytes(att_map: Mapping[str, Tuple[Interval, ...]],
+                         name_index: Mapping[str, Tuple[str, ...]]) -> int:
+    """インデックスが保持するオブジェクトの推定バイト数"""
+    total = sys.getsizeof(att_map) + sys.getsizeof(name_index)
+    for key, ivs in att_map.items():
+        total += sys.getsizeof(key) + sys.getsizeof(ivs)
+        for iv in ivs:
+            total += sys.getsizeof(iv) + sys.getsizeof(iv.start) + sys.getsizeof(iv.end)
+    for key, names in name_index.items():
+        total += sys.getsizeof(key) + sys.getsizeof(names) + sum(sys.getsizeof(n) for n in names)
+    return total
+
+
+@dataclass(frozen=True)
+class AttendanceIndex:
+    """共有される勤怠インデックス（読み取り専用）"""
+    key: str
+    att_map: Mapping[str, Tuple[Interval, ...]]
+    name_index: Mapping[str, Tuple[str, ...]]
+    nbytes: int
+    built_at: datetime = field(default_factory=datetime.now)
+
+    @classmethod
+    def freeze(cls, key: str, att_map: Dict[str, List[Interval]],
+               name_index: Dict[str, List[str]]) -> "AttendanceIndex":
+        frozen_map = MappingProxyType({k: tuple(v) for k, v in att_map.items()})
+        frozen_names = MappingProxyType({k: tuple(v) for k, v in name_index.items()})
+        return cls(key, frozen_map, frozen_names, estimate_index_bytes(frozen_map, frozen_names))
+
+    def as_tuple(self) -> Tuple[Mapping[str, Tuple[Interval, ...]], Mapping[str, Tuple[str, ...]]]:
+        """build_work_intervals と同じ (att_map, name_index) の形"""
+        return self.att_map, self.name_index
+
+
+class AttendanceIndexCache:
+    """
+    サイズ上限付きLRUキャッシュ
+    同じキーの構築が同時に要求された場合は、最初の1件だけが構築し他は完了を待つ。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, AttendanceIndex]" = OrderedDict()
+        self._building: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[AttendanceIndex]:
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return index
+
+    def get_or_build(self, key: str,
+                     builder: Callable[[], Tuple[Dict[str, List[Interval]], Dict[str, List[str]]]]) -> AttendanceIndex:
+        index = self.get(key)
+        if index is not None:
+            return index
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            # 待っている間に他のセッションが構築済みならそれを使う
+            index = self.get(key)
+            if index is not None:
+                return index
+            try:
+                att_map, name_index = builder()
+                index = AttendanceIndex.freeze(key, att_map, name_index)
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = index
+                self._bytes += index.nbytes
+                self._evict()
+            return index
+
+    def _evict(self) -> None:
+        # 直近に追加したものは上限を超えていても残す
+        while len(self._entries) > 1 and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.nbytes
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_shared_cache: Optional[AttendanceIndexCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_index_cache() -> AttendanceIndexCache:
+    """プロセス全体で共有するキャッシュ"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = AttendanceIndexCache()
+        return _shared_cache
+
+
+def attendance_index_key(digest: str, name_col: str, use_schedule_when_missing: bool) -> str:
+    """ファイルハッシュ＋構築オプションのキー"""
+    return f"{digest}:{name_col}:{int(use_schedule_when_missing)}"
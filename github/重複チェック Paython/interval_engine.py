@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+区間演算のベクトル化エンジン
+従業員ごとの勤務区間を1本のソート済み配列（従業員オフセット付き）にまとめ、
+サービス区間の被覆量や重複ペア数を searchsorted と累積和でまとめて求める。
+src.analyze_coverage_details / find_overlaps を1件ずつ呼ぶのと同じ結果を返す。
+重複ペアの列挙（overlap_pairs）は src.find_overlaps_with_details とエラー分析で共有する。
+間隔の短い区間の結合（merge_close_intervals）は jinjer形式CSVの2時間ルールに使う。
+"""
+
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import Interval
+
+# analyze_coverage_details と同じ許容誤差（未カバーが1分以下なら完全カバー）
+COVERAGE_TOLERANCE_SECONDS = 60
+
+_EPOCH = np.datetime64(0, "s")
+_MINUTE_NS = 60 * 10 ** 9
+
+
+def to_seconds(values) -> np.ndarray:
+    """datetime の並びを秒（int64）に。欠損は呼び出し側で valid_interval_mask により除くこと"""
+    series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    return (pd.to_datetime(series).to_numpy(dtype="datetime64[s]") - _EPOCH).astype(np.int64)
+
+
+def to_nanoseconds(values) -> np.ndarray:
+    """datetime の並びをナノ秒（int64）に（Timestamp どうしの比較と同じ精度）"""
+    series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    return pd.to_datetime(series).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+def valid_interval_mask(starts: pd.Series, ends: pd.Series) -> np.ndarray:
+    """開始・終了がともにある行"""
+    return (starts.notna() & ends.notna()).to_numpy()
+
+
+class _OffsetIndex:
+    """
+    キー（従業員など）ごとにソートした値の配列を、キー順に連結して1本で持つ。
+    値は全体の最小値からの相対秒で持ち、キーごとに span ずつずらした合成キーで一括探索する。
+    """
+
+    def __init__(self, codes: np.ndarray, values: np.ndarray, n_keys: int, origin: int, span: int):
+        order = np.lexsort((values, codes))
+        self.codes = codes[order]
+        self.values = values[order] - origin
+        self.origin = origin
+        self.span = span
+        self.composite = self.codes * span + self.values
+        self.prefix = np.concatenate([[0], np.cumsum(self.values)])
+        self.bounds = np.searchsorted(self.codes, np.arange(n_keys + 1))
+
+    def count_and_sum_le(self, codes: np.ndarray, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """キー codes[i] の値のうち t[i] 以下のものの (件数, 合計)"""
+        rel = t - self.origin
+        pos = np.searchsorted(self.composite, codes * self.span + rel, side="right")
+        lo = self.bounds[codes]
+        return pos - lo, self.prefix[pos] - self.prefix[lo]
+
+
+class CoverageIndex:
+    """
+    従業員ごとの勤務区間の被覆量インデックス
+    F_k(t) = Σ_{a_i ≤ t}(t − a_i) − Σ_{b_i ≤ t}(t − b_i) は、従業員 k の勤務区間のうち
+    t 以前にある部分の合計長（区間が重なっていれば重ねて数える）なので、
+    サービス [s, e] の被覆量は F_k(e) − F_k(s) で求まる（analyze_coverage_details の covered と同じ）。
+    """
+
+    def __init__(self, att_map: Mapping[str, Sequence[Interval]]):
+        self.keys = list(att_map.keys())
+        self.key_codes: Dict[str, int] = {k: i for i, k in enumerate(self.keys)}
+        codes, starts, ends = [], [], []
+        for i, key in enumerate(self.keys):
+            ivs = att_map[key]
+            codes.append(np.full(len(ivs), i, dtype=np.int64))
+            starts.extend(iv.start for iv in ivs)
+            ends.extend(iv.end for iv in ivs)
+        codes_arr = np.concatenate(codes) if codes else np.empty(0, dtype=np.int64)
+        starts_arr = to_seconds(starts) if starts else np.empty(0, dtype=np.int64)
+        ends_arr = to_seconds(ends) if ends else np.empty(0, dtype=np.int64)
+        self.interval_counts = np.bincount(codes_arr, minlength=len(self.keys))
+
+        self._origin = int(starts_arr.min()) if len(starts_arr) else 0
+        self._span = (int(ends_arr.max()) - self._origin + 1) if len(ends_arr) else 1
+        self._starts = _OffsetIndex(codes_arr, starts_arr, len(self.keys), self._origin, self._span)
+        self._ends = _OffsetIndex(codes_arr, ends_arr, len(self.keys), self._origin, self._span)
+
+    def codes_for(self, staff_keys: Sequence[str]) -> np.ndarray:
+        """従業員キー → コード（勤務区間がない従業員は -1）"""
+        return np.fromiter((self.key_codes.get(k, -1) for k in staff_keys), dtype=np.int64,
+                           count=len(staff_keys))
+
+    def _cumulative(self, codes: np.ndarray, t: np.ndarray) -> np.ndarray:
+        # 全区間より前は 0、全区間より後は合計長で一定なので、合成キーが隣の従業員にはみ出さないよう丸める
+        t = np.clip(t, self._origin - 1, self._origin + self._span - 1)
+        n_a, sum_a = self._starts.count_and_sum_le(codes, t)
+        n_b, sum_b = self._ends.count_and_sum_le(codes, t)
+        rel = t - self._origin
+        return (n_a * rel - sum_a) - (n_b * rel - sum_b)
+
+    def covered_seconds(self, codes: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """各サービス区間のうち勤務区間で覆われている秒数（codes が -1 の行は 0）"""
+        covered = np.zeros(len(codes), dtype=np.int64)
+        known = codes >= 0
+        if known.any() and len(self.keys):
+            c = codes[known]
+            covered[known] = self._cumulative(c, ends[known]) - self._cumulative(c, starts[known])
+        return covered
+
+    def fully_covered(self, codes: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """interval_fully_covered と同じ判定（勤務区間がない従業員は常に False）"""
+        uncovered = np.maximum(0, (ends - starts) - self.covered_seconds(codes, starts, ends))
+        has_covers = np.zeros(len(codes), dtype=bool)
+        known = codes >= 0
+        has_covers[known] = self.interval_counts[codes[known]] > 0
+        return has_covers & (uncovered <= COVERAGE_TOLERANCE_SECONDS)
+
+
+def count_overlapping_pairs(group_codes: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                            n_groups: Optional[int] = None) -> np.ndarray:
+    """
+    グループ（施設×従業員など）ごとに、互いに重なる区間ペア（i≠j、順不同）の数を返す。
+    find_overlaps(df, df) の idx1≠idx2 の件数 // 2 と同じ。
+    (グループ, 開始, 終了) 順に並べると、i より後ろで開始 < 終了_i のものが i と重なる相手になる。
+    """
+    if n_groups is None:
+        n_groups = int(group_codes.max()) + 1 if len(group_codes) else 0
+    if len(group_codes) == 0:
+        return np.zeros(n_groups, dtype=np.int64)
+    order = np.lexsort((ends, starts, group_codes))
+    g, s, e = group_codes[order], starts[order], ends[order]
+    origin = int(s.min())
+    span = int(max(e.max(), s.max())) - origin + 1
+    composite = g * span + (s - origin)
+    limit = np.searchsorted(composite, g * span + (np.maximum(e, s) - origin), side="left")
+    per_row = np.maximum(0, limit - (np.arange(len(g)) + 1))
+    return np.bincount(g, weights=per_row, minlength=n_groups).astype(np.int64)
+
+
+def merge_close_intervals(group_codes: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                          max_gap: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    グループ（従業員×日付など、0 以上の整数）ごとに、開始順で前の区間群の終了から max_gap 未満で始まる区間を
+    つなげた区間を (グループ, 開始, 終了) の配列で、グループ・開始の順に返す。
+    時刻は整数（分など）で、24時間を超えてもそのまま扱う。
+    """
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if len(group_codes) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    order = np.lexsort((starts, group_codes))
+    g, s, e = group_codes[order], starts[order], ends[order]
+    new_group = np.concatenate([[True], g[1:] != g[:-1]])
+
+    # グループ順に並んでいるので、(グループ番号, 終了) の合成キーの累積最大がグループ内の「ここまでの終了の最大値」になる
+    rank = np.cumsum(new_group) - 1
+    origin = int(min(s.min(), e.min()))
+    width = int(max(s.max(), e.max())) - origin + 1
+    running_end = np.maximum.accumulate(rank * width + (e - origin)) - rank * width + origin
+    new_block = new_group.copy()
+    new_block[1:] |= s[1:] - running_end[:-1] >= max_gap
+
+    firsts = np.flatnonzero(new_block)
+    return g[firsts], s[firsts], np.maximum.reduceat(e, firsts)
+
+
+def overlap_pairs(codes1: np.ndarray, starts1: np.ndarray, ends1: np.ndarray,
+                  codes2: Optional[np.ndarray] = None, starts2: Optional[np.ndarray] = None,
+                  ends2: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    コード（従業員など、0 以上）が同じで s1 < e2 かつ s2 < e1 となる行の組 (i, j) を、i, j の順に並べて返す。
+    2組目を省略すると1組目どうしで i < j の組だけを返す。
+    2組目を (コード, 開始) 順に並べ、開始 < e1 の上限と「そこまでの終了の最大値 > s1」の下限を二分探索で求め、
+    その範囲だけを調べる（重ならない区間の組は作らない）。時刻は順位に置き換えるので単位は問わない。
+    """
+    self_join = codes2 is None
+    if self_join:
+        codes2, starts2, ends2 = codes1, starts1, ends1
+    if len(codes1) == 0 or len(codes2) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    values = np.unique(np.concatenate([starts1, ends1, starts2, ends2]))
+    width = len(values) + 1
+    order = np.lexsort((starts2, codes2))
+    c2 = codes2[order].astype(np.int64)
+    s2 = np.searchsorted(values, starts2[order])
+    e2 = np.searchsorted(values, ends2[order])
+    by_start = c2 * width + s2
+    # コード順に並んでいるので、合成キーの累積最大はコードごとの「ここまでの終了の最大値」になる
+    max_end = np.maximum.accumulate(c2 * width + e2)
+
+    c1 = codes1.astype(np.int64)
+    s1 = np.searchsorted(values, starts1)
+    e1 = np.searchsorted(values, ends1)
+    lo = np.searchsorted(max_end, c1 * width + s1, side="right")
+    hi = np.searchsorted(by_start, c1 * width + e1, side="left")
+    counts = np.maximum(hi - lo, 0)
+    i = np.repeat(np.arange(len(c1)), counts)
+    k = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+    keep = e2[k] > s1[i]
+    i, j = i[keep], order[k[keep]]
+    if self_join:
+        i, j = i[j > i], j[j > i]
+    pair_order = np.lexsort((j, i))
+    return i[pair_order], j[pair_order]
+
+
+def overlap_flags(codes: np.ndarray, facility_codes: np.ndarray, starts_ns: np.ndarray, ends_ns: np.ndarray,
+                  prefer_identical: str = 'earlier') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    process() が立てる (施設間重複, 事業所内重複) のフラグ（行ごとの bool）
+    行は施設名の昇順・施設内の元の順に並べ、facility_codes は施設名の順位、時刻はナノ秒で渡す。
+    重なる組 (i < j) ごとに decide_flag_target と同じ規則でどちらか一方に立てる：
+      完全一致 → 施設間は prefer_identical が 'earlier' なら i、'later' なら j。事業所内は j
+      それ以外 → 実施時間（分、切り捨て）の短い方。同じなら施設間は i、事業所内は j
+    """
+    cross = np.zeros(len(codes), dtype=bool)
+    internal = np.zeros(len(codes), dtype=bool)
+    i, j = overlap_pairs(codes, starts_ns, ends_ns)
+    if len(i) == 0:
+        return cross, internal
+    same_facility = facility_codes[i] == facility_codes[j]
+    identical = (starts_ns[i] == starts_ns[j]) & (ends_ns[i] == ends_ns[j])
+    minutes = (ends_ns - starts_ns) // _MINUTE_NS
+    d_i, d_j = minutes[i], minutes[j]
+    first = np.where(identical, ~same_facility & (prefer_identical != 'later'),
+                     (d_i < d_j) | ((d_i == d_j) & ~same_facility))
+    target = np.where(first, i, j)
+    cross[target[~same_facility]] = True
+    internal[target[same_facility]] = True
+    return cross, internal
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+バックグラウンドジョブ管理
+エラーチェックなどの長時間処理をスレッドプールで実行し、
+段階ごとの進捗・キャンセル・再接続（ジョブIDでの再取得）を提供する。
+ジョブごとの作業ディレクトリなどは cleanup に渡し、ジョブが一覧から外れる（古くなって整理される、
+新しい実行に置き換えられて discard される）ときに片付ける。
+Streamlit からは st.cache_resource で1プロセスに1つだけ保持して使う。
+"""
+
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from src import ProcessCancelled
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+@dataclass
+class Job:
+    """ジョブ1件の状態"""
+    job_id: str
+    label: str
+    status: str = JOB_QUEUED
+    stage: str = ""
+    progress: float = 0.0
+    result: Any = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    future: Optional[Future] = field(default=None, repr=False)
+    # 一覧から外れたときの後片付け（作業ディレクトリの削除など）。1回だけ呼ばれる
+    cleanup: Optional[Callable[[], None]] = field(default=None, repr=False)
+    discarded: bool = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def update_progress(self, stage: str, fraction: float) -> None:
+        """process() の progress コールバックとして渡す"""
+        self.stage = stage
+        self.progress = min(1.0, max(self.progress, fraction))
+
+    def run_cleanup(self) -> None:
+        cleanup, self.cleanup = self.cleanup, None
+        if cleanup is not None:
+            try:
+                cleanup()
+            except Exception:
+                traceback.print_exc()
+
+
+class JobManager:
+    """
+    スレッドプールで動くジョブの管理
+    - 実行関数は progress=Job.update_progress, cancel_event=Job.cancel_event を受け取る
+    - 終了済みジョブは max_finished 件まで保持し、再実行後（rerun）でも結果を取り出せる
+    """
+
+    def __init__(self, max_workers: int = 2, max_finished: int = 20):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="check-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_finished = max_finished
+
+    def submit(self, fn: Callable[..., Any], *args, label: str = "",
+               cleanup: Optional[Callable[[], None]] = None, **kwargs) -> Job:
+        """cleanup はジョブが一覧から外れたとき（終了後）に1回だけ呼ばれる"""
+        job = Job(job_id=uuid.uuid4().hex[:12], label=label, cleanup=cleanup)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            pruned = self._prune()
+        for old in pruned:
+            old.run_cleanup()
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs) -> None:
+        if job.cancel_event.is_set():
+            self._finish(job, JOB_CANCELLED)
+            return
+        job.status = JOB_RUNNING
+        try:
+            job.result = fn(*args, progress=job.update_progress, cancel_event=job.cancel_event, **kwargs)
+        except ProcessCancelled:
+            self._finish(job, JOB_CANCELLED)
+        except BaseException as e:  # SystemExit（入力ファイル不足）も失敗として扱う
+            job.error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+            self._finish(job, JOB_FAILED)
+        else:
+            job.progress = 1.0
+            self._finish(job, JOB_DONE)
+
+    def _finish(self, job: Job, status: str) -> None:
+        with self._lock:
+            job.finished_at = datetime.now()
+            job.status = status
+            discarded = job.discarded
+        # 実行中に discard されたジョブは、終わってから片付ける
+        if discarded:
+            job.run_cleanup()
+
+    def _prune(self) -> List[Job]:
+        """終了済みのジョブを max_finished 件まで減らし、外したジョブを返す（ロックを持って呼ぶ）"""
+        finished = [j for j in self._jobs.values() if j.finished]
+        pruned = finished[:max(0, len(finished) - self._max_finished)]
+        for job in pruned:
+            del self._jobs[job.job_id]
+            job.discarded = True
+        return pruned
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        if not job_id:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> bool:
+        """キャンセルを要求する（実行中なら次の段階境界で停止）"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, JOB_CANCELLED)
+        return True
+
+    def discard(self, job_id: Optional[str]) -> None:
+        """
+        ジョブを一覧から外して後片付けする（新しい実行に置き換えられたときなど）
+        実行中ならキャンセルを要求し、後片付けは終了してから行う
+        """
+        with self._lock:
+            job = self._jobs.pop(job_id, None) if job_id else None
+            if job is None:
+                return
+            job.discarded = True
+            finished = job.finished
+        if finished:
+            job.run_cleanup()
+        else:
+            job.cancel_event.set()
+            if job.future is not None and job.future.cancel():
+                self._finish(job, JOB_CANCELLED)
+
+    def shutdown(self, wait: bool = False) -> None:
+        for job in self.jobs():
+            job.cancel_event.set()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+労働時間の計算（jinjer形式CSVの労働時間列）
+行（従業員×日付）ごとの勤務・休憩・予定を「日付の 0:00 からの分」の区間で受け取り、
+区間どうしの重なりは interval_engine.overlap_pairs で、深夜帯は固定の時間帯との重なりを配列でまとめて求める。
+1行ずつ Python で回さずに、全行の労働時間・休憩・残業（法定内／法定外）・深夜・不足時間を一度に計算する。
+
+- 労働時間 = 勤務区間 − 休憩（jinjer と同じく、総労働時間・実労働時間とも休憩を除いた時間）
+- 法定外残業 = 労働時間のうち1日8時間を超える分
+- 法定内残業（スケジュール軸）= 予定の時間帯の外で働いた時間 − 法定外残業（予定がなければ労働時間 − 法定外残業）
+- 法定内残業（労働時間軸）= min(労働時間, 8時間) − 所定労働時間（予定 − 予定休憩）
+- 総残業 = 法定内残業（スケジュール軸）+ 法定外残業
+- 深夜 = 労働時間のうち 22:00〜29:00（と当日 0:00〜5:00）の分
+- 不足（スケジュール軸）= 予定の時間帯（予定休憩を除く）のうち勤務していない時間、不足（労働時間軸）= 所定労働時間 − 労働時間
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from interval_engine import merge_close_intervals, overlap_pairs
+
+STATUTORY_DAILY_MINUTES = 8 * 60
+# 深夜帯（日付の 0:00 からの分）：当日 0:00〜5:00、22:00〜29:00、翌日 22:00〜29:00（35:00 までの勤務を想定）
+NIGHT_WINDOWS = np.array([[-2 * 60, 5 * 60], [22 * 60, 29 * 60], [46 * 60, 53 * 60]], dtype=np.int64)
+
+# jinjer形式CSVの列名 → LaborTimes の属性
+LABOR_COLUMNS = {
+    '総労働時間': 'worked',
+    '実労働時間': 'worked',
+    '休憩時間': 'breaks',
+    '総残業時間': 'overtime',
+    '法定内残業時間（スケジュール軸）': 'legal_overtime_schedule',
+    '法定内残業時間（労働時間軸）': 'legal_overtime_hours',
+    '法定外残業時間': 'statutory_overtime',
+    '深夜時間': 'night',
+    '不足労働時間数（スケジュール軸）': 'shortage_schedule',
+    '不足労働時間数（労働時間軸）': 'shortage_hours',
+}
+
+Intervals = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _empty() -> Intervals:
+    empty = np.empty(0, dtype=np.int64)
+    return empty, empty, empty
+
+
+def _as_intervals(intervals: Optional[Intervals]) -> Intervals:
+    """(行, 開始, 終了) を整数配列にし、長さ0以下を除いて行ごとに重なり・接する区間をまとめる"""
+    if intervals is None:
+        return _empty()
+    rows, starts, ends = (np.asarray(a, dtype=np.int64) for a in intervals)
+    keep = ends > starts
+    return merge_close_intervals(rows[keep], starts[keep], ends[keep], max_gap=1)
+
+
+def intersect_intervals(a: Intervals, b: Intervals) -> Intervals:
+    """同じ行の区間どうしの重なり部分 (行, 開始, 終了)。各行の区間が互いに重ならなければ結果も重ならない"""
+    i, j = overlap_pairs(a[0], a[1], a[2], b[0], b[1], b[2])
+    return a[0][i], np.maximum(a[1][i], b[1][j]), np.minimum(a[2][i], b[2][j])
+
+
+def minutes_per_row(intervals: Intervals, n_rows: int) -> np.ndarray:
+    rows, starts, ends = intervals
+    return np.bincount(rows, weights=ends - starts, minlength=n_rows).astype(np.int64)
+
+
+def window_minutes(starts: np.ndarray, ends: np.ndarray, windows: np.ndarray = NIGHT_WINDOWS) -> np.ndarray:
+    """区間ごとの、固定の時間帯（windows の各行 [開始, 終了)）と重なる分"""
+    lo = np.maximum(starts[:, None], windows[None, :, 0])
+    hi = np.minimum(ends[:, None], windows[None, :, 1])
+    return np.clip(hi - lo, 0, None).sum(axis=1)
+
+
+def _window_per_row(intervals: Intervals, n_rows: int) -> np.ndarray:
+    rows, starts, ends = intervals
+    return np.bincount(rows, weights=window_minutes(starts, ends), minlength=n_rows).astype(np.int64)
+
+
+@dataclass
+class LaborTimes:
+    """行ごとの労働時間（分）"""
+    has_work: np.ndarray
+    span: np.ndarray                    # 勤務区間の合計（休憩を含む）
+    breaks: np.ndarray
+    worked: np.ndarray
+    overtime: np.ndarray
+    legal_overtime_schedule: np.ndarray
+    legal_overtime_hours: np.ndarray
+    statutory_overtime: np.ndarray
+    night: np.ndarray
+    shortage_schedule: np.ndarray
+    shortage_hours: np.ndarray
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """jinjer形式CSVの労働時間列（分）"""
+        return {column: getattr(self, attr) for column, attr in LABOR_COLUMNS.items()}
+
+
+def compute_labor_times(n_rows: int, shifts: Intervals, breaks: Optional[Intervals] = None,
+                        schedule: Optional[Intervals] = None,
+                        scheduled_breaks: Optional[Intervals] = None) -> LaborTimes:
+    """
+    行 0..n_rows-1 の労働時間をまとめて計算する
+    各引数は (行, 開始分, 終了分) の配列の組（分は日付の 0:00 から、24時間超あり）。
+    休憩は勤務区間と重なる部分だけ、予定休憩は予定の時間帯と重なる部分だけを数える
+    """
+    shifts = _as_intervals(shifts)
+    breaks = intersect_intervals(_as_intervals(breaks), shifts)
+    schedule = _as_intervals(schedule)
+    scheduled_breaks = intersect_intervals(_as_intervals(scheduled_breaks), schedule)
+
+    span = minutes_per_row(shifts, n_rows)
+    break_minutes = minutes_per_row(breaks, n_rows)
+    worked = span - break_minutes
+    night = _window_per_row(shifts, n_rows) - _window_per_row(breaks, n_rows)
+
+    # 予定の時間帯の内側で働いた時間（勤務∩予定 − 休憩∩予定）
+    has_schedule = minutes_per_row(schedule, n_rows) > 0
+    shifts_in_schedule = intersect_intervals(shifts, schedule)
+    worked_in_schedule = minutes_per_row(shifts_in_schedule, n_rows) - \
+        minutes_per_row(intersect_intervals(breaks, schedule), n_rows)
+    scheduled_work = minutes_per_row(schedule, n_rows) - minutes_per_row(scheduled_breaks, n_rows)
+    attended_schedule = minutes_per_row(shifts_in_schedule, n_rows) - \
+        minutes_per_row(intersect_intervals(shifts_in_schedule, scheduled_breaks), n_rows)
+
+    statutory = np.maximum(worked - STATUTORY_DAILY_MINUTES, 0)
+    legal_schedule = np.maximum(worked - worked_in_schedule - statutory, 0)
+    legal_hours = np.maximum(np.minimum(worked, STATUTORY_DAILY_MINUTES) - scheduled_work, 0)
+    return LaborTimes(
+        has_work=span > 0,
+        span=span,
+        breaks=break_minutes,
+        worked=worked,
+        overtime=legal_schedule + statutory,
+        legal_overtime_schedule=legal_schedule,
+        legal_overtime_hours=legal_hours,
+        statutory_overtime=statutory,
+        night=night,
+        shortage_schedule=np.where(has_schedule, scheduled_work - attended_schedule, 0),
+        shortage_hours=np.where(has_schedule, np.maximum(scheduled_work - worked, 0), 0),
+    )
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表記ゆれを含む重複（近似重複）の検出
+髙橋/高橋・全角スペース・先頭の◯/〇 などの違いを src.normalize_name で吸収した正規化キーを作り、
+ブロッキング索引（日付＋正規化した名前、または日付＋時間帯）の同じブロック内だけで候補ペアを作って照合する。
+全行の総当たりは行わないので、行数が増えても候補ペア数はブロックの大きさでしか増えない。
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src import normalize_name, parse_minute_of_day
+
+# 名前として正規化する列の判定に使う列名の一部
+NAME_COLUMN_HINTS = ("名", "氏名", "所員", "担当", "職員", "利用者", "スタッフ")
+
+BLOCK_BY_NAME = "name"
+BLOCK_BY_TIME = "time"
+
+GROUP_COL = "近似重複グループ"
+KEY_COL = "正規化キー"
+
+_SPACE_RE = re.compile(r"[　\s]+")
+
+
+def name_like_columns(columns: Sequence[str]) -> List[str]:
+    """列名から名前列らしいものを選ぶ"""
+    return [c for c in columns if any(h in str(c) for h in NAME_COLUMN_HINTS)]
+
+
+def _map_unique(series: pd.Series, func) -> np.ndarray:
+    """値の種類ごとに1回だけ func を適用する"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    mapped = np.array([func(v) for v in uniques], dtype=object)
+    return mapped[codes] if len(mapped) else np.empty(0, dtype=object)
+
+
+def normalize_name_key(value) -> str:
+    """名前の比較キー（normalize_name 後に姓名間のスペースも除く）"""
+    return normalize_name(value).replace(" ", "")
+
+
+def normalize_text_key(value) -> str:
+    """名前以外の比較キー（NFKC・前後空白除去・空白の統一）"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    text = unicodedata.normalize("NFKC", str(value))
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def normalize_date_key(series: pd.Series) -> np.ndarray:
+    """日付列を YYYY-MM-DD に揃える（解釈できない値は文字列のまま）"""
+    def to_key(v):
+        d = pd.to_datetime(normalize_text_key(v), errors="coerce")
+        return normalize_text_key(v) if pd.isna(d) else f"{d:%Y-%m-%d}"
+    return _map_unique(series, to_key)
+
+
+def time_minutes(series: pd.Series) -> np.ndarray:
+    """時刻列を分に（解釈できない値は -1）"""
+    def to_minutes(v):
+        m = parse_minute_of_day(normalize_text_key(v))
+        return -1 if m is None else m
+    return _map_unique(series, to_minutes).astype(np.int64)
+
+
+@dataclass
+class NearDuplicateResult:
+    """近似重複の検出結果"""
+    rows: pd.DataFrame          # グループに属する元の行（グループ番号・正規化キー付き）
+    group_count: int
+    candidate_pairs: int        # ブロック内で照合したペア数
+    matched_pairs: int
+    block_count: int
+    all_pairs: int              # 総当たりした場合のペア数（比較用）
+
+
+class NearDuplicateFinder:
+    """
+    正規化キー＋ブロッキング索引による近似重複検出
+    - name_columns: normalize_name で正規化する列（比較対象 columns のうち名前の列）
+    - block_by: "name" なら (日付, 先頭の名前列)、"time" なら (日付, 開始時刻 // bucket_minutes)
+    - time_column / time_tolerance: 開始時刻を分に直して ±time_tolerance 分までを同一とみなす
+    """
+
+    def __init__(self, columns: Sequence[str], name_columns: Optional[Sequence[str]] = None,
+                 block_by: str = BLOCK_BY_NAME, date_column: Optional[str] = None,
+                 time_column: Optional[str] = None, time_tolerance: int = 0, bucket_minutes: int = 60):
+        if not columns:
+            raise ValueError("重複チェックを行う列を1つ以上指定してください")
+        self.columns = list(columns)
+        self.name_columns = [c for c in (name_columns if name_columns is not None
+                                         else name_like_columns(columns)) if c in self.columns]
+        self.block_by = block_by
+        self.date_column = date_column
+        self.time_column = time_column
+        self.time_tolerance = max(0, int(time_tolerance))
+        self.bucket_minutes = max(1, int(bucket_minutes), self.time_tolerance)
+        if block_by == BLOCK_BY_NAME and not self.name_columns:
+            raise ValueError("名前でブロック化するには名前列を1つ以上指定してください")
+        if block_by == BLOCK_BY_TIME and not time_column:
+            raise ValueError("時間帯でブロック化するには時刻列を指定してください")
+
+    # ---- 正規化 ----
+    def normalized_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """比較・ブロック化に使う正規化済みの列"""
+        norm = pd.DataFrame(index=pd.RangeIndex(len(df)))
+        for col in self.columns:
+            if col == self.time_column:
+                continue
+            if col in self.name_columns:
+                norm[col] = _map_unique(df[col], normalize_name_key)
+            elif col == self.date_column:
+                norm[col] = normalize_date_key(df[col])
+            else:
+                norm[col] = _map_unique(df[col], normalize_text_key)
+        norm["_date"] = normalize_date_key(df[self.date_column]) if self.date_column else ""
+        if self.time_column:
+            norm["_minutes"] = time_minutes(df[self.time_column])
+        return norm
+
+    def _block_keys(self, norm: pd.DataFrame) -> pd.DataFrame:
+        """各行のブロックキー (_date, _block)。ブロック化できない行（名前が空・時刻なし）は含めない"""
+        keys = pd.DataFrame({"_row": np.arange(len(norm)), "_date": norm["_date"]})
+        if self.block_by == BLOCK_BY_NAME:
+            keys["_block"] = norm[self.name_columns[0]]
+            keys = keys[keys["_block"] != ""]
+        else:
+            minutes = norm["_minutes"].to_numpy()
+            keys["_block"] = minutes // self.bucket_minutes
+            keys = keys[minutes >= 0]
+        return keys
+
+    def _candidate_pairs(self, norm: pd.DataFrame) -> pd.DataFrame:
+        """同じブロック内の行ペア (_row_l < _row_r)"""
+        keys = self._block_keys(norm)
+        right = keys
+        if self.block_by == BLOCK_BY_TIME and self.time_tolerance > 0:
+            # 許容差が時間帯の境界をまたぐ場合に備え、次の時間帯の行も候補にする
+            shifted = keys.assign(_block=keys["_block"] - 1)
+            right = pd.concat([keys, shifted], ignore_index=True)
+        pairs = keys.merge(right, on=["_date", "_block"], suffixes=("_l", "_r"))
+        left = pairs["_row_l"].to_numpy()
+        right_rows = pairs["_row_r"].to_numpy()
+        distinct = left != right_rows
+        pairs = pd.DataFrame({"_row_l": np.minimum(left, right_rows)[distinct],
+                              "_row_r": np.maximum(left, right_rows)[distinct]})
+        return pairs.drop_duplicates(ignore_index=True)
+
+    # ---- 照合 ----
+    def _match(self, norm: pd.DataFrame, pairs: pd.DataFrame) -> np.ndarray:
+        left = pairs["_row_l"].to_numpy()
+        right = pairs["_row_r"].to_numpy()
+        ok = np.ones(len(pairs), dtype=bool)
+        for col in self.columns:
+            if col == self.time_column:
+                continue
+            values = norm[col].to_numpy()
+            ok &= values[left] == values[right]
+        if self.date_column and self.date_column not in self.columns:
+            dates = norm["_date"].to_numpy()
+            ok &= dates[left] == dates[right]
+        if self.time_column:
+            minutes = norm["_minutes"].to_numpy()
+            ok &= (minutes[left] >= 0) & (minutes[right] >= 0)
+            ok &= np.abs(minutes[left] - minutes[right]) <= self.time_tolerance
+        return ok
+
+    @staticmethod
+    def _components(n: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+        """一致したペアを連結成分にまとめる（union-find）。ペアに現れない行は -1"""
+        parent = np.arange(n)
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b in zip(left.tolist(), right.tolist()):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+        labels = np.full(n, -1, dtype=np.int64)
+        members = np.unique(np.concatenate([left, right])) if len(left) else np.empty(0, dtype=np.int64)
+        for m in members.tolist():
+            labels[m] = find(m)
+        return labels
+
+    def find(self, df: pd.DataFrame) -> NearDuplicateResult:
+        n = len(df)
+        norm = self.normalized_frame(df)
+        pairs = self._candidate_pairs(norm)
+        matched = pairs[self._match(norm, pairs)]
+        labels = self._components(n, matched["_row_l"].to_numpy(), matched["_row_r"].to_numpy())
+
+        positions = np.flatnonzero(labels >= 0)
+        # グループ番号は各グループの先頭行の順
+        roots = labels[positions]
+        first_seen = pd.unique(roots)
+        renumber = pd.Series(np.arange(1, len(first_seen) + 1), index=first_seen)
+        group_ids = renumber.loc[roots].to_numpy()
+        order = np.lexsort((positions, group_ids))
+        positions, group_ids = positions[order], group_ids[order]
+
+        key_cols = [c for c in self.columns if c != self.time_column]
+        keys = norm[key_cols].iloc[positions].astype(str).agg(" | ".join, axis=1).to_numpy() \
+            if len(positions) else np.empty(0, dtype=object)
+        rows = df.iloc[positions].copy()
+        rows.insert(0, KEY_COL, keys)
+        rows.insert(0, GROUP_COL, group_ids)
+
+        blocks = self._block_keys(norm)
+        return NearDuplicateResult(
+            rows=rows,
+            group_count=len(first_seen),
+            candidate_pairs=len(pairs),
+            matched_pairs=len(matched),
+            block_count=int(blocks.groupby(["_date", "_block"]).ngroups) if len(blocks) else 0,
+            all_pairs=n * (n - 1) // 2,
+        )
+
+
+def find_near_duplicates(df: pd.DataFrame, columns: Sequence[str], **kwargs) -> NearDuplicateResult:
+    """columns を正規化して比較し、表記ゆれを含む重複グループを返す"""
+    return NearDuplicateFinder(columns, **kwargs).find(df)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+稼働状況（同時に提供中のサービス数）の時系列
+サービス区間を分単位の差分配列に積んで累積和をとり、従業員・施設・日ごとの負荷曲線を作る。
+日をまたぐ区間（35:00 まで）は翌日の分に入るので、0:00 をまたぐ負荷もそのまま数えられる。
+同じ曲線をグラフ表示と、負荷の最も低い連続した時間帯（8時間など）の検索の両方に使う。
+"""
+
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from interval_engine import valid_interval_mask
+from src import Interval
+
+DAY_MINUTES = 24 * 60
+# 勤務時間の表記は 35:00 まで
+LATEST_END_MINUTES = 35 * 60
+
+
+def _to_minutes(values) -> np.ndarray:
+    return pd.to_datetime(pd.Series(values)).to_numpy(dtype="datetime64[m]").astype(np.int64)
+
+
+class OccupancyIndex:
+    """
+    サービス区間（従業員・施設付き）の負荷曲線
+    曲線は分単位で計算し、resolution 分ごとの平均に集約して返す（resolution は 1440 の約数）
+    """
+
+    def __init__(self, staff: Sequence[str], facilities: Sequence[str], starts, ends):
+        self.staff_codes, staff_names = pd.factorize(pd.Series(list(staff), dtype=object))
+        self.facility_codes, facility_names = pd.factorize(pd.Series(list(facilities), dtype=object))
+        self.staff_names = list(staff_names)
+        self.facility_names = list(facility_names)
+        self.starts = _to_minutes(starts) if len(starts) else np.empty(0, dtype=np.int64)
+        self.ends = _to_minutes(ends) if len(ends) else np.empty(0, dtype=np.int64)
+        if len(self.starts):
+            self.origin = int(self.starts.min()) // DAY_MINUTES * DAY_MINUTES
+            self.n_days = -(-(int(self.ends.max()) - self.origin) // DAY_MINUTES)
+        else:
+            self.origin, self.n_days = 0, 0
+        self._loads: Dict[Tuple, np.ndarray] = {}
+
+    @classmethod
+    def from_service_dfs(cls, service_dfs: Mapping[str, pd.DataFrame]) -> "OccupancyIndex":
+        """build_service_records の結果（施設ごと）から作る"""
+        staff, facilities, starts, ends = [], [], [], []
+        for facility, df in service_dfs.items():
+            if df.empty:
+                continue
+            part = df[valid_interval_mask(df["_開始DT"], df["_終了DT"])]
+            staff.extend(part["_担当所員_norm"].astype(object).fillna("").tolist())
+            facilities.extend([facility] * len(part))
+            starts.extend(part["_開始DT"].tolist())
+            ends.extend(part["_終了DT"].tolist())
+        return cls(staff, facilities, starts, ends)
+
+    @classmethod
+    def from_interval_map(cls, interval_map: Mapping[str, Sequence[Interval]], facility: str = "") -> "OccupancyIndex":
+        """従業員 → 区間リスト（busy_map や att_map）から作る"""
+        staff, starts, ends = [], [], []
+        for name, ivs in interval_map.items():
+            for iv in ivs:
+                staff.append(name)
+                starts.append(iv.start)
+                ends.append(iv.end)
+        return cls(staff, [facility] * len(staff), starts, ends)
+
+    @property
+    def days(self) -> pd.DatetimeIndex:
+        origin = pd.Timestamp(np.datetime64(self.origin, "m"))
+        return pd.date_range(origin, periods=self.n_days, freq="D")
+
+    # ---- 分単位の負荷 ----
+    def _code(self, names: Sequence, value) -> int:
+        try:
+            return names.index(value)
+        except ValueError:
+            return -1
+
+    def minute_load(self, staff: Optional[str] = None, facility: Optional[str] = None,
+                    exclude_staff: Optional[str] = None) -> np.ndarray:
+        """分ごとの同時サービス数（長さ = 日数 × 1440、先頭は最初の日の 0:00）"""
+        key = (staff, facility, exclude_staff)
+        load = self._loads.get(key)
+        if load is not None:
+            return load
+        if exclude_staff is not None:
+            # 全体（施設で絞る場合はその施設）から本人分を引く
+            load = self.minute_load(facility=facility) - self.minute_load(staff=exclude_staff, facility=facility) \
+                if staff is None else self.minute_load(staff=staff, facility=facility)
+        else:
+            mask = np.ones(len(self.starts), dtype=bool)
+            if staff is not None:
+                mask &= self.staff_codes == self._code(self.staff_names, staff)
+            if facility is not None:
+                mask &= self.facility_codes == self._code(self.facility_names, facility)
+            diff = np.zeros(self.n_days * DAY_MINUTES + 1, dtype=np.int64)
+            np.add.at(diff, self.starts[mask] - self.origin, 1)
+            np.add.at(diff, self.ends[mask] - self.origin, -1)
+            load = np.cumsum(diff[:-1])
+        self._loads[key] = load
+        return load
+
+    def curve(self, resolution: int = 15, **filters) -> pd.Series:
+        """負荷曲線（resolution 分ごとの平均同時サービス数、インデックスは時刻）"""
+        load = self.minute_load(**filters).reshape(-1, resolution).mean(axis=1)
+        index = pd.date_range(pd.Timestamp(np.datetime64(self.origin, "m")), periods=len(load),
+                              freq=f"{resolution}min")
+        return pd.Series(load, index=index, name="稼働")
+
+    def daily_matrix(self, resolution: int = 15, **filters) -> pd.DataFrame:
+        """日 × 時刻の負荷（ヒートマップ用）"""
+        load = self.minute_load(**filters).reshape(self.n_days, -1, resolution).mean(axis=2)
+        columns = [f"{m // 60:02d}:{m % 60:02d}" for m in range(0, DAY_MINUTES, resolution)]
+        return pd.DataFrame(load, index=self.days.date, columns=columns)
+
+    def time_of_day_profile(self, resolution: int = 15, **filters) -> np.ndarray:
+        """時刻ごとの負荷を全日で合計したもの（長さ 1440 / resolution、単位は サービス×分）"""
+        return self.minute_load(**filters).reshape(self.n_days, -1, resolution).sum(axis=(0, 2))
+
+    def frame(self, resolution: int = 15, by: str = "staff") -> pd.DataFrame:
+        """グラフ用の縦長データ（時刻・従業員または施設・稼働）"""
+        names, key, label = (self.staff_names, "staff", "従業員") if by == "staff" \
+            else (self.facility_names, "facility", "施設")
+        parts = []
+        for name in names:
+            curve = self.curve(resolution, **{key: name})
+            parts.append(pd.DataFrame({"時刻": curve.index, label: name, "稼働": curve.to_numpy()}))
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["時刻", label, "稼働"])
+
+    def count(self, staff: Optional[str] = None, exclude_staff: Optional[str] = None) -> int:
+        """対象となるサービス区間の件数"""
+        if staff is not None:
+            return int((self.staff_codes == self._code(self.staff_names, staff)).sum())
+        if exclude_staff is not None:
+            return len(self.starts) - self.count(staff=exclude_staff)
+        return len(self.starts)
+
+    # ---- 連続した時間帯の検索 ----
+    def lowest_load_window(self, hours: float = 8, resolution: int = 15,
+                           latest_end: int = LATEST_END_MINUTES, **filters) -> Tuple[int, int, float]:
+        """
+        負荷の合計が最も低い連続した hours 時間の (開始分, 終了分, 平均負荷)
+        開始は resolution 分刻み、終了は latest_end（既定 35:00）まで。0:00 をまたぐ時間帯は
+        翌日の同じ時刻の負荷で数える（時刻ごとに全日を合計した曲線を2日分つなげて探す）
+        """
+        width = int(round(hours * 60 / resolution))
+        bins = DAY_MINUTES // resolution
+        if self.n_days == 0:
+            profile = np.zeros(bins)
+        else:
+            profile = self.time_of_day_profile(resolution, **filters).astype(float)
+        doubled = np.concatenate([profile, profile, profile[:1]])
+        csum = np.concatenate([[0.0], np.cumsum(doubled)])
+        last_start = min(bins - 1, (latest_end - int(hours * 60)) // resolution)
+        if last_start < 0:
+            raise ValueError("時間帯の長さが長すぎます")
+        starts = np.arange(last_start + 1)
+        sums = csum[starts + width] - csum[starts]
+        best = int(np.argmin(sums))
+        start = best * resolution
+        days = max(1, self.n_days)
+        return start, start + width * resolution, float(sums[best] / (width * resolution * days))
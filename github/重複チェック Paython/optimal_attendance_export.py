@@ -3,6 +3,8 @@
 """
 最適勤怠データ出力機能
 jinjer形式CSV（133列）を出力する
+全行を列単位で組み立てた表（従業員 × 日付）を、エンコード済みのチャンク（bytes）として順に返す（全体を文字列で持たない）
+期間指定の出力では、期間全体の表を月・所属グループ・従業員ごとのファイルに分けてZIPにまとめる
 """
 
 import streamlit as st
@@ -10,9 +12,28 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import io
-from typing import List, Dict, Any
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Any, BinaryIO, Iterator, Mapping, Optional, Tuple
 import calendar
-from src import normalize_name, parse_date_any, parse_minute_of_day
+from derived_attendance import derive_attendance_frame, load_service_dfs
+from employee_roster import DEFAULT_ATTENDANCE_PATH, EmployeeRoster, load_employee_roster
+from interval_engine import merge_close_intervals
+from labor_time import compute_labor_times
+from src import ENCODING, parse_date_any, parse_minute_of_day
+
+# jinjer 取込用CSVの文字コードと、表せない文字の扱い
+#   'replace': '?' に置き換えて文字と件数を記録（既定）、'strict': UnicodeEncodeError を送出、'ignore': 削除して記録
+JINJER_ENCODING = ENCODING
+JINJER_ENCODE_ERRORS = 'replace'
+# 何行ごとにエンコードして返すか
+STREAM_CHUNK_ROWS = 2048
 
 def create_jinjer_headers() -> List[str]:
     """jinjer形式CSVのヘッダー（133列）を生成"""
@@ -99,9 +120,7 @@ def time_to_minutes(time_str: str, is_end_time: bool = False) -> int:
         return 0
 
 def minutes_to_time(minutes: int) -> str:
-    """分を時:分形式に変換"""
-    if minutes >= 24 * 60:
-        return '24:00'
+    """分を時:分形式に変換（24時超もそのまま、例: 1590 -> '26:30'）"""
     hours = minutes // 60
     mins = minutes % 60
     return f"{hours}:{mins:02d}"
@@ -112,218 +131,510 @@ def format_time_for_csv(time_str: str) -> str:
         return ''
     return time_str
 
+# 2時間ルール：前のシフトの終了から2時間（120分）未満で始まるシフトは連続とみなして結合する
+MERGE_GAP_MINUTES = 120
+
+def punch_minutes(values: pd.Series, is_end_time: bool = False) -> np.ndarray:
+    """
+    打刻（'H:MM'）をまとめて分の配列に変換（time_to_minutes と同じ規則）
+    24時超はそのまま、解釈できない値は 0、退勤の '0:00' は 24:00（1440分）
+    """
+    text = values.astype(str).str.strip()
+    parts = text.str.extract(r'^(\d+)(?::(\d+))?(?::\d+)?$')
+    hours = pd.to_numeric(parts[0], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+    mins = pd.to_numeric(parts[1], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+    minutes = hours * 60 + mins
+    if is_end_time:
+        minutes[(text == '0:00').to_numpy()] = 24 * 60
+    return minutes
+
 def merge_overlapping_shifts(shifts: List[Dict]) -> List[Dict]:
-    """2時間ルール適用：シフトを結合"""
+    """2時間ルール適用：シフトを結合（24時超の時刻はそのまま残す）"""
     if not shifts or len(shifts) <= 1:
         return shifts
     
-    # 時間順にソート
-    sorted_shifts = sorted(shifts, key=lambda x: time_to_minutes(x.get('work_start', '0:00')))
-    merged = []
-    
-    for shift in sorted_shifts:
-        if not shift.get('work_start') or not shift.get('work_end'):
-            continue
-            
-        current_start = time_to_minutes(shift['work_start'], False)
-        current_end = time_to_minutes(shift['work_end'], True)
-        
-        # 最後に追加されたシフトと重複・連続チェック
-        if merged:
-            last_shift = merged[-1]
-            last_end = time_to_minutes(last_shift['work_end'], True)
-            
-            # 2時間（120分）未満の間隔は連続とみなす
-            if current_start - last_end < 120:
-                # 結合：終了時間を延長
-                new_end_time = max(last_end, current_end)
-                last_shift['work_end'] = minutes_to_time(new_end_time)
-                continue
-        
-        # 新しいシフトとして追加
-        merged.append({
-            'work_start': minutes_to_time(current_start),
-            'work_end': minutes_to_time(current_end)
-        })
-    
-    return merged
+    valid = [shift for shift in shifts if shift.get('work_start') and shift.get('work_end')]
+    if not valid:
+        return []
+    starts = punch_minutes(pd.Series([shift['work_start'] for shift in valid]))
+    ends = punch_minutes(pd.Series([shift['work_end'] for shift in valid]), is_end_time=True)
+    _, merged_starts, merged_ends = merge_close_intervals(np.zeros(len(valid)), starts, ends, MERGE_GAP_MINUTES)
+    return [{'work_start': minutes_to_time(int(a)), 'work_end': minutes_to_time(int(b))}
+            for a, b in zip(merged_starts, merged_ends)]
 
-def load_employee_id_mapping(attendance_file_path: str = 'input/勤怠履歴.csv') -> Dict[str, str]:
-    """勤怠CSVから従業員名と従業員IDのマッピングを作成"""
-    try:
-        df = pd.read_csv(attendance_file_path, encoding='cp932')
-        
-        # 名前と従業員IDの組み合わせを取得（重複を除去）
-        mapping = {}
-        for _, row in df.iterrows():
-            name = str(row.get('名前', '')).strip()
-            emp_id = str(row.get('*従業員ID', '')).strip()
-            
-            if name and emp_id and name != 'nan' and emp_id != 'nan':
-                # 名前の正規化を行う
-                normalized_name = normalize_name(name)
-                if normalized_name:
-                    mapping[normalized_name] = emp_id
-                    # 元の名前でもマッピングを作成（正規化前の名前でも検索できるように）
-                    mapping[name] = emp_id
-        
-        return mapping
-    except Exception as e:
-        print(f"勤怠CSVの読み込みエラー: {e}")
-        return {}
+def load_employee_id_mapping(attendance_file_path: str = DEFAULT_ATTENDANCE_PATH) -> Dict[str, str]:
+    """勤怠CSVから従業員名と従業員IDのマッピングを作成（名簿のキャッシュを使う）"""
+    return dict(load_employee_roster(attendance_file_path).ids)
 
-def get_employee_id(employee_name: str, attendance_file_path: str = 'input/勤怠履歴.csv') -> str:
+def get_employee_id(employee_name: str, attendance_file_path: str = DEFAULT_ATTENDANCE_PATH) -> str:
     """勤怠CSVから従業員IDを正しく取得"""
-    # 勤怠CSVから従業員IDマッピングを取得
-    mapping = load_employee_id_mapping(attendance_file_path)
-    
-    if not mapping:
-        # フォールバック: 従来の固定マッピング
-        employee_ids = {
-            '利光 梨絵': 'EMP001',
-            '大宮 浩子': 'EMP002',
-            '早崎 友音': 'EMP003',
-            '早崎 琴絵': 'EMP004',
-            '萩原 真理子': 'EMP005'
-        }
-        return employee_ids.get(employee_name, f'EMP{hash(employee_name) % 1000:03d}')
-    
-    # まず元の名前で検索
-    if employee_name in mapping:
-        return mapping[employee_name]
-    
-    # 正規化した名前で検索
-    normalized_name = normalize_name(employee_name)
-    if normalized_name in mapping:
-        return mapping[normalized_name]
-    
-    # 見つからない場合は、勤怠CSVに存在する従業員名を表示してエラー
-    available_names = [name for name in mapping.keys() if not name.startswith('EMP')]
-    print(f"警告: 従業員 '{employee_name}' (正規化後: '{normalized_name}') が勤怠CSVに見つかりません")
-    print(f"利用可能な従業員名: {available_names[:10]}...")  # 最初の10名を表示
-    
-    # フォールバック: ハッシュベースのID生成
-    return f'EMP{hash(employee_name) % 1000:03d}'
+    return load_employee_roster(attendance_file_path).employee_id(employee_name)
 
-def generate_jinjer_csv(selected_employees: List[str], target_month: str, attendance_data: pd.DataFrame) -> str:
-    """jinjer形式CSVを生成"""
-    headers = create_jinjer_headers()
-    csv_content = ','.join(headers) + '\n'
-    
-    # 対象月の全日付を生成
+# 列の並び（ヘッダー名で参照する）
+SHIFT_SLOTS = 10
+STAMP_CATEGORY_COLUMNS = [f'打刻区分ID:{i}' for i in range(1, 51)]
+# 勤怠データの (開始列, 終了列) の組
+SHIFT_PUNCH_PAIRS = [(f'出勤{i}', f'退勤{i}') for i in range(1, SHIFT_SLOTS + 1)]
+BREAK_PUNCH_PAIRS = [(f'休憩{i}', f'復帰{i}') for i in range(1, SHIFT_SLOTS + 1)]
+SCHEDULE_PUNCH_PAIRS = [('出勤予定時刻', '退勤予定時刻')]
+SCHEDULED_BREAK_PUNCH_PAIRS = [(f'休憩予定時刻{i}', f'復帰予定時刻{i}') for i in range(1, 6)]
+GROUP_ID = '1'
+GROUP_NAME = '株式会社hot'
+
+
+def format_minutes_column(minutes: pd.Series) -> pd.Series:
+    """分（整数）を 'H:MM' に（負の値は '-H:MM'）"""
+    m = minutes.astype(np.int64)
+    sign = np.where(m < 0, '-', '')
+    a = m.abs()
+    return pd.Series(sign, index=m.index) + (a // 60).astype(str) + ':' + (a % 60).astype(str).str.zfill(2)
+
+
+def _punch_text(values: pd.Series) -> pd.Series:
+    """打刻列を文字列に（欠損・'nan' は空文字）"""
+    text = values.astype(str).str.strip()
+    return text.mask(values.isna() | (text == 'nan'), '')
+
+
+def _punch_intervals(data_grid: pd.DataFrame, data_rows: np.ndarray, pairs: List[Tuple[str, str]],
+                     columns: Optional[Dict[str, Any]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (開始列, 終了列) の組ごとに両方が入っている打刻を (行, 開始分, 終了分) の縦長の配列にする
+    columns を渡すと打刻の文字列をそのまま同じ列名に書き込む
+    """
+    rows, starts, ends = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for start_col, end_col in pairs:
+        if start_col not in data_grid.columns or end_col not in data_grid.columns:
+            continue
+        start_text = _punch_text(data_grid[start_col])
+        end_text = _punch_text(data_grid[end_col])
+        ok = ((start_text != '') & (end_text != '')).to_numpy()
+        if columns is not None:
+            columns[start_col][data_rows[ok]] = start_text.to_numpy()[ok]
+            columns[end_col][data_rows[ok]] = end_text.to_numpy()[ok]
+        rows.append(data_rows[ok])
+        starts.append(punch_minutes(start_text[ok]))
+        ends.append(punch_minutes(end_text[ok], is_end_time=True))
+    return np.concatenate(rows), np.concatenate(starts), np.concatenate(ends)
+
+
+def month_dates(target_month: str) -> pd.DatetimeIndex:
+    """'YYYY-MM' の月の全日付"""
     year, month = map(int, target_month.split('-'))
-    days_in_month = calendar.monthrange(year, month)[1]
-    all_dates = [f"{year:04d}-{month:02d}-{day:02d}" for day in range(1, days_in_month + 1)]
-    
-    for employee in selected_employees:
-        # 従業員の勤怠データを取得
-        employee_data = attendance_data[
-            attendance_data['名前'].str.strip() == employee.strip()
-        ].copy()
-        
-        # 従業員IDを勤怠データから直接取得
-        employee_id = ''
-        if not employee_data.empty:
-            employee_id = str(employee_data.iloc[0].get('*従業員ID', '')).strip()
-        
-        # 勤怠データにない場合はフォールバック関数を使用
-        if not employee_id or employee_id == 'nan':
-            employee_id = get_employee_id(employee)
-        
-        for date in all_dates:
-            row = [''] * len(headers)
-            
-            # 基本情報の設定
-            row[0] = employee  # 名前
-            row[1] = employee_id  # *従業員ID（勤怠CSVから取得）
-            row[2] = date  # *年月日
-            row[3] = '1'  # *打刻グループID
-            row[4] = '株式会社hot'  # 所属グループ名
-            
-            # その日の勤務データを検索
-            date_data = employee_data[
-                pd.to_datetime(employee_data['*年月日']).dt.strftime('%Y-%m-%d') == date
-            ]
-            
-            if not date_data.empty:
-                # 勤務データがある場合
-                day_record = date_data.iloc[0]
-                
-                # シフトデータを構築
-                shifts = []
-                for i in range(1, 11):  # 最大10シフト
-                    start_col = f'出勤{i}'
-                    end_col = f'退勤{i}'
-                    
-                    if start_col in day_record and end_col in day_record:
-                        start_time = str(day_record[start_col]).strip()
-                        end_time = str(day_record[end_col]).strip()
-                        
-                        if start_time and end_time and start_time != 'nan' and end_time != 'nan':
-                            shifts.append({
-                                'work_start': start_time,
-                                'work_end': end_time
-                            })
-                
-                # 2時間ルール適用
-                merged_shifts = merge_overlapping_shifts(shifts)
-                
-                # 最大10シフトまで対応
-                for i, shift in enumerate(merged_shifts[:10]):
-                    start_index = 19 + (i * 2)  # 出勤1=19, 出勤2=21, ...
-                    end_index = start_index + 1  # 退勤1=20, 退勤2=22, ...
-                    
-                    if start_index < len(headers) and end_index < len(headers):
-                        row[start_index] = format_time_for_csv(shift['work_start'])
-                        row[end_index] = format_time_for_csv(shift['work_end'])
-                
-                # 管理情報の設定（勤務状況、遅刻取消処理等）- 空欄のまま
-                # row[95-99]は既に''で初期化されているので何もしない
-                
-                # 直行・直帰の設定 - 空欄のまま
-                # row[100-119]は既に''で初期化されているので何もしない
-                
-                # 打刻区分ID（1-50にFALSE）
-                stamp_index = 122  # 打刻区分IDの開始位置（正しいインデックス）
-                for i in range(50):  # 打刻区分ID:1-50にFALSEを設定
-                    if stamp_index + i < len(headers):
-                        row[stamp_index + i] = 'FALSE'
-                
-                # 勤務状況フラグ（未打刻、欠勤、休日打刻、休暇打刻、実績確定状況）を空欄に設定
-                status_flag_index = 172  # 勤務状況フラグの開始位置（打刻区分ID:50の次）
-                for i in range(5):  # 5つの勤務状況フラグを空欄に設定
-                    if status_flag_index + i < len(headers):
-                        row[status_flag_index + i] = ''
-                
-                # 労働時間の設定（サンプル値）
-                labor_index = 177  # 労働時間計算の開始位置（勤務状況フラグ5個の後）
-                if len(merged_shifts) > 0:
-                    total_minutes = sum(
-                        time_to_minutes(shift['work_end'], True) - time_to_minutes(shift['work_start'], False)
-                        for shift in merged_shifts
-                    )
-                    total_hours = total_minutes / 60
-                    
-                    row[labor_index] = f"{int(total_hours)}:{int((total_hours % 1) * 60):02d}"  # 総労働時間
-                    row[labor_index + 1] = f"{int(total_hours - 1)}:{int(((total_hours - 1) % 1) * 60):02d}"  # 実労働時間（休憩1時間差し引き）
-                    row[labor_index + 2] = '1:00'  # 休憩時間
-                    
-                    if total_hours > 8:
-                        overtime = total_hours - 8
-                        row[labor_index + 3] = f"{int(overtime)}:{int((overtime % 1) * 60):02d}"  # 総残業時間
-                        row[labor_index + 6] = f"{int(overtime)}:{int((overtime % 1) * 60):02d}"  # 法定外残業時間
-            else:
-                # 勤務データがない場合：初期データとして設定
-                row[19] = '0:00'  # 出勤1
-                row[20] = '24:00'  # 退勤1
-            
-            # CSVの1行として追加
-            csv_content += ','.join([
-                f'"{field}"' if ',' in str(field) else str(field)
-                for field in row
-            ]) + '\n'
-    
-    return csv_content
+    return pd.date_range(f"{year:04d}-{month:02d}-01", periods=calendar.monthrange(year, month)[1], freq='D')
+
+
+def build_jinjer_frame(selected_employees: List[str], target_month: str, attendance_data: pd.DataFrame,
+                       roster: Optional[EmployeeRoster] = None) -> pd.DataFrame:
+    """jinjer形式CSVの全行（従業員 × 対象月の全日付）を列単位で組み立てる"""
+    return build_jinjer_frame_for_dates(selected_employees, month_dates(target_month), attendance_data,
+                                        roster=roster)
+
+
+def _resolve_employee_ids(employees: List[str], selected: pd.DataFrame, selected_names: pd.Series,
+                          roster: Optional[EmployeeRoster]) -> List[str]:
+    """従業員ID（selected は選択された従業員の勤怠行、selected_names はその前後の空白を除いた名前）"""
+    first_ids = _punch_text(selected['*従業員ID']).groupby(selected_names.to_numpy()).first().to_dict() \
+        if '*従業員ID' in selected.columns else {}
+    employee_ids = [first_ids.get(e.strip(), '') for e in employees]
+    if not all(employee_ids):
+        roster = roster if roster is not None else load_employee_roster()
+        employee_ids = [emp_id or roster.employee_id(e) for e, emp_id in zip(employees, employee_ids)]
+    return employee_ids
+
+
+def build_jinjer_frame_for_dates(selected_employees: List[str], dates: pd.DatetimeIndex,
+                                 attendance_data: pd.DataFrame, roster: Optional[EmployeeRoster] = None,
+                                 employee_ids: Optional[Mapping[str, str]] = None,
+                                 groups: Optional[Mapping[str, str]] = None) -> pd.DataFrame:
+    """
+    jinjer形式CSVの全行（従業員 × dates の全日付、従業員ごとに日付順）を列単位で組み立てる
+    - 日付は1回だけ解析し、従業員×日付ごとの最初の勤怠行を (従業員, 日付) の MultiIndex に並べ直す
+    - 出勤/退勤は2時間ルールで結合したシフトを列名で埋め、労働時間は分の配列で計算する
+    勤怠行がない日は出勤1=0:00・退勤1=24:00（初期データ）
+    勤怠データにIDがない従業員は roster（省略時は既定の勤怠CSVの名簿）から引く
+    所属グループ名は勤怠データの従業員ごとの値（employee_groups）、なければ GROUP_NAME
+    employee_ids / groups（名前 → 値）を渡すと勤怠データ・名簿から引く代わりにそれを使う
+    （期間出力で、勤怠データの一部から1ファイル分を作るときに全体で決めた値をそろえる）
+    休憩n/復帰n・予定はそのまま出力し、労働時間の列は labor_time.compute_labor_times で求める（休憩は打刻された分だけ）
+    """
+    headers = create_jinjer_headers()
+    dates = pd.DatetimeIndex(dates).normalize()
+    employees = list(selected_employees)
+    index = pd.MultiIndex.from_product([range(len(employees)), dates], names=['従業員', '日付'])
+    n_rows = len(index)
+
+    # 選択された従業員の勤怠行（名前は前後の空白を除いて照合、日付は1回だけ解析）
+    names = attendance_data['名前'].astype(str).str.strip() if '名前' in attendance_data.columns \
+        else pd.Series('', index=attendance_data.index)
+    positions = pd.Series(range(len(employees)), index=[e.strip() for e in employees])
+    selected = attendance_data[names.isin(positions.index)]
+    selected_names = names[selected.index]
+
+    # 従業員ID：勤怠データの最初の行、なければ名簿
+    if employee_ids is not None:
+        employee_ids = [employee_ids[e] for e in employees]
+    else:
+        employee_ids = _resolve_employee_ids(employees, selected, selected_names, roster)
+
+    # 従業員×日付ごとの最初の勤怠行を全日付のグリッドに並べ直す
+    # 行ごとに解析していたときと同じく、書式の混在（2025/02/03 と 2025-02-03 など）を受け付ける
+    days = pd.to_datetime(selected['*年月日'].astype(str).str.strip(), format='mixed', errors='coerce').dt.normalize()
+    records = selected.assign(_name=selected_names, _date=days)
+    records = records[records['_date'].isin(dates)].drop_duplicates(['_name', '_date'], keep='first')
+    records = records.join(positions.rename('_emp'), on='_name')
+    # 同じ名前が複数回選ばれた場合はそれぞれの位置に並べる
+    records = records.set_index(['_emp', '_date'])
+    grid = records.reindex(index)
+    has_data = grid['_name'].notna().to_numpy()
+
+    columns: Dict[str, Any] = {h: np.full(n_rows, '', dtype=object) for h in headers}
+    columns['名前'] = np.repeat(np.array(employees, dtype=object), len(dates))
+    columns['*従業員ID'] = np.repeat(np.array(employee_ids, dtype=object), len(dates))
+    columns['*年月日'] = np.tile(dates.strftime('%Y-%m-%d').to_numpy(dtype=object), len(employees))
+    columns['*打刻グループID'] = np.full(n_rows, GROUP_ID, dtype=object)
+    groups = groups if groups is not None else employee_groups(selected)
+    columns['所属グループ名'] = np.repeat(np.array([groups.get(e.strip(), GROUP_NAME) for e in employees], dtype=object),
+                                    len(dates))
+    columns['出勤1'][~has_data] = '0:00'
+    columns['退勤1'][~has_data] = '24:00'
+    for col in STAMP_CATEGORY_COLUMNS:
+        columns[col][has_data] = 'FALSE'
+
+    # シフト：勤怠行のある日の出勤n/退勤n を (行, 出勤, 退勤) の縦長にして、全行まとめて2時間ルールで結合する
+    # 時刻は分の整数のまま扱い（24時超も保持）、文字列にするのは列に書き込むときだけ
+    data_rows = np.flatnonzero(has_data)
+    data_grid = grid.iloc[data_rows]
+    shifted = np.zeros(n_rows, dtype=bool)
+    rows, merged_starts, merged_ends = merge_close_intervals(
+        *_punch_intervals(data_grid, data_rows, SHIFT_PUNCH_PAIRS), MERGE_GAP_MINUTES)
+    if len(rows):
+        # 行ごとの結合後シフトの番号（1から）
+        position = np.arange(len(rows))
+        first_of_row = np.concatenate([[True], rows[1:] != rows[:-1]])
+        slots = position - np.maximum.accumulate(np.where(first_of_row, position, 0)) + 1
+        start_text = format_minutes_column(pd.Series(merged_starts)).to_numpy()
+        end_text = format_minutes_column(pd.Series(merged_ends)).to_numpy()
+        for k in range(1, SHIFT_SLOTS + 1):
+            in_slot = slots == k
+            columns[f'出勤{k}'][rows[in_slot]] = start_text[in_slot]
+            columns[f'退勤{k}'][rows[in_slot]] = end_text[in_slot]
+        shifted[rows] = True
+
+    # 休憩・予定（出勤予定時刻/退勤予定時刻・休憩予定n/復帰予定n）は勤怠データの打刻をそのまま出力する
+    breaks = _punch_intervals(data_grid, data_rows, BREAK_PUNCH_PAIRS, columns)
+    schedule = _punch_intervals(data_grid, data_rows, SCHEDULE_PUNCH_PAIRS, columns)
+    scheduled_breaks = _punch_intervals(data_grid, data_rows, SCHEDULED_BREAK_PUNCH_PAIRS, columns)
+
+    # 労働時間の列（シフトのある日）：結合後のシフト・休憩・予定から全行まとめて計算する
+    labor = compute_labor_times(n_rows, (rows, merged_starts, merged_ends), breaks, schedule, scheduled_breaks)
+    shifted_rows = np.flatnonzero(shifted)
+    for column, minutes in labor.columns().items():
+        columns[column][shifted_rows] = format_minutes_column(pd.Series(minutes[shifted_rows])).to_numpy()
+
+    return pd.DataFrame(columns, columns=headers)
+
+
+class JinjerCsvStream:
+    """
+    jinjer形式CSV（build_jinjer_frame の表）をエンコード済みのチャンク（bytes）で順に返す
+    chunk_rows 行ずつ to_csv で書く（クォートは csv モジュールと同じく、カンマ・ダブルクォート・改行を含む項目を囲む）。
+    encoding で表せない文字は errors（JINJER_ENCODE_ERRORS 参照）に従い、置き換え・削除した文字は unencodable に数える
+    """
+
+    def __init__(self, frame: pd.DataFrame, encoding: str = JINJER_ENCODING,
+                 errors: str = JINJER_ENCODE_ERRORS, chunk_rows: int = STREAM_CHUNK_ROWS):
+        if errors not in ('replace', 'strict', 'ignore'):
+            raise ValueError(f"未対応のエンコードエラー処理です: {errors}")
+        self.frame = frame
+        self.encoding = encoding
+        self.errors = errors
+        self.chunk_rows = max(1, chunk_rows)
+        self.rows = 0  # 出力したデータ行数（ヘッダー除く）
+        self.bytes_written = 0
+        self.unencodable: Dict[str, int] = {}
+
+    def __iter__(self) -> Iterator[bytes]:
+        for start in range(0, max(1, len(self.frame)), self.chunk_rows):
+            part = self.frame.iloc[start:start + self.chunk_rows]
+            text = part.to_csv(index=False, header=(start == 0), lineterminator='\n')
+            self.rows += len(part)
+            yield self._encode(text)
+
+    def _encode(self, text: str) -> bytes:
+        try:
+            data = text.encode(self.encoding)
+        except UnicodeEncodeError:
+            if self.errors == 'strict':
+                raise
+            for ch in set(text):
+                try:
+                    ch.encode(self.encoding)
+                except UnicodeEncodeError:
+                    self.unencodable[ch] = self.unencodable.get(ch, 0) + text.count(ch)
+            data = text.encode(self.encoding, self.errors)
+        self.bytes_written += len(data)
+        return data
+
+
+def stream_jinjer_csv(selected_employees: List[str], target_month: str, attendance_data: pd.DataFrame,
+                      encoding: str = JINJER_ENCODING, errors: str = JINJER_ENCODE_ERRORS,
+                      roster: Optional[EmployeeRoster] = None) -> JinjerCsvStream:
+    """jinjer形式CSVのストリーム（for で回すとエンコード済みのチャンクが返る）"""
+    frame = build_jinjer_frame(selected_employees, target_month, attendance_data, roster=roster)
+    return JinjerCsvStream(frame, encoding=encoding, errors=errors)
+
+
+def write_jinjer_csv(fileobj: BinaryIO, selected_employees: List[str], target_month: str,
+                     attendance_data: pd.DataFrame, encoding: str = JINJER_ENCODING,
+                     errors: str = JINJER_ENCODE_ERRORS, roster: Optional[EmployeeRoster] = None) -> JinjerCsvStream:
+    """jinjer形式CSVをバイナリのファイルオブジェクトに書き出し、行数・置き換えた文字を持つストリームを返す"""
+    stream = stream_jinjer_csv(selected_employees, target_month, attendance_data, encoding=encoding, errors=errors,
+                               roster=roster)
+    for chunk in stream:
+        fileobj.write(chunk)
+    return stream
+
+
+def generate_jinjer_csv(selected_employees: List[str], target_month: str, attendance_data: pd.DataFrame,
+                        roster: Optional[EmployeeRoster] = None) -> str:
+    """jinjer形式CSVを文字列で生成（エンコード前、互換用）"""
+    frame = build_jinjer_frame(selected_employees, target_month, attendance_data, roster=roster)
+    return frame.to_csv(index=False, lineterminator='\n')
+
+# 期間出力でファイルを分けるキー（キー → 表示名）
+EXPORT_SPLIT_KEYS = {'month': '月', 'group': '所属グループ', 'employee': '従業員'}
+EXPORT_FILE_PREFIX = '最適勤怠データ'
+_FILENAME_RESERVED = str.maketrans({c: '_' for c in '\\/:*?"<>|'})
+
+
+@dataclass
+class JinjerExportFile:
+    """ZIPに入れたCSV1ファイルの出力結果"""
+    filename: str
+    rows: int
+    bytes_written: int
+    unencodable: Dict[str, int] = field(default_factory=dict)
+
+
+def export_dates(start_date, end_date) -> pd.DatetimeIndex:
+    """開始日〜終了日（両端を含む）の全日付"""
+    start, end = pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+    if end < start:
+        raise ValueError("終了日が開始日より前です")
+    return pd.date_range(start, end, freq='D')
+
+
+def attendance_dates(attendance_data: pd.DataFrame) -> pd.Series:
+    """勤怠データの *年月日（解析できない行は除く）"""
+    if '*年月日' not in attendance_data.columns:
+        return pd.Series(dtype='datetime64[ns]')
+    days = pd.to_datetime(attendance_data['*年月日'].astype(str).str.strip(), format='mixed', errors='coerce')
+    return days.dropna().dt.normalize()
+
+
+def employee_groups(attendance_data: pd.DataFrame) -> Dict[str, str]:
+    """従業員名 → 所属グループ名（勤怠データで最初に出てくる空でない値）"""
+    if '名前' not in attendance_data.columns or '所属グループ名' not in attendance_data.columns:
+        return {}
+    names = _punch_text(attendance_data['名前'])
+    groups = _punch_text(attendance_data['所属グループ名'])
+    known = (names != '') & (groups != '')
+    return groups[known].groupby(names[known].to_numpy(), sort=False).first().to_dict()
+
+
+def split_jinjer_frame(frame: pd.DataFrame, split_by=()) -> List[Tuple[str, pd.DataFrame]]:
+    """
+    build_jinjer_frame_for_dates の表を split_by（EXPORT_SPLIT_KEYS のキー、複数可）の値ごとに分ける
+    (ファイル名に使うラベル, 表) をラベル順に返す。分けない場合は ('', 表) の1件
+    期間出力（export_jinjer_zip）は表を作る前に plan_jinjer_export で同じ分け方を決める
+    所属グループは表に書いた 所属グループ名 の値で分ける（ファイル名と中身が食い違わない）
+    """
+    split_by = list(split_by)
+    if not split_by:
+        return [('', frame)]
+    keys = []
+    for key in split_by:
+        if key == 'month':
+            keys.append(frame['*年月日'].str[:7])
+        elif key == 'group':
+            keys.append(frame['所属グループ名'])
+        elif key == 'employee':
+            keys.append(frame['名前'])
+        else:
+            raise ValueError(f"未対応の分割キーです: {key}")
+    parts = []
+    for values, part in frame.groupby(keys, sort=True):
+        values = values if isinstance(values, tuple) else (values,)
+        parts.append(('_'.join(str(v).translate(_FILENAME_RESERVED) for v in values), part))
+    return parts
+
+
+@dataclass
+class _JinjerExportPart:
+    """ZIPに入れる1ファイル分の入力（従業員・日付・その分だけの勤怠行と、全体で決めたID・所属グループ）"""
+    filename: str
+    employees: List[str]
+    dates: pd.DatetimeIndex
+    attendance: pd.DataFrame
+    employee_ids: Dict[str, str]
+    groups: Dict[str, str]
+
+
+def plan_jinjer_export(selected_employees: List[str], dates: pd.DatetimeIndex, attendance_data: pd.DataFrame,
+                       split_by=(), roster: Optional[EmployeeRoster] = None) -> List[_JinjerExportPart]:
+    """
+    期間出力のファイル分け（split_jinjer_frame と同じ分け方・ラベル順）を、表を組み立てる前に決める
+    月は日付、所属グループ・従業員は従業員の組で分け、各ファイルにはその従業員・日付の勤怠行だけを渡す。
+    従業員ID・所属グループ名は勤怠データ全体から1回だけ決める
+    """
+    split_by = list(split_by)
+    for key in split_by:
+        if key not in EXPORT_SPLIT_KEYS:
+            raise ValueError(f"未対応の分割キーです: {key}")
+    dates = pd.DatetimeIndex(dates).normalize()
+    employees = list(selected_employees)
+    keys = [e.strip() for e in employees]
+
+    # 勤怠行は名前（前後の空白を除く）ごとの行位置と、解析した日付で引く
+    names = attendance_data['名前'].astype(str).str.strip() if '名前' in attendance_data.columns \
+        else pd.Series('', index=attendance_data.index)
+    selected_mask = names.isin(set(keys)).to_numpy()
+    selected = attendance_data[selected_mask]
+    selected_names = names[selected_mask]
+    selected_rows = np.flatnonzero(selected_mask)
+    rows_by_name = {name: selected_rows[idx] for name, idx in
+                    pd.Series(selected_rows).groupby(selected_names.to_numpy(), sort=False).indices.items()}
+    days = pd.to_datetime(attendance_data['*年月日'].astype(str).str.strip(), format='mixed', errors='coerce') \
+        .dt.normalize().to_numpy() if '*年月日' in attendance_data.columns \
+        else np.full(len(attendance_data), np.datetime64('NaT'), dtype='datetime64[ns]')
+
+    ids = dict(zip(employees, _resolve_employee_ids(employees, selected, selected_names, roster)))
+    groups = employee_groups(selected)
+
+    # 日付の組（月ごと、または期間全体）と従業員の組（所属グループ・従業員ごと、または全員）
+    date_blocks = [(month, block) for month, block in dates.groupby(dates.strftime('%Y-%m')).items()] \
+        if 'month' in split_by else [(None, dates)]
+    employee_blocks: Dict[Tuple, List[str]] = {}
+    for employee, key in zip(employees, keys):
+        values = {'group': groups.get(key, GROUP_NAME), 'employee': employee}
+        employee_blocks.setdefault(tuple(values[k] for k in split_by if k != 'month'), []).append(employee)
+
+    period = f"{dates[0]:%Y%m%d}-{dates[-1]:%Y%m%d}"
+    planned = []
+    for month, block_dates in date_blocks:
+        block_dates = pd.DatetimeIndex(block_dates)
+        first, last = block_dates[0].to_datetime64(), block_dates[-1].to_datetime64()
+        for employee_key, block_employees in employee_blocks.items():
+            values = iter(employee_key)
+            label_values = tuple(month if k == 'month' else next(values) for k in split_by)
+            names_in_block = dict.fromkeys(e.strip() for e in block_employees)
+            rows = np.sort(np.concatenate([rows_by_name.get(n, np.empty(0, dtype=np.intp)) for n in names_in_block]
+                                          + [np.empty(0, dtype=np.intp)]))
+            rows = rows[(days[rows] >= first) & (days[rows] <= last)]
+            planned.append((label_values, block_employees, block_dates, rows))
+
+    parts = []
+    for label_values, block_employees, block_dates, rows in sorted(planned, key=lambda p: p[0]):
+        label = '_'.join(str(v).translate(_FILENAME_RESERVED) for v in label_values)
+        stem = label if 'month' in split_by else '_'.join(x for x in (period, label) if x)
+        names_in_block = {e.strip() for e in block_employees}
+        parts.append(_JinjerExportPart(
+            filename=f"{EXPORT_FILE_PREFIX}_{stem}.csv",
+            employees=block_employees,
+            dates=block_dates,
+            attendance=attendance_data.iloc[rows],
+            employee_ids={e: ids[e] for e in block_employees},
+            groups={k: g for k, g in groups.items() if k in names_in_block},
+        ))
+    return parts
+
+
+def _write_jinjer_part(fileobj: BinaryIO, part: _JinjerExportPart, encoding: str, errors: str) -> JinjerCsvStream:
+    """1ファイル分の表を組み立て、エンコード済みのチャンクで fileobj に順に書く（全体を bytes にまとめない）"""
+    frame = build_jinjer_frame_for_dates(part.employees, part.dates, part.attendance,
+                                         employee_ids=part.employee_ids, groups=part.groups)
+    stream = JinjerCsvStream(frame, encoding=encoding, errors=errors)
+    for chunk in stream:
+        fileobj.write(chunk)
+    return stream
+
+
+def _write_jinjer_part_file(path: str, part: _JinjerExportPart, encoding: str,
+                            errors: str) -> Tuple[int, int, Dict[str, int]]:
+    """ワーカープロセス用：1ファイル分を組み立てて path に書き、(行数, バイト数, 置き換えた文字) を返す"""
+    with open(path, 'wb') as f:
+        stream = _write_jinjer_part(f, part, encoding, errors)
+    return stream.rows, stream.bytes_written, stream.unencodable
+
+
+def export_jinjer_zip(fileobj: BinaryIO, selected_employees: List[str], start_date, end_date,
+                      attendance_data: pd.DataFrame, split_by=(), roster: Optional[EmployeeRoster] = None,
+                      max_workers: Optional[int] = None, encoding: str = JINJER_ENCODING,
+                      errors: str = JINJER_ENCODE_ERRORS) -> List[JinjerExportFile]:
+    """
+    開始日〜終了日の jinjer形式CSVを split_by ごとのファイルに分け、ZIPとして fileobj に書き出す
+    - ファイル分けは plan_jinjer_export で先に決め、各ファイルはその従業員・日付の勤怠行だけから組み立てる
+      （期間全体の表は作らないので、月で分ければ1ファイルの手間はいちばん大きい月と同程度）
+    - max_workers>1 なら各ファイルの組み立て・CSV化・エンコードをプロセスプールで並行に行い
+      （to_csv・encode は GIL を離さないのでスレッドでは速くならない）、ワーカーが一時ファイルに書いたものを
+      ファイル名順にZIPへ写す。max_workers<=1 なら同じプロセスで順に、チャンクごとにZIPのエントリへ直接書く
+    """
+    dates = export_dates(start_date, end_date)
+    parts = plan_jinjer_export(selected_employees, dates, attendance_data, split_by, roster=roster)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(parts))
+    manifest: List[JinjerExportFile] = []
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zf:
+        if max_workers <= 1:
+            for part in parts:
+                with zf.open(part.filename, 'w', force_zip64=True) as entry:
+                    stream = _write_jinjer_part(entry, part, encoding, errors)
+                manifest.append(JinjerExportFile(part.filename, stream.rows, stream.bytes_written,
+                                                 dict(stream.unencodable)))
+        else:
+            with tempfile.TemporaryDirectory(prefix="jinjer-export-") as tmp, \
+                    ProcessPoolExecutor(max_workers=max_workers) as executor:
+                paths = [os.path.join(tmp, f"{i}.csv") for i in range(len(parts))]
+                futures = [executor.submit(_write_jinjer_part_file, path, part, encoding, errors)
+                           for path, part in zip(paths, parts)]
+                for part, path, future in zip(parts, paths, futures):
+                    rows, bytes_written, unencodable = future.result()
+                    with open(path, 'rb') as src, zf.open(part.filename, 'w', force_zip64=True) as entry:
+                        shutil.copyfileobj(src, entry)
+                    os.remove(path)
+                    manifest.append(JinjerExportFile(part.filename, rows, bytes_written, unencodable))
+    return manifest
+
+@contextmanager
+def download_tempfile(suffix: str) -> Iterator[BinaryIO]:
+    """ダウンロード用のディスク上の一時ファイル（書き込み用に開いたもの）。with を抜けると削除する"""
+    tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        yield tmp
+    finally:
+        tmp.close()
+        os.remove(tmp.name)
+
+
+def offer_download(tmp: BinaryIO, **kwargs) -> None:
+    """書き終えた一時ファイルを読み込み用に開き直してダウンロードボタンに渡す（メモリ上の bytes にしない）"""
+    tmp.flush()
+    with open(tmp.name, 'rb') as f:
+        st.download_button(data=f, **kwargs)
+
+SOURCE_PUNCHES = "勤怠履歴の打刻"
+SOURCE_SERVICES = "サービス実態から算出"
+
+
+@st.cache_data(max_entries=2, show_spinner="サービス実態から勤怠を算出中...")
+def get_derived_attendance(input_dir: str, service_signature: tuple, roster_signature: tuple) -> pd.DataFrame:
+    """サービス実態から算出した勤怠（ファイルの更新時刻ごとに1回だけ算出する）"""
+    roster = load_employee_roster(os.path.join(input_dir, os.path.basename(DEFAULT_ATTENDANCE_PATH)))
+    return derive_attendance_frame(load_service_dfs(input_dir), roster=roster)
+
 
 def show_optimal_attendance_export():
     """最適勤怠データ出力UI"""
@@ -331,15 +642,13 @@ def show_optimal_attendance_export():
     
     # 勤怠データの読み込み確認
     try:
-        attendance_file_path = 'input/勤怠履歴.csv'
-        attendance_df = pd.read_csv(attendance_file_path, encoding='cp932')
-        
-        # 利用可能な従業員リストを取得
-        available_employees = []
-        for _, row in attendance_df.iterrows():
-            emp_name = str(row.get('名前', '')).strip()
-            if emp_name and emp_name not in available_employees:
-                available_employees.append(emp_name)
+        attendance_file_path = DEFAULT_ATTENDANCE_PATH
+        if not os.path.exists(attendance_file_path):
+            raise FileNotFoundError(attendance_file_path)
+        # 名簿（勤怠データ・従業員一覧・ID）はファイルが変わるまで再利用する
+        roster = load_employee_roster(attendance_file_path)
+        attendance_df = roster.attendance
+        available_employees = list(roster.display_names)
         
         if not available_employees:
             st.error("勤怠データから従業員情報を取得できませんでした。")
@@ -347,14 +656,45 @@ def show_optimal_attendance_export():
         
         st.success(f"勤怠データを読み込みました。利用可能な従業員: {len(available_employees)}名")
         
-        # 対象月の選択
-        col1, col2 = st.columns(2)
-        with col1:
-            target_year = st.selectbox("対象年", range(2023, 2026), index=2)
-        with col2:
-            target_month = st.selectbox("対象月", range(1, 13), index=datetime.now().month - 1)
+        # 勤怠の作成元：勤怠履歴の打刻をそのまま使うか、サービス実態から算出するか
+        source = st.radio("勤怠の作成元", [SOURCE_PUNCHES, SOURCE_SERVICES], horizontal=True, key="export_source")
+        if source == SOURCE_SERVICES:
+            input_dir = os.path.dirname(attendance_file_path)
+            service_paths = tuple(sorted(str(p) for p in Path(input_dir).glob("*.csv")
+                                         if not p.name.startswith(("result_", "_result_")) and "勤怠" not in p.name))
+            if not service_paths:
+                st.error("サービス実態CSVが見つかりません。inputフォルダに配置してください。")
+                return
+            attendance_df = get_derived_attendance(input_dir, tuple(os.stat(p).st_mtime_ns for p in service_paths),
+                                                   roster.signature)
+            available_employees = list(dict.fromkeys(attendance_df['名前']))
+            shortage = int((attendance_df['休憩不足(分)'] > 0).sum())
+            st.info(f"サービス実態{len(service_paths)}ファイルから {len(available_employees)}名・{len(attendance_df)}日分の勤怠を算出しました。")
+            if shortage:
+                st.warning(f"サービスの空き時間が足りず、必要な休憩を割り当てられなかった日が {shortage}日あります。")
         
-        target_month_str = f"{target_year}-{target_month:02d}"
+        # 出力方法と対象期間の選択（年の候補は勤怠データの日付から作る）
+        data_days = attendance_dates(attendance_df)
+        latest = data_days.max() if len(data_days) else pd.Timestamp(datetime.now()).normalize()
+        years = sorted(set(data_days.dt.year.astype(int).tolist()) | {latest.year})
+        export_mode = st.radio("出力方法", ["1か月（CSV）", "期間指定（ZIP）"], horizontal=True, key="export_mode")
+        if export_mode == "1か月（CSV）":
+            col1, col2 = st.columns(2)
+            with col1:
+                target_year = st.selectbox("対象年", years, index=years.index(latest.year))
+            with col2:
+                target_month = st.selectbox("対象月", range(1, 13), index=latest.month - 1)
+            target_month_str = f"{target_year}-{target_month:02d}"
+        else:
+            earliest = data_days.min() if len(data_days) else latest
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                range_start = st.date_input("開始日", value=earliest.replace(day=1).date(), key="export_start")
+            with col2:
+                range_end = st.date_input("終了日", value=(latest + pd.offsets.MonthEnd(0)).date(), key="export_end")
+            with col3:
+                split_by = st.multiselect("ファイルの分割", list(EXPORT_SPLIT_KEYS), default=['month'],
+                                          format_func=EXPORT_SPLIT_KEYS.get, key="export_split")
         
         # 従業員選択
         st.markdown("### 👥 出力対象従業員の選択")
@@ -400,33 +740,80 @@ def show_optimal_attendance_export():
         if st.session_state.selected_employees_export:
             st.markdown("### 📥 CSV出力")
             
-            if st.button("🎯 最適勤怠データをCSV出力", type="primary", key="export_csv"):
+            if export_mode == "期間指定（ZIP）":
+                if st.button("🎯 最適勤怠データをZIP出力", type="primary", key="export_zip"):
+                    with st.spinner("CSV生成中..."):
+                        try:
+                            # 分割した各CSVを並行に作り、ディスク上の一時ファイルのZIPに順に書き込む
+                            with download_tempfile(".zip") as tmp:
+                                manifest = export_jinjer_zip(
+                                    tmp,
+                                    st.session_state.selected_employees_export,
+                                    range_start,
+                                    range_end,
+                                    attendance_df,
+                                    split_by=split_by,
+                                    roster=roster
+                                )
+                                zip_size = tmp.tell()
+                                
+                                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                                offer_download(
+                                    tmp,
+                                    label="📥 ZIPファイルをダウンロード",
+                                    file_name=f"最適勤怠データ_{range_start:%Y%m%d}-{range_end:%Y%m%d}_{timestamp}.zip",
+                                    mime="application/zip",
+                                    help="jinjer形式（133列）の最適勤怠データCSVをまとめたZIPファイル"
+                                )
+                            
+                            st.success(f"✅ ZIP生成完了！{len(manifest)}ファイル（{zip_size / 1024:.0f}KB）を出力しました。")
+                            unencodable: Dict[str, int] = {}
+                            for item in manifest:
+                                for ch, n in item.unencodable.items():
+                                    unencodable[ch] = unencodable.get(ch, 0) + n
+                            if unencodable:
+                                chars = "、".join(f"{ch}（{n}件）" for ch, n in unencodable.items())
+                                st.warning(f"{JINJER_ENCODING} で表せない文字を「?」に置き換えました: {chars}")
+                            with st.expander("ZIPの内容"):
+                                st.dataframe(pd.DataFrame([
+                                    {"ファイル名": item.filename, "行数": item.rows, "サイズ(KB)": round(item.bytes_written / 1024, 1)}
+                                    for item in manifest
+                                ]), hide_index=True)
+                            
+                        except Exception as e:
+                            st.error(f"ZIP生成エラー: {str(e)}")
+            elif st.button("🎯 最適勤怠データをCSV出力", type="primary", key="export_csv"):
                 with st.spinner("CSV生成中..."):
                     try:
-                        # jinjer形式CSVを生成
-                        csv_content = generate_jinjer_csv(
-                            st.session_state.selected_employees_export,
-                            target_month_str,
-                            attendance_df
-                        )
-                        
-                        # ダウンロードボタン
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        filename = f"最適勤怠データ_{target_month_str}_{timestamp}.csv"
-                        
-                        st.download_button(
-                            label="📥 CSVファイルをダウンロード",
-                            data=csv_content.encode('shift_jis', errors='ignore'),
-                            file_name=filename,
-                            mime="text/csv",
-                            help="jinjer形式（133列）の最適勤怠データCSVファイル"
-                        )
+                        # jinjer形式CSVをエンコード済みのチャンクでディスク上の一時ファイルに書き出す
+                        with download_tempfile(".csv") as tmp:
+                            stream = write_jinjer_csv(
+                                tmp,
+                                st.session_state.selected_employees_export,
+                                target_month_str,
+                                attendance_df,
+                                roster=roster
+                            )
+                            
+                            # ダウンロードボタン
+                            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                            filename = f"最適勤怠データ_{target_month_str}_{timestamp}.csv"
+                            
+                            offer_download(
+                                tmp,
+                                label="📥 CSVファイルをダウンロード",
+                                file_name=filename,
+                                mime="text/csv",
+                                help="jinjer形式（133列）の最適勤怠データCSVファイル"
+                            )
                         
                         st.success(f"✅ CSV生成完了！{len(st.session_state.selected_employees_export)}名の勤怠データを出力しました。")
+                        if stream.unencodable:
+                            chars = "、".join(f"{ch}（{n}件）" for ch, n in stream.unencodable.items())
+                            st.warning(f"{stream.encoding} で表せない文字を「?」に置き換えました: {chars}")
                         
                         # 生成されたCSVの詳細情報
-                        lines = csv_content.count('\n') - 1  # ヘッダー行を除く
-                        st.info(f"📊 出力詳細: {lines}行のデータ（ヘッダー含む{lines + 1}行）")
+                        st.info(f"📊 出力詳細: {stream.rows}行のデータ（ヘッダー含む{stream.rows + 1}行、{stream.bytes_written / 1024:.0f}KB）")
                         
                     except Exception as e:
                         st.error(f"CSV生成エラー: {str(e)}")
@@ -5,16 +5,24 @@
 既存のsrc.pyの機能を活用して、従業員の勤務時間を最適化する提案を生成
 """
 
+import os
+import threading
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional, NamedTuple
+from typing import Callable, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple, Optional, NamedTuple
 from dataclasses import dataclass
 import numpy as np
 from src import (
+    ENCODING, ProcessCancelled,
     Interval, normalize_name, parse_date_any, parse_minute_of_day,
     minute_to_datetimetetime, build_work_intervals, build_service_records,
-    interval_fully_covered, find_overlaps, build_staff_busy_map
+    build_staff_busy_map
 )
+from pattern_evaluator import PatternEvaluator
+from roster_rebalancer import RebalanceResult, rebalance_roster
+from interval_engine import CoverageIndex, overlap_flags, to_nanoseconds, to_seconds, valid_interval_mask
+from occupancy import OccupancyIndex
 
 @dataclass
 class WorkPattern:
@@ -42,28 +50,117 @@ class OptimizationResult:
     benefits: List[str]
     error_reduction: int
     work_time_change: int  # 分単位での変更（正の値は増加、負の値は減少）
-    feasibility_score: float  # 0-1の実現可能性スコア
+    feasibility_score: float  # 0-1の実現可能性スコア（feasibility_score() を参照）
+
+# generate_optimization_patterns に入れるグリッド探索の候補数
+SEARCH_PATTERN_COUNT = 3
+# 出勤・退勤の変更幅の合計がこの分数以上で実現可能性0
+FEASIBILITY_SHIFT_MINUTES = 8 * 60
+
+def feasibility_score(current: WorkPattern, proposed: WorkPattern) -> float:
+    """現在の勤務時間からの変更の小ささ（変更なしで1、出勤・退勤の変更幅の合計が8時間以上で0）"""
+    shift_change = abs(proposed.work_start - current.work_start) + abs(proposed.work_end - current.work_end)
+    return float(max(0.0, 1 - shift_change / FEASIBILITY_SHIFT_MINUTES))
 
 class WorkOptimizer:
     """勤務時間最適化エンジン"""
     
-    def __init__(self, att_df: pd.DataFrame, service_dfs: Dict[str, pd.DataFrame]):
+    def __init__(self, att_df: pd.DataFrame, service_dfs: Dict[str, pd.DataFrame],
+                 att_index=None, busy_map: Optional[Mapping[str, Sequence[Interval]]] = None):
+        """
+        att_index: 構築済みの (att_map, name_index)、または index_cache.AttendanceIndex（共有キャッシュの値）。
+                   指定時は build_work_intervals を呼ばない（process() と同じ勤怠インデックスを使い回す）
+        busy_map: 構築済みの build_staff_busy_map の結果。未指定なら初回参照時に構築する
+        """
         self.att_df = att_df
         self.service_dfs = service_dfs
-        self.att_map, self.att_name_index = build_work_intervals(att_df)
-        self.busy_map = build_staff_busy_map(service_dfs)
+        if att_index is None:
+            self.att_map, self.att_name_index = build_work_intervals(att_df)
+        else:
+            self.att_map, self.att_name_index = att_index.as_tuple() if hasattr(att_index, "as_tuple") else att_index
+        self._busy_map = busy_map
+        self._busy_map_injected = busy_map is not None
+        # 分析結果と全従業員で共通の集計（初回参照時に1回だけ計算し、invalidate で破棄）
+        self._analyses: Dict[str, Dict[str, any]] = {}
+        self._roster: Optional[Dict[str, Dict[str, any]]] = None
+        self._mean_work_hours: Optional[float] = None
+        self._occupancy: Optional[OccupancyIndex] = None
+        self._evaluators: Dict[str, PatternEvaluator] = {}
+        # 正規化した従業員名 → 勤怠の行位置（att_df は入力なので invalidate では破棄しない）
+        self._att_groups: Optional[Dict[str, np.ndarray]] = None
+        # 上のキャッシュの読み書きを守る（アプリでは1つのエンジンを複数セッションのスレッドで共有する）
+        self._lock = threading.RLock()
+
+    @property
+    def busy_map(self) -> Mapping[str, Sequence[Interval]]:
+        """全施設のサービス提供区間（従業員ごと、マージ済み）"""
+        with self._lock:
+            if self._busy_map is None:
+                self._busy_map = build_staff_busy_map(self.service_dfs)
+            return self._busy_map
+
+    @property
+    def att_groups(self) -> Dict[str, np.ndarray]:
+        """勤怠の行位置を正規化した従業員名でグループ化したもの（名前の正規化は値の種類ごとに1回、初回参照時だけ）"""
+        with self._lock:
+            if self._att_groups is None:
+                names = self.att_df['名前'] if '名前' in self.att_df.columns else pd.Series(index=self.att_df.index, dtype=object)
+                att_keys = _map_unique(names, normalize_name)
+                self._att_groups = pd.Series(np.arange(len(self.att_df))).groupby(att_keys, sort=False).indices
+            return self._att_groups
+
+    def invalidate(self, employee_name: Optional[str] = None) -> None:
+        """
+        キャッシュした分析結果を破棄する（service_dfs などを書き換えた後に呼ぶ）
+        employee_name を指定するとその従業員の分析・評価器と全体の集計だけを、未指定ならすべてを破棄する。
+        コンストラクタで渡された att_index / busy_map は入力なので破棄しない
+        """
+        with self._lock:
+            if employee_name is None:
+                self._analyses.clear()
+                self._evaluators.clear()
+                if not self._busy_map_injected:
+                    self._busy_map = None
+            else:
+                key = normalize_name(employee_name)
+                self._analyses.pop(key, None)
+                self._evaluators.pop(key, None)
+            self._roster = None
+            self._mean_work_hours = None
+            self._occupancy = None
+
+    def __getstate__(self):
+        # 共有キャッシュの読み取り専用マップ（MappingProxyType）はそのままでは pickle できない。ロックは送らない
+        state = self.__dict__.copy()
+        del state["_lock"]
+        for name in ("att_map", "att_name_index", "_busy_map"):
+            if state[name] is not None and not isinstance(state[name], dict):
+                state[name] = dict(state[name])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
         
     def analyze_employee_patterns(self, employee_name: str) -> Dict[str, any]:
-        """従業員の勤務パターンを分析"""
+        """
+        従業員の勤務パターンを分析（結果は正規化した従業員名ごとに保持し、invalidate まで再計算しない）
+        同じエンジンを複数スレッドから呼んでも、計算はロックの中で1回だけ
+        """
         normalized_name = normalize_name(employee_name)
-        
+        with self._lock:
+            cached = self._analyses.get(normalized_name)
+            if cached is not None:
+                return cached
+            self._analyses[normalized_name] = analysis = self._analyze_employee(employee_name, normalized_name)
+            return analysis
+
+    def _analyze_employee(self, employee_name: str, normalized_name: str) -> Dict[str, any]:
         # 勤怠データから該当従業員の情報を抽出
-        employee_att = self.att_df[
-            self.att_df['名前'].apply(normalize_name) == normalized_name
-        ].copy()
-        
-        if employee_att.empty:
+        rows = self.att_groups.get(normalized_name)
+        if rows is None or not normalized_name:
             return {"error": "従業員が見つかりません"}
+        employee_att = self.att_df.iloc[rows].copy()
         
         # サービス提供データから該当従業員の情報を抽出
         employee_services = []
@@ -94,244 +191,164 @@ class WorkOptimizer:
             "work_intervals": work_intervals,
             "service_records": all_services,
             "error_analysis": error_analysis,
-            "attendance_data": employee_att
+            "attendance_data": employee_att,
+            "pattern_inputs": _pattern_inputs_from_frames(employee_att)
         }
     
+    def analyze_all_employees(self) -> Dict[str, Dict[str, any]]:
+        """
+        全従業員の勤務パターンを1回の走査で分析する（キーは正規化した従業員名）
+        各値は analyze_employee_patterns と同じ形式で、generate_optimization_patterns にそのまま渡せる。
+        - 名前の正規化は値の種類ごとに1回
+        - 勤怠・サービスは従業員キーで1回ずつグループ化
+        - 統計・エラー内訳・パターン入力は groupby とベクトル演算でまとめて計算
+        結果は invalidate まで保持し、2回目以降はそのまま返す（複数スレッドから呼んでも計算は1回）
+        """
+        with self._lock:
+            if self._roster is None:
+                self._roster = self._analyze_roster()
+                self._analyses.update(self._roster)
+            return self._roster
+
+    def _analyze_roster(self) -> Dict[str, Dict[str, any]]:
+        names = self.att_df['名前'] if '名前' in self.att_df.columns else pd.Series(index=self.att_df.index, dtype=object)
+        att_groups = self.att_groups
+
+        # 勤怠の出勤1/退勤1（パターン入力）
+        att_starts = _minutes_column(self.att_df, "出勤1")
+        att_ends = _minutes_column(self.att_df, "退勤1")
+
+        # サービス：施設ごとに従業員キーでグループ化（施設の列構成・型は analyze_employee_patterns と同じになる）
+        services_by_staff: Dict[str, List[pd.DataFrame]] = {}
+        for facility, df in self.service_dfs.items():
+            for key, idx in df.groupby('_担当所員_norm', sort=False, observed=True).indices.items():
+                part = df.iloc[idx].copy()
+                part['施設'] = facility
+                services_by_staff.setdefault(key, []).append(part)
+        all_services = {key: pd.concat(parts, ignore_index=True) for key, parts in services_by_staff.items()}
+        error_analyses = self._analyze_errors_all(all_services)
+
+        analyses: Dict[str, Dict[str, any]] = {}
+        for key, rows in att_groups.items():
+            if not key:
+                continue
+            employee_att = self.att_df.iloc[rows].copy()
+            services = all_services.get(key, pd.DataFrame())
+            work_intervals = self.att_map.get(key, [])
+            total_work_days = len(employee_att)
+            total_work_hours = sum(iv.duration_minutes() for iv in work_intervals) / 60
+            employee_name = self.att_name_index.get(key, [str(names.iloc[rows[0]])])[0]
+            analyses[key] = {
+                "employee_name": employee_name,
+                "normalized_name": key,
+                "total_work_days": total_work_days,
+                "total_work_hours": total_work_hours,
+                "avg_daily_hours": total_work_hours / max(1, total_work_days),
+                "work_intervals": work_intervals,
+                "service_records": services,
+                "error_analysis": error_analyses.get(key, {"total_errors": 0, "error_types": {}}),
+                "attendance_data": employee_att,
+                "pattern_inputs": _pattern_inputs(att_starts[rows], att_ends[rows]),
+            }
+        return analyses
+    
+    def _analyze_errors_all(self, services_by_staff: Dict[str, pd.DataFrame]) -> Dict[str, Dict[str, any]]:
+        """
+        全従業員分の _analyze_errors をまとめて計算
+        件数は process() が立てるフラグと同じ（勤怠履歴超過・施設間重複・事業所内重複それぞれ、フラグの立つ行数）
+        """
+        frames = [df for df in services_by_staff.values() if not df.empty]
+        if not frames:
+            return {}
+        staff_keys = list(services_by_staff.keys())
+        staff_codes = np.concatenate([np.full(len(services_by_staff[k]), i, dtype=np.int64)
+                                      for i, k in enumerate(staff_keys)])
+        combined = pd.concat([services_by_staff[k][['施設', '_開始DT', '_終了DT']] for k in staff_keys],
+                             ignore_index=True)
+        valid = valid_interval_mask(combined['_開始DT'], combined['_終了DT'])
+        codes = staff_codes[valid]
+        starts = to_seconds(combined.loc[valid, '_開始DT'])
+        ends = to_seconds(combined.loc[valid, '_終了DT'])
+
+        # 勤怠履歴超過：勤務区間で完全にカバーされないサービス
+        coverage = CoverageIndex({k: self.att_map.get(k, []) for k in staff_keys})
+        att_codes = coverage.codes_for(staff_keys)[codes]
+        not_covered = ~coverage.fully_covered(att_codes, starts, ends)
+        excess = np.bincount(codes[not_covered], minlength=len(staff_keys))
+
+        # 施設間重複・事業所内重複：process() と同じ規則で立つフラグの件数
+        # （重複は同じ従業員どうしなので、従業員ごとに施設名の昇順・施設内の元の順に並べれば同じ組・同じ判定になる）
+        facilities = combined.loc[valid, '施設'].astype(str)
+        facility_rank = pd.Index(sorted(facilities.unique())).get_indexer(facilities)
+        order = np.argsort(facility_rank, kind="stable")
+        cross, internal_flags = overlap_flags(
+            codes[order], facility_rank[order],
+            to_nanoseconds(combined.loc[valid, '_開始DT']).take(order),
+            to_nanoseconds(combined.loc[valid, '_終了DT']).take(order),
+        )
+        inter = np.bincount(codes[order][cross], minlength=len(staff_keys))
+        internal = np.bincount(codes[order][internal_flags], minlength=len(staff_keys))
+
+        results = {}
+        for i, key in enumerate(staff_keys):
+            if services_by_staff[key].empty:
+                results[key] = {"total_errors": 0, "error_types": {}}
+                continue
+            errors = {
+                "勤怠履歴超過": int(excess[i]),
+                "施設間重複": int(inter[i]),
+                "事業所内重複": int(internal[i])
+            }
+            results[key] = {"total_errors": sum(errors.values()), "error_types": errors}
+        return results
+    
     def _analyze_errors(self, normalized_name: str, services_df: pd.DataFrame) -> Dict[str, any]:
-        """エラー分析を実行"""
+        """エラー分析を実行（一括分析と同じ計算を1人分で行う）"""
         if services_df.empty:
             return {"total_errors": 0, "error_types": {}}
-        
-        work_intervals = self.att_map.get(normalized_name, [])
-        errors = {
-            "勤怠履歴超過": 0,
-            "施設間重複": 0,
-            "事業所内重複": 0
-        }
-        
-        # 勤怠履歴超過のチェック
-        for _, service in services_df.iterrows():
-            if pd.isna(service["_開始DT"]) or pd.isna(service["_終了DT"]):
-                continue
-            service_interval = Interval(service["_開始DT"], service["_終了DT"])
-            if not interval_fully_covered(service_interval, work_intervals):
-                errors["勤怠履歴超過"] += 1
-        
-        # 重複エラーのチェック（簡略版）
-        for facility, facility_services in services_df.groupby('施設'):
-            overlaps = find_overlaps(facility_services, facility_services)
-            errors["事業所内重複"] += len([o for o in overlaps if o[0] != o[1]]) // 2
-        
-        return {
-            "total_errors": sum(errors.values()),
-            "error_types": errors
-        }
+        return self._analyze_errors_all({normalized_name: services_df})[normalized_name]
     
-    def generate_optimization_patterns(self, employee_name: str) -> List[OptimizationResult]:
-        """複数の最適化パターンを生成"""
-        analysis = self.analyze_employee_patterns(employee_name)
+    def generate_optimization_patterns(self, employee_name: str,
+                                       analysis: Optional[Dict[str, any]] = None) -> List[OptimizationResult]:
+        """複数の最適化パターンを生成（analysis に analyze_all_employees の結果を渡せば再分析しない）"""
+        if analysis is None:
+            analysis = self.analyze_employee_patterns(employee_name)
         if "error" in analysis:
             return []
         
         patterns = []
         
-        # パターン1: 現在の勤務時間を基準とした微調整
-        pattern1 = self._generate_fine_tuning_pattern(analysis)
-        if pattern1:
-            patterns.append(pattern1)
-        
-        # パターン2: サービス提供時間に最適化
-        pattern2 = self._generate_service_optimized_pattern(analysis)
-        if pattern2:
-            patterns.append(pattern2)
+        # パターン1〜: 出勤・退勤のグリッド探索（サービスの未カバー時間と実働のパレート最適な勤務時間）
+        if not analysis["service_records"].empty:
+            patterns.extend(self.search_shift_patterns(employee_name, analysis, max_results=SEARCH_PATTERN_COUNT))
         
-        # パターン3: 他の従業員との重複を最小化
+        # 他の従業員との重複を最小化
         pattern3 = self._generate_conflict_minimized_pattern(analysis)
         if pattern3:
             patterns.append(pattern3)
         
-        # パターン4: 労働時間の均等化
+        # 労働時間の均等化
         pattern4 = self._generate_balanced_pattern(analysis)
         if pattern4:
             patterns.append(pattern4)
         
         return patterns
     
-    def _generate_fine_tuning_pattern(self, analysis: Dict) -> Optional[OptimizationResult]:
-        """現在の勤務時間を基準とした微調整パターン"""
-        att_data = analysis["attendance_data"]
-        if att_data.empty:
-            return None
-        
-        # 最も一般的な勤務パターンを特定
-        work_starts = []
-        work_ends = []
-        
-        for _, row in att_data.iterrows():
-            start_time = parse_minute_of_day(row.get("出勤1"))
-            end_time = parse_minute_of_day(row.get("退勤1"))
-            if start_time is not None and end_time is not None:
-                work_starts.append(start_time)
-                work_ends.append(end_time)
-        
-        if not work_starts:
-            return None
-        
-        # 平均的な勤務時間を計算
-        avg_start = int(np.mean(work_starts))
-        avg_end = int(np.mean(work_ends))
-        
-        # 微調整：15分単位で調整
-        adjusted_start = (avg_start // 15) * 15
-        adjusted_end = ((avg_end + 14) // 15) * 15
-        
-        # 現在のパターンと提案パターンを作成
-        current_pattern = WorkPattern(
-            employee_name=analysis["employee_name"],
-            date=datetime.now().date(),
-            work_start=avg_start,
-            work_end=avg_end,
-            break_periods=[(12*60, 13*60)]  # デフォルト昼休み
-        )
-        
-        proposed_pattern = WorkPattern(
-            employee_name=analysis["employee_name"],
-            date=datetime.now().date(),
-            work_start=adjusted_start,
-            work_end=adjusted_end,
-            break_periods=[(12*60, 13*60)]
-        )
-        
-        benefits = [
-            "勤務時間を15分単位に整理",
-            "管理しやすい時間設定",
-            "現在のパターンからの最小限の変更"
-        ]
-        
-        return OptimizationResult(
-            pattern_name="微調整パターン",
-            description="現在の勤務時間を基準に15分単位で調整",
-            current_pattern=current_pattern,
-            proposed_pattern=proposed_pattern,
-            benefits=benefits,
-            error_reduction=1,
-            work_time_change=proposed_pattern.total_work_minutes() - current_pattern.total_work_minutes(),
-            feasibility_score=0.9
-        )
-    
-    def _generate_service_optimized_pattern(self, analysis: Dict) -> Optional[OptimizationResult]:
-        """サービス提供時間に最適化したパターン"""
-        services = analysis["service_records"]
-        if services.empty:
-            return None
-        
-        # サービス提供時間の範囲を分析
-        service_starts = []
-        service_ends = []
-        
-        for _, service in services.iterrows():
-            if pd.notna(service["_開始DT"]) and pd.notna(service["_終了DT"]):
-                start_dt = service["_開始DT"]
-                end_dt = service["_終了DT"]
-                service_starts.append(start_dt.hour * 60 + start_dt.minute)
-                service_ends.append(end_dt.hour * 60 + end_dt.minute)
-        
-        if not service_starts:
-            return None
-        
-        # サービス提供時間に合わせた勤務時間を提案
-        earliest_service = min(service_starts)
-        latest_service = max(service_ends)
-        
-        # 30分のバッファを追加
-        proposed_start = max(0, earliest_service - 30)
-        proposed_end = min(24*60, latest_service + 30)
-        
-        # 現在の平均的なパターンを計算
-        att_data = analysis["attendance_data"]
-        current_starts = [parse_minute_of_day(row.get("出勤1")) for _, row in att_data.iterrows()]
-        current_ends = [parse_minute_of_day(row.get("退勤1")) for _, row in att_data.iterrows()]
-        current_starts = [s for s in current_starts if s is not None]
-        current_ends = [e for e in current_ends if e is not None]
-        
-        avg_current_start = int(np.mean(current_starts)) if current_starts else 9*60
-        avg_current_end = int(np.mean(current_ends)) if current_ends else 17*60
-        
-        current_pattern = WorkPattern(
-            employee_name=analysis["employee_name"],
-            date=datetime.now().date(),
-            work_start=avg_current_start,
-            work_end=avg_current_end,
-            break_periods=[(12*60, 13*60)]
-        )
-        
-        proposed_pattern = WorkPattern(
-            employee_name=analysis["employee_name"],
-            date=datetime.now().date(),
-            work_start=proposed_start,
-            work_end=proposed_end,
-            break_periods=[(12*60, 13*60)]
-        )
-        
-        benefits = [
-            "サービス提供時間を完全にカバー",
-            "勤怠履歴超過エラーの削減",
-            "効率的な業務時間配分"
-        ]
-        
-        error_reduction = analysis["error_analysis"]["error_types"].get("勤怠履歴超過", 0)
-        
-        return OptimizationResult(
-            pattern_name="サービス最適化パターン",
-            description="サービス提供時間に合わせて勤務時間を最適化",
-            current_pattern=current_pattern,
-            proposed_pattern=proposed_pattern,
-            benefits=benefits,
-            error_reduction=error_reduction,
-            work_time_change=proposed_pattern.total_work_minutes() - current_pattern.total_work_minutes(),
-            feasibility_score=0.8
-        )
-    
     def _generate_conflict_minimized_pattern(self, analysis: Dict) -> Optional[OptimizationResult]:
         """他の従業員との重複を最小化するパターン"""
         normalized_name = analysis["normalized_name"]
         
-        # 他の従業員の繁忙時間を分析
-        busy_intervals = []
-        for name, intervals in self.busy_map.items():
-            if name != normalized_name:
-                busy_intervals.extend(intervals)
-        
-        if not busy_intervals:
+        # 他の従業員の稼働（全体の負荷曲線から本人分を引く）
+        occupancy = self.occupancy()
+        if occupancy.count(exclude_staff=normalized_name) == 0:
             return None
         
-        # 繁忙時間を避けた勤務時間を提案
-        # 簡略化：最も空いている時間帯を特定
-        hour_usage = [0] * 24
-        for interval in busy_intervals:
-            start_hour = interval.start.hour
-            end_hour = interval.end.hour
-            for h in range(start_hour, min(end_hour + 1, 24)):
-                hour_usage[h] += 1
-        
-        # 最も使用率の低い8時間を特定
-        min_usage_hours = sorted(range(24), key=lambda h: hour_usage[h])[:8]
-        min_usage_hours.sort()
-        
-        # 連続する時間帯を優先
-        best_start = min_usage_hours[0]
-        proposed_start = best_start * 60
-        proposed_end = (best_start + 8) * 60
+        # 他の従業員の稼働が最も低い連続8時間（15分刻み、0:00 をまたぐ時間帯も含む）
+        proposed_start, proposed_end, _ = occupancy.lowest_load_window(
+            hours=8, resolution=15, exclude_staff=normalized_name)
         
         # 現在のパターン
-        att_data = analysis["attendance_data"]
-        current_starts = [parse_minute_of_day(row.get("出勤1")) for _, row in att_data.iterrows()]
-        current_ends = [parse_minute_of_day(row.get("退勤1")) for _, row in att_data.iterrows()]
-        current_starts = [s for s in current_starts if s is not None]
-        current_ends = [e for e in current_ends if e is not None]
-        
-        avg_current_start = int(np.mean(current_starts)) if current_starts else 9*60
-        avg_current_end = int(np.mean(current_ends)) if current_ends else 17*60
+        avg_current_start, avg_current_end = self._current_average(analysis)
         
         current_pattern = WorkPattern(
             employee_name=analysis["employee_name"],
@@ -355,32 +372,25 @@ class WorkOptimizer:
             "リソースの効率的な配分"
         ]
         
-        conflict_errors = (analysis["error_analysis"]["error_types"].get("施設間重複", 0) + 
-                          analysis["error_analysis"]["error_types"].get("事業所内重複", 0))
-        
         return OptimizationResult(
             pattern_name="重複最小化パターン",
             description="他の従業員との重複を避けた勤務時間",
             current_pattern=current_pattern,
             proposed_pattern=proposed_pattern,
             benefits=benefits,
-            error_reduction=conflict_errors,
+            error_reduction=self._simulated_reduction(analysis, current_pattern, proposed_pattern),
             work_time_change=proposed_pattern.total_work_minutes() - current_pattern.total_work_minutes(),
-            feasibility_score=0.7
+            feasibility_score=feasibility_score(current_pattern, proposed_pattern)
         )
     
     def _generate_balanced_pattern(self, analysis: Dict) -> Optional[OptimizationResult]:
         """労働時間の均等化パターン"""
         # 全従業員の平均労働時間を計算
-        all_work_hours = []
-        for name, intervals in self.att_map.items():
-            total_minutes = sum(iv.duration_minutes() for iv in intervals)
-            all_work_hours.append(total_minutes / 60)
-        
-        if not all_work_hours:
+        mean_work_hours = self._mean_all_work_hours()
+        if mean_work_hours is None:
             return None
         
-        target_daily_hours = np.mean(all_work_hours) / max(1, len(analysis["attendance_data"]))
+        target_daily_hours = mean_work_hours / max(1, len(analysis["attendance_data"]))
         target_minutes = int(target_daily_hours * 60)
         
         # 標準的な勤務時間（9:00-18:00）をベースに調整
@@ -419,11 +429,214 @@ class WorkOptimizer:
             current_pattern=current_pattern,
             proposed_pattern=proposed_pattern,
             benefits=benefits,
-            error_reduction=0,
+            error_reduction=self._simulated_reduction(analysis, current_pattern, proposed_pattern),
             work_time_change=proposed_pattern.total_work_minutes() - current_pattern.total_work_minutes(),
-            feasibility_score=0.6
+            feasibility_score=feasibility_score(current_pattern, proposed_pattern)
         )
 
+    def rebalance_roster(self, iterations: int = 200_000, time_limit: float = 60.0,
+                         seed: Optional[int] = None, **kwargs) -> RebalanceResult:
+        """全従業員の担当替え・勤務区間の調整でエラー合計を減らす（roster_rebalancer を参照）"""
+        return rebalance_roster(self.att_map, self.service_dfs, iterations=iterations,
+                                time_limit=time_limit, seed=seed, **kwargs)
+    
+    # ---- 候補パターンの評価 ----
+    def pattern_evaluator(self, employee_name: str, analysis: Optional[Dict[str, any]] = None) -> PatternEvaluator:
+        """従業員のサービスに対する what-if 評価器（従業員ごとに1回だけ作る）"""
+        key = analysis["normalized_name"] if analysis is not None else normalize_name(employee_name)
+        with self._lock:
+            evaluator = self._evaluators.get(key)
+            if evaluator is None:
+                if analysis is None:
+                    analysis = self.analyze_employee_patterns(employee_name)
+                evaluator = PatternEvaluator.from_analysis(analysis)
+                self._evaluators[key] = evaluator
+            return evaluator
+    
+    def _simulated_reduction(self, analysis: Dict, current: WorkPattern, proposed: WorkPattern, day=None) -> int:
+        """提案パターンを勤務日（day 指定時はその日）に当てはめて数え直した勤怠履歴超過の削減数"""
+        try:
+            return self.pattern_evaluator(analysis["normalized_name"], analysis).error_reduction(current, proposed, day)
+        except ValueError:
+            # 24時間を超える勤務は評価対象外
+            return 0
+    
+    def rank_candidate_shifts(self, employee_name: str, candidates: Sequence[Tuple[int, int]],
+                              analysis: Optional[Dict[str, any]] = None,
+                              break_periods: Sequence[Tuple[int, int]] = ((12*60, 13*60),),
+                              top_n: Optional[int] = None) -> List[OptimizationResult]:
+        """
+        候補の勤務時間（出勤分, 退勤分）をまとめて評価し、エラーの少ない順に並べる
+        同じエラー数なら現在の勤務時間からの変更が小さいものを優先する
+        """
+        if analysis is None:
+            analysis = self.analyze_employee_patterns(employee_name)
+        if "error" in analysis or not candidates:
+            return []
+        starts = np.array([c[0] for c in candidates], dtype=np.int64)
+        ends = np.array([c[1] for c in candidates], dtype=np.int64)
+        evaluator = self.pattern_evaluator(employee_name, analysis)
+        current_start, current_end = self._current_average(analysis)
+        current_pattern = WorkPattern(
+            employee_name=analysis["employee_name"],
+            date=datetime.now().date(),
+            work_start=current_start,
+            work_end=current_end,
+            break_periods=list(break_periods)
+        )
+        try:
+            current_excess = evaluator.evaluate(current_pattern).excess_errors
+        except ValueError:
+            current_excess = analysis["error_analysis"].get("error_types", {}).get("勤怠履歴超過", 0)
+        excess = evaluator.excess_counts(starts, ends, break_periods)
+        shift_change = np.abs(starts - current_start) + np.abs(ends - current_end)
+        order = np.lexsort((shift_change, excess))
+        if top_n is not None:
+            order = order[:top_n]
+
+        results = []
+        for i in order:
+            proposed_pattern = WorkPattern(
+                employee_name=analysis["employee_name"],
+                date=datetime.now().date(),
+                work_start=int(starts[i]),
+                work_end=int(ends[i]),
+                break_periods=list(break_periods)
+            )
+            results.append(OptimizationResult(
+                pattern_name=f"候補 {format_time_minutes(int(starts[i]))}-{format_time_minutes(int(ends[i]))}",
+                description=f"勤怠履歴超過 {int(excess[i])}件（現在のパターンでは {current_excess}件）",
+                current_pattern=current_pattern,
+                proposed_pattern=proposed_pattern,
+                benefits=[f"勤怠履歴超過を{current_excess - int(excess[i])}件削減"],
+                error_reduction=current_excess - int(excess[i]),
+                work_time_change=proposed_pattern.total_work_minutes() - current_pattern.total_work_minutes(),
+                feasibility_score=feasibility_score(current_pattern, proposed_pattern)
+            ))
+        return results
+
+    def search_shift_patterns(self, employee_name: str, analysis: Optional[Dict[str, any]] = None,
+                              step: int = 15, min_hours: float = 4, max_hours: float = 12,
+                              max_results: int = 5, per_day: bool = False) -> List[OptimizationResult]:
+        """
+        出勤・退勤を step 分刻みで総当たりし、未カバー時間と実働のパレート最適な候補を返す
+        - per_day=False: 全勤務日に同じ勤務時間を当てはめる（max_results 件まで）
+        - per_day=True: 勤務日ごとに、その日に始まるサービスに合わせて探索する（1日あたり max_results 件まで）
+        休憩は拘束時間に応じて45分／60分を勤務の中ほどに置く
+        """
+        if analysis is None:
+            analysis = self.analyze_employee_patterns(employee_name)
+        if "error" in analysis:
+            return []
+        evaluator = self.pattern_evaluator(employee_name, analysis)
+        current_start, current_end = self._current_average(analysis)
+        current_pattern = WorkPattern(
+            employee_name=analysis["employee_name"],
+            date=datetime.now().date(),
+            work_start=current_start,
+            work_end=current_end,
+            break_periods=[(12*60, 13*60)]
+        )
+        options = dict(step=step, min_minutes=int(min_hours * 60), max_minutes=int(max_hours * 60))
+
+        results = []
+        days = evaluator.work_days if per_day else [None]
+        for day in days:
+            found = evaluator.search(day=day, **options)
+            front = found.pareto
+            if len(front) > max_results:
+                # パレート前線から未カバーの少ない側（実働の長い側）を優先して均等に選ぶ
+                front = front[np.unique(np.linspace(len(front) - 1, 0, max_results).round().astype(int))]
+            date = pd.Timestamp(day).date() if day is not None else datetime.now().date()
+            for i in front:
+                proposed_pattern = WorkPattern(
+                    employee_name=analysis["employee_name"],
+                    date=date,
+                    work_start=int(found.work_starts[i]),
+                    work_end=int(found.work_ends[i]),
+                    break_periods=found.break_periods(i)
+                )
+                work = int(found.work_minutes[i])
+                results.append(OptimizationResult(
+                    pattern_name=f"探索パターン {format_time_minutes(proposed_pattern.work_start)}-"
+                                 f"{format_time_minutes(proposed_pattern.work_end)}",
+                    description=f"未カバー {found.uncovered_minutes[i]:.0f}分・実働 {work // 60}時間{work % 60:02d}分",
+                    current_pattern=current_pattern,
+                    proposed_pattern=proposed_pattern,
+                    benefits=[f"サービスの未カバー時間 {found.uncovered_minutes[i]:.0f}分",
+                              f"休憩 {int(found.break_ends[i] - found.break_starts[i])}分を含む勤務"],
+                    error_reduction=self._simulated_reduction(analysis, current_pattern, proposed_pattern, day),
+                    work_time_change=proposed_pattern.total_work_minutes() - current_pattern.total_work_minutes(),
+                    feasibility_score=feasibility_score(current_pattern, proposed_pattern)
+                ))
+        return results
+
+    # ---- パターン生成の共通入力 ----
+    @staticmethod
+    def _pattern_inputs(analysis: Dict) -> Dict[str, Optional[float]]:
+        inputs = analysis.get("pattern_inputs")
+        if inputs is None:
+            inputs = _pattern_inputs_from_frames(analysis["attendance_data"])
+        return inputs
+    
+    def current_shift(self, employee_name: str, analysis: Optional[Dict[str, any]] = None) -> Tuple[int, int]:
+        """現在の平均的な出勤・退勤（分）。提案パターンの「現在のパターン」と同じ"""
+        if analysis is None:
+            analysis = self.analyze_employee_patterns(employee_name)
+        return self._current_average(analysis)
+
+    def _current_average(self, analysis: Dict) -> Tuple[int, int]:
+        """現在の平均的な出勤・退勤（分）。打刻がなければ 9:00-17:00"""
+        inputs = self._pattern_inputs(analysis)
+        avg_start = int(inputs["start_mean"]) if inputs["start_mean"] is not None else 9*60
+        avg_end = int(inputs["end_mean"]) if inputs["end_mean"] is not None else 17*60
+        return avg_start, avg_end
+    
+    def _mean_all_work_hours(self) -> Optional[float]:
+        """全従業員の総労働時間（時間）の平均"""
+        with self._lock:
+            if self._mean_work_hours is None and self.att_map:
+                self._mean_work_hours = float(np.mean([
+                    sum(iv.duration_minutes() for iv in intervals) / 60 for intervals in self.att_map.values()
+                ]))
+            return self._mean_work_hours
+    
+    def occupancy(self) -> OccupancyIndex:
+        """全施設のサービス区間の負荷曲線（従業員・施設・日ごと、グラフにも使う）"""
+        with self._lock:
+            if self._occupancy is None:
+                self._occupancy = OccupancyIndex.from_service_dfs(self.service_dfs)
+            return self._occupancy
+
+def _map_unique(series: pd.Series, func) -> np.ndarray:
+    """値の種類ごとに1回だけ func を適用する"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    mapped = np.array([func(v) for v in uniques], dtype=object)
+    return mapped[codes] if len(mapped) else np.empty(0, dtype=object)
+
+def _minutes_column(att_df: pd.DataFrame, col: str) -> np.ndarray:
+    """勤怠の時刻列を分に（解釈できない値・列なしは NaN）"""
+    if col not in att_df.columns:
+        return np.full(len(att_df), np.nan)
+    minutes = _map_unique(att_df[col], parse_minute_of_day)
+    return np.array([np.nan if m is None else m for m in minutes], dtype=float)
+
+def _pattern_inputs(starts: np.ndarray, ends: np.ndarray) -> Dict[str, Optional[float]]:
+    """
+    パターン生成の入力
+    - start_mean / end_mean: 出勤1・退勤1それぞれがある日の平均（現在のパターン）
+    """
+    def mean(values):
+        return float(values.mean()) if len(values) else None
+
+    return {
+        "start_mean": mean(starts[~np.isnan(starts)]),
+        "end_mean": mean(ends[~np.isnan(ends)]),
+    }
+
+def _pattern_inputs_from_frames(att_data: pd.DataFrame) -> Dict[str, Optional[float]]:
+    return _pattern_inputs(_minutes_column(att_data, "出勤1"), _minutes_column(att_data, "退勤1"))
+
 def format_time_minutes(minutes: int) -> str:
     """分を時:分形式に変換"""
     hours = minutes // 60
@@ -444,5 +657,105 @@ def calculate_optimization_impact(results: List[OptimizationResult]) -> Dict[str
         "total_error_reduction": total_error_reduction,
         "average_feasibility": avg_feasibility,
         "work_time_changes": work_time_changes,
-        "recommended_pattern": max(results, key=lambda r: r.feasibility_score * (1 + r.error_reduction/10))
-    }
\ No newline at end of file
+        # rank_candidate_shifts と同じ順：エラー削減の多いもの、同数なら現在からの変更が小さいもの
+        "recommended_pattern": max(results, key=lambda r: (r.error_reduction, r.feasibility_score))
+    }
+
+# ---- 全従業員分の並列生成 ----
+# ワーカープロセスごとに1回だけ受け取る最適化エンジンと一括分析の結果（読み取り専用）
+_worker_optimizer: Optional[WorkOptimizer] = None
+_worker_analyses: Dict[str, Dict[str, any]] = {}
+
+def _init_pattern_worker(optimizer: WorkOptimizer, analyses: Dict[str, Dict[str, any]]) -> None:
+    global _worker_optimizer, _worker_analyses
+    _worker_optimizer = optimizer
+    _worker_analyses = analyses
+
+def _generate_patterns_chunk(names: List[str]) -> List[Tuple[str, List[OptimizationResult]]]:
+    return [(name, _worker_optimizer.generate_optimization_patterns(name, _worker_analyses[name]))
+            for name in names]
+
+def generate_all_patterns(optimizer: WorkOptimizer, employee_names: Optional[Iterable[str]] = None,
+                          max_workers: Optional[int] = None, chunk_size: int = 4,
+                          progress: Optional[Callable[[str, float], None]] = None,
+                          cancel_event: Optional[threading.Event] = None
+                          ) -> Iterator[Tuple[str, List[OptimizationResult]]]:
+    """
+    全従業員（または employee_names）の最適化パターンを生成し、終わった従業員から順に返す
+    - 分析は analyze_all_employees で1回だけ行い、att_map / busy_map と一緒にワーカー起動時に渡す
+    - 従業員は chunk_size 名ずつプロセスプールに振り分ける（max_workers<=1 なら同じプロセスで順に処理）
+    - cancel_event がセットされると未着手の分を取り消して ProcessCancelled を送出する
+    """
+    analyses = optimizer.analyze_all_employees()
+    if employee_names is None:
+        names = list(analyses)
+    else:
+        names = [n for n in dict.fromkeys(normalize_name(n) for n in employee_names) if n in analyses]
+    total = max(1, len(names))
+    done = 0
+
+    def report():
+        if progress:
+            progress("optimize", done / total)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    chunk_size = max(1, chunk_size)
+    chunks = [names[i:i + chunk_size] for i in range(0, len(names), chunk_size)]
+
+    if max_workers <= 1 or len(chunks) <= 1:
+        for name in names:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ProcessCancelled("optimize")
+            yield name, optimizer.generate_optimization_patterns(name, analyses[name])
+            done += 1
+            report()
+        return
+
+    executor = ProcessPoolExecutor(max_workers=min(max_workers, len(chunks)),
+                                   initializer=_init_pattern_worker,
+                                   initargs=(optimizer, {n: analyses[n] for n in names}))
+    try:
+        futures = [executor.submit(_generate_patterns_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            if cancel_event is not None and cancel_event.is_set():
+                raise ProcessCancelled("optimize")
+            for name, results in future.result():
+                yield name, results
+                done += 1
+            report()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+OPTIMIZATION_EXPORT_COLUMNS = [
+    "従業員名", "提案パターン名", "現在の出勤", "現在の退勤", "提案出勤", "提案退勤",
+    "勤務時間変更(分)", "エラー削減予想数", "実現可能性スコア", "提案の詳細説明"
+]
+
+def optimization_results_frame(results: Mapping[str, List[OptimizationResult]]) -> pd.DataFrame:
+    """従業員ごとの最適化結果を1つの表にまとめる（従業員名・パターン名の順）"""
+    rows = []
+    for name in sorted(results):
+        for r in results[name]:
+            rows.append({
+                "従業員名": r.proposed_pattern.employee_name,
+                "提案パターン名": r.pattern_name,
+                "現在の出勤": format_time_minutes(r.current_pattern.work_start),
+                "現在の退勤": format_time_minutes(r.current_pattern.work_end),
+                "提案出勤": format_time_minutes(r.proposed_pattern.work_start),
+                "提案退勤": format_time_minutes(r.proposed_pattern.work_end),
+                "勤務時間変更(分)": r.work_time_change,
+                "エラー削減予想数": r.error_reduction,
+                "実現可能性スコア": r.feasibility_score,
+                "提案の詳細説明": r.description,
+            })
+    return pd.DataFrame(rows, columns=OPTIMIZATION_EXPORT_COLUMNS)
+
+def export_optimization_results(results: Mapping[str, List[OptimizationResult]], path) -> pd.DataFrame:
+    """全従業員分の最適化結果をCSVに一括出力する（result_*.csv と同じく cp932、書けない文字があれば UTF-8）"""
+    df = optimization_results_frame(results)
+    try:
+        df.to_csv(path, index=False, encoding=ENCODING)
+    except UnicodeEncodeError:
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+    return df
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+勤務パターンの what-if 評価
+提案された勤務パターン（出勤・退勤・休憩、分単位）を従業員の勤務日すべてに当てはめたと仮定し、
+その従業員のサービスのうち勤怠履歴超過になる件数を数え直す。
+サービスは「開始日の 0:00 からの秒」と前後の日が勤務日かどうかに前処理しておき、
+候補パターンの評価は配列演算だけで行う（process() の再実行はしない）。
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from interval_engine import COVERAGE_TOLERANCE_SECONDS, to_seconds, valid_interval_mask
+from src import ATT_DATE_COL, parse_date_any, parse_minute_of_day
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def required_break_minutes(span_minutes) -> np.ndarray:
+    """
+    拘束時間（分）に対する休憩の長さ（労働基準法第34条：6時間超で45分、8時間超で60分）
+    休憩45分を引いても8時間を超える場合は60分とする
+    """
+    span = np.asarray(span_minutes, dtype=np.int64)
+    return np.where(span <= 6 * 60, 0, np.where(span <= 8 * 60 + 45, 45, 60))
+
+
+@dataclass
+class PatternScore:
+    """候補パターン1件の評価結果"""
+    work_start: int
+    work_end: int
+    excess_errors: int      # 勤怠履歴超過の件数
+    overlap_errors: int     # 事業所内重複・施設間重複（勤務時間では変わらない）
+
+    @property
+    def total_errors(self) -> int:
+        return self.excess_errors + self.overlap_errors
+
+
+def attendance_work_days(att_data: pd.DataFrame) -> List[np.datetime64]:
+    """出勤1 の打刻がある日（build_work_intervals が勤務日として扱う日）"""
+    if att_data.empty or ATT_DATE_COL not in att_data.columns or "出勤1" not in att_data.columns:
+        return []
+    days = []
+    for date_value, first_in in zip(att_data[ATT_DATE_COL], att_data["出勤1"]):
+        if parse_minute_of_day(first_in) is None:
+            continue
+        try:
+            days.append(np.datetime64(parse_date_any(date_value).date(), "D"))
+        except ValueError:
+            continue
+    return days
+
+
+@dataclass
+class ShiftSearchResult:
+    """グリッド探索の結果（各配列は候補ごと、時刻は勤務日の 0:00 からの分）"""
+    work_starts: np.ndarray
+    work_ends: np.ndarray
+    break_starts: np.ndarray
+    break_ends: np.ndarray
+    uncovered_minutes: np.ndarray   # サービス時間のうち勤務で覆われない分（全サービスの合計）
+    work_minutes: np.ndarray        # 実働（拘束時間 − 休憩）
+    pareto: np.ndarray              # 未カバー・実働のどちらでも他に劣らない候補（実働の短い順）
+
+    def __len__(self) -> int:
+        return len(self.work_starts)
+
+    def break_periods(self, i: int) -> List[Tuple[int, int]]:
+        if self.break_ends[i] > self.break_starts[i]:
+            return [(int(self.break_starts[i]), int(self.break_ends[i]))]
+        return []
+
+
+class _ServiceDemand:
+    """
+    サービス区間の累積量 D(x) = Σ overlap([s_i, e_i], (-∞, x])
+    勤務区間 [a, b] が覆うサービス時間の合計は D(b) − D(a) で求まる
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray):
+        self.starts = np.sort(starts)
+        self.ends = np.sort(ends)
+        self.start_prefix = np.concatenate([[0], np.cumsum(self.starts)])
+        self.end_prefix = np.concatenate([[0], np.cumsum(self.ends)])
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        i = np.searchsorted(self.starts, x, side="right")
+        j = np.searchsorted(self.ends, x, side="right")
+        return (i * x - self.start_prefix[i]) - (j * x - self.end_prefix[j])
+
+
+def pareto_front(costs: np.ndarray, work: np.ndarray) -> np.ndarray:
+    """costs・work をともに小さくしたい場合のパレート最適な候補（work の短い順）"""
+    order = np.lexsort((costs, work))
+    best = np.minimum.accumulate(costs[order])
+    improved = np.r_[True, costs[order][1:] < best[:-1]]
+    return order[improved]
+
+
+class PatternEvaluator:
+    """
+    1人分のサービスに対する勤務パターンの評価器
+    - 勤務区間は「勤務日 + 出勤〜退勤、休憩を除く」で、勤務は24時間以内・休憩どうしは重ならないものとする
+    - 被覆の判定は interval_fully_covered と同じ（未カバーが1分以下なら完全カバー）
+    """
+
+    def __init__(self, services: pd.DataFrame, work_days: Iterable, overlap_errors: int = 0):
+        self.overlap_errors = int(overlap_errors)
+        days = np.unique(np.array([np.datetime64(d, "D") for d in work_days], dtype="datetime64[D]"))
+        self.has_work_days = len(days) > 0
+
+        if services.empty:
+            starts = ends = np.empty(0, dtype=np.int64)
+        else:
+            valid = valid_interval_mask(services["_開始DT"], services["_終了DT"])
+            starts = to_seconds(services.loc[valid, "_開始DT"])
+            ends = to_seconds(services.loc[valid, "_終了DT"])
+        day_index = starts // DAY_SECONDS
+        # サービス開始日の 0:00 からの秒
+        self.starts = starts - day_index * DAY_SECONDS
+        self.ends = ends - day_index * DAY_SECONDS
+        self.durations = self.ends - self.starts
+        self._day_index = day_index
+        self.work_days = days
+        self._work_days = days.astype(np.int64)
+        self._on_day_cache = {}
+        self._demand_cache = {}
+
+    def _on_day(self, k: int) -> np.ndarray:
+        """開始日から k 日ずれた日が勤務日かどうか（サービスごと）"""
+        on_day = self._on_day_cache.get(k)
+        if on_day is None:
+            on_day = np.isin(self._day_index + k, self._work_days)
+            self._on_day_cache[k] = on_day
+        return on_day
+
+    @classmethod
+    def from_analysis(cls, analysis: dict) -> "PatternEvaluator":
+        """analyze_employee_patterns / analyze_all_employees の結果から作る"""
+        error_types = analysis["error_analysis"].get("error_types", {})
+        return cls(analysis["service_records"], attendance_work_days(analysis["attendance_data"]),
+                   overlap_errors=error_types.get("事業所内重複", 0) + error_types.get("施設間重複", 0))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def excess_counts(self, work_starts: Sequence[int], work_ends: Sequence[int],
+                      break_periods: Sequence[Tuple[int, int]] = (), day=None) -> np.ndarray:
+        """
+        候補（出勤[i], 退勤[i]）ごとの勤怠履歴超過の件数
+        break_periods はすべての候補に共通の休憩（分、勤務時間外の部分は無視）
+        day を指定するとその日に始まるサービスだけを、その日の勤務だけで判定する
+        """
+        a = np.asarray(work_starts, dtype=np.int64) * 60
+        b = np.asarray(work_ends, dtype=np.int64) * 60
+        if np.any(b - a > DAY_SECONDS):
+            raise ValueError("勤務時間は24時間以内で指定してください")
+        if day is not None:
+            mask = self._day_index == int(np.datetime64(day, "D").astype(np.int64))
+            day_offsets = [(0, np.ones(int(mask.sum()), dtype=bool))]
+        else:
+            mask = slice(None)
+            # k 日ずれた日の勤務区間のうち、サービスと重なりうる範囲（前日以前からの持ち越し〜終了日まで）
+            first_k = -int(max(0, b.max()) // DAY_SECONDS) if len(b) else 0
+            last_k = (int(self.ends.max() // DAY_SECONDS) if len(self) else 0) \
+                - (int(a.min()) // DAY_SECONDS if len(a) else 0)
+            day_offsets = ((k, self._on_day(k)) for k in range(first_k, last_k + 1))
+        s = self.starts[mask][None, :]
+        e = self.ends[mask][None, :]
+        n = s.shape[1]
+        if n == 0:
+            return np.zeros(len(a), dtype=np.int64)
+        if day is None and not self.has_work_days:
+            return np.full(len(a), n, dtype=np.int64)
+
+        covered = np.zeros((len(a), n), dtype=np.int64)
+        for k, on_day in day_offsets:
+            if not on_day.any():
+                continue
+            shift = k * DAY_SECONDS
+            wa = (a + shift)[:, None]
+            wb = (b + shift)[:, None]
+            day_cover = np.maximum(0, np.minimum(e, wb) - np.maximum(s, wa))
+            for bs, be in break_periods:
+                ba = np.maximum(wa, bs * 60 + shift)
+                bb = np.minimum(wb, be * 60 + shift)
+                day_cover -= np.maximum(0, np.minimum(e, bb) - np.maximum(s, ba))
+            covered += day_cover * on_day[None, :]
+        uncovered = self.durations[mask][None, :] - covered
+        has_cover = (b > a)[:, None]
+        excess = ~(has_cover & (uncovered <= COVERAGE_TOLERANCE_SECONDS))
+        return excess.sum(axis=1)
+
+    def score(self, work_starts: Sequence[int], work_ends: Sequence[int],
+              break_periods: Sequence[Tuple[int, int]] = (), day=None) -> List[PatternScore]:
+        counts = self.excess_counts(work_starts, work_ends, break_periods, day=day)
+        return [PatternScore(int(ws), int(we), int(c), self.overlap_errors)
+                for ws, we, c in zip(work_starts, work_ends, counts)]
+
+    def evaluate(self, pattern, day=None) -> PatternScore:
+        """WorkPattern 1件を評価する"""
+        return self.score([pattern.work_start], [pattern.work_end], pattern.break_periods, day=day)[0]
+
+    def error_reduction(self, current, proposed, day=None) -> int:
+        """現在のパターンから提案パターンに変えたときに減るエラー件数（増える場合は負）"""
+        return self.evaluate(current, day).excess_errors - self.evaluate(proposed, day).excess_errors
+
+    # ---- グリッド探索 ----
+    def _demand(self, day=None) -> Tuple[_ServiceDemand, int]:
+        """
+        勤務日の 0:00 を起点にしたサービス区間の累積量と、対象サービスの合計時間（秒）
+        day を省略すると全勤務日に同じ勤務時間を当てはめる場合（前後の日からの持ち越しも含む）、
+        指定するとその日に始まるサービスだけを対象にする
+        """
+        key = None if day is None else int(np.datetime64(day, "D").astype(np.int64))
+        cached = self._demand_cache.get(key)
+        if cached is None:
+            if key is not None:
+                mask = self._day_index == key
+                cached = (_ServiceDemand(self.starts[mask], self.ends[mask]), int(self.durations[mask].sum()))
+            else:
+                # 開始日から k 日後が勤務日なら、その日の勤務区間から見たサービスは k 日分前にずれる
+                last_k = int(self.ends.max() // DAY_SECONDS) if len(self) else 0
+                starts, ends = [], []
+                for k in range(-2, last_k + 1):
+                    on_day = self._on_day(k)
+                    starts.append(self.starts[on_day] - k * DAY_SECONDS)
+                    ends.append(self.ends[on_day] - k * DAY_SECONDS)
+                cached = (_ServiceDemand(np.concatenate(starts), np.concatenate(ends)),
+                          int(self.durations.sum()))
+            self._demand_cache[key] = cached
+        return cached
+
+    def search(self, step: int = 15, min_minutes: int = 4 * 60, max_minutes: int = 12 * 60,
+               earliest_start: int = 0, latest_start: int = 24 * 60, day=None) -> ShiftSearchResult:
+        """
+        出勤・拘束時間を step 分刻みで総当たりし、未カバー時間と実働をまとめて計算する
+        休憩は required_break_minutes の長さを勤務の中ほどに置く
+        """
+        if max_minutes > 24 * 60:
+            raise ValueError("勤務時間は24時間以内で指定してください")
+        starts, spans = np.meshgrid(np.arange(earliest_start, latest_start, step, dtype=np.int64),
+                                    np.arange(min_minutes, max_minutes + 1, step, dtype=np.int64),
+                                    indexing="ij")
+        starts = starts.ravel()
+        spans = spans.ravel()
+        ends = starts + spans
+        breaks = required_break_minutes(spans)
+        break_starts = starts + ((spans - breaks) // 2 // step) * step
+        break_ends = break_starts + breaks
+
+        demand, total = self._demand(day)
+        covered = (demand(ends * 60) - demand(starts * 60)) - (demand(break_ends * 60) - demand(break_starts * 60))
+        uncovered = (total - covered) / 60
+        work = spans - breaks
+        return ShiftSearchResult(starts, ends, break_starts, break_ends, uncovered, work,
+                                 pareto_front(uncovered, work))
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全従業員の勤務・担当をまとめて見直すリバランス（焼きなまし法）
+エラーのあるサービスの担当替えと、勤務区間の開始・終了の前後移動を繰り返し、
+施設間重複・事業所内重複・勤怠履歴超過の合計を減らす。
+- 従業員ごとのサービスと勤務区間はソート済みリストで持ち、1手の評価は bisect による近傍の走査だけで行う
+  （全件の再チェックはしない）
+- 勤務時間は従業員ごとの上限（既定は現在の総勤務時間 + max_extra_hours）を超えない
+"""
+
+import bisect
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from interval_engine import COVERAGE_TOLERANCE_SECONDS, to_seconds, valid_interval_mask
+from src import Interval
+
+# 元の状態から変えること自体への小さなペナルティ（同じエラー数なら変更の少ない解を選ぶ）
+REASSIGN_PENALTY = 0.05
+SHIFT_PENALTY_PER_MINUTE = 0.0005
+
+_EPOCH = pd.Timestamp(0)
+
+
+@dataclass
+class RebalanceResult:
+    """リバランスの結果"""
+    errors_before: Dict[str, int]
+    errors_after: Dict[str, int]
+    reassignments: pd.DataFrame         # 施設・行・元の担当・新しい担当
+    shift_changes: pd.DataFrame         # 従業員・元の勤務区間・新しい勤務区間
+    work_intervals: Dict[str, List[Interval]]
+    iterations: int
+    accepted: int
+    elapsed_seconds: float
+    stats: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def total_before(self) -> int:
+        return sum(self.errors_before.values())
+
+    @property
+    def total_after(self) -> int:
+        return sum(self.errors_after.values())
+
+
+class RosterRebalancer:
+    """
+    勤務区間（att_map）とサービス（施設ごとの build_service_records の結果）から作る探索状態
+    - サービス i の担当 staff[i] を別の従業員に替える手
+    - 従業員の勤務区間 1 つの開始または終了を step 分ずらす手
+    の2種類を焼きなましで試す
+    """
+
+    def __init__(self, att_map: Mapping[str, Sequence[Interval]], service_dfs: Mapping[str, pd.DataFrame],
+                 step_minutes: int = 15, max_extra_hours: float = 8.0,
+                 hour_limits: Optional[Mapping[str, float]] = None, seed: Optional[int] = None):
+        self.step = step_minutes * 60
+        self.rng = random.Random(seed)
+
+        # ---- サービス ----
+        facilities, rows, staff_names, starts, ends = [], [], [], [], []
+        for facility, df in service_dfs.items():
+            if df.empty:
+                continue
+            valid = valid_interval_mask(df["_開始DT"], df["_終了DT"]) & (df["_担当所員_norm"].astype(object).fillna("") != "").to_numpy()
+            part = df[valid]
+            facilities.extend([facility] * len(part))
+            rows.extend(part.index.tolist())
+            staff_names.extend(part["_担当所員_norm"].tolist())
+            starts.append(to_seconds(part["_開始DT"]))
+            ends.append(to_seconds(part["_終了DT"]))
+        self.facilities = facilities
+        self.rows = rows
+        self.starts = np.concatenate(starts).tolist() if starts else []
+        self.ends = np.concatenate(ends).tolist() if ends else []
+        self.max_duration = max((e - s for s, e in zip(self.starts, self.ends)), default=0)
+
+        # ---- 従業員 ----
+        self.staff_names: List[str] = list(dict.fromkeys(list(att_map.keys()) + staff_names))
+        self.staff_code = {name: i for i, name in enumerate(self.staff_names)}
+        self.original_staff = [self.staff_code[n] for n in staff_names]
+        self.staff = list(self.original_staff)
+
+        # 勤務区間（[開始秒, 終了秒] のリスト、開始順・重なりなし）
+        self.work: List[List[List[int]]] = []
+        for name in self.staff_names:
+            ivs = sorted(att_map.get(name, []), key=lambda iv: (iv.start, iv.end))
+            secs = [[int((pd.Timestamp(iv.start) - _EPOCH).total_seconds()),
+                     int((pd.Timestamp(iv.end) - _EPOCH).total_seconds())] for iv in ivs]
+            self.work.append(secs)
+        self.original_work = [[list(iv) for iv in ivs] for ivs in self.work]
+        self.work_starts = [[iv[0] for iv in ivs] for ivs in self.work]
+        self.work_seconds = [sum(e - s for s, e in ivs) for ivs in self.work]
+        self.hour_limit_seconds = []
+        for name, seconds in zip(self.staff_names, self.work_seconds):
+            if hour_limits is not None and name in hour_limits:
+                self.hour_limit_seconds.append(int(hour_limits[name] * 3600))
+            else:
+                self.hour_limit_seconds.append(seconds + int(max_extra_hours * 3600))
+        # 勤務区間がある従業員（担当替えの候補）
+        self.available = [c for c, ivs in enumerate(self.work) if ivs]
+
+        # 従業員ごとのサービス（(開始, 終了, i) の開始順リスト）
+        self.services: List[List[Tuple[int, int, int]]] = [[] for _ in self.staff_names]
+        for i, c in enumerate(self.staff):
+            self.services[c].append((self.starts[i], self.ends[i], i))
+        for lst in self.services:
+            lst.sort()
+
+        # ---- エラー状態 ----
+        n = len(self.starts)
+        self.excess = [self._is_excess(self.staff[i], i) for i in range(n)]
+        self.overlaps = [len(self._overlapping(self.staff[i], i)) for i in range(n)]
+        self.flagged: List[int] = []
+        self._flag_pos: Dict[int, int] = {}
+        for i in range(n):
+            self._update_flag(i)
+
+    # ---- 近傍の走査 ----
+    def _covered_seconds(self, c: int, s: int, e: int) -> int:
+        ivs = self.work[c]
+        j = bisect.bisect_left(self.work_starts[c], e) - 1
+        covered = 0
+        while j >= 0 and ivs[j][1] > s:
+            covered += min(e, ivs[j][1]) - max(s, ivs[j][0])
+            j -= 1
+        return covered
+
+    def _is_excess(self, c: int, i: int) -> bool:
+        """interval_fully_covered と同じ判定（勤務区間がなければ超過）"""
+        if not self.work[c]:
+            return True
+        s, e = self.starts[i], self.ends[i]
+        return (e - s) - self._covered_seconds(c, s, e) > COVERAGE_TOLERANCE_SECONDS
+
+    def _overlapping(self, c: int, i: int) -> List[int]:
+        """従業員 c のサービスのうち i と重なるもの（i 自身は除く）"""
+        s, e = self.starts[i], self.ends[i]
+        lst = self.services[c]
+        j = bisect.bisect_left(lst, (e, -1, -1)) - 1
+        found = []
+        while j >= 0 and lst[j][0] > s - self.max_duration - 1:
+            sj, ej, k = lst[j]
+            if k != i and sj < e and s < ej:
+                found.append(k)
+            j -= 1
+        return found
+
+    def _services_in(self, c: int, a: int, b: int) -> List[int]:
+        """従業員 c のサービスのうち [a, b] と重なるもの"""
+        lst = self.services[c]
+        j = bisect.bisect_left(lst, (b, -1, -1)) - 1
+        found = []
+        while j >= 0 and lst[j][0] > a - self.max_duration - 1:
+            if lst[j][1] > a:
+                found.append(lst[j][2])
+            j -= 1
+        return found
+
+    def _update_flag(self, i: int) -> None:
+        flagged = self.excess[i] or self.overlaps[i] > 0
+        pos = self._flag_pos.get(i)
+        if flagged and pos is None:
+            self._flag_pos[i] = len(self.flagged)
+            self.flagged.append(i)
+        elif not flagged and pos is not None:
+            last = self.flagged.pop()
+            if last != i:
+                self.flagged[pos] = last
+                self._flag_pos[last] = pos
+            del self._flag_pos[i]
+
+    # ---- 手1: 担当替え ----
+    def _reassign_delta(self, i: int, q: int) -> Tuple[float, List[int], List[int], bool]:
+        p = self.staff[i]
+        old_overlaps = self._overlapping(p, i)
+        new_overlaps = self._overlapping(q, i)
+        new_excess = self._is_excess(q, i)
+        delta = (len(new_overlaps) - len(old_overlaps)) + (int(new_excess) - int(self.excess[i]))
+        if p == self.original_staff[i]:
+            delta += REASSIGN_PENALTY
+        elif q == self.original_staff[i]:
+            delta -= REASSIGN_PENALTY
+        return delta, old_overlaps, new_overlaps, new_excess
+
+    def _apply_reassign(self, i: int, q: int, old_overlaps, new_overlaps, new_excess) -> None:
+        p = self.staff[i]
+        item = (self.starts[i], self.ends[i], i)
+        lst = self.services[p]
+        del lst[bisect.bisect_left(lst, item)]
+        bisect.insort(self.services[q], item)
+        self.staff[i] = q
+        for k in old_overlaps:
+            self.overlaps[k] -= 1
+            self._update_flag(k)
+        for k in new_overlaps:
+            self.overlaps[k] += 1
+            self._update_flag(k)
+        self.overlaps[i] = len(new_overlaps)
+        self.excess[i] = new_excess
+        self._update_flag(i)
+
+    def _candidate_staff(self, i: int) -> Optional[int]:
+        """担当替え先：勤務区間で i を覆える従業員を優先し、いなければ勤務区間のある誰か"""
+        p = self.staff[i]
+        s, e = self.starts[i], self.ends[i]
+        covering = [c for c in self.available
+                    if c != p and (e - s) - self._covered_seconds(c, s, e) <= COVERAGE_TOLERANCE_SECONDS]
+        pool = covering or [c for c in self.available if c != p]
+        return self.rng.choice(pool) if pool else None
+
+    # ---- 手2: 勤務区間の前後移動 ----
+    def _shift_move(self) -> Optional[Tuple[int, int, int, int]]:
+        """(従業員, 区間番号, 端(0=開始/1=終了), 新しい値) を1つ選ぶ。上限や隣の区間に当たる場合は None"""
+        if not self.flagged:
+            return None
+        # エラーのあるサービスの担当者の勤務区間を優先して動かす
+        i = self.rng.choice(self.flagged)
+        c = self.staff[i]
+        ivs = self.work[c]
+        if not ivs:
+            return None
+        j = max(0, min(len(ivs) - 1, bisect.bisect_right(self.work_starts[c], self.starts[i]) - 1))
+        side = self.rng.randrange(2)
+        value = ivs[j][side] + self.rng.choice((-1, 1)) * self.step
+        lo = ivs[j - 1][1] if side == 0 and j > 0 else None
+        hi = ivs[j + 1][0] if side == 1 and j + 1 < len(ivs) else None
+        if side == 0 and (value >= ivs[j][1] or (lo is not None and value < lo)):
+            return None
+        if side == 1 and (value <= ivs[j][0] or (hi is not None and value > hi)):
+            return None
+        change = (ivs[j][1] - value) - (ivs[j][1] - ivs[j][0]) if side == 0 else \
+            (value - ivs[j][0]) - (ivs[j][1] - ivs[j][0])
+        if self.work_seconds[c] + change > self.hour_limit_seconds[c]:
+            return None
+        return c, j, side, value
+
+    def _shift_delta(self, c: int, j: int, side: int, value: int) -> Tuple[float, List[Tuple[int, bool]]]:
+        iv = self.work[c][j]
+        old = iv[side]
+        a, b = min(old, value), max(old, value)
+        affected = self._services_in(c, a, b)
+        # 仮に動かして超過を数え直す
+        iv[side] = value
+        if side == 0:
+            self.work_starts[c][j] = value
+        changes = [(k, self._is_excess(c, k)) for k in affected]
+        iv[side] = old
+        if side == 0:
+            self.work_starts[c][j] = old
+        delta = sum(int(new) - int(self.excess[k]) for k, new in changes)
+        original = self.original_work[c][j][side]
+        delta += SHIFT_PENALTY_PER_MINUTE * (abs(value - original) - abs(old - original)) / 60
+        return delta, changes
+
+    def _apply_shift(self, c: int, j: int, side: int, value: int, changes) -> None:
+        iv = self.work[c][j]
+        self.work_seconds[c] += (iv[side] - value) if side == 0 else (value - iv[side])
+        iv[side] = value
+        if side == 0:
+            self.work_starts[c][j] = value
+        for k, new in changes:
+            self.excess[k] = new
+            self._update_flag(k)
+
+    # ---- 全件の集計 ----
+    def error_counts(self) -> Dict[str, int]:
+        """現在の状態のエラー件数（全件を数え直す。重複はペア数）"""
+        excess = sum(self._is_excess(self.staff[i], i) for i in range(len(self.starts)))
+        cross = same = 0
+        for i in range(len(self.starts)):
+            for k in self._overlapping(self.staff[i], i):
+                if k > i:
+                    if self.facilities[k] == self.facilities[i]:
+                        same += 1
+                    else:
+                        cross += 1
+        return {"勤怠履歴超過": int(excess), "施設間重複": cross, "事業所内重複": same}
+
+    def tracked_errors(self) -> int:
+        """差分更新で追跡しているエラー数（勤怠履歴超過 + 重複ペア）"""
+        return sum(self.excess) + sum(self.overlaps) // 2
+
+    # ---- 探索 ----
+    def run(self, iterations: int = 200_000, time_limit: float = 60.0,
+            start_temperature: float = 1.0, end_temperature: float = 0.01,
+            reassign_ratio: float = 0.5) -> RebalanceResult:
+        errors_before = self.error_counts()
+        started = time.time()
+        cost = float(self.tracked_errors())
+        best_cost = cost
+        best = self._snapshot()
+        accepted = 0
+        it = 0
+        for it in range(1, iterations + 1):
+            if not self.flagged:
+                break
+            if it % 1024 == 0 and time.time() - started > time_limit:
+                break
+            temperature = start_temperature * (end_temperature / start_temperature) ** (it / iterations)
+
+            if self.rng.random() < reassign_ratio:
+                i = self.rng.choice(self.flagged)
+                q = self._candidate_staff(i)
+                if q is None:
+                    continue
+                delta, old_ov, new_ov, new_excess = self._reassign_delta(i, q)
+                if delta <= 0 or self.rng.random() < math.exp(-delta / temperature):
+                    self._apply_reassign(i, q, old_ov, new_ov, new_excess)
+                    cost += delta
+                    accepted += 1
+            else:
+                move = self._shift_move()
+                if move is None:
+                    continue
+                delta, changes = self._shift_delta(*move)
+                if delta <= 0 or self.rng.random() < math.exp(-delta / temperature):
+                    self._apply_shift(*move, changes)
+                    cost += delta
+                    accepted += 1
+
+            if cost < best_cost - 1e-9:
+                best_cost = cost
+                best = self._snapshot()
+
+        self._restore(best)
+        elapsed = time.time() - started
+        return RebalanceResult(
+            errors_before=errors_before,
+            errors_after=self.error_counts(),
+            reassignments=self.reassignment_frame(),
+            shift_changes=self.shift_change_frame(),
+            work_intervals=self.work_intervals(),
+            iterations=it,
+            accepted=accepted,
+            elapsed_seconds=elapsed,
+            stats={"iterations_per_second": it / elapsed if elapsed > 0 else float("inf")},
+        )
+
+    def _snapshot(self):
+        return (list(self.staff), [[list(iv) for iv in ivs] for ivs in self.work])
+
+    def _restore(self, snapshot) -> None:
+        staff, work = snapshot
+        self.staff = list(staff)
+        self.work = [[list(iv) for iv in ivs] for ivs in work]
+        self.work_starts = [[iv[0] for iv in ivs] for ivs in self.work]
+        self.work_seconds = [sum(e - s for s, e in ivs) for ivs in self.work]
+        self.services = [[] for _ in self.staff_names]
+        for i, c in enumerate(self.staff):
+            self.services[c].append((self.starts[i], self.ends[i], i))
+        for lst in self.services:
+            lst.sort()
+        n = len(self.starts)
+        self.excess = [self._is_excess(self.staff[i], i) for i in range(n)]
+        self.overlaps = [len(self._overlapping(self.staff[i], i)) for i in range(n)]
+        self.flagged, self._flag_pos = [], {}
+        for i in range(n):
+            self._update_flag(i)
+
+    # ---- 結果 ----
+    def reassignment_frame(self) -> pd.DataFrame:
+        changed = [i for i in range(len(self.staff)) if self.staff[i] != self.original_staff[i]]
+        return pd.DataFrame({
+            "施設": [self.facilities[i] for i in changed],
+            "行": [self.rows[i] for i in changed],
+            "開始": [_EPOCH + pd.Timedelta(seconds=self.starts[i]) for i in changed],
+            "終了": [_EPOCH + pd.Timedelta(seconds=self.ends[i]) for i in changed],
+            "元の担当所員": [self.staff_names[self.original_staff[i]] for i in changed],
+            "新しい担当所員": [self.staff_names[self.staff[i]] for i in changed],
+        }, columns=["施設", "行", "開始", "終了", "元の担当所員", "新しい担当所員"])
+
+    def shift_change_frame(self) -> pd.DataFrame:
+        rows = []
+        for c, (ivs, orig) in enumerate(zip(self.work, self.original_work)):
+            for iv, ov in zip(ivs, orig):
+                if iv != ov:
+                    rows.append({
+                        "従業員": self.staff_names[c],
+                        "元の開始": _EPOCH + pd.Timedelta(seconds=ov[0]),
+                        "元の終了": _EPOCH + pd.Timedelta(seconds=ov[1]),
+                        "新しい開始": _EPOCH + pd.Timedelta(seconds=iv[0]),
+                        "新しい終了": _EPOCH + pd.Timedelta(seconds=iv[1]),
+                    })
+        return pd.DataFrame(rows, columns=["従業員", "元の開始", "元の終了", "新しい開始", "新しい終了"])
+
+    def work_intervals(self) -> Dict[str, List[Interval]]:
+        return {self.staff_names[c]: [Interval((_EPOCH + pd.Timedelta(seconds=s)).to_pydatetime(),
+                                               (_EPOCH + pd.Timedelta(seconds=e)).to_pydatetime())
+                                      for s, e in ivs]
+                for c, ivs in enumerate(self.work) if ivs}
+
+
+def rebalance_roster(att_map: Mapping[str, Sequence[Interval]], service_dfs: Mapping[str, pd.DataFrame],
+                     iterations: int = 200_000, time_limit: float = 60.0, seed: Optional[int] = None,
+                     **kwargs) -> RebalanceResult:
+    """勤務区間とサービスから全従業員のリバランスを行う"""
+    return RosterRebalancer(att_map, service_dfs, seed=seed, **kwargs).run(iterations=iterations,
+                                                                          time_limit=time_limit)
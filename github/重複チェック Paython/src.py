@@ -15,10 +15,12 @@ import re
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Tuple, Dict, Optional, Iterable
+from typing import List, Tuple, Dict, Optional, Iterable, Callable, Mapping, Sequence
+import threading
 import unicodedata
 import math
 
+import numpy as np
 import pandas as pd
 
 ENCODING = "cp932"  # 入出力はWindows-31J想定（添付データ準拠）
@@ -40,14 +42,45 @@ CAT_COL = "カテゴリ"
 ALT_COL = "代替職員リスト"
 
 FLAG = "◯"
+# 結果の分・件数の列（欠損ありの整数型）
+DETAIL_INT_DTYPES = {'重複時間（分）': 'Int32', '超過時間（分）': 'Int32', '勤務区間数': 'Int16'}
+# process() が行ごとに種類の多い文字列を書き込む列（書き込み中は object、出力前にカテゴリ型へ1回で変換）
+ROW_TEXT_COLUMNS = (CAT_COL, ALT_COL, '重複相手施設', '重複相手担当者', '重複タイプ')
+
+# process() の進捗段階（進捗コールバックに渡す段階名と、開始時点の全体進捗率）
+PROCESS_STAGES = {
+    "ingest": 0.0,
+    "overlaps": 0.2,
+    "alternates": 0.45,
+    "coverage": 0.6,
+    "output": 0.9,
+}
+
+
+class ProcessCancelled(Exception):
+    """process() の実行がキャンセルされた"""
 
 from dataclasses import dataclass
 
+# 時刻を整数の分（1970-01-01 0:00 から）で持つときの単位
+_MINUTE_NS = 60 * 10 ** 9
+
+
 @dataclass(frozen=True)
 class Interval:
+    """区間 [start, end)。__slots__ で属性辞書を持たない（勤怠・サービスの区間は月に数万件作られる）"""
+    __slots__ = ("start", "end")
     start: datetime
     end: datetime
 
+    def __getstate__(self):
+        return (self.start, self.end)
+
+    def __setstate__(self, state):
+        # frozen のため object.__setattr__ で復元する
+        object.__setattr__(self, "start", state[0])
+        object.__setattr__(self, "end", state[1])
+
     def duration_minutes(self) -> int:
         return int((self.end - self.start).total_seconds() // 60)
 
@@ -60,38 +93,295 @@ class Interval:
     def contains(self, other: "Interval") -> bool:
         return self.start <= other.start and self.end >= other.end
 
-@dataclass
+
+def epoch_minutes(value) -> int:
+    """日時 → 1970-01-01 0:00 からの分（秒以下は切り捨て）"""
+    return pd.Timestamp(value).value // _MINUTE_NS
+
+
+def minutes_to_timestamp(minutes) -> pd.Timestamp:
+    """epoch_minutes の逆変換"""
+    return pd.Timestamp(int(minutes) * _MINUTE_NS)
+
+
+def format_interval(start, end) -> str:
+    return f"{start.strftime('%H:%M')}-{end.strftime('%H:%M')}"
+
+
+# 重複ペアの表の1レコード：df1・df2 の行位置、各区間の開始・終了（分）、重複時間（分）、開始・終了の完全一致
+OVERLAP_DTYPE = np.dtype([
+    ("row1", np.int64), ("row2", np.int64),
+    ("start1", np.int64), ("end1", np.int64), ("start2", np.int64), ("end2", np.int64),
+    ("overlap_minutes", np.int32), ("identical", np.bool_),
+])
+
+
+class OverlapTable:
+    """
+    重複ペアの表（1ペア = OVERLAP_DTYPE の1レコード、全ペアで1本の配列）
+    施設名・行ラベル・担当所員名は表全体で1つずつ参照し、1件ずつの OverlapInfo は添字・反復のときに作るビュー
+    """
+    __slots__ = ("records", "facility1", "facility2", "index1", "index2", "names1", "names2")
+
+    def __init__(self, records: np.ndarray, facility1: str, facility2: str, index1: pd.Index, index2: pd.Index,
+                 names1: Sequence[str], names2: Sequence[str]):
+        self.records = records
+        self.facility1, self.facility2 = facility1, facility2
+        self.index1, self.index2 = index1, index2
+        self.names1, self.names2 = names1, names2
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, k: int) -> "OverlapInfo":
+        n = len(self.records)
+        if not -n <= k < n:
+            raise IndexError(k)
+        return OverlapInfo(self, k % n)
+
+    def __iter__(self):
+        return (OverlapInfo(self, k) for k in range(len(self.records)))
+
+    @property
+    def idx1(self) -> pd.Index:
+        return self.index1[self.records["row1"]]
+
+    @property
+    def idx2(self) -> pd.Index:
+        return self.index2[self.records["row2"]]
+
+    @property
+    def nbytes(self) -> int:
+        return self.records.nbytes
+
+    def select(self, mask: np.ndarray) -> "OverlapTable":
+        """mask で絞り込んだ表"""
+        return OverlapTable(self.records[mask], self.facility1, self.facility2,
+                            self.index1, self.index2, self.names1, self.names2)
+
+
 class OverlapInfo:
-    """重複情報の詳細"""
-    idx1: int
-    idx2: int
-    facility1: str
-    facility2: str
-    staff1: str
-    staff2: str
-    start1: datetime
-    end1: datetime
-    start2: datetime
-    end2: datetime
-    overlap_start: datetime
-    overlap_end: datetime
-    overlap_minutes: int
-    overlap_type: str  # "完全重複" | "部分重複"
-
-@dataclass
-class CoverageInfo:
-    """カバー状況の詳細情報"""
-    is_fully_covered: bool
-    coverage_status: str  # "完全カバー" | "部分カバー" | "カバー不足"
-    total_service_minutes: int
-    covered_minutes: int
-    uncovered_minutes: int
-    work_intervals: List[str]  # 勤務区間の文字列表現
-    covered_intervals: List[str]  # カバーされた区間
-    uncovered_intervals: List[str]  # カバーされていない区間
-    work_interval_count: int
+    """重複情報の詳細（OverlapTable の1行のビュー。日時・名前は参照したときに表から作る）"""
+    __slots__ = ("_table", "_row")
+    FIELDS = ("idx1", "idx2", "facility1", "facility2", "staff1", "staff2", "start1", "end1", "start2", "end2",
+              "overlap_start", "overlap_end", "overlap_minutes", "overlap_type")
+
+    def __init__(self, table: OverlapTable, row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def _record(self):
+        return self._table.records[self._row]
 
+    @property
+    def idx1(self) -> int:
+        return self._table.index1[self._record["row1"]]
 
+    @property
+    def idx2(self) -> int:
+        return self._table.index2[self._record["row2"]]
+
+    @property
+    def facility1(self) -> str:
+        return self._table.facility1
+
+    @property
+    def facility2(self) -> str:
+        return self._table.facility2
+
+    @property
+    def staff1(self) -> str:
+        return self._table.names1[self._record["row1"]]
+
+    @property
+    def staff2(self) -> str:
+        return self._table.names2[self._record["row2"]]
+
+    @property
+    def start1(self) -> datetime:
+        return minutes_to_timestamp(self._record["start1"])
+
+    @property
+    def end1(self) -> datetime:
+        return minutes_to_timestamp(self._record["end1"])
+
+    @property
+    def start2(self) -> datetime:
+        return minutes_to_timestamp(self._record["start2"])
+
+    @property
+    def end2(self) -> datetime:
+        return minutes_to_timestamp(self._record["end2"])
+
+    @property
+    def overlap_start(self) -> datetime:
+        rec = self._record
+        return minutes_to_timestamp(max(rec["start1"], rec["start2"]))
+
+    @property
+    def overlap_end(self) -> datetime:
+        rec = self._record
+        return minutes_to_timestamp(min(rec["end1"], rec["end2"]))
+
+    @property
+    def overlap_minutes(self) -> int:
+        return int(self._record["overlap_minutes"])
+
+    @property
+    def overlap_type(self) -> str:
+        """重複タイプ（"完全重複" | "部分重複"）"""
+        return "完全重複" if self._record["identical"] else "部分重複"
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, OverlapInfo):
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return "OverlapInfo(" + ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS) + ")"
+
+
+COVERAGE_STATUSES = ("完全カバー", "部分カバー", "カバー不足")
+# カバー状況の表の1レコード：行位置、勤務区間リストの番号（なしは -1）、サービスの開始・終了（分）、
+# サービス時間・カバー・未カバー（分）、勤務区間数、カバー状況（COVERAGE_STATUSES の番号）
+COVERAGE_DTYPE = np.dtype([
+    ("row", np.int64), ("cover", np.int32), ("start", np.int64), ("end", np.int64),
+    ("total_minutes", np.int32), ("covered_minutes", np.int32), ("uncovered_minutes", np.int32),
+    ("work_interval_count", np.int32), ("status", np.int8),
+])
+
+
+class CoverageTable:
+    """
+    カバー状況の表（サービス1件 = COVERAGE_DTYPE の1レコード、全件で1本の配列）
+    勤務区間は従業員ごとのリスト covers を番号で参照し、区間の文字列は CoverageInfo を参照したときに作る
+    """
+    __slots__ = ("records", "index", "covers")
+
+    def __init__(self, records: np.ndarray, index: pd.Index, covers: Sequence[Sequence[Interval]]):
+        self.records = records
+        self.index = index
+        self.covers = covers
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, k: int) -> "CoverageInfo":
+        n = len(self.records)
+        if not -n <= k < n:
+            raise IndexError(k)
+        return CoverageInfo(self, k % n)
+
+    def __iter__(self):
+        return (CoverageInfo(self, k) for k in range(len(self.records)))
+
+    @property
+    def labels(self) -> pd.Index:
+        return self.index[self.records["row"]]
+
+    @property
+    def is_fully_covered(self) -> np.ndarray:
+        return self.records["status"] == 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.records.nbytes
+
+
+class CoverageInfo:
+    """カバー状況の詳細情報（CoverageTable の1行のビュー。区間の文字列表現は参照したときに作る）"""
+    __slots__ = ("_table", "_row")
+    FIELDS = ("is_fully_covered", "coverage_status", "total_service_minutes", "covered_minutes",
+              "uncovered_minutes", "work_intervals", "covered_intervals", "uncovered_intervals",
+              "work_interval_count")
+
+    def __init__(self, table: CoverageTable, row: int):
+        self._table = table
+        self._row = row
+
+    @property
+    def _record(self):
+        return self._table.records[self._row]
+
+    @property
+    def is_fully_covered(self) -> bool:
+        return bool(self._record["status"] == 0)
+
+    @property
+    def coverage_status(self) -> str:
+        """カバー状況（"完全カバー" | "部分カバー" | "カバー不足"）"""
+        return COVERAGE_STATUSES[self._record["status"]]
+
+    @property
+    def total_service_minutes(self) -> int:
+        return int(self._record["total_minutes"])
+
+    @property
+    def covered_minutes(self) -> int:
+        return int(self._record["covered_minutes"])
+
+    @property
+    def uncovered_minutes(self) -> int:
+        return int(self._record["uncovered_minutes"])
+
+    @property
+    def work_interval_count(self) -> int:
+        return int(self._record["work_interval_count"])
+
+    def _target(self) -> Interval:
+        rec = self._record
+        return Interval(minutes_to_timestamp(rec["start"]), minutes_to_timestamp(rec["end"]))
+
+    def _covers(self) -> Sequence[Interval]:
+        cover = self._record["cover"]
+        return self._table.covers[cover] if cover >= 0 else []
+
+    @property
+    def work_intervals(self) -> List[str]:
+        """勤務区間の文字列表現"""
+        return [format_interval(iv.start, iv.end) for iv in self._covers()]
+
+    @property
+    def covered_intervals(self) -> List[str]:
+        """カバーされた区間"""
+        target = self._target()
+        covered = []
+        for work_iv in self._covers():
+            overlap_start = max(target.start, work_iv.start)
+            overlap_end = min(target.end, work_iv.end)
+            if overlap_start < overlap_end:
+                covered.append(format_interval(overlap_start, overlap_end))
+        return covered
+
+    @property
+    def uncovered_intervals(self) -> List[str]:
+        """カバーされていない区間"""
+        status = self._record["status"]
+        if status == 0:
+            return []
+        target = self._target()
+        if status == 1:
+            return calculate_uncovered_intervals(target, self._covers())
+        return [format_interval(target.start, target.end)]
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CoverageInfo):
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return "CoverageInfo(" + ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS) + ")"
 
 
 def normalize_name(s: str) -> str:
@@ -335,13 +625,16 @@ def build_service_records(path: Path, df: pd.DataFrame, facility_name: str, staf
         if col not in df.columns:
             raise RuntimeError(f"{path.name} に必要列が不足しています: {col}")
 
-    out = df.copy()
-    out["施設"] = facility_name
+    # 元の列は複製せずに共有し、補助列だけを足す
+    out = df.copy(deep=False)
+    out["施設"] = label_column(len(df), facility_name, categories=(facility_name,))
 
     # 文字列時間を分に
     starts = df[SERVICE_START_COL].astype(str).map(parse_minute_of_day)
     ends = df[SERVICE_END_COL].astype(str).map(parse_minute_of_day)
-    dates = df[SERVICE_DATE_COL].map(parse_date_any)
+    # 日付は種類ごとに1回だけ解析する
+    date_values = df[SERVICE_DATE_COL]
+    dates = date_values.map({d: parse_date_any(d) for d in pd.unique(date_values.to_numpy(dtype=object))})
 
     start_dt: List[datetime] = []
     end_dt: List[datetime] = []
@@ -360,11 +653,60 @@ def build_service_records(path: Path, df: pd.DataFrame, facility_name: str, staf
 
     out["_開始DT"] = start_dt
     out["_終了DT"] = end_dt
-    out["_担当所員"] = out[staff_col].astype(str).str.strip()
-    out["_担当所員_norm"] = out["_担当所員"].map(normalize_name)
+    # 担当所員は行ごとに同じ名前が繰り返されるのでカテゴリ型にし、正規化は名前の種類ごとに1回だけ行う
+    staff = out[staff_col].astype(str).str.strip().astype("category")
+    norm_codes, norm_names = pd.factorize(np.array([normalize_name(n) for n in staff.cat.categories], dtype=object))
+    codes = staff.cat.codes.to_numpy()
+    out["_担当所員"] = staff
+    out["_担当所員_norm"] = pd.Categorical.from_codes(np.where(codes >= 0, norm_codes[codes], -1)
+                                                   if len(norm_codes) else codes, categories=norm_names)
 
     return out
 
+
+def label_column(n: int, value: str = "", categories: Sequence[str] = ("",)) -> pd.Categorical:
+    """n 行すべてが value のカテゴリ列（フラグ・施設名など、同じ文字列が繰り返される列用）"""
+    categories = list(dict.fromkeys([value, *categories]))
+    return pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=categories)
+
+
+def text_column(n: int) -> np.ndarray:
+    """n 行すべてが空文字の object 列（行ごとに種類の多い文字列を書き込む列用。書き終えてから categorize_columns）"""
+    return np.full(n, "", dtype=object)
+
+
+def categorize_columns(df: pd.DataFrame, columns: Iterable[str]) -> None:
+    """書き込みを終えた object の列を、それぞれ1回でカテゴリ型に変換する"""
+    for col in columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+
+def set_label(df: pd.DataFrame, idx, col: str, value: str) -> None:
+    """
+    列に値を書き込む（idx は行ラベルまたはそのリスト）
+    カテゴリ列でまだない値なら、先にカテゴリへ追加する（列全体を作り直すので、値の種類が少ない列だけに使う。
+    種類の多い列は text_column で object のまま書き込み、最後に categorize_columns で変換する）
+    """
+    column = df[col]
+    if isinstance(column.dtype, pd.CategoricalDtype) and value not in column.cat.categories:
+        df[col] = column.cat.add_categories([value])
+    if isinstance(idx, list):
+        df.loc[idx, col] = value
+    else:
+        df.at[idx, col] = value
+
+
+def records_memory_report(frames: Mapping[str, pd.DataFrame]) -> pd.DataFrame:
+    """施設ごと・列ごとのメモリ使用量（文字列の中身も含むバイト数）。合計は 列="(合計)" の行"""
+    rows = []
+    for name, df in frames.items():
+        usage = df.memory_usage(index=False, deep=True)
+        for col, nbytes in usage.items():
+            rows.append({"施設": name, "列": col, "dtype": str(df[col].dtype), "バイト": int(nbytes)})
+        rows.append({"施設": name, "列": "(合計)", "dtype": "", "バイト": int(usage.sum())})
+    return pd.DataFrame(rows, columns=["施設", "列", "dtype", "バイト"])
+
 def interval_fully_covered(target: Interval, covers: List[Interval]) -> bool:
     """
     既存の関数（互換性維持）
@@ -381,7 +723,7 @@ def find_overlaps(df1: pd.DataFrame, df2: pd.DataFrame) -> List[Tuple[int, int]]
     facility1 = "facility1"  # ダミー値
     facility2 = "facility2"  # ダミー値
     detailed_overlaps = find_overlaps_with_details(df1, df2, facility1, facility2)
-    return [(overlap.idx1, overlap.idx2) for overlap in detailed_overlaps]
+    return list(zip(detailed_overlaps.idx1, detailed_overlaps.idx2))
 
 def decide_flag_target(row1: pd.Series, row2: pd.Series, prefer_identical: str = 'earlier') -> int:
     """
@@ -470,7 +812,7 @@ def list_available_staff(target: Interval, att_map: Dict[str, List[Interval]], b
     return ordered
 
 def find_overlaps_with_details(df1: pd.DataFrame, df2: pd.DataFrame, 
-                              facility1: str, facility2: str) -> List[OverlapInfo]:
+                              facility1: str, facility2: str) -> OverlapTable:
     """
     重複検出に詳細情報を追加した版
     
@@ -479,66 +821,47 @@ def find_overlaps_with_details(df1: pd.DataFrame, df2: pd.DataFrame,
         facility1, facility2: 施設名
     
     Returns:
-        OverlapInfoのリスト
+        OverlapTable（反復・添字で OverlapInfo を返す、OverlapInfo のリストと同じ並び）
     """
-    overlaps: List[OverlapInfo] = []
-    
-    # スタッフごとに分けて重複をチェック
-    for staff in df1["_担当所員_norm"].dropna().unique():
-        if pd.isna(staff) or staff == "":
-            continue
-            
-        # 該当スタッフのレコードを抽出
-        g1 = df1[df1["_担当所員_norm"] == staff].copy()
-        g2 = df2[df2["_担当所員_norm"] == staff].copy()
-        
-        if g1.empty or g2.empty:
-            continue
-            
-        # 有効な時間データのみを対象
-        g1 = g1.dropna(subset=["_開始DT", "_終了DT"])
-        g2 = g2.dropna(subset=["_開始DT", "_終了DT"])
-        
-        if g1.empty or g2.empty:
-            continue
-        
-        # 全ペアをチェック
-        for idx1, row1 in g1.iterrows():
-            for idx2, row2 in g2.iterrows():
-                s1, e1 = row1["_開始DT"], row1["_終了DT"]
-                s2, e2 = row2["_開始DT"], row2["_終了DT"]
-                
-                # 時間の重複をチェック
-                if s1 < e2 and s2 < e1:  # overlap condition
-                    overlap_start = max(s1, s2)
-                    overlap_end = min(e1, e2)
-                    overlap_minutes = int((overlap_end - overlap_start).total_seconds() / 60)
-                    
-                    # 重複タイプの判定
-                    if s1 == s2 and e1 == e2:
-                        overlap_type = "完全重複"
-                    else:
-                        overlap_type = "部分重複"
-                    
-                    overlap_info = OverlapInfo(
-                        idx1=idx1,
-                        idx2=idx2,
-                        facility1=facility1,
-                        facility2=facility2,
-                        staff1=row1["_担当所員"],
-                        staff2=row2["_担当所員"],
-                        start1=s1,
-                        end1=e1,
-                        start2=s2,
-                        end2=e2,
-                        overlap_start=overlap_start,
-                        overlap_end=overlap_end,
-                        overlap_minutes=overlap_minutes,
-                        overlap_type=overlap_type
-                    )
-                    overlaps.append(overlap_info)
-    
-    return overlaps
+    from interval_engine import overlap_pairs, to_nanoseconds
+
+    # スタッフごとに分けて重複をチェック（スタッフは df1 での出現順、各スタッフ内は df1・df2 の行順）
+    staff1 = df1["_担当所員_norm"]
+    staff_codes, staff_keys = pd.factorize(staff1)
+    staff_index = pd.Index(staff_keys)
+    codes2 = staff_index.get_indexer(df2["_担当所員_norm"])
+    valid1 = (staff_codes >= 0) & (staff1 != "").to_numpy() & df1["_開始DT"].notna().to_numpy() & df1["_終了DT"].notna().to_numpy()
+    valid2 = (codes2 >= 0) & df2["_開始DT"].notna().to_numpy() & df2["_終了DT"].notna().to_numpy()
+    rows1 = np.flatnonzero(valid1)
+    rows2 = np.flatnonzero(valid2)
+    names1, names2 = df1["_担当所員"].array, df2["_担当所員"].array
+    if len(rows1) == 0 or len(rows2) == 0:
+        return OverlapTable(np.empty(0, dtype=OVERLAP_DTYPE), facility1, facility2, df1.index, df2.index,
+                            names1, names2)
+
+    # 時間の重複（s1 < e2 かつ s2 < e1）を区間の掃引でまとめて列挙
+    starts1, ends1 = to_nanoseconds(df1["_開始DT"]), to_nanoseconds(df1["_終了DT"])
+    starts2, ends2 = to_nanoseconds(df2["_開始DT"]), to_nanoseconds(df2["_終了DT"])
+    i, j = overlap_pairs(
+        staff_codes[rows1], starts1[rows1], ends1[rows1],
+        codes2[rows2], starts2[rows2], ends2[rows2],
+    )
+    order = np.argsort(staff_codes[rows1][i], kind="stable")
+    pos1, pos2 = rows1[i[order]], rows2[j[order]]
+
+    s1, e1, s2, e2 = starts1[pos1], ends1[pos1], starts2[pos2], ends2[pos2]
+    records = np.empty(len(pos1), dtype=OVERLAP_DTYPE)
+    records["row1"], records["row2"] = pos1, pos2
+    records["start1"], records["end1"] = s1 // _MINUTE_NS, e1 // _MINUTE_NS
+    records["start2"], records["end2"] = s2 // _MINUTE_NS, e2 // _MINUTE_NS
+    # 重複時間は分未満を切り捨て、完全一致はナノ秒で判定（1件ずつ Timestamp で計算していたときと同じ）
+    records["overlap_minutes"] = (np.minimum(e1, e2) - np.maximum(s1, s2)) // _MINUTE_NS
+    records["identical"] = (s1 == s2) & (e1 == e2)
+    return OverlapTable(records, facility1, facility2, df1.index, df2.index, names1, names2)
+
+def coverage_status_code(has_covers, covered_seconds, uncovered_seconds):
+    """COVERAGE_STATUSES の番号（1分以下の未カバーは誤差として完全カバー）。スカラーでも配列でもよい"""
+    return np.where(has_covers & (uncovered_seconds <= 60), 0, np.where(covered_seconds > 0, 1, 2))
 
 def analyze_coverage_details(target: Interval, covers: List[Interval], 
                            staff_name: str) -> CoverageInfo:
@@ -551,66 +874,62 @@ def analyze_coverage_details(target: Interval, covers: List[Interval],
         staff_name: 職員名
     
     Returns:
-        CoverageInfo: カバー状況の詳細
-    """
-    if not covers:
-        total_minutes = int((target.end - target.start).total_seconds() / 60)
-        return CoverageInfo(
-            is_fully_covered=False,
-            coverage_status="カバー不足",
-            total_service_minutes=total_minutes,
-            covered_minutes=0,
-            uncovered_minutes=total_minutes,
-            work_intervals=[],
-            covered_intervals=[],
-            uncovered_intervals=[f"{target.start.strftime('%H:%M')}-{target.end.strftime('%H:%M')}"],
-            work_interval_count=0
-        )
-    
-    # 勤務区間の文字列表現を作成
-    work_intervals = [f"{iv.start.strftime('%H:%M')}-{iv.end.strftime('%H:%M')}" for iv in covers]
-    
-    # カバー状況の詳細計算
+        CoverageInfo: カバー状況の詳細（区間の文字列表現は参照したときに作る）
+    """
     total_seconds = (target.end - target.start).total_seconds()
     covered_seconds = 0.0
-    covered_intervals = []
-    
     for work_iv in covers:
         overlap_start = max(target.start, work_iv.start)
         overlap_end = min(target.end, work_iv.end)
         if overlap_start < overlap_end:
-            overlap_seconds = (overlap_end - overlap_start).total_seconds()
-            covered_seconds += overlap_seconds
-            covered_intervals.append(f"{overlap_start.strftime('%H:%M')}-{overlap_end.strftime('%H:%M')}")
-    
-    uncovered_seconds = max(0, total_seconds - covered_seconds)
-    
-    # カバー状況の判定
-    if uncovered_seconds <= 60:  # 1分以下の誤差は許容
-        coverage_status = "完全カバー"
-        is_fully_covered = True
-        uncovered_intervals = []
-    elif covered_seconds > 0:
-        coverage_status = "部分カバー"
-        is_fully_covered = False
-        # 未カバー区間の計算（簡略化）
-        uncovered_intervals = calculate_uncovered_intervals(target, covers)
-    else:
-        coverage_status = "カバー不足"
-        is_fully_covered = False
-        uncovered_intervals = [f"{target.start.strftime('%H:%M')}-{target.end.strftime('%H:%M')}"]
-    
-    return CoverageInfo(
-        is_fully_covered=is_fully_covered,
-        coverage_status=coverage_status,
-        total_service_minutes=int(total_seconds / 60),
-        covered_minutes=int(covered_seconds / 60),
-        uncovered_minutes=int(uncovered_seconds / 60),
-        work_intervals=work_intervals,
-        covered_intervals=covered_intervals,
-        uncovered_intervals=uncovered_intervals,
-        work_interval_count=len(covers)
-    )
+            covered_seconds += (overlap_end - overlap_start).total_seconds()
+    uncovered_seconds = max(0, total_seconds - covered_seconds) if covers else total_seconds
+
+    records = np.zeros(1, dtype=COVERAGE_DTYPE)
+    rec = records[0]
+    rec["start"], rec["end"] = epoch_minutes(target.start), epoch_minutes(target.end)
+    rec["total_minutes"] = int(total_seconds / 60)
+    rec["covered_minutes"] = int(covered_seconds / 60)
+    rec["uncovered_minutes"] = int(uncovered_seconds / 60)
+    rec["work_interval_count"] = len(covers)
+    rec["status"] = coverage_status_code(bool(covers), covered_seconds, uncovered_seconds)
+    return CoverageTable(records, pd.RangeIndex(1), [covers])[0]
+
+def analyze_coverage_table(df: pd.DataFrame, att_map: Mapping[str, Sequence[Interval]],
+                           coverage_index=None) -> CoverageTable:
+    """
+    開始・終了のあるサービス行すべてのカバー状況（1行ずつ analyze_coverage_details を呼ぶのと同じ値）
+    被覆量は interval_engine.CoverageIndex でまとめて求める。coverage_index は att_map から作った構築済みのもの
+    """
+    from interval_engine import CoverageIndex, to_seconds, valid_interval_mask
+
+    if coverage_index is None:
+        coverage_index = CoverageIndex(att_map)
+    rows = np.flatnonzero(valid_interval_mask(df["_開始DT"], df["_終了DT"]))
+    codes = coverage_index.codes_for(df["_担当所員_norm"].iloc[rows].tolist())
+    starts = to_seconds(df["_開始DT"].iloc[rows])
+    ends = to_seconds(df["_終了DT"].iloc[rows])
+
+    total = ends - starts
+    covered = coverage_index.covered_seconds(codes, starts, ends)
+    counts = np.zeros(len(codes), dtype=np.int64)
+    known = codes >= 0
+    counts[known] = coverage_index.interval_counts[codes[known]]
+    has_covers = counts > 0
+    uncovered = np.where(has_covers, np.maximum(0, total - covered), total)
+
+    records = np.empty(len(rows), dtype=COVERAGE_DTYPE)
+    records["row"] = rows
+    records["cover"] = np.where(has_covers, codes, -1)
+    records["start"], records["end"] = starts // 60, ends // 60
+    # int(秒 / 60) と同じ0方向への切り捨て
+    records["total_minutes"] = np.trunc(total / 60)
+    records["covered_minutes"] = np.trunc(covered / 60)
+    records["uncovered_minutes"] = np.trunc(uncovered / 60)
+    records["work_interval_count"] = counts
+    records["status"] = coverage_status_code(has_covers, covered, uncovered)
+    covers = [att_map[key] for key in coverage_index.keys]
+    return CoverageTable(records, df.index, covers)
 
 def calculate_uncovered_intervals(target: Interval, covers: List[Interval]) -> List[str]:
     """未カバー区間を計算"""
@@ -620,34 +939,46 @@ def calculate_uncovered_intervals(target: Interval, covers: List[Interval]) -> L
 
 def update_overlap_details_in_csv(df: pd.DataFrame, idx: int, overlap_info: OverlapInfo, partner_facility: str):
     """CSVの重複詳細カラムを更新"""
-    current_overlap_time = df.at[idx, '重複時間（分）'] or 0
+    current_overlap_time = df.at[idx, '重複時間（分）']
+    if pd.isna(current_overlap_time) or current_overlap_time == "":
+        current_overlap_time = 0
     df.at[idx, '重複時間（分）'] = current_overlap_time + overlap_info.overlap_minutes
     
     current_facilities = str(df.at[idx, '重複相手施設'] or "")
     facilities = [f.strip() for f in current_facilities.split("，") if f.strip()]
     if partner_facility not in facilities:
         facilities.append(partner_facility)
-    df.at[idx, '重複相手施設'] = "，".join(sorted(facilities))
+    set_label(df, idx, '重複相手施設', "，".join(sorted(facilities)))
     
     current_staff = str(df.at[idx, '重複相手担当者'] or "")
     staff_list = [s.strip() for s in current_staff.split("，") if s.strip()]
     partner_staff = overlap_info.staff2 if overlap_info.idx1 == idx else overlap_info.staff1
     if partner_staff not in staff_list:
         staff_list.append(partner_staff)
-    df.at[idx, '重複相手担当者'] = "，".join(sorted(staff_list))
+    set_label(df, idx, '重複相手担当者', "，".join(sorted(staff_list)))
     
     current_types = str(df.at[idx, '重複タイプ'] or "")
     types = [t.strip() for t in current_types.split("，") if t.strip()]
     if overlap_info.overlap_type not in types:
         types.append(overlap_info.overlap_type)
-    df.at[idx, '重複タイプ'] = "，".join(sorted(types))
+    set_label(df, idx, '重複タイプ', "，".join(sorted(types)))
 
 def update_coverage_details_in_csv(df: pd.DataFrame, idx: int, coverage_info: CoverageInfo):
     """CSVのカバー詳細カラムを更新"""
     df.at[idx, '超過時間（分）'] = coverage_info.uncovered_minutes
-    df.at[idx, 'カバー状況'] = coverage_info.coverage_status
+    set_label(df, idx, 'カバー状況', coverage_info.coverage_status)
     df.at[idx, '勤務区間数'] = coverage_info.work_interval_count
 
+def update_coverage_table_in_csv(df: pd.DataFrame, coverage: CoverageTable):
+    """CSVのカバー詳細カラムを CoverageTable の全行分まとめて更新"""
+    labels = coverage.labels
+    df.loc[labels, '超過時間（分）'] = coverage.records["uncovered_minutes"]
+    df.loc[labels, '勤務区間数'] = coverage.records["work_interval_count"]
+    for code, status in enumerate(COVERAGE_STATUSES):
+        hit = coverage.records["status"] == code
+        if hit.any():
+            set_label(df, list(labels[hit]), 'カバー状況', status)
+
 def generate_detail_id(facility: str, row_index: int) -> str:
     """詳細情報参照用IDを生成"""
     import time
@@ -655,7 +986,23 @@ def generate_detail_id(facility: str, row_index: int) -> str:
     return f"{facility_code}_{row_index:03d}_{int(time.time()) % 1000:03d}"
 
 
-def process(input_dir: Path, prefer_identical: str = 'earlier', alt_delim: str = '/', service_staff_col: str = SERVICE_STAFF_COL, att_name_col: str = ATT_NAME_COL, write_diagnostics: bool = True, use_schedule_when_missing: bool = False) -> None:
+def process(input_dir: Path, prefer_identical: str = 'earlier', alt_delim: str = '/', service_staff_col: str = SERVICE_STAFF_COL, att_name_col: str = ATT_NAME_COL, write_diagnostics: bool = True, use_schedule_when_missing: bool = False, progress: Optional[Callable[[str, float], None]] = None, cancel_event: Optional[threading.Event] = None, att_index: Optional[Tuple[Mapping[str, Sequence[Interval]], Mapping[str, Sequence[str]]]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    戻り値: 施設名 → サービス実態の表（build_service_records の列＋結果列）。最適化エンジンなどで読み直さずに使える
+    att_index: 構築済みの (att_map, name_index)。指定時は勤怠CSVを読み込まずにこれを使う（共有キャッシュ用）
+    progress: 段階の開始ごとに (段階名, 全体進捗率 0-1) で呼ばれる
+    cancel_event: セットされると次の段階境界で ProcessCancelled を送出する
+    """
+    def check_cancelled(stage: str) -> None:
+        if cancel_event is not None and cancel_event.is_set():
+            raise ProcessCancelled(stage)
+
+    def report(stage: str, fraction: Optional[float] = None) -> None:
+        check_cancelled(stage)
+        if progress is not None:
+            progress(stage, PROCESS_STAGES[stage] if fraction is None else fraction)
+
+    report("ingest")
     # ファイル探索
     service_files: List[Path] = []
     att_file: Optional[Path] = None
@@ -671,49 +1018,67 @@ def process(input_dir: Path, prefer_identical: str = 'earlier', alt_delim: str =
 
     if not service_files:
         raise SystemExit("施設のサービス実態CSVが見つかりません。")
-    if not att_file:
+    if not att_file and att_index is None:
         raise SystemExit("勤怠履歴CSVが見つかりません。")
 
+    # CSVの読み込みは csv_ingest（エンジンは CSV_INGEST_ENGINE で切り替え）
+    from csv_ingest import read_records
+
     # 勤怠ロード＆インターバル化
-    att_df = pd.read_csv(att_file, encoding=ENCODING)
-    att_map, att_name_index = build_work_intervals(att_df, name_col=att_name_col, use_schedule_when_missing=use_schedule_when_missing)
+    if att_index is not None:
+        att_map, att_name_index = att_index
+    else:
+        att_df = read_records(att_file, encoding=ENCODING)
+        att_map, att_name_index = build_work_intervals(att_df, name_col=att_name_col, use_schedule_when_missing=use_schedule_when_missing)
 
     # 施設ごとのデータロード＆インターバル化
     service_raw: Dict[str, pd.DataFrame] = {}
     for sf in service_files:
         fac = sf.stem  # 例: サービス実態A
-        df = pd.read_csv(sf, encoding=ENCODING)
+        df = read_records(sf, encoding=ENCODING)
         service_raw[fac] = build_service_records(sf, df, fac, staff_col=service_staff_col)
 
     # 1) 施設間重複の検出（ペアごと）
-    # フラグ列の初期化
+    # フラグ列の初期化（文字列の列はカテゴリ型、分・件数の列は欠損ありの整数型）
     for fac, df in service_raw.items():
+        n = len(df)
+        # カテゴリ・代替職員リストは行ごとに種類の多い値を書くので、出力前まで object の列にする
         if ERR_COL not in df.columns:
-            df.insert(0, ALT_COL, "")
-            df.insert(0, CAT_COL, "")
-            df.insert(0, ERR_COL, "")
+            df.insert(0, ALT_COL, text_column(n))
+            df.insert(0, CAT_COL, text_column(n))
+            df.insert(0, ERR_COL, label_column(n, categories=("", FLAG)))
         else:
             # 既存列がある場合の上書き
-            df[ERR_COL] = ""
-            df[CAT_COL] = ""
-            df[ALT_COL] = ""
+            df[ERR_COL] = label_column(n, categories=("", FLAG))
+            df[CAT_COL] = text_column(n)
+            df[ALT_COL] = text_column(n)
         
         # 新規詳細カラムの初期化
         detail_columns = ['重複時間（分）', '超過時間（分）', '重複相手施設', '重複相手担当者',
                          '重複タイプ', 'カバー状況', '勤務区間数', '詳細ID']
         
         for col in detail_columns:
+            if col in DETAIL_INT_DTYPES:
+                values = pd.array(np.full(n, None), dtype=DETAIL_INT_DTYPES[col])
+            elif col == '詳細ID':
+                values = ""
+            elif col in ROW_TEXT_COLUMNS:
+                values = text_column(n)
+            else:
+                values = label_column(n)
             if col not in df.columns:
-                df.insert(len([ERR_COL, CAT_COL, ALT_COL]), col, "")
+                df.insert(len([ERR_COL, CAT_COL, ALT_COL]), col, values)
             else:
-                df[col] = ""
+                df[col] = values
 
+    report("overlaps")
     facilities = sorted(service_raw.keys())  # 昇順比較ルールに整合
     flagged_indices: Dict[str, set] = {fac: set() for fac in facilities}
 
     for i in range(len(facilities)):
         for j in range(i+1, len(facilities)):
             f1, f2 = facilities[i], facilities[j]
+            report("overlaps")
             df1, df2 = service_raw[f1], service_raw[f2]
 
             # 詳細情報付きの重複検出
@@ -739,14 +1104,15 @@ def process(input_dir: Path, prefer_identical: str = 'earlier', alt_delim: str =
     for fac, df in service_raw.items():
         if flagged_indices[fac]:
             df.loc[list(flagged_indices[fac]), ERR_COL] = FLAG
-            df.loc[list(flagged_indices[fac]), CAT_COL] = "施設間重複"
+            set_label(df, list(flagged_indices[fac]), CAT_COL, "施設間重複")
 
     # 1.5) 事業所内重複の検出（同一施設内での重複）
     for fac, df in service_raw.items():
+        report("overlaps")
         # 詳細情報付きの同一施設内重複検出
         internal_overlaps = find_overlaps_with_details(df, df, fac, fac)
         # 自分自身との比較は除外
-        internal_overlaps = [overlap for overlap in internal_overlaps if overlap.idx1 != overlap.idx2]
+        internal_overlaps = internal_overlaps.select(internal_overlaps.records["row1"] != internal_overlaps.records["row2"])
         
         # 重複ペアを処理（同じペアを2回処理しないよう注意）
         processed_pairs = set()
@@ -774,56 +1140,57 @@ def process(input_dir: Path, prefer_identical: str = 'earlier', alt_delim: str =
                 categories = [c.strip() for c in existing_cat.split("，") if c.strip()]
                 if "事業所内重複" not in categories:
                     categories.append("事業所内重複")
-                    df.at[target_idx, CAT_COL] = "，".join(sorted(categories))
+                    set_label(df, target_idx, CAT_COL, "，".join(sorted(categories)))
             else:
                 df.at[target_idx, ERR_COL] = FLAG
-                df.at[target_idx, CAT_COL] = "事業所内重複"
+                set_label(df, target_idx, CAT_COL, "事業所内重複")
             
             # 詳細情報をCSVカラムに設定
             update_overlap_details_in_csv(df, target_idx, overlap_info, fac)
 
     # 2) 施設間重複・事業所内重複の補正案（代替職員リスト）
+    report("alternates")
     busy_map = build_staff_busy_map(service_raw)
     for fac, df in service_raw.items():
         # 施設間重複または事業所内重複のレコードを対象
         need_rows = df[df[CAT_COL].str.contains("重複", na=False)]
         for idx, r in need_rows.iterrows():
+            check_cancelled("alternates")
             iv = Interval(r["_開始DT"], r["_終了DT"])
             staff = r["_担当所員_norm"]
             alts = list_available_staff(iv, att_map, busy_map, exclude=staff, att_name_index=att_name_index)
-            df.at[idx, ALT_COL] = alt_delim.join(alts) if alts else "ー"
+            set_label(df, idx, ALT_COL, alt_delim.join(alts) if alts else "ー")
 
     # 3) 勤怠履歴超過の検出（詳細情報付き）
+    report("coverage")
+    from interval_engine import CoverageIndex
+    coverage_index = CoverageIndex(att_map)
     for fac, df in service_raw.items():
-        for idx, r in df.iterrows():
-            if pd.isna(r["_開始DT"]) or pd.isna(r["_終了DT"]):
-                continue
-            
-            staff = r["_担当所員_norm"]
-            iv = Interval(r["_開始DT"], r["_終了DT"])
-            work_ivs = att_map.get(staff, [])
-            
-            # 詳細なカバー分析
-            coverage_info = analyze_coverage_details(iv, work_ivs, staff)
-            
-            # CSVカラムに詳細情報を設定
-            update_coverage_details_in_csv(df, idx, coverage_info)
-            
-            if not coverage_info.is_fully_covered:
-                # 既にエラーが付いている場合はカテゴリを追記（カンマ連結）
-                if df.at[idx, ERR_COL] != FLAG:
-                    df.at[idx, ERR_COL] = FLAG
-                    df.at[idx, CAT_COL] = "勤怠履歴超過"
-                else:
-                    cat = df.at[idx, CAT_COL]
-                    parts = [c for c in [cat, "勤怠履歴超過"] if c]
-                    df.at[idx, CAT_COL] = "，".join(sorted(set(parts)))
+        report("coverage")
+        # 詳細なカバー分析（施設の全行をまとめて）
+        coverage = analyze_coverage_table(df, att_map, coverage_index)
+        
+        # CSVカラムに詳細情報を設定
+        update_coverage_table_in_csv(df, coverage)
+        
+        for idx in coverage.labels[~coverage.is_fully_covered]:
+            check_cancelled("coverage")
+            # 既にエラーが付いている場合はカテゴリを追記（カンマ連結）
+            if df.at[idx, ERR_COL] != FLAG:
+                df.at[idx, ERR_COL] = FLAG
+                set_label(df, idx, CAT_COL, "勤怠履歴超過")
+            else:
+                cat = df.at[idx, CAT_COL]
+                parts = [c for c in [cat, "勤怠履歴超過"] if c]
+                set_label(df, idx, CAT_COL, "，".join(sorted(set(parts))))
 
     # 4) 勤怠履歴超過の補正案
+    report("alternates", 0.75)
     busy_map = build_staff_busy_map(service_raw)  # 施設間重複フラグで除外…はせず、現状のまま
     for fac, df in service_raw.items():
         need_rows = df[df[CAT_COL].str.contains("勤怠履歴超過", na=False)]
         for idx, r in need_rows.iterrows():
+            check_cancelled("alternates")
             iv = Interval(r["_開始DT"], r["_終了DT"])
             staff = r["_担当所員_norm"]
             alts = list_available_staff(iv, att_map, busy_map, exclude=staff, att_name_index=att_name_index)
@@ -836,11 +1203,15 @@ def process(input_dir: Path, prefer_identical: str = 'earlier', alt_delim: str =
             if prev and prev != "ー":
                 # すでにある候補と結合してユニーク化
                 merged = sorted(set([p for p in prev.split("/") if p] + alts))
-                df.at[idx, ALT_COL] = "/".join(merged) if merged else "ー"
+                set_label(df, idx, ALT_COL, "/".join(merged) if merged else "ー")
             else:
-                df.at[idx, ALT_COL] = new
+                set_label(df, idx, ALT_COL, new)
 
 
+    report("output")
+    # 行ごとに書き込んだ列を、ここで1回だけカテゴリ型にする
+    for df in service_raw.values():
+        categorize_columns(df, ROW_TEXT_COLUMNS)
     if write_diagnostics:
         diag_dir = input_dir / "diagnostics"
         diag_dir.mkdir(exist_ok=True)
@@ -894,6 +1265,9 @@ def process(input_dir: Path, prefer_identical: str = 'earlier', alt_delim: str =
                 })
             pd.DataFrame(det).to_csv(diag_dir / f"03_service_detail_{fac}.csv", index=False, encoding="utf-8-sig")
 
+        # 04: memory usage per facility and column
+        records_memory_report(service_raw).to_csv(diag_dir / "04_memory_usage.csv", index=False, encoding="utf-8-sig")
+
     # 5) 詳細IDの生成と出力（先頭3列 + 詳細8列 + 元データ）
     for fac, df in service_raw.items():
         # 詳細IDの生成
@@ -902,10 +1276,7 @@ def process(input_dir: Path, prefer_identical: str = 'earlier', alt_delim: str =
             df.at[idx, '詳細ID'] = detail_id
         
         # 内部列は落としてから出力
-        out_df = df.copy()
-        for c in ["_開始DT","_終了DT","_担当所員","施設"]:
-            if c in out_df.columns:
-                out_df.drop(columns=[c], inplace=True)
+        out_df = df.drop(columns=[c for c in ["_開始DT","_終了DT","_担当所員","施設"] if c in df.columns])
 
         # カラムの並び順を調整（基本3列 + 詳細8列 + その他）
         base_cols = [ERR_COL, CAT_COL, ALT_COL]
@@ -923,6 +1294,10 @@ def process(input_dir: Path, prefer_identical: str = 'earlier', alt_delim: str =
             # cp932でエンコードできない場合はUTF-8で出力
             out_df.to_csv(out_path, index=False, encoding="utf-8-sig")
 
+    if progress is not None:
+        progress("output", 1.0)
+    return service_raw
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", "-i", type=str, default="/input", help="サービス実態CSV群と勤怠履歴.csvがあるフォルダ")
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+複数ファイル・大容量向けの重複検出（アウトオブコア）
+各CSVをチャンク単位で読み、選択列の値のハッシュでパーティションに振り分けて
+ローカルディスクに書き出す（spill）。その後パーティションごとに読み戻して重複を確定するので、
+メモリ使用量は入力全体の大きさではなくチャンクサイズとパーティションの大きさで決まる。
+- 同じ値の行は必ず同じパーティションに入るため、パーティション内の照合だけで全体の重複が求まる
+- 重複グループは (ファイル, 行番号) の出所付きでCSVに書き出す
+"""
+
+import argparse
+import io
+import math
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from src import ProcessCancelled
+
+DEFAULT_CHUNK_ROWS = 100_000
+DEFAULT_PARTITION_BYTES = 64 * 1024 * 1024
+MIN_PARTITIONS = 8
+MAX_PARTITIONS = 4096
+
+GROUP_COL = "重複グループ"
+FILE_COL = "ファイル"
+ROW_COL = "行番号"
+
+# spillファイル内の出所列（利用者の列名と衝突しないよう内部名を使う）
+_SPILL_FILE = "__file__"
+_SPILL_ROW = "__row__"
+
+
+def detect_encoding(path: Union[str, bytes], sample_bytes: int = 1 << 16) -> str:
+    """先頭を UTF-8 として読めれば utf-8-sig、読めなければ cp932（path はパスまたはファイルの中身）"""
+    if isinstance(path, bytes):
+        head = path[:sample_bytes]
+    else:
+        with open(path, "rb") as f:
+            head = f.read(sample_bytes)
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # サンプル末尾でマルチバイト文字が切れただけなら UTF-8 とみなす
+        if e.start < len(head) - 3:
+            return "cp932"
+    return "utf-8-sig"
+
+
+def read_header(path: Union[str, bytes], encoding: Optional[str] = None) -> List[str]:
+    """CSVの列名だけを読む（path はパスまたはファイルの中身。アップロードをディスクに書く前に列を選べる）"""
+    source = io.BytesIO(path) if isinstance(path, bytes) else path
+    return list(pd.read_csv(source, nrows=0, encoding=encoding or detect_encoding(path)).columns)
+
+
+def list_folder_csvs(folder: str, base_dir: str) -> List[str]:
+    """
+    base_dir 配下のフォルダ folder（base_dir からの相対パス）にある *.csv を返す
+    シンボリックリンクや「..」で base_dir の外を指すフォルダ・ファイルは ValueError / 対象外
+    """
+    base = Path(base_dir).resolve()
+    target = (base / folder).resolve()
+    if not target.is_relative_to(base):
+        raise ValueError(f"指定できるのは {base_dir} 配下のフォルダだけです: {folder}")
+    if not target.is_dir():
+        raise ValueError(f"フォルダが見つかりません: {folder}")
+    return sorted(str(p) for p in target.glob("*.csv") if p.resolve().is_relative_to(base))
+
+
+@dataclass
+class DuplicateReport:
+    """重複検出の結果"""
+    groups_path: str
+    columns: List[str]
+    files: List[str]
+    total_rows: int = 0
+    duplicate_groups: int = 0
+    duplicate_rows: int = 0
+    cross_file_groups: int = 0
+    partitions: int = 0
+    rows_per_file: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def redundant_rows(self) -> int:
+        """各グループの1件目を残したときに重複となる行数（duplicated(keep='first') 相当）"""
+        return self.duplicate_rows - self.duplicate_groups
+
+    def iter_groups(self, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        """重複グループCSVをチャンク単位で読む"""
+        if self.duplicate_rows == 0:
+            return
+        for chunk in pd.read_csv(self.groups_path, dtype=str, keep_default_na=False,
+                                 encoding="utf-8-sig", chunksize=chunk_rows):
+            chunk[GROUP_COL] = chunk[GROUP_COL].astype(np.int64)
+            chunk[ROW_COL] = chunk[ROW_COL].astype(np.int64)
+            yield chunk
+
+    def preview(self, n_rows: int = 1000) -> pd.DataFrame:
+        if self.duplicate_rows == 0:
+            return pd.DataFrame(columns=[GROUP_COL, FILE_COL, ROW_COL] + self.columns)
+        return pd.read_csv(self.groups_path, dtype=str, keep_default_na=False,
+                           encoding="utf-8-sig", nrows=n_rows)
+
+
+class StreamingDuplicateFinder:
+    """
+    ハッシュパーティション方式の重複検出
+    1) 分割: 各ファイルをチャンクで読み、選択列のハッシュ % パーティション数 でspillファイルへ追記
+    2) 確定: パーティションを1つずつ読み戻し、選択列の値で厳密にグループ化して重複グループを出力
+    """
+
+    def __init__(self, columns: Sequence[str], chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                 partition_bytes: int = DEFAULT_PARTITION_BYTES, n_partitions: Optional[int] = None,
+                 spill_dir: Optional[str] = None, encoding: Optional[str] = None):
+        if not columns:
+            raise ValueError("重複チェックを行う列を1つ以上指定してください")
+        self.columns = list(columns)
+        self.chunk_rows = chunk_rows
+        self.partition_bytes = partition_bytes
+        self.n_partitions = n_partitions
+        self.spill_dir = spill_dir
+        self.encoding = encoding
+        self._cancel_event: Optional[threading.Event] = None
+
+    def _partition_count(self, paths: Sequence[str]) -> int:
+        if self.n_partitions:
+            return self.n_partitions
+        total = sum(os.path.getsize(p) for p in paths)
+        return int(min(MAX_PARTITIONS, max(MIN_PARTITIONS, math.ceil(total / self.partition_bytes))))
+
+    def run(self, paths: Sequence[str], output_path: str,
+            progress: Optional[Callable[[str, float], None]] = None,
+            cancel_event: Optional[threading.Event] = None) -> DuplicateReport:
+        """progress(stage, fraction) は split → resolve の順に呼ばれる。cancel_event はチャンク・パーティション単位で確認"""
+        paths = [str(p) for p in paths]
+        self._cancel_event = cancel_event
+        n_parts = self._partition_count(paths)
+        report = DuplicateReport(groups_path=str(output_path), columns=self.columns,
+                                 files=[os.path.basename(p) for p in paths], partitions=n_parts)
+        work_dir = Path(tempfile.mkdtemp(prefix="dup_spill_", dir=self.spill_dir))
+        try:
+            part_paths = [work_dir / f"part_{i:04d}.csv" for i in range(n_parts)]
+            self._split(paths, part_paths, report, progress)
+            self._resolve(part_paths, report, progress)
+        except ProcessCancelled:
+            # 途中までの出力は残さない
+            if os.path.exists(report.groups_path):
+                os.remove(report.groups_path)
+            raise
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        if progress is not None:
+            progress("resolve", 1.0)
+        return report
+
+    def _check_cancelled(self, stage: str) -> None:
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise ProcessCancelled(stage)
+
+    # ---- 1) 分割 ----
+    def _split(self, paths: List[str], part_paths: List[Path], report: DuplicateReport,
+               progress: Optional[Callable[[str, float], None]]) -> None:
+        n_parts = len(part_paths)
+        handles = [open(p, "w", encoding="utf-8", newline="") for p in part_paths]
+        try:
+            total_bytes = max(1, sum(os.path.getsize(p) for p in paths))
+            done_bytes = 0
+            for file_id, path in enumerate(paths):
+                name = os.path.basename(path)
+                missing = [c for c in self.columns if c not in read_header(path, self.encoding)]
+                if missing:
+                    raise ValueError(f"{name} に列がありません: {missing}")
+                rows = 0
+                reader = pd.read_csv(path, usecols=self.columns, dtype=str, keep_default_na=False,
+                                     encoding=self.encoding or detect_encoding(path),
+                                     chunksize=self.chunk_rows)
+                for chunk in reader:
+                    self._check_cancelled("split")
+                    keys = chunk[self.columns]
+                    parts = pd.util.hash_pandas_object(keys, index=False).to_numpy() % np.uint64(n_parts)
+                    spill = keys.copy()
+                    spill.insert(0, _SPILL_ROW, np.arange(rows + 1, rows + len(chunk) + 1, dtype=np.int64))
+                    spill.insert(0, _SPILL_FILE, file_id)
+                    order = np.argsort(parts, kind="stable")
+                    bounds = np.searchsorted(parts[order], np.arange(n_parts + 1))
+                    for part in np.flatnonzero(np.diff(bounds)):
+                        spill.iloc[order[bounds[part]:bounds[part + 1]]].to_csv(
+                            handles[part], header=False, index=False)
+                    rows += len(chunk)
+                report.rows_per_file[name] = rows
+                report.total_rows += rows
+                done_bytes += os.path.getsize(path)
+                if progress is not None:
+                    progress("split", done_bytes / total_bytes)
+        finally:
+            for h in handles:
+                h.close()
+
+    # ---- 2) 確定 ----
+    def _resolve(self, part_paths: List[Path], report: DuplicateReport,
+                 progress: Optional[Callable[[str, float], None]]) -> None:
+        names = [_SPILL_FILE, _SPILL_ROW] + self.columns
+        next_group = 1
+        with open(report.groups_path, "w", encoding="utf-8-sig", newline="") as out:
+            pd.DataFrame(columns=[GROUP_COL, FILE_COL, ROW_COL] + self.columns).to_csv(out, index=False)
+            for i, part_path in enumerate(part_paths):
+                self._check_cancelled("resolve")
+                if os.path.getsize(part_path) > 0:
+                    part = pd.read_csv(part_path, header=None, names=names, dtype=str,
+                                       keep_default_na=False)
+                    groups = self._groups_in_partition(part, next_group)
+                    if len(groups):
+                        n_groups = int(groups[GROUP_COL].iloc[-1]) - next_group + 1
+                        next_group += n_groups
+                        report.duplicate_groups += n_groups
+                        report.duplicate_rows += len(groups)
+                        report.cross_file_groups += int(
+                            (groups.groupby(GROUP_COL, sort=False)[_SPILL_FILE].nunique() > 1).sum())
+                        groups[_SPILL_FILE] = np.asarray(report.files, dtype=object)[groups[_SPILL_FILE].to_numpy()]
+                        groups.to_csv(out, header=False, index=False)
+                if progress is not None:
+                    progress("resolve", (i + 1) / len(part_paths))
+
+    def _groups_in_partition(self, part: pd.DataFrame, first_group: int) -> pd.DataFrame:
+        """パーティション内の重複グループ（グループ内はファイル順・行番号順）"""
+        codes = part.groupby(self.columns, sort=False).ngroup().to_numpy()
+        counts = np.bincount(codes)
+        keep = counts[codes] > 1
+        if not keep.any():
+            return part.iloc[0:0]
+        dup = part.loc[keep].copy()
+        dup[_SPILL_FILE] = dup[_SPILL_FILE].astype(np.int64)
+        dup[_SPILL_ROW] = dup[_SPILL_ROW].astype(np.int64)
+        # グループ番号は出所（最初のファイル・行番号）順に振る
+        dup["_code"] = codes[keep]
+        dup = dup.sort_values([_SPILL_FILE, _SPILL_ROW], kind="stable")
+        first_seen = pd.unique(dup["_code"].to_numpy())
+        renumber = {code: first_group + i for i, code in enumerate(first_seen)}
+        dup.insert(0, GROUP_COL, dup["_code"].map(renumber))
+        dup = dup.sort_values([GROUP_COL, _SPILL_FILE, _SPILL_ROW], kind="stable")
+        return dup.drop(columns="_code")
+
+
+def find_duplicates(paths: Sequence[str], columns: Sequence[str], output_path: str,
+                    **kwargs) -> DuplicateReport:
+    """paths のCSV群から columns が一致する行のグループを output_path に書き出す"""
+    return StreamingDuplicateFinder(columns, **kwargs).run(paths, output_path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="複数CSVにまたがる重複行の検出（アウトオブコア）")
+    ap.add_argument("files", nargs="+", help="対象のCSVファイル")
+    ap.add_argument("--columns", "-c", required=True, help="重複判定に使う列（カンマ区切り）")
+    ap.add_argument("--output", "-o", default="duplicate_groups.csv", help="重複グループの出力先")
+    ap.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="1回に読み込む行数")
+    ap.add_argument("--partition-mb", type=int, default=DEFAULT_PARTITION_BYTES // (1024 * 1024),
+                    help="1パーティションの目安サイズ（MB）")
+    ap.add_argument("--spill-dir", type=str, default=None, help="一時ファイルの置き場所")
+    args = ap.parse_args()
+
+    report = find_duplicates(args.files, [c.strip() for c in args.columns.split(",") if c.strip()],
+                             args.output, chunk_rows=args.chunk_rows,
+                             partition_bytes=args.partition_mb * 1024 * 1024, spill_dir=args.spill_dir)
+    print(f"総行数: {report.total_rows} / 重複グループ: {report.duplicate_groups} "
+          f"（ファイル間: {report.cross_file_groups}） / 重複行: {report.duplicate_rows}")
+    print(f"出力: {report.groups_path}")
+
+
+if __name__ == "__main__":
+    main()
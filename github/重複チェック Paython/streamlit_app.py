@@ -1,144 +1,734 @@
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from functools import partial
+from pathlib import Path
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
-# ページ設定
-st.set_page_config(
-    page_title="重複チェック アプリ",
-    page_icon="🔍",
-    layout="wide",
-    initial_sidebar_state="expanded"
+from src import process, build_work_intervals, build_service_records, ENCODING, ATT_NAME_COL
+from csv_ingest import read_records
+from optimization import WorkOptimizer, calculate_optimization_impact, format_time_minutes, optimization_results_frame
+from grid_engine import GridEngine, DetailStore, GRID_LABELS, DEFAULT_PAGE_SIZE
+from job_manager import JobManager, JOB_DONE, JOB_FAILED, JOB_CANCELLED
+from index_cache import get_shared_index_cache, attendance_index_key, file_digest
+from duplicate_index import DuplicateIndex
+from streaming_duplicates import StreamingDuplicateFinder, read_header, list_folder_csvs
+from near_duplicates import (
+    NearDuplicateResult, find_near_duplicates, name_like_columns, BLOCK_BY_NAME, BLOCK_BY_TIME
 )
 
-# タイトル
-st.title("🔍 重複チェック アプリ")
-st.markdown("---")
+# 複数ファイルの重複チェックでサーバー上のフォルダを指定できる範囲（未設定ならアップロードのみ）
+DUP_CHECK_BASE_DIR = os.environ.get("DUP_CHECK_BASE_DIR")
+
+STAGE_LABELS = {
+    "ingest": "読み込み",
+    "overlaps": "重複検出",
+    "alternates": "代替職員の抽出",
+    "coverage": "勤怠照合",
+    "output": "結果出力",
+    "split": "パーティション分割",
+    "resolve": "重複の確定",
+}
+
+
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    """プロセス全体で共有するジョブ管理（再実行やセッションをまたいで生存）"""
+    return JobManager(max_workers=2)
+
+
+@st.cache_resource(max_entries=4)
+def get_grid_engine(result_paths: tuple, signature: tuple) -> GridEngine:
+    """結果セットごとのグリッドエンジン（signature は各ファイルの更新時刻とサイズ）"""
+    return GridEngine.from_paths(list(result_paths))
+
+
+@st.cache_resource(max_entries=4)
+def get_detail_store(result_paths: tuple, signature: tuple) -> DetailStore:
+    """結果セットごとの行詳細ストア"""
+    return DetailStore(list(result_paths))
+
+
+@st.cache_resource(max_entries=2)
+def load_uploaded_csv(digest: str, _data: bytes) -> pd.DataFrame:
+    """アップロードCSVの読み込み（内容のハッシュごとに1回）"""
+    return read_records(_data, encoding="utf-8")
+
+
+@st.cache_resource(max_entries=2)
+def get_duplicate_index(digest: str, _df: pd.DataFrame) -> DuplicateIndex:
+    """アップロードごとの重複インデックス（列ハッシュと選択列ごとの結果を内部で保持）"""
+    return DuplicateIndex(_df)
+
+
+@st.cache_resource(max_entries=2)
+def get_work_optimizer(workdir: str, att_index_key: str, use_schedule: bool, _service_dfs=None) -> WorkOptimizer:
+    """
+    結果セットごとの最適化エンジン（セッション間で共有。分析結果のキャッシュはエンジン内のロックで保護）
+    勤怠インデックスはエラーチェックで共有キャッシュに載せたものを、サービス実態の表は process() が作ったもの
+    （_service_dfs、ジョブ結果に保持）を使う。_service_dfs がなければCSVから作り直す
+    """
+    workdir = Path(workdir)
+    att_path = workdir / "勤怠履歴.csv"
+    _, att_index = load_attendance_index(att_path, use_schedule, key=att_index_key)
+    service_dfs = _service_dfs
+    if service_dfs is None:
+        service_dfs = {}
+        for p in sorted(workdir.glob("*.csv")):
+            if p.name.startswith(("result_", "_result_")) or "勤怠" in p.name:
+                continue
+            service_dfs[p.stem] = build_service_records(p, read_records(p, encoding=ENCODING), p.stem)
+    return WorkOptimizer(read_records(att_path, encoding=ENCODING), service_dfs, att_index=att_index)
+
+
+@st.cache_data(max_entries=4)
+def get_near_duplicates(digest: str, columns: tuple, options: tuple, _df: pd.DataFrame) -> NearDuplicateResult:
+    """近似重複の検出結果（アップロードのハッシュ＋列＋オプションごとに1回）"""
+    return find_near_duplicates(_df, list(columns), **dict(options))
+
 
-# サイドバー
-st.sidebar.header("設定")
+def near_duplicate_options(check_columns) -> dict:
+    """近似重複モードの設定UI"""
+    def pick(hint):
+        return next((c for c in check_columns if hint in str(c)), None)
 
-# メイン機能
-tab1, tab2, tab3 = st.tabs(["データアップロード", "重複チェック", "結果表示"])
+    col1, col2 = st.columns(2)
+    with col1:
+        name_columns = st.multiselect("名前として正規化する列（髙/高・全角スペース・先頭の◯を吸収）",
+                                      options=check_columns, default=name_like_columns(check_columns))
+        block_by = st.radio("ブロック化", [BLOCK_BY_NAME, BLOCK_BY_TIME], horizontal=True,
+                            format_func=lambda x: {BLOCK_BY_NAME: "日付＋名前", BLOCK_BY_TIME: "日付＋時間帯"}[x],
+                            help="同じブロックの行どうしだけを比較します")
+    with col2:
+        candidates = [None] + list(check_columns)
+        date_column = st.selectbox("日付列", candidates, index=candidates.index(pick("日付")),
+                                   format_func=lambda x: "（なし）" if x is None else x)
+        time_column = st.selectbox("開始時刻列", candidates, index=candidates.index(pick("開始")),
+                                   format_func=lambda x: "（なし）" if x is None else x)
+        time_tolerance = st.number_input("開始時刻の許容差（分）", min_value=0, max_value=120, value=0, step=5,
+                                         disabled=time_column is None)
+    return {
+        "name_columns": tuple(name_columns),
+        "block_by": block_by,
+        "date_column": date_column,
+        "time_column": time_column,
+        "time_tolerance": int(time_tolerance),
+    }
 
-with tab1:
-    st.header("📁 データアップロード")
-    
-    uploaded_file = st.file_uploader(
-        "CSVファイルをアップロードしてください",
-        type=['csv'],
-        help="重複チェックを行いたいCSVファイルを選択してください"
+
+def result_signature(result_paths) -> tuple:
+    return tuple((os.path.getmtime(p), os.path.getsize(p)) for p in result_paths)
+
+
+def prepare_workdir(service_files, att_file) -> Path:
+    """
+    アップロードされたCSVを作業ディレクトリに保存する
+    ディレクトリはジョブの cleanup で削除される（submit_session_job 参照）
+    """
+    workdir = Path(tempfile.mkdtemp(prefix="error_check_"))
+    for f in service_files:
+        (workdir / f.name).write_bytes(f.getvalue())
+    (workdir / "勤怠履歴.csv").write_bytes(att_file.getvalue())
+    return workdir
+
+
+def load_attendance_index(att_path: Path, use_schedule: bool, key: str = None):
+    """勤怠インデックスを共有キャッシュから取得する（なければ構築）。(キー, インデックス) を返す"""
+    if key is None:
+        key = attendance_index_key(file_digest(str(att_path)), ATT_NAME_COL, use_schedule)
+    index = get_shared_index_cache().get_or_build(
+        key,
+        lambda: build_work_intervals(read_records(att_path, encoding=ENCODING),
+                                     use_schedule_when_missing=use_schedule)
     )
-    
-    if uploaded_file is not None:
-        try:
-            df = pd.read_csv(uploaded_file)
-            st.success(f"ファイルが正常にアップロードされました！ ({df.shape[0]}行, {df.shape[1]}列)")
-            
-            # データプレビュー
-            st.subheader("データプレビュー")
-            st.dataframe(df.head(10))
-            
-            # 基本統計
-            st.subheader("基本統計")
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("総行数", df.shape[0])
-            with col2:
-                st.metric("列数", df.shape[1])
-            with col3:
-                st.metric("欠損値", df.isnull().sum().sum())
-            with col4:
-                st.metric("重複行数", df.duplicated().sum())
-                
-        except Exception as e:
-            st.error(f"ファイルの読み込みでエラーが発生しました: {str(e)}")
-
-with tab2:
-    st.header("🔍 重複チェック")
-    
-    if 'df' in locals():
-        # 重複チェック対象列の選択
-        st.subheader("重複チェック設定")
-        
-        check_columns = st.multiselect(
-            "重複チェックを行う列を選択してください",
-            options=df.columns.tolist(),
-            default=df.columns.tolist()
-        )
-        
-        if check_columns:
-            # 重複チェック実行
-            if st.button("重複チェック実行", type="primary"):
-                duplicates = df[df.duplicated(subset=check_columns, keep=False)]
-                
-                if len(duplicates) > 0:
-                    st.warning(f"重複データが {len(duplicates)} 件見つかりました")
-                    
-                    # 重複データの表示
-                    st.subheader("重複データ")
-                    st.dataframe(duplicates)
-                    
-                    # 重複データのダウンロード
-                    csv = duplicates.to_csv(index=False)
-                    st.download_button(
-                        label="重複データをCSVでダウンロード",
-                        data=csv,
-                        file_name="duplicate_data.csv",
-                        mime="text/csv"
-                    )
-                else:
-                    st.success("重複データは見つかりませんでした！")
+    return key, index
+
+
+def run_error_check(workdir: Path, options: dict, progress=None, cancel_event=None) -> dict:
+    """作業ディレクトリに対して src.process を実行し、結果ファイルの一覧を返す（ジョブ本体）"""
+    # 勤怠インデックスは同じファイルなら全セッションで1つを共有する
+    use_schedule = options.get("use_schedule_when_missing", False)
+    att_key, att_index = load_attendance_index(workdir / "勤怠履歴.csv", use_schedule)
+
+    service_records = process(workdir, progress=progress, cancel_event=cancel_event, att_index=att_index.as_tuple(),
+                              **options)
+
+    result_paths = sorted(str(p) for p in workdir.glob("result_*.csv"))
+    diag_dir = workdir / "diagnostics"
+    diagnostic_paths = sorted(str(p) for p in diag_dir.glob("*.csv")) if diag_dir.exists() else []
+    return {
+        "workdir": str(workdir),
+        "result_paths": result_paths,
+        "diagnostic_paths": diagnostic_paths,
+        "att_index_key": att_key,
+        "use_schedule_when_missing": use_schedule,
+        # 最適化タブで読み直さずに使う（process() が作ったサービス実態の表）
+        "service_records": service_records,
+    }
+
+
+def build_result_zip(paths) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for p in paths:
+            zf.write(p, arcname=os.path.basename(p))
+    return buf.getvalue()
+
+
+@st.cache_data(max_entries=4)
+def get_result_zip(paths: tuple, signature: tuple) -> bytes:
+    return build_result_zip(paths)
+
+
+@st.fragment
+def show_result_charts(result_paths: tuple, signature: tuple):
+    """集計グラフ（切り替えてもこの部分だけ再実行）"""
+    engine = get_grid_engine(result_paths, signature)
+    st.subheader("📈 集計グラフ")
+    view = st.radio("表示", ["担当所員別", "ファイル別"], horizontal=True, key="chart_view")
+    if view == "担当所員別":
+        staff_df = engine.staff_summary()
+        top_n = st.slider("表示人数", 5, max(5, len(staff_df)), min(20, max(5, len(staff_df))), key="chart_top_n")
+        fig = px.bar(staff_df.head(top_n), x='C', y='エラー件数', title="担当所員別エラー件数",
+                     labels={'C': '担当所員'})
     else:
-        st.info("まずはデータをアップロードしてください")
-
-with tab3:
-    st.header("📊 結果表示")
-    
-    if 'df' in locals():
-        # 重複統計の可視化
-        st.subheader("重複統計")
-        
-        # 列ごとの重複数
-        duplicate_counts = {}
-        for col in df.columns:
-            duplicate_counts[col] = df[col].duplicated().sum()
-        
-        if any(duplicate_counts.values()):
-            fig = px.bar(
-                x=list(duplicate_counts.keys()),
-                y=list(duplicate_counts.values()),
-                title="列ごとの重複数",
-                labels={'x': '列名', 'y': '重複数'}
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # データ品質サマリー
-        st.subheader("データ品質サマリー")
-        
-        quality_metrics = {
-            "総行数": df.shape[0],
-            "重複行数": df.duplicated().sum(),
-            "欠損値数": df.isnull().sum().sum(),
-            "完全行数": df.dropna().shape[0]
-        }
-        
+        summary_df = engine.summary()
+        token_columns = [c for c in summary_df.columns if c.endswith('件数') and c not in ('総件数', 'エラー件数')]
+        fig = px.bar(summary_df, x='ファイル', y=token_columns, barmode='group', title="ファイル別カテゴリ件数")
+    st.plotly_chart(fig, use_container_width=True)
+
+
+@st.fragment
+def show_detail_panel(result_paths: tuple, signature: tuple, file_name: str, row_number: int):
+    """選択行の詳細（詳細ストアから1行だけ取得）"""
+    row = get_detail_store(result_paths, signature).get(file_name, row_number)
+    if row is None:
+        st.info("詳細情報が見つかりません")
+        return
+
+    with st.expander(f"📋 詳細情報 - {row.get('担当所員', '')} "
+                     f"({row.get('日付', '')} {row.get('開始時間', '')}-{row.get('終了時間', '')})", expanded=True):
         col1, col2 = st.columns(2)
         with col1:
-            for metric, value in list(quality_metrics.items())[:2]:
-                st.metric(metric, value)
+            st.markdown("##### 🔄 重複詳細")
+            for key in ['重複時間（分）', '重複相手施設', '重複相手担当者', '重複タイプ']:
+                st.write(f"**{key}**: {row.get(key, '')}")
         with col2:
-            for metric, value in list(quality_metrics.items())[2:]:
-                st.metric(metric, value)
-                
-        # データ品質スコア
-        quality_score = ((df.shape[0] - df.duplicated().sum() - df.isnull().sum().sum()) / df.shape[0]) * 100
-        st.metric("データ品質スコア", f"{quality_score:.1f}%")
-        
+            st.markdown("##### ⏰ 勤怠詳細")
+            for key in ['超過時間（分）', 'カバー状況', '勤務区間数', '詳細ID']:
+                st.write(f"**{key}**: {row.get(key, '')}")
+        if st.toggle("元データを表示", key="detail_show_raw"):
+            st.dataframe(row.to_frame("値"), use_container_width=True)
+
+
+@st.fragment
+def show_result_grid(result_paths: tuple, signature: tuple):
+    """
+    フィルタ＋ページ単位のグリッド表示（表示するのは現在ページのみ）
+    フィルタやページを変えてもこのフラグメントだけが再実行される
+    """
+    engine = get_grid_engine(result_paths, signature)
+    st.subheader("📋 データグリッド")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        errors_only = st.checkbox("エラーのみ表示", key="grid_errors_only")
+        categories = st.multiselect("カテゴリ", engine.options('B'), key="grid_categories")
+    with col2:
+        staff = st.multiselect("担当所員", engine.options('C'), key="grid_staff")
+        users = st.multiselect("利用者名", engine.options('G'), key="grid_users")
+    with col3:
+        first, last = engine.date_bounds()
+        date_range = None
+        if first is not None:
+            picked = st.date_input("日付範囲", value=(first.date(), last.date()),
+                                   min_value=first.date(), max_value=last.date(), key="grid_dates")
+            if isinstance(picked, (list, tuple)) and len(picked) == 2:
+                date_range = tuple(picked)
+
+    available_columns = [c for c in GRID_LABELS if c != 'O']
+    selected_columns = st.multiselect(
+        "表示するカラムを選択",
+        options=available_columns,
+        default=['A', 'B', 'C', 'D', 'E', 'F', 'G', 'AB', 'H', 'I'],
+        format_func=lambda x: GRID_LABELS[x],
+        key="grid_columns"
+    )
+
+    positions = engine.select(errors_only=errors_only, categories=categories,
+                              staff=staff, users=users, date_range=date_range)
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("表示件数", [50, 100, 200, 500],
+                                 index=[50, 100, 200, 500].index(DEFAULT_PAGE_SIZE), key="grid_page_size")
+    n_pages = GridEngine.page_count(len(positions), page_size)
+    with col2:
+        page = st.number_input("ページ", min_value=1, max_value=n_pages, value=1, step=1, key="grid_page")
+    with col3:
+        st.caption(f"{len(positions)}件中 {n_pages}ページ")
+
+    page_df = engine.page(positions, int(page), page_size, columns=selected_columns + ['ファイル', '行番号'])
+    event = st.dataframe(page_df.rename(columns=GRID_LABELS), use_container_width=True, hide_index=True,
+                         on_select="rerun", selection_mode="single-row", key="grid_table")
+
+    selected = event.selection.rows if event is not None else []
+    if selected and selected[0] < len(page_df):
+        picked = page_df.iloc[selected[0]]
+        show_detail_panel(result_paths, signature, str(picked['ファイル']), int(picked['行番号']))
+    else:
+        st.caption("行を選択すると詳細を表示します")
+
+
+@st.fragment(run_every=0.5)
+def show_job_progress(manager: JobManager, job_id: str):
+    """実行中のジョブの進捗（0.5秒ごとにこの部分だけ再描画し、終了したらページ全体を再実行する）"""
+    job = manager.get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    col1, col2 = st.columns([4, 1])
+    with col2:
+        # ウィジェット操作で再実行されてもジョブ自体は継続する
+        if st.button("キャンセル", key=f"cancel_{job.job_id}"):
+            manager.cancel(job.job_id)
+    with col1:
+        st.progress(job.progress, text=f"{job.label}: {STAGE_LABELS.get(job.stage, '待機中')}")
+
+
+def submit_session_job(manager: JobManager, job_key: str, result_key: str, workdir: Path, fn, *args,
+                       label: str):
+    """
+    このセッションのジョブとして実行する（ジョブIDは session_state[job_key]）
+    workdir はジョブが一覧から外れたときに削除する。前回のジョブがまだ結果として取り込まれていなければ
+    （実行中・失敗・キャンセル）ここで破棄し、取り込み済みなら新しい結果に置き換わったときに破棄する
+    """
+    previous = st.session_state.get(job_key)
+    if previous and previous != st.session_state.get(f"{result_key}_job_id"):
+        manager.discard(previous)
+    job = manager.submit(fn, *args, label=label, cleanup=partial(shutil.rmtree, workdir, ignore_errors=True))
+    st.session_state[job_key] = job.job_id
+    return job
+
+
+def show_job_status(manager: JobManager, job, result_key: str = "check_result"):
+    """
+    ジョブの進捗表示（実行中は進捗の部分だけを更新し、終了したら結果を session_state[result_key] に取り込む）
+    新しい結果を取り込んだら、置き換えられた前回のジョブ（作業ディレクトリ）を破棄する
+    """
+    if not job.finished:
+        show_job_progress(manager, job.job_id)
+        return
+
+    if job.status == JOB_DONE:
+        previous = st.session_state.get(f"{result_key}_job_id")
+        if previous != job.job_id:
+            st.session_state[result_key] = job.result
+            st.session_state[f"{result_key}_job_id"] = job.job_id
+            manager.discard(previous)
+        st.success(f"{job.label}: 完了（{job.finished_at:%H:%M:%S}）")
+    elif job.status == JOB_FAILED:
+        st.error(f"{job.label}でエラーが発生しました: {job.error}")
+    elif job.status == JOB_CANCELLED:
+        st.warning(f"{job.label}: キャンセルされました")
+
+
+def run_streaming_duplicates(paths, columns, output_path, progress=None, cancel_event=None):
+    """複数ファイルの重複検出（ジョブ本体）"""
+    return StreamingDuplicateFinder(columns).run(paths, output_path, progress=progress, cancel_event=cancel_event)
+
+
+def show_streaming_duplicate_section():
+    """複数ファイル・大容量向けの重複チェック（全件をメモリに載せない）"""
+    st.subheader("複数ファイルの重複チェック（大容量向け）")
+    st.caption("各ファイルをチャンク単位で読み、ディスク上でパーティション分割してから重複を確定します")
+
+    dup_files = st.file_uploader("対象のCSVファイル（複数可）", type=['csv'],
+                                 accept_multiple_files=True, key="dup_files") or []
+    folder_paths = []
+    if DUP_CHECK_BASE_DIR:
+        folder = st.text_input(f"または {DUP_CHECK_BASE_DIR} 配下のフォルダ（フォルダ内の *.csv を対象）",
+                               key="dup_folder")
+        if folder:
+            try:
+                folder_paths = list_folder_csvs(folder, DUP_CHECK_BASE_DIR)
+            except ValueError as e:
+                st.error(str(e))
+    if not dup_files and not folder_paths:
+        return
+
+    try:
+        columns = read_header(folder_paths[0] if folder_paths else dup_files[0].getvalue())
+    except Exception as e:
+        st.error(f"ファイルの読み込みでエラーが発生しました: {str(e)}")
+        return
+    key_columns = st.multiselect("重複チェックを行う列を選択してください", options=columns,
+                                 default=columns, key="dup_columns")
+
+    manager = get_job_manager()
+    if st.button("複数ファイルの重複チェック実行", disabled=not key_columns):
+        # アップロードと結果はジョブごとのフォルダに置き、ジョブが一覧から外れたら削除する
+        jobdir = Path(tempfile.mkdtemp(prefix="dup_job_"))
+        upload_dir = jobdir / "uploads"
+        upload_dir.mkdir()
+        paths = list(folder_paths)
+        for f in dup_files:
+            (upload_dir / f.name).write_bytes(f.getvalue())
+            paths.append(str(upload_dir / f.name))
+        submit_session_job(manager, "dup_job_id", "dup_report", jobdir, run_streaming_duplicates,
+                           paths, key_columns, str(jobdir / "duplicate_groups.csv"),
+                           label=f"重複チェック（{len(paths)}ファイル）")
+
+    job = manager.get(st.session_state.get("dup_job_id"))
+    if job is not None:
+        show_job_status(manager, job, result_key="dup_report")
+
+    report = st.session_state.get("dup_report")
+    if report is None:
+        return
+    if not os.path.exists(report.groups_path):
+        # ジョブの整理で結果のフォルダが削除された
+        del st.session_state["dup_report"]
+        return
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("総行数", report.total_rows)
+    with col2:
+        st.metric("重複グループ", report.duplicate_groups)
+    with col3:
+        st.metric("ファイル間の重複グループ", report.cross_file_groups)
+    with col4:
+        st.metric("重複行数", report.redundant_rows)
+
+    if report.duplicate_rows:
+        st.dataframe(report.preview(), use_container_width=True, hide_index=True)
+        with open(report.groups_path, "rb") as f:
+            st.download_button("重複グループをCSVでダウンロード", f, file_name="duplicate_groups.csv",
+                               mime="text/csv", key="dup_download")
     else:
-        st.info("まずはデータをアップロードしてください")
+        st.success("重複データは見つかりませんでした！")
+
+
+def get_check_result():
+    """取り込んだエラーチェックの結果（作業ディレクトリがジョブの整理で削除されていれば捨てて None）"""
+    check_result = st.session_state.get("check_result")
+    if check_result and not os.path.isdir(check_result["workdir"]):
+        del st.session_state["check_result"]
+        return None
+    return check_result
+
+
+def show_error_check_tab():
+    st.header("🧾 エラーチェック")
+
+    options = {
+        "prefer_identical": st.sidebar.radio("完全一致時のフラグ先", ["earlier", "later"],
+                                             help="開始/終了が完全一致のとき、施設名の昇順で早い方/遅い方にフラグ"),
+        "alt_delim": st.sidebar.text_input("代替職員リストの区切り文字", value="/"),
+        "use_schedule_when_missing": st.sidebar.checkbox("実打刻欠損時に予定時刻で代用"),
+        "write_diagnostics": not st.sidebar.checkbox("診断CSVを出力しない"),
+    }
+
+    cache_stats = get_shared_index_cache().stats()
+    st.sidebar.caption(
+        f"勤怠インデックス共有キャッシュ: {cache_stats['entries']}件 / "
+        f"{cache_stats['bytes'] / 1024 / 1024:.1f}MB（上限 {cache_stats['max_bytes'] / 1024 / 1024:.0f}MB）"
+    )
+
+    service_files = st.file_uploader("サービス実態CSVをアップロード", type=['csv'],
+                                     accept_multiple_files=True, key="service_files")
+    att_file = st.file_uploader("勤怠履歴CSVをアップロード", type=['csv'], key="att_file")
+
+    manager = get_job_manager()
+    if st.button("エラーチェックを実行する", type="primary", disabled=not (service_files and att_file)):
+        workdir = prepare_workdir(service_files, att_file)
+        job = submit_session_job(manager, "check_job_id", "check_result", workdir, run_error_check, workdir, options,
+                                 label=f"エラーチェック（{len(service_files)}施設）")
+        st.query_params["job"] = job.job_id
+
+    # 再実行やページ再読み込みの後もジョブIDから再接続する
+    job_id = st.session_state.get("check_job_id") or st.query_params.get("job")
+    job = manager.get(job_id)
+    if job is not None:
+        st.session_state.check_job_id = job.job_id
+        show_job_status(manager, job)
+
+    check_result = get_check_result()
+    if not check_result or not check_result["result_paths"]:
+        st.info("サービス実態CSVと勤怠履歴CSVをアップロードして実行してください")
+        return
+
+    result_paths = tuple(check_result["result_paths"])
+    signature = result_signature(result_paths)
+    engine = get_grid_engine(result_paths, signature)
+
+    st.subheader("📊 結果サマリー")
+    summary_df = engine.summary()
+    col1, col2, col3, col4 = st.columns(4)
+    total = int(summary_df['総件数'].sum())
+    errors = int(summary_df['エラー件数'].sum())
+    with col1:
+        st.metric("総件数", total)
+    with col2:
+        st.metric("エラー件数", errors)
+    with col3:
+        st.metric("エラー率", f"{(errors / total * 100) if total else 0:.1f}%")
+    with col4:
+        st.metric("利用者数", len(engine.options('G')))
+    st.dataframe(summary_df, use_container_width=True, hide_index=True)
+
+    show_result_charts(result_paths, signature)
+    show_result_grid(result_paths, signature)
+
+    st.subheader("📥 ダウンロード")
+    for p in result_paths:
+        with open(p, "rb") as f:
+            st.download_button(f"{os.path.basename(p)} をダウンロード", f.read(),
+                               file_name=os.path.basename(p), mime="text/csv", key=f"dl_{p}")
+    zip_paths = result_paths + tuple(check_result["diagnostic_paths"])
+    st.download_button("全結果をZIPでダウンロード",
+                       get_result_zip(zip_paths, result_signature(zip_paths)),
+                       file_name="results.zip", mime="application/zip")
+
+
+def show_optimization_tab():
+    st.header("🛠 勤務時間最適化提案")
+
+    check_result = get_check_result()
+    if not check_result or not check_result["result_paths"]:
+        st.info("先にエラーチェックを実行してください")
+        return
+
+    # エラーチェックと同じ作業ディレクトリ・勤怠インデックス・サービス実態の表を使う（分析結果もエンジン内に保持される）
+    optimizer = get_work_optimizer(check_result["workdir"], check_result["att_index_key"],
+                                   check_result.get("use_schedule_when_missing", False),
+                                   check_result.get("service_records"))
+    roster = optimizer.analyze_all_employees()
+    if not roster:
+        st.info("分析できる従業員がいません")
+        return
+
+    keys = {analysis["employee_name"]: key for key, analysis in roster.items()}
+    selected = st.selectbox("従業員", list(keys), key="optimize_employee")
+    analysis = roster[keys[selected]]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("勤務日数", analysis["total_work_days"])
+    with col2:
+        st.metric("総勤務時間", f"{analysis['total_work_hours']:.1f}h")
+    with col3:
+        st.metric("エラー件数", analysis["error_analysis"]["total_errors"])
+
+    results = optimizer.generate_optimization_patterns(keys[selected], analysis)
+    if results:
+        recommended = calculate_optimization_impact(results)["recommended_pattern"]
+        st.caption(f"おすすめ: {recommended.pattern_name}（エラー削減 {recommended.error_reduction}件・"
+                   f"実現可能性 {recommended.feasibility_score:.0%}）")
+        st.dataframe(optimization_results_frame({selected: results}), use_container_width=True, hide_index=True)
+        st.caption("探索パターン：出勤・退勤を15分刻みで総当たりし、サービスの未カバー時間と実働時間のどちらでも他に劣らない候補")
+    else:
+        st.info("提案できるパターンがありません")
+
+    show_candidate_ranking(optimizer, keys[selected], analysis)
+
+
+def show_candidate_ranking(optimizer: WorkOptimizer, employee_key: str, analysis: dict):
+    """出勤・退勤の範囲から候補を作り、勤怠履歴超過の少ない順に並べる（rank_candidate_shifts）"""
+    st.subheader("勤務時間の候補を比較")
+    current_start, current_end = optimizer.current_shift(employee_key, analysis)
+    options = list(range(0, 30 * 60 + 1, 15))
+
+    def around(minutes):
+        base = min(max(0, minutes // 15 * 15), options[-1])
+        return max(0, base - 60), min(options[-1], base + 60)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        start_range = st.select_slider("出勤の範囲", options=options, value=around(current_start),
+                                       format_func=format_time_minutes, key=f"rank_start_{employee_key}")
+    with col2:
+        end_range = st.select_slider("退勤の範囲", options=options, value=around(current_end),
+                                     format_func=format_time_minutes, key=f"rank_end_{employee_key}")
+    candidates = [(start, end) for start in range(start_range[0], start_range[1] + 1, 15)
+                  for end in range(end_range[0], end_range[1] + 1, 15) if end > start]
+    if not candidates:
+        st.info("退勤が出勤より後になる範囲を選んでください")
+        return
+    ranked = optimizer.rank_candidate_shifts(employee_key, candidates, analysis, top_n=10)
+    st.caption(f"{len(candidates)}候補のうち上位{len(ranked)}件（同じ件数なら現在の勤務時間からの変更が小さい順）")
+    st.dataframe(optimization_results_frame({employee_key: ranked}), use_container_width=True, hide_index=True)
+
+
+def main():
+    # ページ設定
+    st.set_page_config(
+        page_title="重複チェック アプリ",
+        page_icon="🔍",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+
+    # タイトル
+    st.title("🔍 重複チェック アプリ")
+    st.markdown("---")
+
+    # サイドバー
+    st.sidebar.header("設定")
+
+    # メイン機能
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["データアップロード", "重複チェック", "結果表示", "エラーチェック", "勤務時間最適化"])
+
+    with tab1:
+        st.header("📁 データアップロード")
+
+        uploaded_file = st.file_uploader(
+            "CSVファイルをアップロードしてください",
+            type=['csv'],
+            help="重複チェックを行いたいCSVファイルを選択してください"
+        )
+
+        # 読み込みと重複インデックスの構築がどちらも成功したときだけ下のタブで使う
+        dup_index = None
+        if uploaded_file is not None:
+            try:
+                data = uploaded_file.getvalue()
+                digest = file_digest(data)
+                df = load_uploaded_csv(digest, data)
+                dup_index = get_duplicate_index(digest, df)
+                st.success(f"ファイルが正常にアップロードされました！ ({df.shape[0]}行, {df.shape[1]}列)")
+
+                # データプレビュー
+                st.subheader("データプレビュー")
+                st.dataframe(df.head(10))
+
+                # 基本統計
+                st.subheader("基本統計")
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("総行数", df.shape[0])
+                with col2:
+                    st.metric("列数", df.shape[1])
+                quality_metrics = dup_index.quality_metrics()
+                with col3:
+                    st.metric("欠損値", quality_metrics["欠損値数"])
+                with col4:
+                    st.metric("重複行数", quality_metrics["重複行数"])
+
+            except Exception as e:
+                st.error(f"ファイルの読み込みでエラーが発生しました: {str(e)}")
+
+    with tab2:
+        st.header("🔍 重複チェック")
+
+        if dup_index is not None:
+            # 重複チェック対象列の選択
+            st.subheader("重複チェック設定")
+
+            check_columns = st.multiselect(
+                "重複チェックを行う列を選択してください",
+                options=df.columns.tolist(),
+                default=df.columns.tolist()
+            )
+
+            mode = st.radio("判定モード", ["完全一致", "表記ゆれを含む（近似）"], horizontal=True)
+            near_options = near_duplicate_options(check_columns) if mode != "完全一致" and check_columns else None
+
+            if check_columns:
+                # 重複チェック実行
+                if st.button("重複チェック実行", type="primary"):
+                    if near_options is None:
+                        duplicates = dup_index.duplicate_rows(check_columns)
+                        group_count = dup_index.rows(check_columns).group_count
+                    else:
+                        try:
+                            near = get_near_duplicates(digest, tuple(check_columns),
+                                                       tuple(near_options.items()), df)
+                        except ValueError as e:
+                            st.error(str(e))
+                            st.stop()
+                        duplicates = near.rows
+                        group_count = near.group_count
+                        st.caption(f"ブロック数 {near.block_count} / 照合ペア {near.candidate_pairs}"
+                                   f"（総当たり {near.all_pairs}）")
+
+                    if len(duplicates) > 0:
+                        st.warning(f"重複データが {len(duplicates)} 件見つかりました（{group_count}グループ）")
+
+                        # 重複データの表示
+                        st.subheader("重複データ")
+                        st.dataframe(duplicates)
+
+                        # 重複データのダウンロード
+                        csv = duplicates.to_csv(index=False)
+                        st.download_button(
+                            label="重複データをCSVでダウンロード",
+                            data=csv,
+                            file_name="duplicate_data.csv",
+                            mime="text/csv"
+                        )
+                    else:
+                        st.success("重複データは見つかりませんでした！")
+        else:
+            st.info("まずはデータをアップロードしてください")
+
+        st.markdown("---")
+        show_streaming_duplicate_section()
+
+    with tab3:
+        st.header("📊 結果表示")
+
+        if dup_index is not None:
+            # 重複統計の可視化
+            st.subheader("重複統計")
+
+            # 列ごとの重複数
+            duplicate_counts = dup_index.column_duplicate_counts()
+
+            if any(duplicate_counts.values()):
+                fig = px.bar(
+                    x=list(duplicate_counts.keys()),
+                    y=list(duplicate_counts.values()),
+                    title="列ごとの重複数",
+                    labels={'x': '列名', 'y': '重複数'}
+                )
+                st.plotly_chart(fig, use_container_width=True)
+
+            # データ品質サマリー
+            st.subheader("データ品質サマリー")
+
+            quality_metrics = dup_index.quality_metrics()
+
+            col1, col2 = st.columns(2)
+            with col1:
+                for metric, value in list(quality_metrics.items())[:2]:
+                    st.metric(metric, value)
+            with col2:
+                for metric, value in list(quality_metrics.items())[2:]:
+                    st.metric(metric, value)
+
+            # データ品質スコア
+            quality_score = dup_index.quality_score()
+            st.metric("データ品質スコア", f"{quality_score:.1f}%")
+
+        else:
+            st.info("まずはデータをアップロードしてください")
+
+    with tab4:
+        show_error_check_tab()
+
+    with tab5:
+        show_optimization_tab()
+
+    # フッター
+    st.markdown("---")
+    st.markdown("**重複チェック アプリ** - データの品質管理をサポートします")
+
 
-# フッター
-st.markdown("---")
-st.markdown("**重複チェック アプリ** - データの品質管理をサポートします")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSV読み込み（csv_ingest）のテスト
+インストールされているエンジンがすべて同じ表を返すこと、列の絞り込み・文字列のままの読み込み、
+欠損表記（空欄だけが欠損）、入っていないエンジンの扱いを確認する
+"""
+
+import sys
+import traceback
+from pathlib import Path
+
+sys.path.append('.')
+
+
+def test_engines_agree():
+    """テストデータのCSVを、どのエンジンでも同じ表（object・欠損は NaN）として読む"""
+    print("=== エンジン間の一致テスト ===")
+
+    try:
+        from csv_ingest import available_engines, read_records
+
+        engines = available_engines()
+        paths = sorted(p for p in Path('test_input').glob('*.csv') if not p.name.startswith('result_'))
+        for path in paths:
+            frames = {engine: read_records(path, engine=engine) for engine in engines}
+            base = frames['pandas']
+            if any(dtype != object for dtype in base.dtypes):
+                print(f"❌ {path.name} に object 以外の列があります")
+                return False
+            for engine, frame in frames.items():
+                if not frame.equals(base):
+                    print(f"❌ {path.name} を {engine} で読んだ結果が pandas と一致しません")
+                    return False
+
+        print(f"✅ {len(paths)}ファイルを {', '.join(engines)} で読んだ結果が一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ エンジン間の一致テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_projection_and_text():
+    """指定した列だけをファイルの列順で読み、値は書かれた文字列のまま（先頭の0を保つ）"""
+    print("\n=== 列の絞り込み・文字列のテスト ===")
+
+    try:
+        from csv_ingest import available_engines, read_records
+
+        data = '﻿名前,番号,開始時間\n山田 太郎,0001234,9:00\n佐藤 花子,,1.0\n'.encode('utf-8')
+        for engine in available_engines():
+            frame = read_records(data, columns=['開始時間', '名前', 'ない列'], engine=engine, encoding='utf-8')
+            if list(frame.columns) != ['名前', '開始時間'] or frame['開始時間'].tolist() != ['9:00', '1.0']:
+                print(f"❌ {engine} の列の絞り込みが想定外です: {frame.to_dict('list')}")
+                return False
+            codes = read_records(data, engine=engine, encoding='utf-8')['番号']
+            if codes.iloc[0] != '0001234' or not codes.isna().iloc[1]:
+                print(f"❌ {engine} の文字列の読み込みが想定外です: {codes.tolist()}")
+                return False
+
+        print("✅ 列の絞り込みと文字列のままの読み込みを確認")
+        return True
+
+    except Exception as e:
+        print(f"❌ 列の絞り込み・文字列のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_null_tokens():
+    """'NA'・'None'・'null'・'#N/A' などはどのエンジンでも文字列のまま、空欄（クォートした空文字も）だけが欠損"""
+    print("\n=== 欠損表記のテスト ===")
+
+    try:
+        import pandas as pd
+        from csv_ingest import available_engines, read_records
+        from src import ENCODING
+
+        tokens = ['NA', 'None', 'null', '#N/A', 'N/A', 'NULL', 'nan', 'NaN', '-', '']
+        text = '名前,備考\n' + ''.join(f'従業員{i},{t}\n' for i, t in enumerate(tokens)) + '従業員X,""\n'
+        expected = tokens[:-1] + [None, None]
+        for encoding in ('utf-8', ENCODING):
+            data = text.encode(encoding)
+            for engine in available_engines():
+                values = read_records(data, engine=engine, encoding=encoding)['備考']
+                actual = [None if pd.isna(v) else v for v in values]
+                if actual != expected:
+                    print(f"❌ {engine}（{encoding}）の欠損の扱いが想定外です: {actual}")
+                    return False
+
+        print(f"✅ {', '.join(available_engines())} で欠損表記を文字列のまま読み込み")
+        return True
+
+    except Exception as e:
+        print(f"❌ 欠損表記のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_engine_selection():
+    """未対応のエンジンは ValueError、入っていないエンジンは ImportError、ベンチマークは入っているものだけ"""
+    print("\n=== エンジン選択のテスト ===")
+
+    try:
+        from csv_ingest import ENGINES, available_engines, benchmark_engines, engine_available, read_records
+
+        try:
+            read_records(b'a\n1\n', engine='excel')
+            print("❌ 未対応のエンジンでエラーになりません")
+            return False
+        except ValueError:
+            pass
+        for engine in ENGINES:
+            if engine_available(engine):
+                continue
+            try:
+                read_records(b'a\n1\n', engine=engine)
+                print(f"❌ 入っていない {engine} でエラーになりません")
+                return False
+            except ImportError:
+                pass
+
+        results = benchmark_engines([Path('test_input/勤怠履歴.csv')], columns=['名前', '*年月日'], repeat=1)
+        if sorted(results) != sorted(available_engines()) or min(results.values()) <= 0:
+            print(f"❌ ベンチマークの結果が想定外です: {results}")
+            return False
+
+        print(f"✅ エンジン選択を確認（利用可能: {', '.join(available_engines())}）")
+        return True
+
+    except Exception as e:
+        print(f"❌ エンジン選択のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_engines_agree,
+        test_projection_and_text,
+        test_null_tokens,
+        test_engine_selection,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
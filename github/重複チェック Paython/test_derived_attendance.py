@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+サービス実態から算出する勤怠のテスト
+算出した勤怠がすべてのサービスをカバーすること（勤怠履歴超過が0件になること）と、
+2時間ルール・休憩の割り当て・24時をまたぐ勤務の扱いを確認する
+"""
+
+import sys
+import traceback
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append('.')
+
+
+def _services(rows):
+    from src import build_service_records
+
+    df = pd.DataFrame(rows, columns=['西暦日付', '開始時間', '終了時間', '担当所員'])
+    return {'サービス実態X': build_service_records(Path('サービス実態X.csv'), df, 'サービス実態X')}
+
+
+def test_covers_every_service():
+    """算出した勤怠を build_work_intervals に通すと、すべてのサービスが勤務区間に収まる"""
+    print("=== サービスのカバーテスト ===")
+
+    try:
+        from derived_attendance import derive_attendance_frame, load_service_dfs
+        from employee_roster import load_employee_roster
+        from src import Interval, build_work_intervals, interval_fully_covered, parse_minute_of_day
+
+        service_dfs = load_service_dfs('test_input')
+        roster = load_employee_roster('test_input/勤怠履歴.csv')
+        frame = derive_attendance_frame(service_dfs, roster=roster)
+        att_map, _ = build_work_intervals(frame)
+
+        checked = 0
+        for df in service_dfs.values():
+            for staff, start, end in zip(df['_担当所員_norm'], df['_開始DT'], df['_終了DT']):
+                if pd.isna(start) or pd.isna(end) or not staff:
+                    continue
+                if not interval_fully_covered(Interval(start, end), att_map.get(staff, [])):
+                    print(f"❌ {staff} の {start}〜{end} が勤務区間に収まりません")
+                    return False
+                checked += 1
+
+        # 同じ日の勤務どうしは2時間以上離れている
+        for _, row in frame.iterrows():
+            shifts = [(parse_minute_of_day(row[f'出勤{i}']), parse_minute_of_day(row[f'退勤{i}']))
+                      for i in range(1, 11) if isinstance(row[f'出勤{i}'], str)]
+            if any(b[0] - a[1] < 120 for a, b in zip(shifts, shifts[1:])):
+                print(f"❌ {row['名前']} {row['*年月日']} の勤務が2時間ルールで結合されていません: {shifts}")
+                return False
+
+        print(f"✅ {checked}件のサービスが{len(frame)}日分の勤務に収まる")
+        return True
+
+    except Exception as e:
+        print(f"❌ サービスのカバーテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_merge_and_break_rules():
+    """2時間未満の空きは結合し、休憩は空き時間に長い順に割り当て、日をまたぐ勤務は開始日に 24時超で入る"""
+    print("\n=== 結合・休憩のテスト ===")
+
+    try:
+        from derived_attendance import derive_attendance_frame
+
+        frame = derive_attendance_frame(_services([
+            # 拘束 9:00-18:30（9時間30分）→ 休憩60分：50分の空き + 20分の空きのうち10分
+            ('2025-02-03', '9:00', '12:00', '山田 太郎'),
+            ('2025-02-03', '12:50', '15:00', '山田 太郎'),
+            ('2025-02-03', '15:20', '18:30', '山田 太郎'),
+            # 2時間以上空けば別の勤務（拘束6時間以下なので休憩なし）
+            ('2025-02-04', '8:00', '10:00', '山田 太郎'),
+            ('2025-02-04', '12:00', '13:00', '山田 太郎'),
+            # 日をまたぐ勤務は開始日の勤務
+            ('2025-02-05', '22:00', '23:30', '山田 太郎'),
+            ('2025-02-06', '0:30', '2:00', '山田 太郎'),
+            # 空きがなければ休憩は割り当てられず不足として残る
+            ('2025-02-03', '8:00', '16:00', '佐藤 花子'),
+        ])).set_index(['名前', '*年月日'])
+
+        day = frame.loc[('山田 太郎', '2025-02-03')]
+        if (day['出勤1'], day['退勤1'], day['出勤2']) != ('9:00', '18:30', None) or \
+                (day['休憩1'], day['復帰1'], day['休憩2'], day['復帰2']) != ('12:00', '12:50', '15:00', '15:10') or \
+                day['休憩不足(分)'] != 0:
+            print(f"❌ 休憩の割り当てが想定外です: {day[['出勤1', '退勤1', '休憩1', '復帰1', '休憩2', '復帰2']].tolist()}")
+            return False
+
+        day = frame.loc[('山田 太郎', '2025-02-04')]
+        if (day['出勤1'], day['退勤1'], day['出勤2'], day['退勤2'], day['休憩1']) != \
+                ('8:00', '10:00', '12:00', '13:00', None):
+            print(f"❌ 2時間ルールが想定外です: {day[['出勤1', '退勤1', '出勤2', '退勤2']].tolist()}")
+            return False
+
+        day = frame.loc[('山田 太郎', '2025-02-05')]
+        if (day['出勤1'], day['退勤1']) != ('22:00', '26:00') or ('山田 太郎', '2025-02-06') in frame.index:
+            print(f"❌ 日をまたぐ勤務が想定外です: {day[['出勤1', '退勤1']].tolist()}")
+            return False
+
+        day = frame.loc[('佐藤 花子', '2025-02-03')]
+        if (day['出勤1'], day['退勤1'], day['休憩1'], day['休憩不足(分)']) != ('8:00', '16:00', None, 45):
+            print(f"❌ 休憩不足が想定外です: {day[['出勤1', '退勤1', '休憩1', '休憩不足(分)']].tolist()}")
+            return False
+
+        print("✅ 結合・休憩・日またぎの規則を確認")
+        return True
+
+    except Exception as e:
+        print(f"❌ 結合・休憩のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_feeds_jinjer_builder():
+    """算出した勤怠をそのまま jinjer形式の表にでき、休憩列と実労働時間に反映される"""
+    print("\n=== jinjer形式への受け渡しテスト ===")
+
+    try:
+        from derived_attendance import derive_attendance_frame
+        from employee_roster import EmployeeRoster
+        from optimal_attendance_export import build_jinjer_frame
+
+        frame = derive_attendance_frame(_services([
+            ('2025-02-03', '9:00', '12:00', '山田 太郎'),
+            ('2025-02-03', '12:50', '15:00', '山田 太郎'),
+            ('2025-02-03', '15:20', '18:30', '山田 太郎'),
+        ]), roster=EmployeeRoster(['山田　太郎'], {'山田 太郎': 's001'}))
+        if frame['名前'].tolist() != ['山田　太郎'] or frame['*従業員ID'].tolist() != ['s001']:
+            print(f"❌ 名簿の表示名・IDに置き換わりません: {frame[['名前', '*従業員ID']].values.tolist()}")
+            return False
+
+        row = build_jinjer_frame(['山田　太郎'], '2025-02', frame).iloc[2]
+        if (row['出勤1'], row['退勤1'], row['休憩1'], row['復帰2'], row['休憩時間'], row['実労働時間'], row['総労働時間']) != \
+                ('9:00', '18:30', '12:00', '15:10', '1:00', '8:30', '8:30'):
+            print(f"❌ jinjer形式の行が想定外です: {row[['出勤1', '退勤1', '休憩1', '復帰2', '休憩時間', '実労働時間']].tolist()}")
+            return False
+
+        print("✅ 算出した勤怠から jinjer形式の行を作成")
+        return True
+
+    except Exception as e:
+        print(f"❌ jinjer形式への受け渡しテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_covers_every_service,
+        test_merge_and_break_rules,
+        test_feeds_jinjer_builder,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+汎用重複チェックの重複インデックスのテスト
+pandas の duplicated と同じ結果になること・ハッシュ衝突時も正しいことを確認する
+"""
+
+import sys
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+
+
+def _sample_frame(n: int = 200000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "職員": rng.choice(["佐藤", "鈴木", "高橋", None], n),
+        "日付": rng.integers(1, 31, n),
+        "開始": rng.integers(0, 48, n).astype(float),
+    })
+    df.loc[::11, "開始"] = np.nan
+    return df
+
+
+def test_matches_pandas_duplicated():
+    """行・列の重複がpandasの duplicated と一致する"""
+    print("=== 重複判定の一致テスト ===")
+
+    try:
+        from duplicate_index import DuplicateIndex
+
+        df = _sample_frame()
+        index = DuplicateIndex(df)
+
+        for subset in [None, ["職員"], ["日付", "開始"], ["開始", "職員"]]:
+            rows = index.rows(subset)
+            if not (rows.duplicated == df.duplicated(subset=subset).to_numpy()).all():
+                print(f"❌ keep='first' の結果が一致しません: {subset}")
+                return False
+            if not (rows.in_group == df.duplicated(subset=subset, keep=False).to_numpy()).all():
+                print(f"❌ keep=False の結果が一致しません: {subset}")
+                return False
+        print("✅ 行の重複判定が一致")
+
+        expected = {col: int(df[col].duplicated().sum()) for col in df.columns}
+        if index.column_duplicate_counts() != expected:
+            print(f"❌ 列ごとの重複数が一致しません: {index.column_duplicate_counts()} != {expected}")
+            return False
+        print(f"✅ 列ごとの重複数が一致: {expected}")
+
+        metrics = index.quality_metrics()
+        if (metrics["重複行数"] != df.duplicated().sum() or metrics["欠損値数"] != df.isnull().sum().sum()
+                or metrics["完全行数"] != df.dropna().shape[0]):
+            print(f"❌ 品質指標が一致しません: {metrics}")
+            return False
+        print(f"✅ 品質指標: {metrics}")
+
+        groups = index.duplicate_rows(["日付", "開始"])
+        if len(groups) != df.duplicated(subset=["日付", "開始"], keep=False).sum():
+            print("❌ 重複グループの行数が一致しません")
+            return False
+        # 同じグループ番号の行は選択列の値が同じ
+        per_group = groups.groupby("重複グループ", dropna=False)[["日付", "開始"]].nunique(dropna=False)
+        if (per_group.to_numpy() != 1).any():
+            print("❌ 重複グループ内で値が異なります")
+            return False
+        print(f"✅ 重複グループ: {groups['重複グループ'].nunique()}グループ")
+        return True
+
+    except Exception as e:
+        print(f"❌ 重複判定テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_hash_collision_fallback():
+    """ハッシュが衝突しても値の照合で正しい結果になる"""
+    print("\n=== ハッシュ衝突時のテスト ===")
+
+    try:
+        from duplicate_index import DuplicateIndex
+
+        df = _sample_frame(2000)
+        index = DuplicateIndex(df)
+        # 全行が同じハッシュになるよう差し替える
+        for col in df.columns:
+            index._column_hashes[col] = np.zeros(len(df), dtype=np.uint64)
+
+        if not (index.rows().duplicated == df.duplicated().to_numpy()).all():
+            print("❌ 衝突時の行の重複判定が一致しません")
+            return False
+        if index.column_duplicate_count("職員") != df["職員"].duplicated().sum():
+            print("❌ 衝突時の列の重複数が一致しません")
+            return False
+        print("✅ 衝突時も厳密な結果")
+        return True
+
+    except Exception as e:
+        print(f"❌ ハッシュ衝突テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_reuse_across_renders():
+    """2回目以降の参照は計算済みの結果を使う"""
+    print("\n=== 再描画時の再利用テスト ===")
+
+    try:
+        from duplicate_index import DuplicateIndex
+
+        df = _sample_frame(1000000)
+        index = DuplicateIndex(df)
+        start_time = time.time()
+        index.quality_metrics()
+        index.column_duplicate_counts()
+        index.rows(["職員", "日付"])
+        first = time.time() - start_time
+
+        start_time = time.time()
+        for _ in range(3):
+            index.quality_metrics()
+            index.column_duplicate_counts()
+            index.rows(["職員", "日付"])
+        again = time.time() - start_time
+        print(f"✅ 初回 {first * 1000:.0f}ms / 再描画3回 {again * 1000:.1f}ms")
+
+        if again > 0.05:
+            print("❌ 再描画で再計算されています")
+            return False
+        return True
+
+    except Exception as e:
+        print(f"❌ 再利用テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """メインテスト実行"""
+    print("重複インデックステスト開始")
+    print("=" * 50)
+
+    tests = [
+        test_matches_pandas_duplicated,
+        test_hash_collision_fallback,
+        test_reuse_across_renders,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
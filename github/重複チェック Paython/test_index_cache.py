@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+勤怠インデックス共有キャッシュのテスト
+同時構築が1回で済むこと・LRUでの破棄・キャッシュ経由でも結果が変わらないことを確認する
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append('.')
+
+
+def _read_results(workdir: Path) -> dict:
+    from grid_engine import read_result_csv
+    results = {}
+    for path in sorted(workdir.glob("result_*.csv")):
+        df = read_result_csv(str(path))
+        results[path.name] = df.drop(columns=["詳細ID"], errors="ignore")
+    return results
+
+
+def test_single_build_across_sessions():
+    """同じキーを複数スレッドから要求しても構築は1回で、同じオブジェクトを共有する"""
+    print("=== 同時構築テスト ===")
+
+    try:
+        from index_cache import AttendanceIndexCache
+        from src import ENCODING, build_work_intervals
+
+        cache = AttendanceIndexCache()
+        att_path = os.path.join('test_input', '勤怠履歴.csv')
+        calls = []
+
+        def builder():
+            calls.append(1)
+            time.sleep(0.1)
+            return build_work_intervals(pd.read_csv(att_path, encoding=ENCODING))
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_build("k", builder)))
+                   for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if len(calls) != 1:
+            print(f"❌ 構築が{len(calls)}回行われました")
+            return False
+        if any(r is not results[0] for r in results):
+            print("❌ セッション間で別のインデックスが返されました")
+            return False
+        try:
+            results[0].att_map["x"] = ()
+            print("❌ 共有インデックスが書き換え可能です")
+            return False
+        except TypeError:
+            pass
+        print(f"✅ 構築1回・共有: {cache.stats()}")
+        return True
+
+    except Exception as e:
+        print(f"❌ 同時構築テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_lru_eviction():
+    """バイト上限を超えたら古いものから破棄される"""
+    print("\n=== LRU破棄テスト ===")
+
+    try:
+        from index_cache import AttendanceIndexCache
+        from src import Interval
+
+        def builder():
+            return {"職員": [Interval(0, 60)]}, {"職員": ["職員"]}
+
+        probe = AttendanceIndexCache().get_or_build("probe", builder)
+        cache = AttendanceIndexCache(max_bytes=probe.nbytes * 2)
+        cache.get_or_build("a", builder)
+        cache.get_or_build("b", builder)
+        cache.get("a")  # a を最近使ったことにする
+        cache.get_or_build("c", builder)
+
+        if cache.get("b") is not None or cache.get("a") is None or cache.get("c") is None:
+            print(f"❌ LRU順に破棄されていません: {cache.stats()}")
+            return False
+        print(f"✅ LRU破棄: {cache.stats()}")
+        return True
+
+    except Exception as e:
+        print(f"❌ LRU破棄テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_process_with_shared_index():
+    """キャッシュしたインデックスを渡しても結果が同じ"""
+    print("\n=== 共有インデックスでの処理結果テスト ===")
+
+    try:
+        from index_cache import AttendanceIndexCache, attendance_index_key, file_digest
+        from src import ATT_NAME_COL, ENCODING, build_work_intervals, process
+
+        base = Path(tempfile.mkdtemp(prefix="index_cache_test_"))
+        outputs = []
+        cache = AttendanceIndexCache()
+        for use_cache in (False, True):
+            workdir = base / str(use_cache)
+            workdir.mkdir()
+            for name in ['サービス実態A.csv', 'サービス実態B.csv', '勤怠履歴.csv']:
+                shutil.copy(os.path.join('test_input', name), workdir / name)
+            kwargs = {}
+            if use_cache:
+                att_path = workdir / '勤怠履歴.csv'
+                key = attendance_index_key(file_digest(str(att_path)), ATT_NAME_COL, False)
+                index = cache.get_or_build(
+                    key, lambda: build_work_intervals(pd.read_csv(att_path, encoding=ENCODING)))
+                kwargs["att_index"] = index.as_tuple()
+            process(workdir, write_diagnostics=False, **kwargs)
+            outputs.append(_read_results(workdir))
+
+        shutil.rmtree(base, ignore_errors=True)
+        plain, cached = outputs
+        if plain.keys() != cached.keys():
+            print(f"❌ 出力ファイルが異なります: {sorted(plain)} / {sorted(cached)}")
+            return False
+        for name in plain:
+            if not plain[name].equals(cached[name]):
+                print(f"❌ 結果が一致しません: {name}")
+                return False
+        print(f"✅ {len(plain)}ファイルで結果一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 共有インデックステストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """メインテスト実行"""
+    print("勤怠インデックス共有キャッシュテスト開始")
+    print("=" * 50)
+
+    tests = [
+        test_single_build_across_sessions,
+        test_lru_eviction,
+        test_process_with_shared_index,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
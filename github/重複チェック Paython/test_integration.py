@@ -18,7 +18,7 @@ def test_grid_functionality():
     try:
         # streamlit_app.pyからprepare_grid_data関数をインポート
         sys.path.append('.')
-        from streamlit_app import prepare_grid_data
+        from grid_engine import prepare_grid_data
         
         # テストデータのパスを設定
         result_paths = [
@@ -239,7 +239,7 @@ def test_error_handling():
         
         # 不正なファイルパスでのテスト
         try:
-            from streamlit_app import prepare_grid_data
+            from grid_engine import prepare_grid_data
             result = prepare_grid_data(['存在しないファイル.csv'])
             print("⚠️ 警告: 存在しないファイルでもエラーが発生しませんでした")
         except Exception as e:
@@ -54,7 +54,7 @@ def test_full_workflow_scenario():
         # 2. グリッド表示機能のテスト
         print("\n📊 ステップ2: グリッド表示機能")
         
-        from streamlit_app import prepare_grid_data, collect_summary
+        from grid_engine import prepare_grid_data, collect_summary
         
         result_paths = [
             'test_input/result_サービス実態A.csv',
@@ -258,7 +258,7 @@ def test_session_state_simulation():
         print("✅ 処理完了状態設定")
         
         # サマリーデータの生成
-        from streamlit_app import collect_summary
+        from grid_engine import collect_summary
         session_state['summary_df'] = collect_summary(session_state['result_paths'])
         
         print(f"✅ サマリーデータ生成: {len(session_state['summary_df'])}行")
@@ -312,7 +312,7 @@ def test_error_recovery_scenario():
         empty_df = pd.DataFrame()
         
         try:
-            from streamlit_app import prepare_grid_data
+            from grid_engine import prepare_grid_data
             result = prepare_grid_data([])  # 空のパスリスト
             print("⚠️ 空データでもエラーが発生しませんでした")
         except Exception as e:
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+区間・重複ペア・カバー状況の表（Interval / OverlapTable / CoverageTable）のテスト
+Interval が属性辞書を持たずに pickle できること、表の1行のビュー（OverlapInfo・CoverageInfo）が
+元の区間から計算した値・1件ずつ分析した値と一致することを確認する
+"""
+
+import pickle
+import sys
+import traceback
+from dataclasses import FrozenInstanceError
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append('.')
+
+
+def _load(name):
+    from csv_ingest import read_records
+    from src import build_service_records
+
+    path = Path('test_input') / f'{name}.csv'
+    return build_service_records(path, read_records(path), name)
+
+
+def test_slotted_interval():
+    """Interval は __slots__ で属性辞書を持たず、変更できず、pickle 後も等しい"""
+    print("=== Interval のテスト ===")
+
+    try:
+        from src import Interval
+
+        iv = Interval(datetime(2025, 2, 1, 9, 0), datetime(2025, 2, 1, 10, 30))
+        if hasattr(iv, '__dict__') or iv.duration_minutes() != 90:
+            print("❌ Interval が属性辞書を持っているか、長さが想定外です")
+            return False
+        try:
+            iv.start = datetime(2025, 2, 1, 8, 0)
+            print("❌ Interval を変更できてしまいます")
+            return False
+        except FrozenInstanceError:
+            pass
+        restored = pickle.loads(pickle.dumps(iv))
+        if restored != iv or hash(restored) != hash(iv) or {iv: 1}.get(restored) != 1:
+            print(f"❌ pickle 後の Interval が一致しません: {restored}")
+            return False
+
+        print("✅ Interval は属性辞書なしで pickle できる")
+        return True
+
+    except Exception as e:
+        print(f"❌ Interval のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_overlap_table():
+    """重複ペアは1本の構造化配列で、各ビューの値が元の表の区間から計算した値と一致する"""
+    print("\n=== 重複ペアの表のテスト ===")
+
+    try:
+        from src import OVERLAP_DTYPE, OverlapInfo, find_overlaps, find_overlaps_with_details
+
+        df1, df2 = _load('サービス実態A'), _load('サービス実態B')
+        table = find_overlaps_with_details(df1, df2, 'A', 'B')
+        if table.records.dtype != OVERLAP_DTYPE or len(table) == 0 or table.nbytes != len(table) * OVERLAP_DTYPE.itemsize:
+            print(f"❌ 重複ペアの表が想定外です: {table.records.dtype} {len(table)}件")
+            return False
+
+        for info in table:
+            s1, e1 = df1.at[info.idx1, '_開始DT'], df1.at[info.idx1, '_終了DT']
+            s2, e2 = df2.at[info.idx2, '_開始DT'], df2.at[info.idx2, '_終了DT']
+            expected = (s1, e1, s2, e2, max(s1, s2), min(e1, e2), int((min(e1, e2) - max(s1, s2)).total_seconds() / 60),
+                        "完全重複" if (s1, e1) == (s2, e2) else "部分重複", df1.at[info.idx1, '_担当所員'],
+                        df2.at[info.idx2, '_担当所員'], 'A', 'B')
+            actual = (info.start1, info.end1, info.start2, info.end2, info.overlap_start, info.overlap_end,
+                      info.overlap_minutes, info.overlap_type, info.staff1, info.staff2, info.facility1, info.facility2)
+            if actual != expected:
+                print(f"❌ 重複ペアのビューが元の区間と一致しません: {actual} != {expected}")
+                return False
+
+        if find_overlaps(df1, df2) != list(zip(table.idx1, table.idx2)):
+            print("❌ find_overlaps の結果が表の行と一致しません")
+            return False
+        internal = find_overlaps_with_details(df2, df2, 'B', 'B')
+        others = internal.select(internal.records['row1'] != internal.records['row2'])
+        if len(internal) == 0 or [(o.idx1, o.idx2) for o in others] != [(o.idx1, o.idx2) for o in internal if o.idx1 != o.idx2] \
+                or not isinstance(table[-1], OverlapInfo) or table[-1] != list(table)[-1]:
+            print("❌ 絞り込んだ表が想定外です")
+            return False
+
+        print(f"✅ {len(table)}件の重複ペアを {table.nbytes:,} バイトの表で保持")
+        return True
+
+    except Exception as e:
+        print(f"❌ 重複ペアの表のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_coverage_table():
+    """施設全体のカバー状況の表が、1行ずつ analyze_coverage_details を呼んだ結果と一致し、区間の文字列は参照時に作る"""
+    print("\n=== カバー状況の表のテスト ===")
+
+    try:
+        from src import (COVERAGE_DTYPE, ENCODING, Interval, analyze_coverage_details, analyze_coverage_table,
+                         build_work_intervals)
+        from csv_ingest import read_records
+
+        # 勤務 9:00-12:00・13:00-15:00 に対して、サービス 11:00-14:00 は部分カバー
+        day = datetime(2025, 2, 1)
+        covers = [Interval(day.replace(hour=9), day.replace(hour=12)), Interval(day.replace(hour=13), day.replace(hour=15))]
+        info = analyze_coverage_details(Interval(day.replace(hour=11), day.replace(hour=14)), covers, '')
+        if (info.coverage_status, info.total_service_minutes, info.covered_minutes, info.uncovered_minutes,
+                info.work_intervals, info.covered_intervals, info.uncovered_intervals, info.work_interval_count) != \
+                ('部分カバー', 180, 120, 60, ['09:00-12:00', '13:00-15:00'], ['11:00-12:00', '13:00-14:00'],
+                 ['12:00-13:00'], 2):
+            print(f"❌ 1件のカバー分析が想定外です: {info}")
+            return False
+
+        att_map, _ = build_work_intervals(read_records(Path('test_input/勤怠履歴.csv'), encoding=ENCODING))
+        df = _load('サービス実態B')
+        table = analyze_coverage_table(df, att_map)
+        if table.records.dtype != COVERAGE_DTYPE or len(table) != int(df['_開始DT'].notna().sum()):
+            print(f"❌ カバー状況の表が想定外です: {table.records.dtype} {len(table)}件")
+            return False
+        for label, row_info in zip(table.labels, table):
+            iv = Interval(df.at[label, '_開始DT'], df.at[label, '_終了DT'])
+            expected = analyze_coverage_details(iv, att_map.get(df.at[label, '_担当所員_norm'], []), '')
+            if row_info != expected:
+                print(f"❌ 行{label} のカバー状況が1件ずつの分析と一致しません: {row_info} != {expected}")
+                return False
+        if not (~table.is_fully_covered).any():
+            print("❌ テストデータに勤怠履歴超過がありません")
+            return False
+
+        print(f"✅ {len(table)}件のカバー状況が1件ずつの分析と一致（超過 {(~table.is_fully_covered).sum()}件）")
+        return True
+
+    except Exception as e:
+        print(f"❌ カバー状況の表のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_slotted_interval,
+        test_overlap_table,
+        test_coverage_table,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
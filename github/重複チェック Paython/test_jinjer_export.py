@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+jinjer形式CSV出力のテスト
+ストリーム出力が文字列出力と同じ内容になること、クォートと文字コードで表せない文字の扱い、
+列単位で組み立てた表の内容、2時間ルールの結合、期間指定のZIP出力（プロセスプールでの並列出力・所属グループでの分割を含む）、
+従業員名簿のキャッシュを確認する
+"""
+
+import csv
+import io
+import sys
+import traceback
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append('.')
+
+
+def _attendance(names):
+    rows = []
+    for i, name in enumerate(names):
+        for day in (1, 2):
+            rows.append({'名前': name, '*従業員ID': f's{i:03d}', '*年月日': f'2025-02-{day:02d}',
+                         '出勤1': '9:00', '退勤1': '18:00'})
+    return pd.DataFrame(rows)
+
+
+def test_stream_matches_string():
+    """チャンクに分けて書いても文字列出力をエンコードしたものと同じになる"""
+    print("=== ストリーム出力の一致テスト ===")
+
+    try:
+        from optimal_attendance_export import JINJER_ENCODING, generate_jinjer_csv, stream_jinjer_csv, write_jinjer_csv
+        from src import ENCODING
+
+        att_df = pd.read_csv('test_input/勤怠履歴.csv', encoding=ENCODING)
+        employees = list(dict.fromkeys(att_df['名前'].astype(str).str.strip()))
+        expected = generate_jinjer_csv(employees, '2025-02', att_df).encode(JINJER_ENCODING)
+
+        stream = stream_jinjer_csv(employees, '2025-02', att_df)
+        stream.chunk_rows = 7
+        chunks = list(stream)
+        if b''.join(chunks) != expected or len(chunks) < 2:
+            print(f"❌ チャンク出力が一致しません（{len(chunks)}チャンク）")
+            return False
+        if stream.rows != len(employees) * 28 or stream.bytes_written != len(expected):
+            print(f"❌ 行数・バイト数が想定外です: {stream.rows}行 {stream.bytes_written}バイト")
+            return False
+
+        buffer = io.BytesIO()
+        write_jinjer_csv(buffer, employees, '2025-02', att_df)
+        if buffer.getvalue() != expected:
+            print("❌ ファイルへの書き出しが一致しません")
+            return False
+
+        print(f"✅ {stream.rows}行・{len(chunks)}チャンクが一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ ストリーム出力の一致テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_quoting_and_encode_policy():
+    """カンマ・ダブルクォート・改行を含む項目をクォートし、表せない文字は指定どおりに扱う"""
+    print("\n=== クォートと文字コードのテスト ===")
+
+    try:
+        from optimal_attendance_export import stream_jinjer_csv
+
+        tricky = '山田,"太郎"\n二世'
+        stream = stream_jinjer_csv([tricky], '2025-02', _attendance([tricky]))
+        records = list(csv.reader(io.StringIO(b''.join(stream).decode(stream.encoding))))
+        if len(records) != 1 + 28 or records[1][0] != tricky or records[1][1] != 's000':
+            print(f"❌ クォートされた項目を読み戻せません: {records[1][:2]}")
+            return False
+
+        # 𠮷 は cp932 にない
+        name = '𠮷田 花子'
+        att_df = _attendance([name])
+        replaced = stream_jinjer_csv([name], '2025-02', att_df)
+        text = b''.join(replaced).decode(replaced.encoding)
+        if '?田 花子' not in text or replaced.unencodable != {'𠮷': 28}:
+            print(f"❌ 置き換えが想定外です: {replaced.unencodable}")
+            return False
+
+        ignored = stream_jinjer_csv([name], '2025-02', att_df, errors='ignore')
+        if '\n田 花子,' not in b''.join(ignored).decode(ignored.encoding):
+            print("❌ 削除が想定外です")
+            return False
+
+        try:
+            b''.join(stream_jinjer_csv([name], '2025-02', att_df, errors='strict'))
+            print("❌ strict で例外になりません")
+            return False
+        except UnicodeEncodeError:
+            pass
+
+        print("✅ クォートと文字コードの扱いを確認")
+        return True
+
+    except Exception as e:
+        print(f"❌ クォートと文字コードのテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_frame_columns():
+    """従業員 × 全日付の表に、結合したシフトと労働時間が列名どおりに入る"""
+    print("\n=== 列単位の表の組み立てテスト ===")
+
+    try:
+        from optimal_attendance_export import build_jinjer_frame, create_jinjer_headers
+
+        att_df = pd.DataFrame([
+            # 日付の書式が混在していても1回の解析で扱う。2つ目のシフトは間隔2時間未満なので結合される
+            {'名前': ' 山田 太郎 ', '*従業員ID': 's001', '*年月日': '2025/02/03',
+             '出勤1': '9:00', '退勤1': '12:00', '出勤2': '13:00', '退勤2': '18:30'},
+            {'名前': '山田 太郎', '*従業員ID': 's001', '*年月日': '2025-02-03',
+             '出勤1': '1:00', '退勤1': '2:00', '出勤2': None, '退勤2': None},
+            {'名前': '山田 太郎', '*従業員ID': 's001', '*年月日': '2025-02-04',
+             '出勤1': '8:00', '退勤1': '10:00', '出勤2': '14:00', '退勤2': '15:00'},
+            {'名前': '佐藤 花子', '*従業員ID': 's002', '*年月日': '2025-02-01',
+             '出勤1': None, '退勤1': None, '出勤2': None, '退勤2': None},
+        ])
+        frame = build_jinjer_frame(['山田 太郎', '佐藤 花子'], '2025-02', att_df)
+        if list(frame.columns) != create_jinjer_headers() or len(frame) != 2 * 28:
+            print(f"❌ 表の形が想定外です: {frame.shape}")
+            return False
+
+        day3 = frame.iloc[2]
+        if (day3['*年月日'], day3['*従業員ID'], day3['出勤1'], day3['退勤1'], day3['出勤2']) != \
+                ('2025-02-03', 's001', '9:00', '18:30', ''):
+            print(f"❌ 結合したシフトが想定外です: {day3[['出勤1', '退勤1', '出勤2']].tolist()}")
+            return False
+        # 休憩の打刻・予定がない日：休憩0分、労働時間はすべて残業（8時間超は法定外）
+        if (day3['総労働時間'], day3['実労働時間'], day3['休憩時間'], day3['総残業時間'], day3['法定外残業時間'],
+                day3['打刻区分ID:1']) != ('9:30', '9:30', '0:00', '9:30', '1:30', 'FALSE'):
+            print(f"❌ 労働時間が想定外です: {day3[['総労働時間', '実労働時間', '総残業時間']].tolist()}")
+            return False
+
+        day4 = frame.iloc[3]
+        if (day4['出勤1'], day4['退勤1'], day4['出勤2'], day4['退勤2'], day4['総労働時間'], day4['総残業時間']) != \
+                ('8:00', '10:00', '14:00', '15:00', '3:00', '3:00'):
+            print("❌ 2時間以上離れたシフトが別の列に入っていません")
+            return False
+
+        # 勤怠行のない日は初期データ、打刻のない勤怠行はシフトなし
+        if (frame.iloc[0]['出勤1'], frame.iloc[0]['退勤1'], frame.iloc[0]['打刻区分ID:1']) != ('0:00', '24:00', ''):
+            print("❌ 勤怠行のない日の初期データが想定外です")
+            return False
+        hanako = frame.iloc[28]
+        if (hanako['名前'], hanako['*従業員ID'], hanako['出勤1'], hanako['打刻区分ID:50'], hanako['総労働時間']) != \
+                ('佐藤 花子', 's002', '', 'FALSE', ''):
+            print("❌ 打刻のない勤怠行の扱いが想定外です")
+            return False
+
+        print("✅ シフト・労働時間・初期データの列を確認")
+        return True
+
+    except Exception as e:
+        print(f"❌ 列単位の表の組み立てテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_gap_merge_matches_scalar():
+    """配列でまとめて行う2時間ルールの結合が、1日ずつ順に結合した結果と一致し、24時超を保つ"""
+    print("\n=== 2時間ルールの結合テスト ===")
+
+    try:
+        import numpy as np
+
+        from interval_engine import merge_close_intervals
+        from optimal_attendance_export import MERGE_GAP_MINUTES, build_jinjer_frame, merge_overlapping_shifts
+
+        rng = np.random.default_rng(7)
+        groups = rng.integers(0, 200, 3000)
+        starts = rng.integers(0, 30 * 60, 3000)
+        ends = starts + rng.integers(10, 6 * 60, 3000)
+        rows, merged_starts, merged_ends = merge_close_intervals(groups, starts, ends, MERGE_GAP_MINUTES)
+
+        expected = []
+        for g in range(200):
+            merged = []
+            for s, e in sorted(zip(starts[groups == g], ends[groups == g])):
+                if merged and s - merged[-1][2] < MERGE_GAP_MINUTES:
+                    merged[-1][2] = max(merged[-1][2], e)
+                else:
+                    merged.append([g, s, e])
+            expected.extend(tuple(m) for m in merged)
+        if list(zip(rows.tolist(), merged_starts.tolist(), merged_ends.tolist())) != expected:
+            print("❌ 1日ずつ結合した結果と一致しません")
+            return False
+
+        # 24時を超える夜勤は 24:00 に切り詰めない
+        shifts = [{'work_start': '18:00', 'work_end': '32:10'}, {'work_start': '9:30', 'work_end': '13:10'},
+                  {'work_start': '14:00', 'work_end': '16:00'}]
+        if merge_overlapping_shifts(shifts) != [{'work_start': '9:30', 'work_end': '16:00'},
+                                                {'work_start': '18:00', 'work_end': '32:10'}]:
+            print(f"❌ 夜勤の結合が想定外です: {merge_overlapping_shifts(shifts)}")
+            return False
+        att_df = pd.DataFrame([{'名前': '山田 太郎', '*従業員ID': 's001', '*年月日': '2025-02-03',
+                                '出勤1': '22:00', '退勤1': '25:00', '出勤2': '26:30', '退勤2': '31:00'}])
+        row = build_jinjer_frame(['山田 太郎'], '2025-02', att_df).iloc[2]
+        if (row['出勤1'], row['退勤1'], row['出勤2'], row['総労働時間']) != ('22:00', '31:00', '', '9:00'):
+            print(f"❌ 24時超のシフトが想定外です: {row[['出勤1', '退勤1', '総労働時間']].tolist()}")
+            return False
+
+        print(f"✅ {len(expected)}件の結合後シフトが一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 2時間ルールの結合テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_range_export_zip():
+    """期間指定のZIP出力：月ごとのファイルが1か月ずつの出力と一致し、並行でも順に処理しても同じ内容になる"""
+    print("\n=== 期間指定のZIP出力テスト ===")
+
+    try:
+        import zipfile
+
+        from optimal_attendance_export import JINJER_ENCODING, export_jinjer_zip, generate_jinjer_csv
+        from src import ENCODING
+
+        att_df = pd.read_csv('test_input/勤怠履歴.csv', encoding=ENCODING)
+        employees = list(dict.fromkeys(att_df['名前'].astype(str).str.strip()))
+
+        buffer = io.BytesIO()
+        manifest = export_jinjer_zip(buffer, employees, '2025-01-01', '2025-03-31', att_df, split_by=['month'],
+                                     max_workers=3)
+        with zipfile.ZipFile(buffer) as zf:
+            names = zf.namelist()
+            if names != ['最適勤怠データ_2025-01.csv', '最適勤怠データ_2025-02.csv', '最適勤怠データ_2025-03.csv']:
+                print(f"❌ ファイル名が想定外です: {names}")
+                return False
+            for name, month in zip(names, ['2025-01', '2025-02', '2025-03']):
+                if zf.read(name) != generate_jinjer_csv(employees, month, att_df).encode(JINJER_ENCODING):
+                    print(f"❌ {name} が1か月ずつの出力と一致しません")
+                    return False
+        if [m.rows for m in manifest] != [len(employees) * d for d in (31, 28, 31)]:
+            print(f"❌ 行数が想定外です: {[m.rows for m in manifest]}")
+            return False
+
+        # 所属グループ×従業員で分けると従業員ごとに1ファイル（期間は分けない）
+        contents = []
+        for workers in (1, 4):
+            buffer = io.BytesIO()
+            export_jinjer_zip(buffer, employees, '2025-02-10', '2025-03-05', att_df,
+                              split_by=['group', 'employee'], max_workers=workers)
+            with zipfile.ZipFile(buffer) as zf:
+                contents.append({name: zf.read(name) for name in zf.namelist()})
+        if contents[0] != contents[1] or len(contents[0]) != len(employees):
+            print("❌ 並行処理と順次処理の結果が一致しません")
+            return False
+        if not all(name.startswith('最適勤怠データ_20250210-20250305_') for name in contents[0]):
+            print(f"❌ 期間がファイル名に入っていません: {list(contents[0])[:2]}")
+            return False
+
+        print(f"✅ {len(manifest)}か月分・{len(contents[0])}名分のファイルを確認")
+        return True
+
+    except Exception as e:
+        print(f"❌ 期間指定のZIP出力テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_parallel_zip_export():
+    """プロセスプールで作ったZIPが順に処理したものと同じで、置き換えた文字の件数もワーカーから戻り、一時ファイルが残らない"""
+    print("\n=== ZIP出力の並列処理テスト ===")
+
+    try:
+        import glob
+        import tempfile
+        import zipfile
+
+        from optimal_attendance_export import export_jinjer_zip
+
+        # cp932 で表せない文字を含む名前（ワーカー側で置き換え・件数を数える）
+        employees = ['山田 太郎', '𠮷田 花子', '佐藤 次郎', '鈴木 三郎']
+        att_df = _attendance(employees)
+        leftovers = set(glob.glob(str(Path(tempfile.gettempdir()) / 'jinjer-export-*')))
+
+        outputs = []
+        for workers in (1, 3):
+            buffer = io.BytesIO()
+            manifest = export_jinjer_zip(buffer, employees, '2025-01-01', '2025-04-30', att_df,
+                                         split_by=['month', 'employee'], max_workers=workers)
+            with zipfile.ZipFile(buffer) as zf:
+                if zf.testzip() is not None:
+                    print("❌ ZIPが壊れています")
+                    return False
+                contents = {name: zf.read(name) for name in zf.namelist()}
+            outputs.append((manifest, contents))
+
+        (sequential, seq_contents), (parallel, par_contents) = outputs
+        if parallel != sequential or par_contents != seq_contents or len(parallel) != 4 * len(employees):
+            print("❌ プロセスプールと順次処理の結果が一致しません")
+            return False
+        # 𠮷田 花子のファイルだけで、名前の列に月の日数ぶん出てくる
+        replaced = {m.filename: m.unencodable for m in parallel if m.unencodable}
+        expected = {f'最適勤怠データ_2025-{month:02d}_𠮷田 花子.csv': {'𠮷': days}
+                    for month, days in ((1, 31), (2, 28), (3, 31), (4, 30))}
+        if replaced != expected:
+            print(f"❌ 置き換えた文字の件数が想定外です: {replaced}")
+            return False
+        if any(m.bytes_written != len(par_contents[m.filename]) for m in parallel):
+            print("❌ マニフェストのバイト数がZIPの中身と一致しません")
+            return False
+        if set(glob.glob(str(Path(tempfile.gettempdir()) / 'jinjer-export-*'))) != leftovers:
+            print("❌ 並列処理の一時ファイルが残っています")
+            return False
+
+        print(f"✅ {len(parallel)}ファイルをプロセスプールで出力（順次処理と一致）")
+        return True
+
+    except Exception as e:
+        print(f"❌ ZIP出力の並列処理テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_group_split_matches_column():
+    """所属グループ名は従業員ごとの値（なければ既定値）で、所属グループで分けたファイル名と中身の値が一致する"""
+    print("\n=== 所属グループでの分割テスト ===")
+
+    try:
+        import zipfile
+
+        from optimal_attendance_export import GROUP_NAME, JINJER_ENCODING, export_jinjer_zip
+
+        employees = ['山田 太郎', '佐藤 花子', '鈴木 三郎']
+        att_df = _attendance(employees)
+        # 1行目が空でも、空でない最初の値を使う。鈴木 三郎は所属グループ名なし
+        att_df['所属グループ名'] = ['', '野川本町', GROUP_NAME, GROUP_NAME, None, None]
+
+        buffer = io.BytesIO()
+        export_jinjer_zip(buffer, employees, '2025-02-01', '2025-02-28', att_df, split_by=['group'], max_workers=1)
+        members = {}
+        with zipfile.ZipFile(buffer) as zf:
+            for name in zf.namelist():
+                df = pd.read_csv(io.BytesIO(zf.read(name)), encoding=JINJER_ENCODING, dtype=str)
+                label = name[:-len('.csv')].split('_')[-1]
+                if set(df['所属グループ名']) != {label}:
+                    print(f"❌ {name} の所属グループ名がファイル名と一致しません: {set(df['所属グループ名'])}")
+                    return False
+                members[label] = list(dict.fromkeys(df['名前']))
+        if members != {GROUP_NAME: ['佐藤 花子', '鈴木 三郎'], '野川本町': ['山田 太郎']}:
+            print(f"❌ 所属グループごとの従業員が想定外です: {members}")
+            return False
+
+        print(f"✅ {len(members)}グループのファイル名と所属グループ名が一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 所属グループでの分割テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_export_parts_match_full_frame():
+    """ファイルごとにその分の勤怠行だけから組み立てた結果が、期間全体の表を分けたものと一致する"""
+    print("\n=== ファイルごとの組み立てテスト ===")
+
+    try:
+        import zipfile
+
+        from optimal_attendance_export import (JinjerCsvStream, build_jinjer_frame_for_dates, export_dates,
+                                               export_jinjer_zip, plan_jinjer_export, split_jinjer_frame)
+        from src import ENCODING
+
+        att_df = pd.read_csv('test_input/勤怠履歴.csv', encoding=ENCODING)
+        att_df['所属グループ名'] = att_df['所属グループ名'].where(att_df.index % 7 != 0, '野川本町')
+        employees = list(dict.fromkeys(att_df['名前'].astype(str).str.strip()))
+        dates = export_dates('2025-01-20', '2025-03-10')
+        days = pd.to_datetime(att_df['*年月日'].astype(str).str.strip(), format='mixed').dt.normalize()
+
+        full = build_jinjer_frame_for_dates(employees, dates, att_df)
+        for split_by in ([], ['month'], ['group', 'month'], ['month', 'employee']):
+            parts = plan_jinjer_export(employees, dates, att_df, split_by)
+            # 各ファイルに渡すのは、その従業員・日付の勤怠行だけ
+            for part in parts:
+                names = part.attendance['名前'].astype(str).str.strip()
+                part_days = days[part.attendance.index]
+                if not names.isin([e.strip() for e in part.employees]).all() or \
+                        not part_days.between(part.dates[0], part.dates[-1]).all():
+                    print(f"❌ {part.filename} に範囲外の勤怠行が渡されています")
+                    return False
+
+            expected = split_jinjer_frame(full, split_by)
+            buffer = io.BytesIO()
+            export_jinjer_zip(buffer, employees, dates[0], dates[-1], att_df, split_by=split_by, max_workers=2)
+            with zipfile.ZipFile(buffer) as zf:
+                names = zf.namelist()
+                if [p.filename for p in parts] != names or len(names) != len(expected):
+                    print(f"❌ {split_by} のファイル分けが想定外です: {names}")
+                    return False
+                for name, (label, frame) in zip(names, expected):
+                    if label not in name or zf.read(name) != b''.join(JinjerCsvStream(frame)):
+                        print(f"❌ {name} が期間全体の表を分けたものと一致しません")
+                        return False
+
+        print("✅ ファイルごとに組み立てた結果が期間全体の表と一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ ファイルごとの組み立てテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_roster_cache():
+    """名簿は行ごとに作ったマッピングと一致し、ファイルが変わるまで読み直さない"""
+    print("\n=== 従業員名簿のキャッシュテスト ===")
+
+    try:
+        import os
+        import shutil
+        import tempfile
+
+        from employee_roster import load_employee_roster
+        from optimal_attendance_export import build_jinjer_frame, get_employee_id
+        from src import ENCODING, normalize_name
+
+        workdir = tempfile.mkdtemp(prefix="roster_test_")
+        try:
+            path = os.path.join(workdir, "勤怠履歴.csv")
+            shutil.copy('test_input/勤怠履歴.csv', path)
+            att_df = pd.read_csv(path, encoding=ENCODING)
+
+            expected = {}
+            for _, row in att_df.iterrows():
+                name, emp_id = str(row.get('名前', '')).strip(), str(row.get('*従業員ID', '')).strip()
+                if name and emp_id and name != 'nan' and emp_id != 'nan' and normalize_name(name):
+                    expected[normalize_name(name)] = emp_id
+                    expected[name] = emp_id
+            names = list(dict.fromkeys(att_df['名前'].astype(str).str.strip()))
+
+            roster = load_employee_roster(path)
+            if dict(roster.ids) != expected or list(roster.display_names) != names:
+                print("❌ 名簿が行ごとのマッピングと一致しません")
+                return False
+            if load_employee_roster(path) is not roster or get_employee_id(names[0], path) != expected[names[0]]:
+                print("❌ 同じファイルで名簿が再利用されません")
+                return False
+
+            # ファイルが変わると読み直す
+            changed = att_df.copy()
+            changed.loc[changed['名前'].astype(str).str.strip() == names[0], '*従業員ID'] = 'x999'
+            changed.to_csv(path, index=False, encoding=ENCODING)
+            os.utime(path, ns=(roster.signature[1] + 10**9, roster.signature[1] + 10**9))
+            reloaded = load_employee_roster(path)
+            if reloaded is roster or reloaded.employee_id(names[0]) != 'x999':
+                print("❌ ファイルの変更後に読み直されません")
+                return False
+
+            # 勤怠データにIDがない従業員は渡した名簿から引く
+            frame = build_jinjer_frame([names[0]], '2025-02', att_df.drop(columns=['*従業員ID']), roster=reloaded)
+            if set(frame['*従業員ID']) != {'x999'}:
+                print(f"❌ 名簿のIDが使われません: {set(frame['*従業員ID'])}")
+                return False
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        print(f"✅ {len(roster)}名の名簿とキャッシュの更新を確認")
+        return True
+
+    except Exception as e:
+        print(f"❌ 従業員名簿のキャッシュテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_stream_matches_string,
+        test_quoting_and_encode_policy,
+        test_frame_columns,
+        test_gap_merge_matches_scalar,
+        test_range_export_zip,
+        test_parallel_zip_export,
+        test_group_split_matches_column,
+        test_export_parts_match_full_frame,
+        test_roster_cache,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
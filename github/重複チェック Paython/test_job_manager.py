@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+バックグラウンドジョブ管理のテスト
+進捗段階の通知・キャンセル・再接続（ジョブIDでの再取得）・一覧から外れたジョブの後片付けを確認する
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from pathlib import Path
+
+sys.path.append('.')
+
+
+def _copy_test_input() -> Path:
+    workdir = Path(tempfile.mkdtemp(prefix="job_test_"))
+    for name in ['サービス実態A.csv', 'サービス実態B.csv', '勤怠履歴.csv']:
+        shutil.copy(os.path.join('test_input', name), workdir / name)
+    return workdir
+
+
+def test_job_progress_and_result():
+    """エラーチェックをジョブとして実行し、段階ごとの進捗と結果を確認"""
+    print("=== ジョブ進捗・結果取得テスト ===")
+
+    try:
+        from job_manager import JobManager, JOB_DONE
+        from src import process
+
+        stages = []
+
+        def run(workdir, progress=None, cancel_event=None):
+            def record(stage, fraction):
+                stages.append(stage)
+                progress(stage, fraction)
+            process(workdir, write_diagnostics=False, progress=record, cancel_event=cancel_event)
+            return sorted(p.name for p in workdir.glob("result_*.csv"))
+
+        manager = JobManager(max_workers=1)
+        workdir = _copy_test_input()
+        job = manager.submit(run, workdir, label="テスト")
+        job.future.result(timeout=60)
+
+        # 再実行後を想定してIDから再取得
+        reattached = manager.get(job.job_id)
+        if reattached is not job or reattached.status != JOB_DONE:
+            print(f"❌ ジョブの再取得に失敗: {reattached}")
+            return False
+        print(f"✅ ジョブ完了: {reattached.result}")
+
+        expected = ["ingest", "overlaps", "alternates", "coverage", "output"]
+        seen = list(dict.fromkeys(stages))
+        if [s for s in seen if s in expected] != expected:
+            print(f"❌ 進捗段階が不足しています: {seen}")
+            return False
+        print(f"✅ 進捗段階: {seen}")
+
+        if reattached.progress != 1.0:
+            print(f"❌ 完了時の進捗が1.0ではありません: {reattached.progress}")
+            return False
+
+        manager.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+        return True
+
+    except Exception as e:
+        print(f"❌ ジョブ進捗テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_job_cancellation():
+    """実行中ジョブのキャンセル"""
+    print("\n=== ジョブキャンセルテスト ===")
+
+    try:
+        from job_manager import JobManager, JOB_CANCELLED
+        from src import process
+
+        started = threading.Event()
+
+        def run(workdir, progress=None, cancel_event=None):
+            def hold(stage, fraction):
+                progress(stage, fraction)
+                if stage == "overlaps":
+                    started.set()
+                    time.sleep(0.2)
+            process(workdir, write_diagnostics=False, progress=hold, cancel_event=cancel_event)
+
+        manager = JobManager(max_workers=1)
+        workdir = _copy_test_input()
+        job = manager.submit(run, workdir, label="キャンセル")
+        started.wait(timeout=30)
+        manager.cancel(job.job_id)
+        job.future.result(timeout=60)
+
+        if job.status != JOB_CANCELLED:
+            print(f"❌ キャンセルされていません: {job.status}")
+            return False
+        if list(workdir.glob("result_*.csv")):
+            print("❌ キャンセル後に結果ファイルが出力されています")
+            return False
+        print(f"✅ キャンセル完了（段階: {job.stage}）")
+
+        manager.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+        return True
+
+    except Exception as e:
+        print(f"❌ ジョブキャンセルテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_job_cleanup():
+    """一覧から外れたジョブ（破棄・古い終了済みジョブの整理）の作業ディレクトリを削除する"""
+    print("\n=== ジョブの後片付けテスト ===")
+
+    try:
+        from job_manager import JobManager, JOB_CANCELLED
+
+        def make_dir():
+            return Path(tempfile.mkdtemp(prefix="job_cleanup_"))
+
+        def cleanup_of(path):
+            return lambda: shutil.rmtree(path, ignore_errors=True)
+
+        manager = JobManager(max_workers=1, max_finished=1)
+
+        # 終了済みのジョブを破棄するとすぐに削除される
+        done_dir = make_dir()
+        job = manager.submit(lambda progress=None, cancel_event=None: 1, label="完了", cleanup=cleanup_of(done_dir))
+        job.future.result(timeout=10)
+        if not done_dir.exists():
+            print("❌ 破棄する前に作業ディレクトリが削除されています")
+            return False
+        manager.discard(job.job_id)
+        if done_dir.exists() or manager.get(job.job_id) is not None:
+            print("❌ 破棄したジョブの作業ディレクトリが残っています")
+            return False
+
+        # 実行中のジョブを破棄するとキャンセルされ、終わってから削除される
+        started, release = threading.Event(), threading.Event()
+
+        def hold(progress=None, cancel_event=None):
+            started.set()
+            release.wait(timeout=10)
+
+        running_dir = make_dir()
+        job = manager.submit(hold, label="実行中", cleanup=cleanup_of(running_dir))
+        started.wait(timeout=10)
+        manager.discard(job.job_id)
+        if not running_dir.exists() or not job.cancel_event.is_set():
+            print("❌ 実行中のジョブの破棄が想定外です")
+            return False
+        release.set()
+        job.future.result(timeout=10)
+        if running_dir.exists():
+            print("❌ 破棄したジョブの終了後に作業ディレクトリが残っています")
+            return False
+
+        # 終了済みジョブが max_finished を超えると、古いものから整理して削除される
+        dirs = []
+        for i in range(3):
+            dirs.append(make_dir())
+            manager.submit(lambda progress=None, cancel_event=None: i, label=f"整理{i}",
+                           cleanup=cleanup_of(dirs[-1])).future.result(timeout=10)
+        if [d.exists() for d in dirs] != [False, True, True] or len(manager.jobs()) != 2:
+            print(f"❌ 古いジョブの整理が想定外です: {[d.exists() for d in dirs]}")
+            return False
+
+        manager.shutdown()
+        for d in dirs:
+            shutil.rmtree(d, ignore_errors=True)
+        print("✅ 破棄・整理したジョブの作業ディレクトリを削除")
+        return True
+
+    except Exception as e:
+        print(f"❌ ジョブの後片付けテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """メインテスト実行"""
+    print("バックグラウンドジョブ管理テスト開始")
+    print("=" * 50)
+
+    tests = [
+        test_job_progress_and_result,
+        test_job_cancellation,
+        test_job_cleanup,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
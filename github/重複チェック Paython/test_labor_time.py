@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+労働時間の計算（labor_time）のテスト
+jinjer が出力した勤怠履歴の労働時間列と同じ値になること、深夜帯の切り出し、
+jinjer形式の表の労働時間列がすべて埋まることを確認する
+"""
+
+import sys
+import traceback
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+
+
+def _intervals(items):
+    """[(行, 'H:MM', 'H:MM'), ...] → (行, 開始分, 終了分)"""
+    from src import parse_minute_of_day
+
+    rows = np.array([r for r, _, _ in items], dtype=np.int64)
+    starts = np.array([parse_minute_of_day(s) for _, s, _ in items], dtype=np.int64)
+    ends = np.array([parse_minute_of_day(e) for _, _, e in items], dtype=np.int64)
+    return rows, starts, ends
+
+
+def test_matches_jinjer_columns():
+    """予定あり・なしの日が、jinjer の出力した労働時間列と一致する"""
+    print("=== jinjer の労働時間列との一致テスト ===")
+
+    try:
+        from labor_time import compute_labor_times
+
+        # 勤怠履歴（jinjer 出力）の行から：行0〜3は予定あり、行4は予定なし
+        shifts = _intervals([(0, '8:51', '18:18'), (1, '9:40', '17:34'), (2, '6:30', '7:30'), (2, '9:00', '17:00'),
+                             (3, '9:09', '12:30'), (4, '6:00', '7:00'), (4, '18:00', '19:00')])
+        breaks = _intervals([(0, '12:15', '13:42'), (1, '13:05', '14:05'), (2, '12:00', '13:00'),
+                             (3, '10:00', '11:00')])
+        schedule = _intervals([(0, '8:00', '18:00'), (1, '9:00', '17:00'), (2, '9:00', '17:00'),
+                               (3, '9:00', '17:00')])
+        labor = compute_labor_times(5, shifts, breaks, schedule)
+
+        expected = {
+            # 総労働, 休憩, 総残業, 法定内(スケ), 法定内(労働), 法定外, 不足(スケ), 不足(労働)
+            0: (480, 87, 18, 18, 0, 0, 51, 120),
+            1: (414, 60, 34, 34, 0, 0, 40, 66),
+            2: (480, 60, 60, 60, 0, 0, 0, 0),
+            3: (141, 60, 0, 0, 0, 0, 279, 339),
+            4: (120, 0, 120, 120, 120, 0, 0, 0),
+        }
+        for row, values in expected.items():
+            actual = (labor.worked[row], labor.breaks[row], labor.overtime[row], labor.legal_overtime_schedule[row],
+                      labor.legal_overtime_hours[row], labor.statutory_overtime[row], labor.shortage_schedule[row],
+                      labor.shortage_hours[row])
+            if tuple(int(v) for v in actual) != values:
+                print(f"❌ 行{row} の労働時間が jinjer と一致しません: {actual} != {values}")
+                return False
+
+        print("✅ 予定あり・なしの労働時間列が jinjer と一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ jinjer の労働時間列との一致テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_night_and_overtime():
+    """深夜帯（22:00〜29:00・0:00〜5:00）は休憩を除いて数え、8時間超は法定外残業になる"""
+    print("\n=== 深夜・法定外残業のテスト ===")
+
+    try:
+        from labor_time import compute_labor_times, window_minutes
+
+        clipped = window_minutes(np.array([-60, 300, 1300, 1700]), np.array([120, 1320, 1800, 3000]))
+        if clipped.tolist() != [180, 0, 420, 40 + 240]:
+            print(f"❌ 深夜帯との重なりが想定外です: {clipped.tolist()}")
+            return False
+
+        # 行0：18:00〜32:14（休憩 23:00〜24:00）、行1：4:00〜6:00、行2：勤務なし
+        labor = compute_labor_times(3, _intervals([(0, '18:00', '32:14'), (1, '4:00', '6:00')]),
+                                    _intervals([(0, '23:00', '24:00'), (2, '12:00', '13:00')]))
+        if (labor.worked.tolist(), labor.breaks.tolist(), labor.night.tolist(), labor.statutory_overtime.tolist(),
+                labor.has_work.tolist()) != ([794, 120, 0], [60, 0, 0], [360, 60, 0], [314, 0, 0],
+                                             [True, True, False]):
+            print(f"❌ 深夜・法定外残業が想定外です: {labor.worked.tolist()} {labor.night.tolist()}")
+            return False
+
+        print("✅ 深夜帯の切り出しと法定外残業を確認")
+        return True
+
+    except Exception as e:
+        print(f"❌ 深夜・法定外残業のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_builder_fills_labor_columns():
+    """jinjer形式の表で、休憩・予定がそのまま出力され、労働時間の列がすべて埋まる"""
+    print("\n=== jinjer形式の労働時間列のテスト ===")
+
+    try:
+        from labor_time import LABOR_COLUMNS
+        from optimal_attendance_export import build_jinjer_frame
+
+        att_df = pd.DataFrame([
+            {'名前': '山田 太郎', '*従業員ID': 's001', '*年月日': '2025-02-03',
+             '出勤予定時刻': '18:00', '退勤予定時刻': '32:00', '出勤1': '18:05', '退勤1': '32:06',
+             '休憩1': '23:00', '復帰1': '24:00'},
+        ])
+        row = build_jinjer_frame(['山田 太郎'], '2025-02', att_df).iloc[2]
+        if (row['出勤予定時刻'], row['退勤予定時刻'], row['休憩1'], row['復帰1']) != ('18:00', '32:00', '23:00', '24:00'):
+            print(f"❌ 予定・休憩が出力されません: {row[['出勤予定時刻', '退勤予定時刻', '休憩1', '復帰1']].tolist()}")
+            return False
+        values = row[list(dict.fromkeys(LABOR_COLUMNS))].tolist()
+        # 総労働, 実労働, 休憩, 総残業, 法定内(スケ), 法定内(労働), 法定外, 深夜, 不足(スケ), 不足(労働)
+        if values != ['13:01', '13:01', '1:00', '5:01', '0:00', '0:00', '5:01', '6:00', '0:05', '0:59']:
+            print(f"❌ 労働時間の列が想定外です: {values}")
+            return False
+
+        print("✅ 労働時間の列をすべて出力")
+        return True
+
+    except Exception as e:
+        print(f"❌ jinjer形式の労働時間列のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_matches_jinjer_columns,
+        test_night_and_overtime,
+        test_builder_fills_labor_columns,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重複（表記ゆれを含む重複）検出のテスト
+髙橋/高橋・全角スペース・先頭の◯ の違いを同一とみなせること、
+ブロック化で候補ペアが総当たりより大幅に少ないことを確認する
+"""
+
+import sys
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+
+
+def _variant_frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "担当所員": ["高橋 太郎", "髙橋　太郎", "◯高橋太郎", "佐藤 花子", "佐藤 花子", "鈴木"],
+        "日付": ["2024/1/5", "2024-01-05", "2024/01/05", "2024/1/5", "2024/1/6", "2024/1/5"],
+        "開始時間": ["9:00", "09:00", "9:10", "10:00", "10:00", "9:00"],
+        "サービス内容": ["身体", "身体", "身体 ", "生活", "生活", "身体"],
+    })
+
+
+def test_name_variants_grouped():
+    """表記ゆれのある名前を同じグループにまとめる"""
+    print("=== 表記ゆれの同一視テスト ===")
+
+    try:
+        from near_duplicates import find_near_duplicates, GROUP_COL
+
+        df = _variant_frame()
+        columns = list(df.columns)
+
+        exact = df.duplicated(subset=columns, keep=False).sum()
+        result = find_near_duplicates(df, columns, date_column="日付", time_column="開始時間",
+                                      time_tolerance=10)
+        if exact != 0 or sorted(result.rows.index) != [0, 1, 2] or result.group_count != 1:
+            print(f"❌ 表記ゆれがまとまりません: {list(result.rows.index)}")
+            return False
+        print(f"✅ 完全一致 {exact}件 → 近似一致 {len(result.rows)}件（{result.group_count}グループ）")
+
+        # 許容差なしなら 9:10 の行は別扱い
+        strict = find_near_duplicates(df, columns, date_column="日付", time_column="開始時間")
+        if sorted(strict.rows.index) != [0, 1]:
+            print(f"❌ 時刻の許容差が効いていません: {list(strict.rows.index)}")
+            return False
+        print("✅ 時刻の許容差で判定が変わる")
+
+        # 時間帯ブロックでも同じ結果（許容差が時間帯の境界をまたぐ場合も含む）
+        by_time = find_near_duplicates(df, columns, block_by="time", bucket_minutes=5,
+                                       date_column="日付", time_column="開始時間", time_tolerance=10)
+        if sorted(by_time.rows.index) != [0, 1, 2] or by_time.rows[GROUP_COL].nunique() != 1:
+            print(f"❌ 時間帯ブロックの結果が一致しません: {list(by_time.rows.index)}")
+            return False
+        print("✅ 時間帯ブロックでも同じグループ")
+        return True
+
+    except Exception as e:
+        print(f"❌ 表記ゆれテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_blocking_limits_candidates():
+    """ブロック化で候補ペアを絞り、総当たりと同じグループを得る"""
+    print("\n=== ブロッキングテスト ===")
+
+    try:
+        from near_duplicates import NearDuplicateFinder
+
+        rng = np.random.default_rng(0)
+        n = 100000
+        names = np.array(["高橋太郎", "髙橋 太郎", "佐藤花子", "◯佐藤　花子", "鈴木一郎"])
+        df = pd.DataFrame({
+            "担当所員": rng.choice(names, n) + rng.integers(0, 200, n).astype(str),
+            "日付": (pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 31, n), "D")).strftime("%Y/%m/%d"),
+            "開始時間": [f"{h}:{m:02d}" for h, m in zip(rng.integers(8, 18, n), rng.integers(0, 4, n) * 15)],
+        })
+
+        finder = NearDuplicateFinder(list(df.columns), date_column="日付", time_column="開始時間")
+        start_time = time.time()
+        result = finder.find(df)
+        elapsed = time.time() - start_time
+        print(f"✅ {n}行: 照合ペア {result.candidate_pairs} / 総当たり {result.all_pairs}（{elapsed:.2f}秒）")
+
+        if result.candidate_pairs * 1000 > result.all_pairs:
+            print("❌ 候補ペアが十分に絞れていません")
+            return False
+
+        # 許容差0なら正規化した列の完全一致と同じ
+        norm = finder.normalized_frame(df)
+        norm["開始時間"] = norm["_minutes"]
+        expected = norm.duplicated(subset=list(df.columns), keep=False)
+        if set(result.rows.index) != set(np.flatnonzero(expected)):
+            print("❌ 正規化キーでの完全一致と結果が異なります")
+            return False
+        print(f"✅ {result.group_count}グループ（正規化キーの一致と同じ）")
+        return True
+
+    except Exception as e:
+        print(f"❌ ブロッキングテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    """メインテスト実行"""
+    print("近似重複検出テスト開始")
+    print("=" * 50)
+
+    tests = [
+        test_name_variants_grouped,
+        test_blocking_limits_candidates,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
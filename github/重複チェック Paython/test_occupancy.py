@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+稼働状況（負荷曲線）のテスト
+分ごとの同時サービス数が区間を1件ずつ数えた値と一致すること、0:00 をまたぐ区間が翌日に入ること、
+負荷の最も低い連続時間帯の検索を確認する
+"""
+
+import sys
+import traceback
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+
+from test_roster_analysis import _load_optimizer
+
+
+def test_minute_load_matches_intervals():
+    """分ごとの同時サービス数が区間を1件ずつ数えた値と一致する"""
+    print("=== 分単位の負荷テスト ===")
+
+    try:
+        optimizer = _load_optimizer()
+        occupancy = optimizer.occupancy()
+        services = pd.concat(optimizer.service_dfs.values(), ignore_index=True)
+        services = services[services["_開始DT"] < services["_終了DT"]]
+
+        load = occupancy.minute_load()
+        if len(load) != occupancy.n_days * 24 * 60:
+            print(f"❌ 長さが日数と一致しません: {len(load)}")
+            return False
+        origin = occupancy.days[0]
+        minutes = np.arange(len(load))
+        expected = np.zeros(len(load), dtype=np.int64)
+        for s, e in zip(services["_開始DT"], services["_終了DT"]):
+            expected += (minutes >= (s - origin).total_seconds() // 60) & (minutes < (e - origin).total_seconds() // 60)
+        if not np.array_equal(load, expected):
+            print("❌ 全体の負荷が一致しません")
+            return False
+
+        # 従業員別・施設別の合計は全体と一致し、除外は全体から本人分を引いたもの
+        by_staff = sum(occupancy.minute_load(staff=name) for name in occupancy.staff_names)
+        by_facility = sum(occupancy.minute_load(facility=name) for name in occupancy.facility_names)
+        if not (np.array_equal(by_staff, load) and np.array_equal(by_facility, load)):
+            print("❌ 従業員別・施設別の合計が全体と一致しません")
+            return False
+        name = occupancy.staff_names[0]
+        if not np.array_equal(occupancy.minute_load(exclude_staff=name),
+                              load - occupancy.minute_load(staff=name)):
+            print("❌ 本人を除いた負荷が一致しません")
+            return False
+
+        curve = occupancy.curve(resolution=15)
+        if len(curve) != len(load) // 15 or abs(curve.sum() * 15 - load.sum()) > 1e-6:
+            print("❌ 15分単位の曲線が分単位の負荷と整合しません")
+            return False
+        if occupancy.daily_matrix(resolution=60).shape != (occupancy.n_days, 24):
+            print("❌ 日 × 時刻の表の形が想定外です")
+            return False
+
+        print(f"✅ {occupancy.n_days}日 × 1440分の負荷が一致（最大 {load.max()}件）")
+        return True
+
+    except Exception as e:
+        print(f"❌ 分単位の負荷テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_day_spill_and_window():
+    """0:00 をまたぐ区間は翌日に入り、最も空いている連続時間帯を探せる"""
+    print("\n=== 日またぎと時間帯検索テスト ===")
+
+    try:
+        from occupancy import OccupancyIndex
+
+        day = pd.Timestamp("2025-02-01")
+        occupancy = OccupancyIndex(
+            ["A", "A", "B"], ["施設1", "施設1", "施設2"],
+            [day + pd.Timedelta(hours=22), day + pd.Timedelta(hours=9), day + pd.Timedelta(hours=8)],
+            [day + pd.Timedelta(hours=26), day + pd.Timedelta(hours=17), day + pd.Timedelta(hours=20)],
+        )
+        matrix = occupancy.daily_matrix(resolution=60, staff="A")
+        if occupancy.n_days != 2 or matrix.iloc[1, :2].tolist() != [1.0, 1.0] or matrix.iloc[1, 2] != 0:
+            print("❌ 日をまたぐ区間が翌日に入っていません")
+            return False
+
+        # 8:00-20:00 が埋まっているので、8時間の空きは 20:00-28:00 の連続した時間帯になる
+        start, end, load = occupancy.lowest_load_window(hours=8, resolution=15, staff="B")
+        if end - start != 8 * 60 or load != 0 or not (start >= 20 * 60 or start + 8 * 60 <= 8 * 60):
+            print(f"❌ 空いている時間帯が想定外です: {start}-{end} 負荷 {load}")
+            return False
+        start, end, load = occupancy.lowest_load_window(hours=8, resolution=15, latest_end=24 * 60, staff="B")
+        if (start, end, load) != (0, 8 * 60, 0.0):
+            print(f"❌ 終了時刻の上限が反映されません: {start}-{end}")
+            return False
+
+        frame = occupancy.frame(resolution=60, by="facility")
+        if set(frame["施設"]) != {"施設1", "施設2"} or len(frame) != 2 * 48:
+            print("❌ グラフ用データの形が想定外です")
+            return False
+
+        print("✅ 日またぎ・連続時間帯・グラフ用データを確認")
+        return True
+
+    except Exception as e:
+        print(f"❌ 日またぎと時間帯検索テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_minute_load_matches_intervals,
+        test_day_spill_and_window,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+勤務パターンの what-if 評価のテスト
+評価器の勤怠履歴超過の件数が、同じパターンの勤怠から build_work_intervals と
+interval_fully_covered で数えた件数と一致すること、候補の並び順、グリッド探索の未カバー時間を確認する
+"""
+
+import random
+import sys
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+
+from test_roster_analysis import _load_optimizer
+
+
+def _format_minutes(minutes: int) -> str:
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def test_matches_rebuilt_attendance():
+    """パターンから勤怠を作り直して数えた件数と一致する"""
+    print("=== 勤怠を作り直した場合との一致テスト ===")
+
+    try:
+        from pattern_evaluator import PatternEvaluator, attendance_work_days
+        from src import ATT_DATE_COL, ATT_NAME_COL, Interval, build_work_intervals, interval_fully_covered
+
+        optimizer = _load_optimizer()
+        rng = random.Random(0)
+        checked = 0
+        for key, analysis in optimizer.analyze_all_employees().items():
+            services = analysis["service_records"]
+            if services.empty:
+                continue
+            services = services[services["_開始DT"].notna() & services["_終了DT"].notna()]
+            evaluator = PatternEvaluator.from_analysis(analysis)
+            days = attendance_work_days(analysis["attendance_data"])
+
+            for _ in range(10):
+                start = rng.randrange(0, 30 * 60, 15)
+                end = start + rng.randrange(0, 24 * 60, 15)
+                breaks = [(start + 120, start + 180)] if rng.random() < 0.5 else []
+                rows = [{
+                    ATT_NAME_COL: key,
+                    ATT_DATE_COL: str(pd.Timestamp(day).date()),
+                    "出勤1": _format_minutes(start),
+                    "退勤1": _format_minutes(end),
+                    "休憩1": _format_minutes(breaks[0][0]) if breaks else None,
+                    "復帰1": _format_minutes(breaks[0][1]) if breaks else None,
+                } for day in days]
+                att_map, _ = build_work_intervals(pd.DataFrame(
+                    rows, columns=[ATT_NAME_COL, ATT_DATE_COL, "出勤1", "退勤1", "休憩1", "復帰1"]))
+                covers = att_map.get(key, [])
+                expected = sum(not interval_fully_covered(Interval(s, e), covers)
+                               for s, e in zip(services["_開始DT"], services["_終了DT"]))
+                got = int(evaluator.excess_counts([start], [end], breaks)[0])
+                if got != expected:
+                    print(f"❌ {key} {_format_minutes(start)}-{_format_minutes(end)}: {got} != {expected}")
+                    return False
+                checked += 1
+
+        print(f"✅ {checked}パターンで一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 勤怠を作り直した場合との一致テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_rank_candidate_shifts():
+    """候補はエラーの少ない順に並び、削減数は評価器の件数と整合する"""
+    print("\n=== 候補の順位付けテスト ===")
+
+    try:
+        optimizer = _load_optimizer()
+        key, analysis = next((k, a) for k, a in optimizer.analyze_all_employees().items()
+                             if not a["service_records"].empty)
+        candidates = [(start, start + length) for start in range(0, 24 * 60, 15)
+                      for length in range(4 * 60, 12 * 60 + 1, 60)]
+        ranked = optimizer.rank_candidate_shifts(key, candidates, analysis)
+        if len(ranked) != len(candidates):
+            print(f"❌ 候補数が一致しません: {len(ranked)} != {len(candidates)}")
+            return False
+        reductions = [r.error_reduction for r in ranked]
+        if reductions != sorted(reductions, reverse=True):
+            print("❌ エラーの少ない順になっていません")
+            return False
+
+        evaluator = optimizer.pattern_evaluator(key, analysis)
+        best = ranked[0]
+        if evaluator.error_reduction(best.current_pattern, best.proposed_pattern) != best.error_reduction:
+            print("❌ 削減数が評価器の件数と一致しません")
+            return False
+        if len(optimizer.rank_candidate_shifts(key, candidates, analysis, top_n=3)) != 3:
+            print("❌ top_n が反映されません")
+            return False
+
+        # 提案パターンの実現可能性は現在からの変更幅で決まり、おすすめはエラー削減→実現可能性の順で選ぶ
+        from optimization import calculate_optimization_impact, feasibility_score
+        patterns = optimizer.generate_optimization_patterns(key, analysis)
+        for r in patterns + ranked[:5]:
+            if r.feasibility_score != feasibility_score(r.current_pattern, r.proposed_pattern):
+                print(f"❌ {r.pattern_name} の実現可能性が変更幅から計算されていません: {r.feasibility_score}")
+                return False
+        recommended = calculate_optimization_impact(patterns)["recommended_pattern"]
+        if (recommended.error_reduction, recommended.feasibility_score) != \
+                max((r.error_reduction, r.feasibility_score) for r in patterns):
+            print(f"❌ おすすめのパターンが想定外です: {recommended.pattern_name}")
+            return False
+
+        print(f"✅ {len(candidates)}候補を評価: 最良 {best.pattern_name}（削減 {best.error_reduction}件）")
+        return True
+
+    except Exception as e:
+        print(f"❌ 候補の順位付けテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_grid_search_uncovered_minutes():
+    """グリッド探索の未カバー時間が、勤怠を作り直して重なりを足し合わせた値と一致する"""
+    print("\n=== グリッド探索テスト ===")
+
+    try:
+        from pattern_evaluator import attendance_work_days
+        from src import ATT_DATE_COL, ATT_NAME_COL, build_work_intervals
+
+        optimizer = _load_optimizer()
+        checked = 0
+        for key, analysis in optimizer.analyze_all_employees().items():
+            services = analysis["service_records"]
+            if services.empty:
+                continue
+            services = services[services["_開始DT"].notna() & services["_終了DT"].notna()]
+            evaluator = optimizer.pattern_evaluator(key, analysis)
+            days = attendance_work_days(analysis["attendance_data"])
+
+            started = time.time()
+            found = evaluator.search()
+            elapsed = time.time() - started
+            if len(found) < 1000 or elapsed > 0.5:
+                print(f"❌ 候補数・時間が想定外です: {len(found)}件 {elapsed:.3f}秒")
+                return False
+
+            for i in found.pareto[:5]:
+                breaks = found.break_periods(i)
+                rows = [{
+                    ATT_NAME_COL: key,
+                    ATT_DATE_COL: str(pd.Timestamp(day).date()),
+                    "出勤1": _format_minutes(int(found.work_starts[i])),
+                    "退勤1": _format_minutes(int(found.work_ends[i])),
+                    "休憩1": _format_minutes(breaks[0][0]) if breaks else None,
+                    "復帰1": _format_minutes(breaks[0][1]) if breaks else None,
+                } for day in days]
+                att_map, _ = build_work_intervals(pd.DataFrame(
+                    rows, columns=[ATT_NAME_COL, ATT_DATE_COL, "出勤1", "退勤1", "休憩1", "復帰1"]))
+                total = covered = 0.0
+                for s, e in zip(services["_開始DT"], services["_終了DT"]):
+                    total += (e - s).total_seconds()
+                    for iv in att_map.get(key, []):
+                        covered += max(0.0, (min(e, iv.end) - max(s, iv.start)).total_seconds())
+                expected = (total - covered) / 60
+                if abs(expected - found.uncovered_minutes[i]) > 1e-6:
+                    print(f"❌ {key} の未カバー時間が一致しません: {found.uncovered_minutes[i]} != {expected}")
+                    return False
+                checked += 1
+
+            # パレート前線は実働が長いほど未カバーが少ない
+            if np.any(np.diff(found.uncovered_minutes[found.pareto]) >= 0):
+                print("❌ パレート前線が単調になっていません")
+                return False
+
+        results = optimizer.search_shift_patterns(key, analysis, max_results=3)
+        if not 1 <= len(results) <= 3:
+            print(f"❌ 探索パターンの件数が想定外です: {len(results)}")
+            return False
+
+        # 提案パターンには探索パターン（パレート最適な候補）が入る
+        from optimization import SEARCH_PATTERN_COUNT
+        patterns = optimizer.generate_optimization_patterns(key, analysis)
+        expected = optimizer.search_shift_patterns(key, analysis, max_results=SEARCH_PATTERN_COUNT)
+        if repr(patterns[:len(expected)]) != repr(expected) or \
+                any(p.pattern_name in ("微調整パターン", "サービス最適化パターン") for p in patterns):
+            print(f"❌ 提案パターンに探索パターンが入っていません: {[p.pattern_name for p in patterns]}")
+            return False
+
+        print(f"✅ パレート候補{checked}件の未カバー時間が一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ グリッド探索テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_matches_rebuilt_attendance,
+        test_rank_candidate_shifts,
+        test_grid_search_uncovered_minutes,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -23,7 +23,7 @@ def test_large_data_performance():
     print("=== 大量データパフォーマンステスト ===")
     
     try:
-        from streamlit_app import prepare_grid_data, collect_summary
+        from grid_engine import prepare_grid_data, collect_summary
         
         # 既存のテストデータを使用
         result_paths = [
@@ -234,7 +234,7 @@ def test_concurrent_operations():
     print("\n=== 並行処理シミュレーションテスト ===")
     
     try:
-        from streamlit_app import prepare_grid_data
+        from grid_engine import prepare_grid_data
         
         # 複数回の処理を連続実行してメモリリークをチェック
         initial_memory = get_memory_usage()
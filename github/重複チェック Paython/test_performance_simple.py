@@ -17,7 +17,7 @@ def test_large_data_performance():
     print("=== 大量データパフォーマンステスト ===")
     
     try:
-        from streamlit_app import prepare_grid_data, collect_summary
+        from grid_engine import prepare_grid_data, collect_summary
         
         # 既存のテストデータを使用
         result_paths = [
@@ -196,7 +196,7 @@ def test_concurrent_operations():
     print("\n=== 並行処理シミュレーションテスト ===")
     
     try:
-        from streamlit_app import prepare_grid_data
+        from grid_engine import prepare_grid_data
         
         # 複数回の処理を連続実行して処理時間の安定性をチェック
         result_paths = [
@@ -259,7 +259,7 @@ def test_data_volume_scalability():
     print("\n=== データ量スケーラビリティテスト ===")
     
     try:
-        from streamlit_app import prepare_grid_data
+        from grid_engine import prepare_grid_data
         
         result_paths = [
             'test_input/result_サービス実態A.csv',
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全従業員一括分析のテスト
+analyze_all_employees が従業員ごとの analyze_employee_patterns と同じ結果を返すこと、
+区間演算エンジンの被覆判定・重複ペア数が src の関数と、エラー内訳が process() のフラグと一致すること、
+process() が返す表で作ったエンジンを複数スレッドで共有できることを確認する
+"""
+
+import random
+import sys
+import tempfile
+import threading
+import traceback
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+
+
+def _load_inputs():
+    from src import ENCODING, build_service_records
+
+    att_df = pd.read_csv('test_input/勤怠履歴.csv', encoding=ENCODING)
+    service_dfs = {}
+    for facility in ['サービス実態A', 'サービス実態B']:
+        path = Path('test_input') / f'{facility}.csv'
+        service_dfs[facility] = build_service_records(
+            path, pd.read_csv(path, encoding=ENCODING), facility, staff_col='担当所員'
+        )
+    return att_df, service_dfs
+
+
+def _load_optimizer(**kwargs):
+    from optimization import WorkOptimizer
+
+    att_df, service_dfs = _load_inputs()
+    return WorkOptimizer(att_df, service_dfs, **kwargs)
+
+
+def test_roster_matches_per_employee():
+    """一括分析の結果と提案パターンが従業員ごとの分析と一致する"""
+    print("=== 一括分析の一致テスト ===")
+
+    try:
+        optimizer = _load_optimizer()
+        roster = optimizer.analyze_all_employees()
+        if not roster:
+            print("❌ 一括分析の結果が空です")
+            return False
+
+        # 分析結果はエンジン内に保持されるので、従業員ごとの分析は別のエンジンで行う
+        single_optimizer = _load_optimizer()
+        for key, analysis in roster.items():
+            single = single_optimizer.analyze_employee_patterns(analysis["employee_name"])
+            for field in ["normalized_name", "total_work_days", "total_work_hours",
+                          "error_analysis", "work_intervals", "pattern_inputs"]:
+                if analysis[field] != single[field]:
+                    print(f"❌ {key} の {field} が一致しません: {analysis[field]} != {single[field]}")
+                    return False
+            pd.testing.assert_frame_equal(analysis["service_records"], single["service_records"])
+            pd.testing.assert_frame_equal(analysis["attendance_data"].reset_index(drop=True),
+                                          single["attendance_data"].reset_index(drop=True))
+
+            batch = optimizer.generate_optimization_patterns(key, analysis)
+            direct = single_optimizer.generate_optimization_patterns(analysis["employee_name"])
+            if repr(batch) != repr(direct):
+                print(f"❌ {key} の提案パターンが一致しません")
+                return False
+
+        # 従業員ごとの分析でも、勤怠の名前の正規化は値の種類ごとに1回だけ
+        import optimization
+        calls = []
+        original = optimization.normalize_name
+        optimization.normalize_name = lambda s: (calls.append(s), original(s))[1]
+        try:
+            counting_optimizer = _load_optimizer()
+            for analysis in roster.values():
+                counting_optimizer.analyze_employee_patterns(analysis["employee_name"])
+        finally:
+            optimization.normalize_name = original
+        unique_names = counting_optimizer.att_df['名前'].nunique(dropna=False)
+        if len(calls) > unique_names + len(roster):
+            print(f"❌ 名前の正規化が多すぎます: {len(calls)}回（名前 {unique_names}種類・{len(roster)}名）")
+            return False
+
+        print(f"✅ {len(roster)}名分が従業員ごとの分析と一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 一括分析の一致テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_interval_engine_matches_src():
+    """被覆判定と重複ペア数がランダムな区間で src と一致する"""
+    print("\n=== 区間演算エンジンの一致テスト ===")
+
+    try:
+        from interval_engine import CoverageIndex, count_overlapping_pairs, to_seconds
+        from src import Interval, find_overlaps, interval_fully_covered
+
+        rng = random.Random(0)
+        base = datetime(2024, 4, 1)
+
+        def random_interval(max_minutes=600):
+            start = base + timedelta(minutes=rng.randrange(0, 3 * 24 * 60), seconds=rng.choice([0, 30]))
+            return start, start + timedelta(minutes=rng.randrange(0, max_minutes))
+
+        staff = [f"職員{i}" for i in range(6)]
+        # 職員5 は勤務区間なし
+        att_map = {name: [Interval(*random_interval()) for _ in range(rng.randrange(1, 6))]
+                   for name in staff[:5]}
+        att_map["勤務なし"] = []
+
+        targets = [(rng.choice(staff), *random_interval(180)) for _ in range(400)]
+        coverage = CoverageIndex(att_map)
+        codes = coverage.codes_for([t[0] for t in targets])
+        starts = to_seconds([t[1] for t in targets])
+        ends = to_seconds([t[2] for t in targets])
+        got = coverage.fully_covered(codes, starts, ends)
+        expected = np.array([interval_fully_covered(Interval(s, e), att_map.get(name, []))
+                             for name, s, e in targets])
+        if not np.array_equal(got, expected):
+            print(f"❌ 被覆判定が {int((got != expected).sum())} 件一致しません")
+            return False
+
+        group_codes = np.array([staff.index(t[0]) for t in targets], dtype=np.int64)
+        pairs = count_overlapping_pairs(group_codes, starts, ends, len(staff))
+        for i, name in enumerate(staff):
+            rows = pd.DataFrame([{"_開始DT": s, "_終了DT": e, "_担当所員": n, "_担当所員_norm": n}
+                                 for n, s, e in targets if n == name])
+            if rows.empty:
+                continue
+            overlaps = [(a, b) for a, b in find_overlaps(rows, rows) if a != b]
+            if pairs[i] != len(overlaps) // 2:
+                print(f"❌ {name} の重複ペア数が一致しません: {pairs[i]} != {len(overlaps) // 2}")
+                return False
+
+        print(f"✅ 被覆判定{len(targets)}件・重複ペア数{int(pairs.sum())}件が一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ 区間演算エンジンの一致テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_parallel_generation():
+    """プロセスプールでの一括生成が順次生成と一致し、CSVに一括出力できる"""
+    print("\n=== 並列生成テスト ===")
+
+    try:
+        from grid_engine import read_result_csv
+        from optimization import export_optimization_results, generate_all_patterns
+        from src import ProcessCancelled
+
+        optimizer = _load_optimizer()
+        serial = dict(generate_all_patterns(optimizer, max_workers=1))
+        parallel = dict(generate_all_patterns(optimizer, max_workers=2, chunk_size=2))
+        if serial.keys() != parallel.keys() or any(repr(serial[k]) != repr(parallel[k]) for k in serial):
+            print("❌ 並列生成の結果が順次生成と一致しません")
+            return False
+
+        with tempfile.TemporaryDirectory() as tmp:
+            out_path = Path(tmp) / "optimization.csv"
+            exported = export_optimization_results(parallel, out_path)
+            if len(read_result_csv(str(out_path))) != sum(len(r) for r in parallel.values()) or exported.empty:
+                print("❌ 一括出力の行数が一致しません")
+                return False
+
+        cancel = threading.Event()
+        cancel.set()
+        try:
+            list(generate_all_patterns(optimizer, max_workers=2, chunk_size=2, cancel_event=cancel))
+            print("❌ キャンセルが反映されません")
+            return False
+        except ProcessCancelled:
+            pass
+
+        print(f"✅ {len(parallel)}名分を並列生成・{len(exported)}行を一括出力")
+        return True
+
+    except Exception as e:
+        print(f"❌ 並列生成テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_injected_index_and_cache():
+    """構築済みの勤怠インデックスを使い、分析結果は invalidate まで使い回す"""
+    print("\n=== インデックス注入と分析キャッシュのテスト ===")
+
+    try:
+        import pickle
+        from index_cache import AttendanceIndex
+        from optimization import WorkOptimizer
+        from src import build_staff_busy_map, build_work_intervals
+
+        att_df, service_dfs = _load_inputs()
+        index = AttendanceIndex.freeze("test", *build_work_intervals(att_df))
+        busy_map = build_staff_busy_map(service_dfs)
+        optimizer = WorkOptimizer(att_df, service_dfs, att_index=index, busy_map=busy_map)
+        if optimizer.att_map is not index.att_map or optimizer.busy_map is not busy_map:
+            print("❌ 渡したインデックスが使われていません")
+            return False
+
+        roster = optimizer.analyze_all_employees()
+        key = next(iter(roster))
+        if optimizer.analyze_all_employees() is not roster or optimizer.analyze_employee_patterns(key) is not roster[key]:
+            print("❌ 分析結果が再計算されています")
+            return False
+
+        optimizer.invalidate(key)
+        fresh = optimizer.analyze_employee_patterns(key)
+        if fresh is roster[key] or fresh["error_analysis"] != roster[key]["error_analysis"]:
+            print("❌ invalidate 後の再分析が想定外です")
+            return False
+        optimizer.invalidate()
+        if optimizer.analyze_all_employees() is roster or optimizer.busy_map is not busy_map:
+            print("❌ 全体の invalidate が想定外です")
+            return False
+
+        # 共有キャッシュの読み取り専用マップを持ったままワーカーへ渡せる
+        restored = pickle.loads(pickle.dumps(optimizer))
+        if restored.att_map != dict(index.att_map):
+            print("❌ pickle 後の勤怠インデックスが一致しません")
+            return False
+
+        reference = WorkOptimizer(att_df, service_dfs).analyze_all_employees()
+        for name, analysis in optimizer.analyze_all_employees().items():
+            if analysis["error_analysis"] != reference[name]["error_analysis"]:
+                print(f"❌ {name} の分析が自前で構築した場合と一致しません")
+                return False
+
+        print(f"✅ {len(roster)}名分をインデックス注入・キャッシュで分析")
+        return True
+
+    except Exception as e:
+        print(f"❌ インデックス注入と分析キャッシュのテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_error_breakdown_matches_checker():
+    """重複ペアの列挙が総当たりと一致し、従業員ごとのエラー内訳が process() のフラグと一致する"""
+    print("\n=== エラー内訳と process() の一致テスト ===")
+
+    try:
+        import shutil
+        from interval_engine import overlap_pairs
+        from grid_engine import read_result_csv
+        from src import CAT_COL, normalize_name, process
+
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            n1, n2 = rng.integers(1, 40, size=2)
+            c1, c2 = rng.integers(0, 4, n1), rng.integers(0, 4, n2)
+            s1, s2 = rng.integers(0, 48, n1) * 15, rng.integers(0, 48, n2) * 15
+            e1 = s1 + rng.choice([-15, 0, 15, 60, 180], n1)
+            e2 = s2 + rng.choice([-15, 0, 15, 60, 180], n2)
+            expected = [(i, j) for i in range(n1) for j in range(n2)
+                        if c1[i] == c2[j] and s1[i] < e2[j] and s2[j] < e1[i]]
+            i, j = overlap_pairs(c1, s1, e1, c2, s2, e2)
+            if list(zip(i.tolist(), j.tolist())) != expected:
+                print("❌ 重複ペアが総当たりと一致しません")
+                return False
+            i, j = overlap_pairs(c1, s1, e1)
+            if list(zip(i.tolist(), j.tolist())) != [(a, b) for a in range(n1) for b in range(a + 1, n1)
+                                                     if c1[a] == c1[b] and s1[a] < e1[b] and s1[b] < e1[a]]:
+                print("❌ 同じ組どうしの重複ペアが総当たりと一致しません")
+                return False
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for path in Path('test_input').glob('*.csv'):
+                if not path.name.startswith('result_'):
+                    shutil.copy(path, Path(tmp) / path.name)
+            process(Path(tmp), write_diagnostics=False)
+            flagged = {}
+            for path in Path(tmp).glob('result_*.csv'):
+                df = read_result_csv(path)
+                for staff, category in zip(df['担当所員'], df[CAT_COL].fillna('')):
+                    counts = flagged.setdefault(normalize_name(staff), {"勤怠履歴超過": 0, "施設間重複": 0, "事業所内重複": 0})
+                    for c in str(category).split('，'):
+                        if c in counts:
+                            counts[c] += 1
+
+        optimizer = _load_optimizer()
+        for key, analysis in optimizer.analyze_all_employees().items():
+            error_types = analysis["error_analysis"]["error_types"]
+            if error_types and error_types != flagged.get(key):
+                print(f"❌ {key} のエラー内訳が一致しません: {error_types} != {flagged.get(key)}")
+                return False
+
+        print(f"✅ {len(flagged)}名分のエラー内訳が process() のフラグと一致")
+        return True
+
+    except Exception as e:
+        print(f"❌ エラー内訳と process() の一致テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_shared_optimizer():
+    """process() が返すサービス実態の表でエンジンを作れ、複数スレッドで共有しても分析は1回だけ"""
+    print("\n=== 共有エンジンのテスト ===")
+
+    try:
+        import pickle
+        import shutil
+        from optimization import WorkOptimizer
+        from src import ENCODING, process
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for path in Path('test_input').glob('*.csv'):
+                if not path.name.startswith('result_'):
+                    shutil.copy(path, Path(tmp) / path.name)
+            service_records = process(Path(tmp), write_diagnostics=False)
+            att_df = pd.read_csv(Path(tmp) / '勤怠履歴.csv', encoding=ENCODING)
+
+        reference = _load_optimizer().analyze_all_employees()
+        optimizer = WorkOptimizer(att_df, service_records)
+        calls = []
+        original = optimizer._analyze_roster
+        optimizer._analyze_roster = lambda: calls.append(1) or original()
+
+        barrier = threading.Barrier(8)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(optimizer.analyze_all_employees())
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if len(calls) != 1 or any(r is not results[0] for r in results):
+            print(f"❌ 全従業員の分析が {len(calls)} 回実行されました")
+            return False
+        for key, analysis in results[0].items():
+            if analysis["error_analysis"] != reference[key]["error_analysis"]:
+                print(f"❌ {key} の分析が CSV から作った表の場合と一致しません")
+                return False
+
+        del optimizer._analyze_roster
+        restored = pickle.loads(pickle.dumps(optimizer))
+        restored.invalidate()
+        if restored.analyze_all_employees().keys() != reference.keys():
+            print("❌ pickle 後のエンジンで分析できません")
+            return False
+
+        print(f"✅ {len(results)}スレッドで {len(reference)}名分の分析を1回だけ実行")
+        return True
+
+    except Exception as e:
+        print(f"❌ 共有エンジンのテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_roster_matches_per_employee,
+        test_interval_engine_matches_src,
+        test_parallel_generation,
+        test_injected_index_and_cache,
+        test_error_breakdown_matches_checker,
+        test_shared_optimizer,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
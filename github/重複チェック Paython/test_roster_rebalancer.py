@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全従業員リバランスのテスト
+差分更新で追跡したエラー数が全件の数え直しと一致すること、
+結果を src の関数で数え直しても同じ件数になること、勤務時間の上限を守ることを確認する
+"""
+
+import sys
+import traceback
+
+sys.path.append('.')
+
+from test_roster_analysis import _load_optimizer
+
+
+def _recount_with_src(service_dfs, result):
+    """リバランス後の担当・勤務区間で src の関数を使って数え直す"""
+    from src import Interval, find_overlaps, interval_fully_covered
+
+    updated = {}
+    for facility, df in service_dfs.items():
+        df = df.copy()
+        # 担当所員の列はカテゴリ型なので、新しい名前を書き込めるよう文字列の列に戻す
+        df["_担当所員_norm"] = df["_担当所員_norm"].astype(object)
+        df["_担当所員"] = df["_担当所員"].astype(object)
+        moved = result.reassignments[result.reassignments["施設"] == facility]
+        df.loc[moved["行"].tolist(), "_担当所員_norm"] = moved["新しい担当所員"].tolist()
+        df.loc[moved["行"].tolist(), "_担当所員"] = moved["新しい担当所員"].tolist()
+        updated[facility] = df.dropna(subset=["_開始DT", "_終了DT"])
+        updated[facility] = updated[facility][updated[facility]["_担当所員_norm"].fillna("") != ""]
+
+    excess = same = cross = 0
+    facilities = list(updated)
+    for i, facility in enumerate(facilities):
+        df = updated[facility]
+        excess += sum(not interval_fully_covered(Interval(s, e), result.work_intervals.get(name, []))
+                      for s, e, name in zip(df["_開始DT"], df["_終了DT"], df["_担当所員_norm"]))
+        same += len([1 for a, b in find_overlaps(df, df) if a != b]) // 2
+        for other in facilities[i + 1:]:
+            cross += len(find_overlaps(df, updated[other]))
+    return {"勤怠履歴超過": excess, "施設間重複": cross, "事業所内重複": same}
+
+
+def test_rebalance_reduces_errors():
+    """エラー合計が減り、差分更新・全件集計・src での数え直しが一致する"""
+    print("=== リバランステスト ===")
+
+    try:
+        from roster_rebalancer import RosterRebalancer
+
+        optimizer = _load_optimizer()
+        rebalancer = RosterRebalancer(optimizer.att_map, optimizer.service_dfs, seed=0, max_extra_hours=2)
+        result = rebalancer.run(iterations=20000, time_limit=30)
+
+        if result.total_after > result.total_before:
+            print(f"❌ エラーが増えています: {result.errors_before} -> {result.errors_after}")
+            return False
+        if rebalancer.tracked_errors() != result.total_after:
+            print(f"❌ 差分更新の件数が全件集計と一致しません: {rebalancer.tracked_errors()} != {result.total_after}")
+            return False
+        recount = _recount_with_src(optimizer.service_dfs, result)
+        if recount != result.errors_after:
+            print(f"❌ src での数え直しと一致しません: {recount} != {result.errors_after}")
+            return False
+        for c, seconds in enumerate(rebalancer.work_seconds):
+            if seconds > rebalancer.hour_limit_seconds[c]:
+                print(f"❌ {rebalancer.staff_names[c]} が勤務時間の上限を超えています")
+                return False
+
+        print(f"✅ {result.errors_before} -> {result.errors_after}"
+              f"（担当替え{len(result.reassignments)}件・勤務区間の調整{len(result.shift_changes)}件）")
+        return True
+
+    except Exception as e:
+        print(f"❌ リバランステストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_rebalance_reduces_errors,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
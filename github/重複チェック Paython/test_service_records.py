@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+サービス実態の表（build_service_records・process の結果列）の型とメモリのテスト
+繰り返しの多い文字列列がカテゴリ型になり（行ごとに書き込む列は出力前に1回で変換）、元の列を複製せず、
+出力CSVの内容は変わらないことを確認する
+"""
+
+import shutil
+import sys
+import tempfile
+import traceback
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+
+
+def test_compact_layout():
+    """施設・担当所員はカテゴリ型で、元の列は複製されず、メモリ使用量が文字列のままの表より小さい"""
+    print("=== 表の型・メモリのテスト ===")
+
+    try:
+        from csv_ingest import read_records
+        from src import build_service_records, normalize_name, records_memory_report
+
+        path = Path('test_input/サービス実態B.csv')
+        source = read_records(path)
+        records = build_service_records(path, source, path.stem)
+
+        for col in ['施設', '_担当所員', '_担当所員_norm']:
+            if not isinstance(records[col].dtype, pd.CategoricalDtype):
+                print(f"❌ {col} がカテゴリ型ではありません: {records[col].dtype}")
+                return False
+        expected = [normalize_name(n) for n in source['担当所員'].astype(str).str.strip()]
+        if records['_担当所員_norm'].tolist() != expected or set(records['施設']) != {path.stem}:
+            print("❌ 担当所員の正規化・施設名が想定外です")
+            return False
+        if not np.shares_memory(records['担当所員'].to_numpy(), source['担当所員'].to_numpy()):
+            print("❌ 元の列が複製されています")
+            return False
+
+        # 比較用：補助列を文字列のまま持ち、元の列を複製した表
+        plain = source.copy()
+        for col in ['施設', '_担当所員', '_担当所員_norm']:
+            plain[col] = records[col].astype(object)
+        report = records_memory_report({'compact': records, 'plain': plain})
+        totals = report[report['列'] == '(合計)'].set_index('施設')['バイト']
+        added = report[report['列'].isin(['施設', '_担当所員', '_担当所員_norm'])].groupby('施設')['バイト'].sum()
+        if not added['compact'] * 2 < added['plain'] or not totals['compact'] < totals['plain']:
+            print(f"❌ メモリ使用量が減っていません: {added.to_dict()} {totals.to_dict()}")
+            return False
+
+        print(f"✅ 補助列 {added['plain']:,} → {added['compact']:,} バイト")
+        return True
+
+    except Exception as e:
+        print(f"❌ 表の型・メモリのテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_result_columns():
+    """process の結果CSVで、フラグ・詳細列がカテゴリ型・整数型でも文字列の列と同じ内容で出力され、メモリ使用量を出力する"""
+    print("\n=== 結果列のテスト ===")
+
+    try:
+        from src import ENCODING, process
+
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            for p in Path('test_input').glob('*.csv'):
+                if not p.name.startswith('result_'):
+                    shutil.copy(p, workdir / p.name)
+            process(workdir)
+
+            report = pd.read_csv(workdir / 'diagnostics' / '04_memory_usage.csv', encoding='utf-8-sig')
+            dtypes = report.set_index(['施設', '列'])['dtype']
+            if dtypes[('サービス実態A', 'エラー')] != 'category' or dtypes[('サービス実態A', '超過時間（分）')] != 'Int32':
+                print(f"❌ 結果列の型が想定外です: {dtypes.loc['サービス実態A'].to_dict()}")
+                return False
+
+            result_path = workdir / 'result_サービス実態A.csv'
+            try:
+                result = pd.read_csv(result_path, encoding=ENCODING, dtype=str, keep_default_na=False)
+            except UnicodeDecodeError:
+                result = pd.read_csv(result_path, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+            flagged = result[result['エラー'] == '◯']
+            if flagged.empty or (flagged['カテゴリ'] == '').any() or (result['カバー状況'] == '').any():
+                print("❌ フラグ・カバー状況が出力されていません")
+                return False
+            minutes = result['超過時間（分）']
+            if not minutes.str.fullmatch(r'\d*').all():
+                print(f"❌ 超過時間（分）が整数で出力されていません: {minutes.unique()[:5]}")
+                return False
+
+        print(f"✅ {len(flagged)}件のフラグと詳細列を出力")
+        return True
+
+    except Exception as e:
+        print(f"❌ 結果列のテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def test_row_labels_categorized_once():
+    """行ごとに書き込む文字列列は書き込み中に値の種類ごとのカテゴリ追加をせず、出力前に1回でカテゴリ型になる"""
+    print("\n=== 結果の文字列列の変換テスト ===")
+
+    try:
+        from src import COVERAGE_STATUSES, ROW_TEXT_COLUMNS, process
+
+        calls = []
+        original = pd.Categorical.add_categories
+
+        def counting(self, *args, **kwargs):
+            calls.append(args)
+            return original(self, *args, **kwargs)
+
+        pd.Categorical.add_categories = counting
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                workdir = Path(tmp)
+                for p in Path('input').glob('*.csv'):
+                    if not p.name.startswith('result_'):
+                        shutil.copy(p, workdir / p.name)
+                records = process(workdir, write_diagnostics=False)
+        finally:
+            pd.Categorical.add_categories = original
+
+        # カテゴリの追加はカバー状況（種類が決まっている列）だけ
+        if len(calls) > len(records) * len(COVERAGE_STATUSES):
+            print(f"❌ カテゴリの追加が {len(calls)} 回行われました")
+            return False
+        for fac, df in records.items():
+            for col in ROW_TEXT_COLUMNS:
+                if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                    print(f"❌ {fac} の {col} がカテゴリ型になっていません: {df[col].dtype}")
+                    return False
+        n_values = sum(df[col].nunique() for df in records.values() for col in ROW_TEXT_COLUMNS)
+
+        print(f"✅ {n_values}種類の値を書き込み、カテゴリの追加は {len(calls)} 回")
+        return True
+
+    except Exception as e:
+        print(f"❌ 結果の文字列列の変換テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+
+
+def main():
+    tests = [
+        test_compact_layout,
+        test_result_columns,
+        test_row_labels_categorized_once,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+複数ファイル・アウトオブコア重複検出のテスト
+全件をメモリに載せた pandas の duplicated と同じ行が、出所付きで得られることを確認する
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import traceback
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('.')
+
+
+def _write_monthly_files(workdir: str, n_rows: int = 20000):
+    """月別エクスポートを模したCSV（1つは cp932）と、出所付きの全件DataFrame"""
+    rng = np.random.default_rng(0)
+    paths, frames = [], []
+    for month, encoding in [(1, "utf-8"), (2, "cp932"), (3, "utf-8-sig")]:
+        df = pd.DataFrame({
+            "利用者名": rng.choice(["佐藤", "鈴木", "高橋", ""], n_rows),
+            "日付": rng.integers(1, 400, n_rows).astype(str),
+            "内容": rng.choice(["身体", "生活"], n_rows),
+        })
+        path = os.path.join(workdir, f"2024{month:02d}.csv")
+        df.to_csv(path, index=False, encoding=encoding)
+        paths.append(path)
+        frames.append(df.assign(ファイル=os.path.basename(path), 行番号=np.arange(1, n_rows + 1)))
+    return paths, pd.concat(frames, ignore_index=True)
+
+
+def test_matches_in_memory_duplicates():
+    """パーティション分割しても全件メモリ上での結果と一致する"""
+    print("=== 全件メモリ処理との一致テスト ===")
+
+    workdir = tempfile.mkdtemp(prefix="stream_dup_test_")
+    try:
+        from streaming_duplicates import find_duplicates
+
+        paths, all_rows = _write_monthly_files(workdir)
+        columns = ["利用者名", "日付"]
+        report = find_duplicates(paths, columns, os.path.join(workdir, "groups.csv"),
+                                 chunk_rows=5000, n_partitions=16)
+
+        expected = all_rows.duplicated(subset=columns, keep=False)
+        if report.total_rows != len(all_rows) or report.duplicate_rows != expected.sum():
+            print(f"❌ 件数が一致しません: {report.duplicate_rows} != {expected.sum()}")
+            return False
+        if report.redundant_rows != all_rows.duplicated(subset=columns).sum():
+            print("❌ 重複行数（2件目以降）が一致しません")
+            return False
+        print(f"✅ 重複行 {report.duplicate_rows}件 / {report.duplicate_groups}グループ")
+
+        groups = pd.concat(report.iter_groups(chunk_rows=3000), ignore_index=True)
+        got = set(zip(groups["ファイル"], groups["行番号"]))
+        want = set(zip(all_rows.loc[expected, "ファイル"], all_rows.loc[expected, "行番号"]))
+        if got != want:
+            print("❌ 出所（ファイル, 行番号）が一致しません")
+            return False
+
+        # 出所の行が実際に同じ値を持つこと
+        merged = groups.merge(all_rows, on=["ファイル", "行番号"], suffixes=("", "_元"))
+        if not all((merged[c] == merged[f"{c}_元"]).all() for c in columns):
+            print("❌ 出所の行の値が一致しません")
+            return False
+        if (groups.groupby("重複グループ")[columns].nunique() != 1).any().any():
+            print("❌ グループ内で値が異なります")
+            return False
+        print(f"✅ 出所付きグループ一致（ファイル間 {report.cross_file_groups}グループ）")
+        return True
+
+    except Exception as e:
+        print(f"❌ 一致テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_cancellation():
+    """キャンセル時は途中の出力を残さない"""
+    print("\n=== キャンセルテスト ===")
+
+    workdir = tempfile.mkdtemp(prefix="stream_dup_test_")
+    try:
+        from src import ProcessCancelled
+        from streaming_duplicates import StreamingDuplicateFinder
+
+        paths, _ = _write_monthly_files(workdir, n_rows=2000)
+        output = os.path.join(workdir, "groups.csv")
+        cancel = threading.Event()
+
+        def stop_after_split(stage, fraction):
+            if stage == "split" and fraction >= 1.0:
+                cancel.set()
+
+        try:
+            StreamingDuplicateFinder(["利用者名"], chunk_rows=500).run(
+                paths, output, progress=stop_after_split, cancel_event=cancel)
+            print("❌ キャンセルされませんでした")
+            return False
+        except ProcessCancelled:
+            pass
+        if os.path.exists(output):
+            print("❌ キャンセル後に出力が残っています")
+            return False
+        print("✅ キャンセル完了")
+        return True
+
+    except Exception as e:
+        print(f"❌ キャンセルテストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_folder_and_upload_inputs():
+    """フォルダ指定は基準フォルダ配下だけ、アップロードは中身（bytes）から列名を読める"""
+    print("\n=== 入力元の制限テスト ===")
+
+    workdir = tempfile.mkdtemp(prefix="stream_dup_test_")
+    try:
+        from streaming_duplicates import list_folder_csvs, read_header
+
+        base = os.path.join(workdir, "base")
+        os.makedirs(os.path.join(base, "2024"))
+        paths, _ = _write_monthly_files(os.path.join(base, "2024"), n_rows=10)
+        outside = os.path.join(workdir, "outside.csv")
+        shutil.copy(paths[0], outside)
+        os.symlink(outside, os.path.join(base, "2024", "link.csv"))
+
+        if list_folder_csvs("2024", base) != sorted(paths):
+            print(f"❌ フォルダ内のCSVが一致しません: {list_folder_csvs('2024', base)}")
+            return False
+        for folder in ["..", "../..", workdir, "missing"]:
+            try:
+                list_folder_csvs(folder, base)
+                print(f"❌ {folder} が拒否されませんでした")
+                return False
+            except ValueError:
+                pass
+
+        for path in paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            if read_header(data) != read_header(path) or read_header(path) != ["利用者名", "日付", "内容"]:
+                print(f"❌ bytes から読んだ列名が一致しません: {os.path.basename(path)}")
+                return False
+        print("✅ 基準フォルダの外（..・絶対パス・リンク先）は対象外、bytes から列名を読めた")
+        return True
+
+    except Exception as e:
+        print(f"❌ 入力元の制限テストでエラー: {str(e)}")
+        traceback.print_exc()
+        return False
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    """メインテスト実行"""
+    print("アウトオブコア重複検出テスト開始")
+    print("=" * 50)
+
+    tests = [
+        test_matches_in_memory_duplicates,
+        test_cancellation,
+        test_folder_and_upload_inputs,
+    ]
+
+    passed = 0
+    for test_func in tests:
+        if test_func():
+            passed += 1
+            print(f"✅ {test_func.__name__} 成功")
+        else:
+            print(f"❌ {test_func.__name__} 失敗")
+        print("-" * 30)
+
+    print(f"\nテスト結果: {passed}/{len(tests)} 成功")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
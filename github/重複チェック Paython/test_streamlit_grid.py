@@ -10,7 +10,7 @@ from pathlib import Path
 
 # streamlit_app.pyから必要な関数をインポート
 sys.path.append('.')
-from streamlit_app import prepare_grid_data, collect_summary
+from grid_engine import prepare_grid_data, collect_summary
 
 def test_grid_data_preparation():
     """グリッドデータ準備機能のテスト"""
@@ -207,6 +207,109 @@ def test_column_mapping():
         print(f"❌ カラムマッピングテストでエラー: {str(e)}")
         return False
 
+def test_grid_engine_index_filters():
+    """索引フィルタとページングのテスト（10万行規模の応答時間を含む）"""
+    print("\n=== 索引フィルタ・ページング機能テスト ===")
+    
+    import time
+    from grid_engine import GridEngine
+    
+    result_paths = [
+        "test_input/result_サービス実態A.csv",
+        "test_input/result_サービス実態B.csv"
+    ]
+    
+    try:
+        engine = GridEngine.from_paths(result_paths)
+        grid_df = engine.frame
+        
+        # 索引フィルタの結果がブールマスクでの抽出と一致すること
+        staff = engine.options('C')[:2]
+        positions = engine.select(errors_only=True, staff=staff)
+        expected = grid_df.index[(grid_df['A'] == '◯') & grid_df['C'].isin(staff)]
+        if list(positions) != list(expected):
+            print(f"❌ 索引フィルタの結果が一致しません: {list(positions)} != {list(expected)}")
+            return False
+        print(f"✅ 索引フィルタ（エラー×担当所員）: {len(positions)}件")
+        
+        positions = engine.select(categories=['勤怠履歴超過'])
+        expected = grid_df.index[grid_df['B'].astype(str).str.contains('勤怠履歴超過')]
+        if list(positions) != list(expected):
+            print("❌ カテゴリ索引の結果が一致しません")
+            return False
+        print(f"✅ カテゴリ索引: {len(positions)}件")
+        
+        # ページングは現在ページの行だけを返す
+        page = engine.page(engine.select(), page=2, page_size=10)
+        if len(page) != 10 or page.index[0] != 10:
+            print(f"❌ ページングが不正です: {len(page)}行")
+            return False
+        print("✅ ページング: 2ページ目10行")
+        
+        # 10万行規模でのフィルタ→ページ切り出し
+        repeat = 100000 // max(1, len(grid_df)) + 1
+        big_df = pd.concat([grid_df] * repeat, ignore_index=True)
+        for col in ['A', 'B', 'C', 'G', 'J', 'K', 'L', 'M', 'ファイル']:
+            big_df[col] = big_df[col].astype('category')
+        big_engine = GridEngine(big_df)
+        
+        start_time = time.time()
+        first, last = big_engine.date_bounds()
+        positions = big_engine.select(errors_only=True, staff=big_engine.options('C')[:3],
+                                      date_range=(first, last))
+        big_engine.page(positions, page=1, page_size=100)
+        elapsed = time.time() - start_time
+        print(f"✅ {len(big_df)}行でのフィルタ＋ページ: {elapsed * 1000:.1f}ms")
+        
+        if elapsed > 0.2:
+            print("❌ フィルタ→表示が200msを超えています")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ 索引フィルタテストでエラー: {str(e)}")
+        return False
+
+def test_detail_store_lookup():
+    """詳細ストアから1行だけを取り出すテスト"""
+    print("\n=== 詳細ストア取得テスト ===")
+    
+    from grid_engine import DetailStore, GridEngine, read_result_csv
+    
+    result_paths = [
+        "test_input/result_サービス実態A.csv",
+        "test_input/result_サービス実態B.csv"
+    ]
+    
+    try:
+        engine = GridEngine.from_paths(result_paths)
+        store = DetailStore(result_paths)
+        
+        # グリッドの (ファイル, 行番号) から元の結果行が取れること
+        picked = engine.frame.iloc[-1]
+        row = store.get(str(picked['ファイル']), int(picked['行番号']))
+        source = read_result_csv(result_paths[-1]).iloc[-1]
+        if row is None or not row.equals(source):
+            print("❌ 詳細ストアの行が元データと一致しません")
+            return False
+        print(f"✅ 行番号で取得: {picked['ファイル']} {picked['行番号']}行目")
+        
+        if not store.get_by_id(row['詳細ID']).equals(row):
+            print("❌ 詳細IDでの取得結果が一致しません")
+            return False
+        print(f"✅ 詳細IDで取得: {row['詳細ID']}")
+        
+        if store.get(str(picked['ファイル']), 0) is not None or store.get_by_id("存在しないID") is not None:
+            print("❌ 存在しない行で None が返りません")
+            return False
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ 詳細ストアテストでエラー: {str(e)}")
+        return False
+
 def main():
     """メインテスト実行"""
     print("Streamlitグリッド表示機能テスト開始")
@@ -216,7 +319,9 @@ def main():
         test_column_mapping,
         test_grid_data_preparation,
         test_summary_collection,
-        test_detailed_analysis_functions
+        test_detailed_analysis_functions,
+        test_grid_engine_index_filters,
+        test_detail_store_lookup
     ]
     
     passed = 0